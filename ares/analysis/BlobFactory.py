@@ -17,6 +17,8 @@ import numpy as np
 from inspect import ismethod
 from types import FunctionType
 from scipy.interpolate import RectBivariateSpline
+from ..util.Misc import LRUDict
+from ..util.ReadData import read_manifest, load_pickled, ColumnReader
 
 try:
     import dill as pickle
@@ -416,24 +418,86 @@ class BlobFactory(object):
 
             self._blobs.append(np.array(this_group))
             
+    @property
+    def blob_cache_size(self):
+        """
+        Maximum memory (in bytes) devoted to blobs already read from disk.
+        
+        Least recently used blobs are discarded when this is exceeded.
+        """
+        if not hasattr(self, '_blob_cache_size'):
+            self._blob_cache_size = 2**30
+        return self._blob_cache_size
+        
+    @blob_cache_size.setter
+    def blob_cache_size(self, value):
+        self._blob_cache_size = value
+        self.blob_data.maxbytes = value
+        self.blob_data._trim()
+    
     @property 
     def blob_data(self):
+        """
+        Cache of blobs (or pieces of blobs) already read from disk.
+        
+        Keys are blob names (entire blobs), or tuples of (name, index, start, 
+        stop) for pieces (see `get_blob_from_disk`).
+        """
         if not hasattr(self, '_blob_data'):
-            self._blob_data = {}
+            self._blob_data = LRUDict(maxsize=None, 
+                maxbytes=self.blob_cache_size)
         return self._blob_data
     
     @blob_data.setter
     def blob_data(self, value):
-        self._blob_data.update(value)    
+        self.blob_data.update(value)
     
-    def get_blob_from_disk(self, name):
-        return self.__getitem__(name)
-    
-    def __getitem__(self, name):
+    def get_blob_from_disk(self, name, index=None, start=None, stop=None):
+        """
+        Read a blob (or a piece of it) from disk, unless it's cached.
+        
+        Parameters
+        ----------
+        name : str
+            Name of blob.
+        index : tuple
+            Only read these elements of each sample, e.g., (k,) for the k'th
+            redshift of a 1-D blob, or (k1, k2) for a 2-D blob.
+        start, stop : int
+            Only read samples start:stop.
+            
+        Returns
+        -------
+        Masked array, where non-finite elements are masked.
+            
+        """
+        
+        if (index is None) and (start is None) and (stop is None):
+            key = name
+        else:
+            key = (name, index, start, stop)
+            
+        if key in self.blob_data:
+            return self.blob_data[key]
+        
+        # Just grab a piece of the entire blob if we've got it already
         if name in self.blob_data:
-            return self.blob_data[name]
+            data = self.blob_data[name][start:stop]
+            if index is not None:
+                data = data[(slice(None),) + tuple(index)]
+            return data
+        
+        data = self._read_blob(name, index, start, stop)
         
-        return self._get_item(name)
+        mask = np.logical_not(np.isfinite(data))
+        masked_data = np.ma.array(data, mask=mask)
+        
+        self.blob_data[key] = masked_data
+        
+        return masked_data
+    
+    def __getitem__(self, name):
+        return self.get_blob_from_disk(name)
     
     def blob_info(self, name):
         """
@@ -456,96 +520,129 @@ class BlobFactory(object):
                 
         return i, j, self.blob_nd[i], self.blob_dims[i]
     
-    def _get_item(self, name):
+    @property
+    def manifest(self):
+        """
+        Info about per-processor output files (shards), if there are any.
+        """
+        if not hasattr(self, '_manifest'):
+            self._manifest = read_manifest(self.prefix)
+        return self._manifest
         
-        i, j, nd, dims = self.blob_info(name)
+    @property
+    def columns(self):
+        """
+        Columnar outputs (see util.ReadData.ColumnReader), if there are any.
+        """
+        if not hasattr(self, '_columns'):
+            if os.path.isdir('%s.columns' % self.prefix):
+                self._columns = ColumnReader('%s.columns' % self.prefix)
+            else:
+                self._columns = None
+        return self._columns
     
+    @property
+    def cache_blobs(self):
+        """
+        Save blobs read from pickles to .npy files for quick access later?
+        
+        Each is stored as prefix.blob_<nd>d.<name>.cache.npy, which is 
+        memory-mapped on subsequent reads (so only the pieces we need are
+        ever read) unless the pickles it was built from have changed.
+        """
+        if not hasattr(self, '_cache_blobs'):
+            self._cache_blobs = True
+        return self._cache_blobs
+        
+    @cache_blobs.setter
+    def cache_blobs(self, value):
+        self._cache_blobs = value
+    
+    def _blob_files(self, nd, name):
+        """
+        Find all files containing a given blob.
+        
+        Returns
+        -------
+        Tuple: (list of filenames, number of bytes to read from each). The
+        latter is None unless the blob is stored in shards.
+        
+        """
+        
         fn = "%s.blob_%id.%s.pkl" % (self.prefix, nd, name)
-                
-        # Might have data split up among processors or checkpoints
-        by_proc = False
-        by_dd = False
-        if not os.path.exists(fn):
-            
-            # First, look for processor-by-processor outputs
-            fn = "%s.proc0000.blob_%id.%s.pkl" % (self.prefix, nd, name)
-            if os.path.exists(fn):
-                by_proc = True        
-                by_dd = False
-            # Then, those where each checkpoint has its own file    
-            else:
-                by_proc = False
-                by_dd = True
-                
-                search_for = "%s.dd????.blob_%id.%s.pkl" % (self.prefix, nd, name)
-                _ddf = glob.glob(search_for)
-                        
-                if self.include_checkpoints is None:
-                    ddf = _ddf
-                else:
-                    ddf = []
-                    for dd in self.include_checkpoints:
-                        ddid = str(dd).zfill(4)
-                        tmp = "%s.dd%s.blob_%id.%s.pkl" \
-                            % (self.prefix, ddid, nd, name)
-                        ddf.append(tmp)
-                
-                print ddf
-                
-                # Start with the first...
-                fn = ddf[0]        
         
+        if os.path.exists(fn):
+            return [fn], None
+            
+        # Shards, i.e., each processor wrote its own file
+        if self.manifest is not None:
+            suffix = "blob_%id.%s.pkl" % (nd, name)
+            fns = []; nbytes = []
+            for info in self.manifest['shards']:
+                fns.append('%s.%s.%s' % (self.prefix, info['shard'], suffix))
+                nbytes.append(info['sizes'].get(suffix, 0))
+            return fns, nbytes
+            
+        # Processor-by-processor outputs
+        fns = []
         fid = 0
-        to_return = []
-        while True:
+        fn = "%s.proc0000.blob_%id.%s.pkl" % (self.prefix, nd, name)
+        while os.path.exists(fn):
+            fns.append(fn)
+            fid += 1
+            fn = "%s.proc%s.blob_%id.%s.pkl" \
+                % (self.prefix, str(fid).zfill(4), nd, name)
+                
+        if fns:
+            return fns, None
             
-            if not os.path.exists(fn):
-                break
+        # Those where each checkpoint has its own file
+        if self.include_checkpoints is None:
+            search_for = "%s.dd????.blob_%id.%s.pkl" % (self.prefix, nd, name)
+            fns = sorted(glob.glob(search_for))
+        else:
+            for dd in self.include_checkpoints:
+                ddid = str(dd).zfill(4)
+                fn = "%s.dd%s.blob_%id.%s.pkl" % (self.prefix, ddid, nd, name)
+                if os.path.exists(fn):
+                    fns.append(fn)
         
-            f = open(fn, 'rb')
-                
-            all_data = []
-            while True:
-                try:
-                    data = pickle.load(f)
-                except EOFError:
-                    break
-                
-                all_data.extend(data)
-                
-            f.close()    
-                
-            # Used to have a squeeze() here for no apparent reason...
-            # somehow it resolved itself.
-            all_data = np.array(all_data, dtype=np.float64)
-            to_return.extend(all_data)
+        return fns, None
+    
+    def _read_blob(self, name, index=None, start=None, stop=None):
+        """
+        Read (a piece of) a blob from disk.
+        
+        See `get_blob_from_disk` for a description of parameters.
+        """
+        
+        i, j, nd, dims = self.blob_info(name)
+        
+        column = "blob_%id.%s" % (nd, name)
+        
+        # Columnar outputs: only read what we need
+        if (self.columns is not None) and (column in self.columns):
+            data = self.columns.read(column, start, stop, 
+                chunks=self.include_checkpoints, index=index)
+            return np.array(data, dtype=np.float64)
             
-            if not (by_proc or by_dd):
-                break
-                
-            fid += 1
+        fns, nbytes = self._blob_files(nd, name)
+        
+        if not fns:
+            raise IOError('No files found for blob %s.' % name)
             
-            if by_proc:
-                fn = "%s.proc%s.blob_%id.%s.pkl" \
-                    % (self.prefix, str(fid).zfill(4), nd, name)
-            else:
-                if (fid >= len(ddf)):
-                    break
-                    
-                fn = ddf[fid]
+        if self.cache_blobs:
+            cache = "%s.%s.cache.npy" % (self.prefix, column)
+        else:
+            cache = None
         
-        mask = np.logical_not(np.isfinite(to_return))
-        masked_data = np.ma.array(to_return, mask=mask)
+        data = load_pickled(fns, cache=cache, nbytes=nbytes)[start:stop]
         
-        # CAN BE VERY CONFUSING
-        #if by_proc and rank == 0:
-        #    f = open("%s.blob_%id.%s.pkl" % (self.prefix, nd, name), 'wb')
-        #    pickle.dump(masked_data, f)
-        #    f.close()
+        if index is not None:
+            data = data[(slice(None),) + tuple(index)]
         
-        self.blob_data = {name: masked_data}
+        return np.array(data, dtype=np.float64)
+        
+    def _get_item(self, name):
+        return self.get_blob_from_disk(name)
         
-        return masked_data
-    
-    
-    
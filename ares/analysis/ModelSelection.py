@@ -77,7 +77,8 @@ class ModelSelection(object):
         results = []
         for i in range(self.Nsets):
             result = \
-                self.ms(i).DeriveBlob(expr, varmap, save, name, clobber)
+                self.ms(i).DeriveBlob(expr=expr, varmap=varmap, save=save, 
+                    name=name, clobber=clobber)
             results.append(result)
             
         return results
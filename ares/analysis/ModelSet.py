@@ -25,6 +25,10 @@ from matplotlib.collections import PatchCollection
 from .MultiPhaseMedium import MultiPhaseMedium as aG21
 from ..util import labels as default_labels
 import matplotlib.patches as patches
+from ..util.Misc import LRUDict
+from ..util.WriteData import ColumnWriter
+from ..util.BlobExpression import BlobExpression
+from ..util.SortedIndex import SortedIndex, intersect
 from ..util.Aesthetics import Labeler
 from ..util.PrintInfo import print_model_set
 from .DerivedQuantities import DerivedQuantities as DQ
@@ -32,11 +36,15 @@ from ..util.ParameterFile import count_populations, par_info
 from ..util.SetDefaultParameterValues import SetAllDefaults, TanhParameters
 from ..util.Stats import Gauss1D, GaussND, error_2D, _error_2D_crude, \
     rebin, correlation_matrix
+from ..util.StreamingStats import RunningMoments, StreamingHistogram, \
+    QuantileSketch
 from ..util.ReadData import read_pickled_dict, read_pickle_file, \
     read_pickled_chain, read_pickled_logL, fcoll_gjah_to_ares, \
-    tanh_gjah_to_ares
+    tanh_gjah_to_ares, read_sharded_pickle, load_chain, file_signature
 
 import pickle 
+import types
+import hashlib
 
 try:
     from scipy.spatial import Delaunay
@@ -104,6 +112,83 @@ def err_str(label, mu, err, log, labels=None):
     
     return r'$%s$' % s
 
+def _hashable(x):
+    """
+    Convert (nested lists of) arrays to something we can use as a key.
+    """
+    if isinstance(x, np.ndarray):
+        return (x.dtype.str, x.shape, x.tostring())
+    elif type(x) in [list, tuple]:
+        return tuple([_hashable(element) for element in x])
+    
+    return x
+
+def _code_info(code):
+    """
+    Everything that determines what a code object does, as a string.
+    
+    Nested code objects (e.g., lambdas) are expanded, since their repr 
+    includes a memory address.
+    """
+    consts = [_code_info(const) if isinstance(const, types.CodeType) \
+        else repr(const) for const in code.co_consts]
+    return repr([code.co_code, consts, code.co_names, code.co_varnames,
+        code.co_freevars])
+    
+def _func_hash(func, version=None, seen=None):
+    """
+    Identify a function by its code, default arguments, the values of any 
+    variables it closes over, and the values of any (numerical) globals it 
+    refers to.
+    
+    Returns
+    -------
+    Hex digest, or None if `func` can't be identified reliably (e.g., if 
+    it's a built-in or callable object), unless `version` is supplied, in
+    which case that's used instead of `func`'s code.
+    
+    """
+    
+    if version is not None:
+        return hashlib.md5(repr(('version', version))).hexdigest()
+    
+    code = getattr(func, '__code__', None)
+    if code is None:
+        return None
+    
+    # Functions might refer to themselves (or each other)
+    if seen is None:
+        seen = set()
+    if id(func) in seen:
+        return code.co_name
+    seen.add(id(func))
+        
+    values = list(func.__defaults__ or [])
+    values.extend([cell.cell_contents for cell in (func.__closure__ or [])])
+    
+    gvars = func.__globals__
+    for name in code.co_names:
+        if (name in gvars) and \
+            isinstance(gvars[name], (int, float, str, np.ndarray)):
+            values.append((name, gvars[name]))
+    
+    info = [_code_info(code)]
+    for value in values:
+        if isinstance(value, types.FunctionType):
+            value = _func_hash(value, seen=seen)
+            if value is None:
+                return None
+        else:
+            value = repr(_hashable(value))
+            
+            # Default repr of arbitrary objects changes from run to run
+            if ' at 0x' in value:
+                return None
+                
+        info.append(value)
+    
+    return hashlib.md5(repr(info)).hexdigest()
+
 class ModelSubSet(object):
     def __init__(self):
         pass
@@ -232,8 +317,13 @@ class ModelSet(BlobFactory):
     @property
     def load(self):
         if not hasattr(self, '_load'):
-            if os.path.exists('%s.load.pkl' % self.prefix):
+            if (self.columns is not None) and ('load' in self.columns):
+                self._load = np.array(self.columns['load'])
+            elif os.path.exists('%s.load.pkl' % self.prefix):
                 self._load = read_pickle_file('%s.load.pkl' % self.prefix)
+            elif self.manifest is not None:
+                self._load = read_sharded_pickle(self.prefix, 'load.pkl', 
+                    self.manifest)
             else:
                 self._load = None
 
@@ -328,6 +418,8 @@ class ModelSet(BlobFactory):
         if not hasattr(self, '_is_mcmc'):
             if os.path.exists('%s.logL.pkl' % self.prefix):
                 self._is_mcmc = True
+            elif (self.columns is not None) and ('logL' in self.columns):
+                self._is_mcmc = True
             else:
                 self._is_mcmc = False
 
@@ -336,7 +428,9 @@ class ModelSet(BlobFactory):
     @property
     def facc(self):
         if not hasattr(self, '_facc'):
-            if os.path.exists('%s.facc.pkl' % self.prefix):
+            if (self.columns is not None) and ('facc' in self.columns):
+                self._facc = np.array(self.columns['facc'])
+            elif os.path.exists('%s.facc.pkl' % self.prefix):
                 f = open('%s.facc.pkl' % self.prefix, 'rb')
                 self._facc = []
                 while True:
@@ -439,6 +533,85 @@ class ModelSet(BlobFactory):
             print "WARNING: the chain has already been read.", 
             print "Be sure to delete `_chain` attribute before continuing."
 
+    @property
+    def cache_chain(self):
+        """
+        Save chain to prefix.chain.cache.npy after reading it from pickles?
+        
+        The cache is memory-mapped on subsequent loads, unless any of the 
+        files it was built from have since changed.
+        """
+        if not hasattr(self, '_cache_chain'):
+            self._cache_chain = True
+        return self._cache_chain
+        
+    @cache_chain.setter
+    def cache_chain(self, value):
+        self._cache_chain = value
+
+    @property
+    def chunk_size(self):
+        """
+        Number of samples to read at a time when computing statistics.
+
+        If None, all samples are read into memory at once. Otherwise,
+        get_1d_error, CovarianceMatrix, PosteriorPDF, and TrianglePlot make
+        chunked passes over the data (see `StreamStatistics`).
+        """
+        if not hasattr(self, '_chunk_size'):
+            self._chunk_size = None
+        return self._chunk_size
+
+    @chunk_size.setter
+    def chunk_size(self, value):
+        self._chunk_size = value
+
+    @property
+    def num_samples(self):
+        """
+        Number of samples (i.e., links in the chain, or grid points).
+        """
+        if (self.columns is not None) and ('chain' in self.columns):
+            chunks = self.columns.chunks['chain']
+            if self.include_checkpoints is not None:
+                chunks = [chunks[i] for i in self.include_checkpoints]
+            return sum([chunk[1] for chunk in chunks])
+            
+        return self.chain.shape[0]
+
+    def _load_chain(self, fns, nbytes=None):
+        if self.cache_chain:
+            cache = '%s.chain.cache.npy' % self.prefix
+        else:
+            cache = None
+        
+        if rank == 0 and len(fns) == 1:
+            print "Loading %s..." % fns[0]
+        elif rank == 0:
+            print "Loading %i files..." % len(fns)
+
+        t1 = time.time()
+        chain = load_chain(fns, cache=cache, nbytes=nbytes)
+        t2 = time.time()
+
+        if rank == 0:
+            print "Loaded chain in %.2g seconds.\n" % (t2 - t1)
+            
+        return chain
+        
+    def _mask_chain(self):
+        """
+        Convert self._chain to a masked array.
+        """
+        
+        # Don't allocate a (potentially huge) mask unless we need one
+        if np.any(self.mask):
+            mask2d = np.array([self.mask] * self._chain.shape[1]).T
+        else:
+            mask2d = np.ma.nomask
+            
+        self._chain = np.ma.array(self._chain, mask=mask2d)
+
     @property
     def chain(self):
         # Read MCMC chain
@@ -446,52 +619,43 @@ class ModelSet(BlobFactory):
             have_chain_f = os.path.exists('%s.chain.pkl' % self.prefix)
             have_f = os.path.exists('%s.pkl' % self.prefix)
             
-            if have_chain_f or have_f:
+            # Columnar outputs (see util.WriteData.ColumnWriter)
+            if (self.columns is not None) and ('chain' in self.columns):
+                self._chain = self.columns.read('chain', 
+                    chunks=self.include_checkpoints)
+                self._mask_chain()
+            
+            elif have_chain_f or have_f:
                 if have_chain_f:
                     fn = '%s.chain.pkl' % self.prefix
                 else:
                     fn = '%s.pkl' % self.prefix
                 
-                if rank == 0:
-                    print "Loading %s..." % fn
-
-                t1 = time.time()
-                self._chain = read_pickled_chain(fn)
-                t2 = time.time()
-
-                if rank == 0:
-                    print "Loaded %s in %.2g seconds.\n" % (fn, t2-t1)
-
-                mask2d = np.array([self.mask] * self._chain.shape[1]).T
-                self._chain = np.ma.array(self._chain, mask=mask2d)
+                self._chain = self._load_chain([fn])
+                self._mask_chain()
+            
+            # Each processor wrote its own shard (see util.WriteData)
+            elif self.manifest is not None:
+                fns = []; nbytes = []
+                for info in self.manifest['shards']:
+                    fns.append('%s.%s.chain.pkl' % (self.prefix, info['shard']))
+                    nbytes.append(info['sizes'].get('chain.pkl', 0))
+                
+                self._chain = self._load_chain(fns, nbytes)
+                self._mask_chain()
             
             # We might have data stored by processor
             elif os.path.exists('%s.proc0000.chain.pkl' % self.prefix):
                 i = 0
-                full_chain = []
-                full_mask = []
+                fns = []
                 fn = '%s.proc0000.chain.pkl' % self.prefix
-                while True:
-                                        
-                    if not os.path.exists(fn):
-                        break
-                                        
-                    this_chain = read_pickled_chain(fn)                                    
-                    full_chain.extend(this_chain.copy())                    
-                    
+                while os.path.exists(fn):
+                    fns.append(fn)
                     i += 1
                     fn = '%s.proc%s.chain.pkl' % (self.prefix, str(i).zfill(4))  
                     
-                self._chain = np.ma.array(full_chain, mask=0)
-
-                # So we don't have to stitch them together again.
-                # THIS CAN BE REALLY CONFUSING IF YOU, E.G., RUN A NEW
-                # CALCULATION AND FORGET TO CLEAR OUT OLD FILES.
-                # Hence, it is commented out (for now).
-                #if rank == 0:
-                #    f = open('%s.chain.pkl' % self.prefix, 'wb')
-                #    pickle.dump(self._chain, f)
-                #    f.close()
+                self._chain = self._load_chain(fns)
+                self._mask_chain()
 
             # If each "chunk" gets its own file.
             elif glob.glob('%s.dd*.chain.pkl' % self.prefix):
@@ -507,21 +671,20 @@ class ModelSet(BlobFactory):
                     outputs_to_read = \
                         sorted(glob.glob('%s.dd*.chain.pkl' % self.prefix))
                                 
-                full_chain = []
+                fns = []
                 for fn in outputs_to_read:
                     if not os.path.exists(fn):
                         print "Found no output: %s" % fn
                         continue
+                    fns.append(fn)
                     
-                    this_chain = read_pickled_chain(fn)                                    
-                    full_chain.extend(this_chain.copy())                    
-                    
-                self._chain = np.ma.array(full_chain, mask=0)
+                self._chain = self._load_chain(fns)
+                self._mask_chain()
 
             else:
                 self._chain = None            
 
-        return self._chain        
+        return self._chain
         
     @property
     def checkpoints(self):
@@ -552,7 +715,11 @@ class ModelSet(BlobFactory):
     @property
     def logL(self):
         if not hasattr(self, '_logL'):            
-            if os.path.exists('%s.logL.pkl' % self.prefix):
+            if (self.columns is not None) and ('logL' in self.columns):
+                self._logL = self.columns.read('logL', 
+                    chunks=self.include_checkpoints)
+                self._logL = np.ma.array(self._logL, mask=self.mask)
+            elif os.path.exists('%s.logL.pkl' % self.prefix):
                 self._logL = read_pickled_logL('%s.logL.pkl' % self.prefix)
                 self._logL = np.ma.array(self._logL, mask=self.mask)
             elif glob.glob('%s.dd*.logL.pkl' % self.prefix):
@@ -819,26 +986,42 @@ class ModelSet(BlobFactory):
             Nd = 1
             x1, x2 = constraints
     
-        # Figure out what these values translate to.
-        data, is_log = self.ExtractData(pars, ivar, take_log, un_log, 
-            multiplier)
-                        
-        # Figure out elements we want
-        xok_ = np.logical_and(data[pars[0]] >= x1, data[pars[0]] <= x2)
-        xok_MP = np.logical_or(np.abs(data[pars[0]] - x1) <= MP, 
-            np.abs(data[pars[0]] - x2) <= MP)
-        xok = np.logical_or(xok_, xok_MP)
-
-        if Nd == 2:
-            yok_ = np.logical_and(data[pars[1]] >= y1, data[pars[1]] <= y2)
-            yok_MP = np.logical_or(np.abs(data[pars[1]] - y1) <= MP, 
-                np.abs(data[pars[1]] - y2) <= MP)
-            yok = np.logical_or(yok_, yok_MP)
-            to_keep = np.logical_and(xok, yok)
+        # Look up elements we want in sorted indexes, rather than scanning
+        if self.use_indexes:
+            if Nd == 2:
+                ranges = [(x1, x2), (y1, y2)]
+            else:
+                ranges = [(x1, x2)]
+                
+            ids = self.Query(pars[0:Nd], ranges, ivar=ivar, take_log=take_log,
+                un_log=un_log, multiplier=multiplier)
+            
+            mask = np.ones(self.num_samples, dtype=bool)
+            mask[ids] = False
+            
         else:
-            to_keep = xok
+        
+            # Figure out what these values translate to.
+            data, is_log = self.ExtractData(pars, ivar, take_log, un_log, 
+                multiplier)
+                        
+            # Figure out elements we want
+            xok_ = np.logical_and(data[pars[0]] >= x1, data[pars[0]] <= x2)
+            xok_MP = np.logical_or(np.abs(data[pars[0]] - x1) <= MP, 
+                np.abs(data[pars[0]] - x2) <= MP)
+            xok = np.logical_or(xok_, xok_MP)
+
+            if Nd == 2:
+                yok_ = np.logical_and(data[pars[1]] >= y1, 
+                    data[pars[1]] <= y2)
+                yok_MP = np.logical_or(np.abs(data[pars[1]] - y1) <= MP, 
+                    np.abs(data[pars[1]] - y2) <= MP)
+                yok = np.logical_or(yok_, yok_MP)
+                to_keep = np.logical_and(xok, yok)
+            else:
+                to_keep = xok
 
-        mask = np.logical_not(to_keep)
+            mask = np.logical_not(to_keep)
         
         ##
         # CREATE NEW MODELSET INSTANCE
@@ -848,6 +1031,10 @@ class ModelSet(BlobFactory):
         # Set the mask! 
         model_set.mask = np.logical_or(mask, self.mask)
         
+        # No need to re-build (or re-load) indexes
+        model_set.use_indexes = self.use_indexes
+        model_set._indexes = self.indexes
+        
         i = 0
         while hasattr(self, 'slice_%i' % i):
             i += 1
@@ -858,6 +1045,141 @@ class ModelSet(BlobFactory):
         
         return model_set
         
+    @property
+    def use_indexes(self):
+        """
+        Use sorted indexes (see util.SortedIndex) to find samples in `Slice`?
+        
+        Each index is built the first time a quantity is queried, and saved
+        to disk (as prefix.<name>.<hash>.index.npy), so that subsequent 
+        queries (in this session or the next) don't have to scan every 
+        sample.
+        """
+        if not hasattr(self, '_use_indexes'):
+            self._use_indexes = False
+        return self._use_indexes
+        
+    @use_indexes.setter
+    def use_indexes(self, value):
+        self._use_indexes = value
+        
+    @property
+    def indexes(self):
+        """
+        Sorted indexes built (or loaded) so far. See `get_index`.
+        """
+        if not hasattr(self, '_indexes'):
+            self._indexes = {}
+        return self._indexes
+        
+    def _sources(self, par):
+        """
+        Files that quantity `par` is read from. If any of them change, 
+        anything computed from `par` (e.g., a saved index) is out of date.
+        """
+        
+        # Columnar outputs. Derived blobs have their own index.
+        derived = '%s.columns/index.derived.pkl' % self.prefix
+        if self._derived_column(par) is not None:
+            fns = [derived]
+        else:
+            fns = [fn for fn in \
+                sorted(glob.glob('%s.columns/index.*.pkl' % self.prefix)) \
+                if fn != derived]
+        
+        # Pickles, possibly split up by checkpoint or processor
+        if par in self.parameters:
+            fns.extend(sorted(glob.glob('%s.*chain.pkl' % self.prefix)))
+        else:
+            fns.extend(sorted(glob.glob('%s.*blob_?d.%s.pkl' \
+                % (self.prefix, par))))
+        
+        # Record of how much of each shard is safe to read
+        fns.extend(sorted(glob.glob('%s.*shard.pkl' % self.prefix)))
+        fns.extend(glob.glob('%s.manifest.pkl' % self.prefix))
+        
+        return fns
+        
+    def get_index(self, par, ivar=None, take_log=False, un_log=False, 
+        multiplier=1.):
+        """
+        Retrieve sorted index of some quantity, building it if necessary.
+        
+        See ExtractData for a description of parameters.
+        
+        Returns
+        -------
+        ares.util.SortedIndex.SortedIndex instance.
+        
+        """
+        
+        # Chain might have been re-ordered by sort_by_Tmin
+        key = _hashable([par, ivar, take_log, un_log, multiplier, 
+            self.include_checkpoints, hasattr(self, '_unsorted_chain')])
+            
+        if key in self.indexes:
+            return self.indexes[key]
+        
+        fn = '%s.%s.%s.index.npy' % (self.prefix, par, 
+            hashlib.md5(repr(key)).hexdigest()[0:8])
+        sources = self._sources(par)
+        
+        index = SortedIndex.load(fn, sources)
+        
+        if index is None:
+            index = SortedIndex(self._read_chunk(par, 0, self.num_samples, 
+                ivar=ivar, take_log=take_log, un_log=un_log, 
+                multiplier=multiplier))
+                
+            if rank == 0:
+                index.save(fn, sources)
+                
+        self.indexes[key] = index
+        
+        return index
+        
+    def Query(self, pars, ranges, ivar=None, take_log=False, un_log=False, 
+        multiplier=1.):
+        """
+        Find samples for which each quantity lies within some range.
+        
+        Uses sorted indexes, so after the first query of any quantity, this 
+        doesn't require scanning through all the samples.
+        
+        Parameters
+        ----------
+        pars : list
+            Quantities of interest. See ExtractData for description of this
+            and the last three parameters.
+        ranges : list
+            (min, max) values for each element of `pars`. Either can be None,
+            in which case the range is unbounded on that side.
+        
+        Returns
+        -------
+        Array of indices of (unmasked) samples satisfying all constraints, in
+        ascending order.
+            
+        """
+        
+        pars, take_log, multiplier, un_log, ivar = \
+            self._listify_common_inputs(pars, take_log, multiplier, un_log, 
+            ivar)
+            
+        ids = []
+        for k, par in enumerate(pars):
+            index = self.get_index(par, ivar=ivar[k], take_log=take_log[k],
+                un_log=un_log[k], multiplier=multiplier[k])
+            
+            ids.append(index.range(*ranges[k]))
+            
+        ids = intersect(ids)
+        
+        if hasattr(self, '_mask'):
+            ids = ids[np.asarray(self._mask)[ids] == 0]
+            
+        return ids
+        
     @property
     def plot_info(self):
         if not hasattr(self, '_plot_info'):
@@ -883,6 +1205,10 @@ class ModelSet(BlobFactory):
 
         if Npops == 1:
             return
+            
+        # Only need to do this once
+        if hasattr(self, '_unsorted_chain'):
+            return
         
         # Check to see if Tmin is common among all populations or not    
     
@@ -907,49 +1233,42 @@ class ModelSet(BlobFactory):
             if prefix == 'Tmin':
                 i_Tmin.append(i)
 
-        self._unsorted_chain = self.chain.copy()
-
-        # Otherwise, proceed to re-sort data
-        tmp_chain = np.zeros_like(self.chain)
-        for i in range(self.chain.shape[0]):
+        chain = np.ma.getdata(self.chain)
+        self._unsorted_chain = chain.copy()
 
-            # Pull out values of Tmin
-            Tmin = [self.chain[i,j] for j in i_Tmin]
+        # Only fix samples where Tmin isn't already in ascending order
+        Tmin = chain[:,i_Tmin]
+        fix = np.any(np.diff(Tmin, axis=1) <= 0, axis=1)
+        
+        # Proper ordering of Tmin indices for each sample
+        i_Tasc = np.argsort(Tmin, axis=1)
+        
+        # Loop over populations, and correct parameter values of all
+        # samples at once
+        tmp_chain = chain.copy()
+        for k, par in enumerate(self.parameters):
             
-            # If ordering is OK, move on to next link in the chain
-            if np.all(np.diff(Tmin) > 0):
-                tmp_chain[i,:] = self.chain[i,:].copy()
-                continue
+            # which pop?
+            m = re.search(r"\{([0-9])\}", par)
 
-            # Otherwise, we need to fix some stuff
+            if m is None:
+                continue
 
-            # Determine proper ordering of Tmin indices
-            i_Tasc = np.argsort(Tmin)
+            pop_num = int(m.group(1))
+            prefix = par.split(m.group(0))[0]
             
-            # Loop over populations, and correct parameter values
-            tmp_pars = np.zeros(len(self.parameters))
-            for k, par in enumerate(self.parameters):
+            # Population #pop_num becomes the one with the pop_num'th 
+            # lowest Tmin
+            for old_pop_num in range(Npops):
+                ok = np.logical_and(fix, i_Tasc[:,pop_num] == old_pop_num)
                 
-                # which pop?
-                m = re.search(r"\{([0-9])\}", par)
-
-                if m is None:
-                    tmp_pars.append()
-                    continue
-
-                pop_num = int(m.group(1))
-                prefix = par.split(m.group(0))[0]
+                old_loc = self.parameters.index('%s{%i}' % (prefix, 
+                    old_pop_num))
                 
-                new_pop_num = i_Tasc[pop_num]
-                
-                new_loc = self.parameters.index('%s{%i}' % (prefix, new_pop_num))
-                
-                tmp_pars[new_loc] = self.chain[i,k]
-
-            tmp_chain[i,:] = tmp_pars.copy()
+                tmp_chain[ok,k] = chain[ok,old_loc]
                         
-        del self.chain
-        self.chain = tmp_chain
+        self._chain = tmp_chain
+        self._mask_chain()
 
     @property
     def cosm(self):
@@ -979,12 +1298,20 @@ class ModelSet(BlobFactory):
             That is, this constraint will be applied in conjunction with
             previous constraints supplied.
         constraints : dict
-            Constraints to use in calculating logL
+            Constraints to use in calculating logL. Each key is the name of
+            a parameter or blob, and each value is a two-element list: the
+            independent variable(s) at which to evaluate it (None for
+            parameters and scalar blobs), and a function that returns the
+            likelihood given its value.
             
         Example
         -------
         # Assume redshift of turning pt. D is 15 +/- 2 (1-sigma Gaussian)
-        data = {'z': ['D', lambda x: np.exp(-(x - 15)**2 / 2. / 2.**2)]}
+        data = {'z_D': [None, lambda x: np.exp(-(x - 15)**2 / 2. / 2.**2)]}
+        self.set_constraint(**data)
+        
+        # Or, using the value of a 1-D blob at z=10
+        data = {'igm_Tk': [10., lambda x: np.exp(-(x - 10.)**2 / 2.)]}
         self.set_constraint(**data)
             
         Returns
@@ -993,46 +1320,35 @@ class ModelSet(BlobFactory):
             
         """    
 
-        if add_constraint and hasattr(self, 'logL'):
+        N = self.num_samples
+
+        if add_constraint and (self.logL is not None):
             pass
         else:    
-            self.logL = np.zeros(self.chain.shape[0])
+            self.logL = np.zeros(N)
 
         if hasattr(self, '_weights'):
             del self._weights
 
-        for i in range(self.chain.shape[0]):
-            logL = 0.0
+        # Evaluate each constraint for all samples at once
+        for element in constraints:
+
+            z, func = constraints[element]
             
-            if i >= self.blobs.shape[0]:
-                break
+            data = self._read_chunk(element, 0, N, ivar=z)
             
-            for element in constraints:
-
-                z, func = constraints[element]
+            # Not all functions will work on arrays
+            try:
+                like = np.asarray(func(data), dtype=float)
+            except (TypeError, ValueError):
+                like = None
                 
-                try:
-                    j = self.blob_redshifts.index(z)
-                except ValueError:
-                    ztmp = []
-                    for redshift in self.blob_redshifts_float:
-                        if redshift is None:
-                            ztmp.append(None)
-                        else:
-                            ztmp.append(round(redshift, 1))    
-
-                    j = ztmp.index(round(z, 1))
-                
-                if element in self.blob_names:
-                    k = self.blob_names.index(element)
-                    data = self.blobs[i,j,k]
-                else:
-                    k = self.derived_blob_names.index(element)
-                    data = self.derived_blobs[i,j,k]                
+            if (like is None) or (like.shape != data.shape):
+                like = np.array(map(func, data), dtype=float)
 
-                logL -= np.log(func(data))
-
-            self.logL[i] -= logL
+            # Blobs may be missing for the last few samples
+            n = min(len(like), N)
+            self.logL[0:n] += np.log(like[0:n])
 
         mask = np.isnan(self.logL)
 
@@ -1231,10 +1547,15 @@ class ModelSet(BlobFactory):
         return nu, levels
     
     def get_1d_error(self, par, ivar=None, nu=0.68, take_log=False,
-        limit=None, un_log=False, multiplier=1., peak='median'):
+        limit=None, un_log=False, multiplier=1., peak='median', skip=0,
+        stop=None):
         """
         Compute 1-D error bar for input parameter.
         
+        Samples are read via `iterate_chunks` (i.e., `chunk_size` at a time,
+        if set), so masked samples are excluded and those of non-MCMC 
+        calculations are weighted by their likelihood either way.
+        
         Parameters
         ----------
         par : str
@@ -1244,6 +1565,8 @@ class ModelSet(BlobFactory):
         peak : str
             Determines whether the 'best' value is the median, mode, or
             maximum likelihood point.
+        skip, stop : int
+            Number of samples at beginning and end of chain to exclude.
             
         Returns
         -------
@@ -1254,42 +1577,25 @@ class ModelSet(BlobFactory):
             tuple: (maximum likelihood value, negative error, positive error).
         """
 
-        #pars, take_log, multiplier, un_log, ivar = \
-        #    self._listify_common_inputs([par], take_log, multiplier, un_log, ivar)
-
-        to_hist, is_log = self.ExtractData(par, ivar=ivar, take_log=take_log, 
-            multiplier=multiplier)
-
-        # Need to weight results of non-MCMC runs explicitly
-        if not hasattr(self, 'weights'):
-            weights = None
-        else:
-            weights = self.weights
-
-        # Apply mask to weights
-        if weights is not None and to_hist[par].shape != weights.shape:
-            weights = weights[np.logical_not(mask)]
-
-        if to_hist[par] == []:
-            print "WARNING: error w/ %s" % par
-            print "@ z=" % z
-            return
+        q1 = 0.5 * 100 * (1. - nu)    
+        q2 = 100 * nu + q1
 
+        stats = self.StreamStatistics(par, ivar=ivar, take_log=take_log,
+            un_log=un_log, multiplier=multiplier, quantiles=True, skip=skip,
+            stop=stop)
+        sketch = stats['sketch'][par]
+        
         if peak == 'median':
-            N = len(self.logL)
-            psorted = np.sort(to_hist[par])
-            mu = psorted[int(N / 2.)]
+            mu = float(sketch.quantile(0.5))
         elif peak == 'mode':
-            mu = to_hist[par][np.argmax(self.logL)]
+            start, end = self._sample_range(skip, stop)
+            i = start + np.argmax(self.logL[start:end])
+            mu = self._read_chunk(par, i, i+1, ivar=ivar, take_log=take_log,
+                un_log=un_log, multiplier=multiplier)[0]
         else:
             mu = None
             
-        if hasattr(to_hist[par], 'compressed'):
-            to_hist[par] = to_hist[par].compressed()
-        
-        q1 = 0.5 * 100 * (1. - nu)    
-        q2 = 100 * nu + q1
-        lo, hi = np.percentile(to_hist[par], (q1, q2))
+        lo, hi = sketch.quantile(np.array([q1, q2]) / 100.)
         
         if mu is not None:
             sigma = (mu - lo, hi - mu)
@@ -1556,15 +1862,28 @@ class ModelSet(BlobFactory):
                 # Blobs are never stored as log10 of their true values
                 val *= multiplier[k]
                 
+            # Derived blobs in columnar store (see DeriveBlob)
+            elif self._derived_column(par) is not None:
+                val = self._read_chunk(par, 0, self.num_samples, 
+                    ivar=ivar[k], multiplier=multiplier[k])
+                
             # Only derived blobs in this else block, yes?                        
             else:
                 
-                cand = sorted(glob.glob('%s*.%s.pkl' % (self.prefix, par)))
+                if par in self.blob_data:
+                    dat = self.blob_data[par]
+                else:
+                    dat = None
+                    cand = sorted(glob.glob('%s*.%s.pkl' % (self.prefix, par)))
                 
-                if len(cand) == 1:
-                    f = open(cand[0], 'rb')     
-                    dat = pickle.load(f)
-                    f.close()
+                    if len(cand) == 1:
+                        f = open(cand[0], 'rb')     
+                        dat = pickle.load(f)
+                        f.close()
+                    
+                        self.blob_data[par] = dat
+                
+                if dat is not None:
                     
                     # What follows is real cludgey...sorry, future Jordan
                     nd = len(dat.shape) #- 1
@@ -1692,6 +2011,399 @@ class ModelSet(BlobFactory):
         
         return binvec
         
+    def _read_chunk(self, par, start, stop, ivar=None, take_log=False,
+        un_log=False, multiplier=1., full=None):
+        """
+        Read samples start:stop of a single quantity, with the same
+        transformations as ExtractData, but without applying any mask.
+
+        Derived blobs, and blobs stored as pickles, are read in full (and 
+        saved in `full`, a dictionary) the first time around.
+        """
+
+        if par in self.parameters:
+            j = self.parameters.index(par)
+
+            if (self.columns is not None) and ('chain' in self.columns):
+                val = self.columns.read('chain', start, stop,
+                    chunks=self.include_checkpoints, index=(j,))
+            else:
+                val = np.ma.getdata(self.chain)[start:stop,j]
+
+            val = np.array(val, dtype=np.float64)
+
+            if self.is_log[j] and un_log:
+                val = 10**val
+
+            if self.is_log[j] and (not un_log):
+                val += np.log10(multiplier)
+            else:
+                val *= multiplier
+
+            if take_log and (not self.is_log[j]):
+                val = np.log10(val)
+
+            return val
+
+        elif par in self.all_blob_names:
+            index = self._blob_index(par, ivar)
+
+            i, j, nd, dims = self.blob_info(par)
+            column = 'blob_%id.%s' % (nd, par)
+
+            # Columnar outputs can be read piece by piece
+            if (par not in self.blob_data) and (self.columns is not None) \
+                and (column in self.columns):
+                val = self._read_blob(par, index, start, stop)
+            else:
+                # Pickled blobs can only be read in full, so do that once 
+                # per pass (via the blob cache) rather than once per chunk
+                if full is None:
+                    full = {}
+
+                if par not in full:
+                    full[par] = self.get_blob_from_disk(par)
+
+                val = full[par][start:stop]
+                if index is not None:
+                    val = val[(slice(None),) + tuple(index)]
+                val = np.ma.filled(val, np.nan)
+
+            val = val * multiplier
+            
+        elif self._derived_column(par) is not None:
+            column = self._derived_column(par)
+            val = self.columns.read(column, start, stop, 
+                index=self._derived_index(column, ivar))
+            val = np.array(val, dtype=np.float64) * multiplier
+
+        else:
+            if full is None:
+                full = {}
+
+            if par not in full:
+                data, is_log = self.ExtractData(par, ivar=ivar,
+                    multiplier=multiplier)
+                full[par] = np.ma.filled(data[par].astype(float), np.nan)
+
+            val = full[par][start:stop]
+
+        if take_log:
+            val = np.log10(val)
+
+        return val
+
+    def _sample_range(self, skip=0, stop=None):
+        """
+        Indices (start, end) of samples to use, given the number of samples
+        to exclude at the beginning (`skip`) and end (`stop`) of the chain.
+        """
+        N = self.num_samples
+        start = min(int(skip), N)
+        if stop is None:
+            end = N
+        else:
+            end = max(N - int(stop), start)
+        return start, end
+
+    def _chunk_weights(self, start, stop):
+        """
+        Weights of samples start:stop, which are only needed for non-MCMC
+        (e.g., ModelGrid) calculations.
+        """
+        if self.is_mcmc:
+            return None
+
+        if hasattr(self, '_weights'):
+            return self._weights[start:stop]
+
+        logL = self.logL
+        if logL is None:
+            return None
+
+        return np.exp(np.ma.filled(logL[start:stop], -np.inf))
+
+    def iterate_chunks(self, pars, ivar=None, take_log=False, un_log=False,
+        multiplier=1., skip=0, stop=None):
+        """
+        Loop over the samples of some quantities, `chunk_size` at a time.
+
+        Masked samples, as well as those with non-finite values for any of
+        the quantities, are thrown out. So are those with zero weight, e.g.,
+        those ruled out by constraints supplied via `set_constraint`.
+
+        Parameters
+        ----------
+        pars : list
+            Quantities of interest. See ExtractData for description of this
+            and the following three parameters.
+        skip : int
+            Number of samples at beginning of chain to exclude.
+        stop : int
+            Number of samples at the end of the chain to exclude.
+
+        Returns
+        -------
+        Generator that yields tuples: (list of 1-D arrays of samples, one
+        per parameter; weights of those samples, or None).
+
+        """
+
+        pars, take_log, multiplier, un_log, ivar = \
+            self._listify_common_inputs(pars, take_log, multiplier, un_log,
+            ivar)
+
+        skip, N = self._sample_range(skip, stop)
+
+        if self.chunk_size is None:
+            size = max(N - skip, 1)
+        else:
+            size = int(self.chunk_size)
+
+        full = {}
+        for start in range(skip, N, size):
+            end = min(start + size, N)
+
+            data = []
+            for k, par in enumerate(pars):
+                data.append(self._read_chunk(par, start, end, ivar=ivar[k],
+                    take_log=take_log[k], un_log=un_log[k],
+                    multiplier=multiplier[k], full=full))
+
+            ok = np.ones(end - start, dtype=bool)
+
+            # Don't bother creating the mask if there isn't one already
+            if hasattr(self, '_mask'):
+                ok = np.logical_and(ok, np.asarray(self._mask[start:end]) == 0)
+
+            for val in data:
+                ok = np.logical_and(ok, np.isfinite(val))
+
+            weights = self._chunk_weights(start, end)
+
+            if weights is not None:
+                ok = np.logical_and(ok, weights > 0)
+                weights = weights[ok]
+
+            yield [val[ok] for val in data], weights
+
+    def StreamStatistics(self, pars, ivar=None, take_log=False, un_log=False,
+        multiplier=1., bins=None, quantiles=False, moments=False, skip=0,
+        stop=None):
+        """
+        Compute statistics in a single pass over the data, `chunk_size`
+        samples at a time, so that (in principle) arbitrarily large data
+        sets can be analyzed.
+
+        Parameters
+        ----------
+        pars : list
+            Quantities of interest. See ExtractData for description of this
+            and the following three parameters.
+        bins : list
+            If supplied, compute histogram of `pars` (one or two of them)
+            with these bin edges (one array per element of `pars`).
+        quantiles : bool
+            Build sketch of each quantity's distribution to compute quantiles.
+        moments : bool
+            Compute mean and covariance of `pars`.
+        skip, stop : int
+            Number of samples at beginning and end of chain to exclude.
+
+        Returns
+        -------
+        Dictionary containing ares.util.StreamingStats objects: 'hist', a
+        StreamingHistogram; 'sketch', a dictionary of QuantileSketch objects,
+        one per parameter; and 'moments', a RunningMoments object.
+
+        """
+
+        pars, take_log, multiplier, un_log, ivar = \
+            self._listify_common_inputs(pars, take_log, multiplier, un_log,
+            ivar)
+
+        stats = {}
+        if bins is not None:
+            stats['hist'] = StreamingHistogram(bins)
+        if quantiles:
+            # Don't compress if everything is in memory anyway
+            if self.chunk_size is None:
+                kw = {'max_exact': np.inf}
+            else:
+                kw = {}
+            stats['sketch'] = {par: QuantileSketch(**kw) for par in pars}
+        if moments:
+            stats['moments'] = RunningMoments(len(pars))
+
+        for data, weights in self.iterate_chunks(pars, ivar=ivar,
+            take_log=take_log, un_log=un_log, multiplier=multiplier,
+            skip=skip, stop=stop):
+
+            if bins is not None:
+                stats['hist'].update(data, weights=weights)
+            if quantiles:
+                for k, par in enumerate(pars):
+                    stats['sketch'][par].update(data[k], weights=weights)
+            if moments:
+                stats['moments'].update(np.array(data).T, weights=weights)
+
+        return stats
+
+    def _stream_bins(self, pars, ivar=None, take_log=False, un_log=False,
+        multiplier=1., bins=20, skip=0, stop=None, chunks=None):
+        """
+        Streaming equivalent of _set_bins.
+
+        If the number of bins is supplied, we need an extra pass over the
+        data to find the range of each quantity, unless the data have 
+        already been read (`chunks`, a list of outputs of iterate_chunks).
+        """
+
+        pars, take_log, multiplier, un_log, ivar = \
+            self._listify_common_inputs(pars, take_log, multiplier, un_log,
+            ivar)
+
+        if type(bins) is int:
+            need_range = True
+        else:
+            need_range = any([type(element) is int for element in bins])
+
+        ranges = {par: np.array([np.inf, -np.inf]) for par in pars}
+
+        if need_range and (chunks is None):
+            chunks = self.iterate_chunks(pars, ivar=ivar, take_log=take_log, 
+                un_log=un_log, multiplier=multiplier, skip=skip, stop=stop)
+                
+        if need_range:
+            for data, weights in chunks:
+                for k, par in enumerate(pars):
+                    if data[k].size == 0:
+                        continue
+                    ranges[par][0] = min(ranges[par][0], data[k].min())
+                    ranges[par][1] = max(ranges[par][1], data[k].max())
+
+        return self._set_bins(pars, ranges, take_log, bins)
+        
+    @property
+    def histogram_cache(self):
+        """
+        Histograms computed by `TriangleHistograms`, so that re-drawing
+        (or re-styling) a plot doesn't require reading any data.
+        """
+        if not hasattr(self, '_histogram_cache'):
+            self._histogram_cache = LRUDict(maxsize=8)
+        return self._histogram_cache
+        
+    def _data_state(self):
+        """
+        Digest of the mask and weights, i.e., whatever determines which 
+        samples contribute (and how much) to a histogram.
+        """
+        
+        digest = hashlib.md5()
+        digest.update(repr(self.include_checkpoints))
+        digest.update(repr(hasattr(self, '_unsorted_chain')))
+        
+        if hasattr(self, '_mask'):
+            digest.update(np.packbits(np.asarray(self._mask) != 0).tostring())
+            
+        if not self.is_mcmc:
+            if hasattr(self, '_weights'):
+                weights = self._weights
+            else:
+                weights = self.logL
+                
+            if weights is not None:
+                weights = np.ma.filled(weights, -np.inf).astype(float)
+                digest.update(weights.tostring())
+                
+        return digest.hexdigest()
+        
+    def TriangleHistograms(self, pars, ivar=None, take_log=False, 
+        un_log=False, multiplier=1., bins=20, skip=0, stop=None, oned=True,
+        twod=True):
+        """
+        Compute all 1-D and pairwise 2-D histograms of some quantities at 
+        once, i.e., everything needed for a triangle plot.
+        
+        Data are read only once (or twice, if the number of bins rather than
+        the bins themselves are supplied), `chunk_size` samples at a time
+        if `chunk_size` is set. Results are cached, and are only recomputed
+        if the inputs, mask, or weights change.
+        
+        Parameters
+        ----------
+        pars : list
+            Quantities of interest. See ExtractData for description of this
+            and the following three parameters.
+        bins : int, list
+            Number of bins, or bin edges, for each element of `pars`.
+        skip, stop : int
+            Number of samples at beginning and end of chain to exclude.
+        oned, twod : bool
+            Compute 1-D and/or 2-D histograms.
+            
+        Returns
+        -------
+        Dictionary of ares.util.StreamingStats.StreamingHistogram objects. 
+        Keys are (i,) for the 1-D histogram of pars[i], and (i, j) for the 2-D
+        histogram of pars[i] (x) vs. pars[j] (y). Also contains 'bins', a list
+        of bin edges for each parameter. Contour levels for 2-D histograms are
+        available via StreamingHistogram.levels.
+        
+        """
+        
+        pars, take_log, multiplier, un_log, ivar = \
+            self._listify_common_inputs(pars, take_log, multiplier, un_log, 
+            ivar)
+            
+        key = _hashable([pars, ivar, take_log, un_log, multiplier, bins, 
+            skip, stop, oned, twod, self._data_state()])
+            
+        if key in self.histogram_cache:
+            return self.histogram_cache[key]
+        
+        kw = {'ivar': ivar, 'take_log': take_log, 'un_log': un_log,
+            'multiplier': multiplier, 'skip': skip, 'stop': stop}
+        
+        # If everything fits in memory, hang on to it rather than reading it
+        # twice (once to get the bin edges, once to histogram).
+        if self.chunk_size is None:
+            chunks = list(self.iterate_chunks(pars, **kw))
+        else:
+            chunks = None
+            
+        binvec = self._stream_bins(pars, bins=bins, chunks=chunks, **kw)
+        binvec = [binvec[par] for par in pars]
+        
+        hists = {}
+        for i in range(len(pars)):
+            if oned:
+                hists[(i,)] = StreamingHistogram([binvec[i]])
+            if not twod:
+                continue
+            for j in range(i + 1, len(pars)):
+                hists[(i, j)] = StreamingHistogram([binvec[i], binvec[j]])
+        
+        if chunks is None:
+            chunks = self.iterate_chunks(pars, **kw)
+        
+        # Single pass over the data    
+        for data, weights in chunks:
+            for element in hists:
+                hists[element].update([data[i] for i in element], 
+                    weights=weights)
+                    
+        # Other half of the triangle
+        for (i, j) in [element for element in hists if len(element) == 2]:
+            hists[(j, i)] = hists[(i, j)].T
+        
+        hists['bins'] = binvec
+        
+        self.histogram_cache[key] = hists
+            
+        return hists
+
     def _set_inputs(self, pars, inputs, is_log, take_log, multiplier):
         """
         Figure out input values for x and y parameters for each panel.
@@ -1801,7 +2513,7 @@ class ModelSet(BlobFactory):
         multiplier=1., like=[0.95, 0.68], cdf=False,
         color_by_like=False, filled=True, take_log=False, un_log=False,
         bins=20, skip=0, skim=1, 
-        contour_method='raw', excluded=False, stop=None, **kwargs):
+        contour_method='raw', excluded=False, stop=None, hist=None, **kwargs):
         """
         Compute posterior PDF for supplied parameters. 
     
@@ -1836,6 +2548,9 @@ class ModelSet(BlobFactory):
         excluded : bool
             If True, and filled == True, fill the area *beyond* the given contour with
             cross-hatching, rather than the area interior to it.
+        hist : ares.util.StreamingStats.StreamingHistogram instance
+            Pre-computed histogram, e.g., from TriangleHistograms. If 
+            supplied, no data will be read.
 
         Returns
         -------
@@ -1862,17 +2577,35 @@ class ModelSet(BlobFactory):
         else:
             gotax = True
 
+        pars, take_log, multiplier, un_log, ivar = \
+            self._listify_common_inputs(pars, take_log, multiplier, un_log, 
+            ivar)
+
+        # Unless we're handed the data, histogram it via TriangleHistograms,
+        # which reads it (in chunks, if chunk_size is set) and caches the 
+        # result. Other contour methods need the samples themselves.
+        if (hist is None) and (to_hist is None) and \
+            ((not color_by_like) or contour_method == 'raw'):
+            hists = self.TriangleHistograms(pars, ivar=ivar, 
+                take_log=take_log, un_log=un_log, multiplier=multiplier, 
+                bins=bins, skip=skip, stop=stop, oned=(len(pars) == 1),
+                twod=(len(pars) == 2))
+            hist = hists[tuple(range(len(pars)))]
+
+        histogram = hist
+        have_hist = histogram is not None
+
         # Grab all the data we need
-        if (to_hist is None) or (is_log is None):
+        if have_hist:
+            if is_log is None:
+                is_log = {}
+        elif (to_hist is None) or (is_log is None):
             to_hist, is_log = self.ExtractData(pars, ivar=ivar, 
                 take_log=take_log, un_log=un_log, multiplier=multiplier)
 
-        pars, take_log, multiplier, un_log, ivar = \
-            self._listify_common_inputs(pars, take_log, multiplier, un_log, 
-            ivar)
-            
         # Modify bins to account for log-taking, multipliers, etc.
-        binvec = self._set_bins(pars, to_hist, take_log, bins)
+        if not have_hist:
+            binvec = self._set_bins(pars, to_hist, take_log, bins)
 
         # We might supply weights by-hand for ModelGrid calculations
         if not hasattr(self, 'weights'):
@@ -1890,7 +2623,10 @@ class ModelSet(BlobFactory):
         # Marginalized 1-D PDFs 
         if len(pars) == 1:
                         
-            if type(to_hist) is dict:
+            if have_hist:
+                bin_edges = histogram.edges[0]
+                hist = histogram.pdf
+            elif type(to_hist) is dict:
                 tohist = to_hist[pars[0]][skip:stop]
                 b = binvec[pars[0]]
             elif type(to_hist) is list:
@@ -1899,9 +2635,10 @@ class ModelSet(BlobFactory):
             else:
                 tohist = to_hist[skip:stop]
                 b = bins
-                        
-            hist, bin_edges = \
-                np.histogram(tohist, density=True, bins=b, weights=weights)
+                
+            if not have_hist:
+                hist, bin_edges = np.histogram(tohist, density=True, bins=b, 
+                    weights=weights)
 
             bc = rebin(bin_edges)
             
@@ -1918,18 +2655,22 @@ class ModelSet(BlobFactory):
         # Marginalized 2-D PDFs
         else:
             
-            if type(to_hist) is dict:
-                tohist1 = to_hist[pars[0]][skip:stop]
-                tohist2 = to_hist[pars[1]][skip:stop]
-                b = [binvec[pars[0]], binvec[pars[1]]]
+            if have_hist:
+                xedges, yedges = histogram.edges
+                hist = histogram.counts
             else:
-                tohist1 = to_hist[0][skip:stop]
-                tohist2 = to_hist[1][skip:stop]
-                b = [binvec[0], binvec[1]]
+                if type(to_hist) is dict:
+                    tohist1 = to_hist[pars[0]][skip:stop]
+                    tohist2 = to_hist[pars[1]][skip:stop]
+                    b = [binvec[pars[0]], binvec[pars[1]]]
+                else:
+                    tohist1 = to_hist[0][skip:stop]
+                    tohist2 = to_hist[1][skip:stop]
+                    b = [binvec[0], binvec[1]]
 
-            # Compute 2-D histogram
-            hist, xedges, yedges = \
-                np.histogram2d(tohist1, tohist2, bins=b, weights=weights)
+                # Compute 2-D histogram
+                hist, xedges, yedges = \
+                    np.histogram2d(tohist1, tohist2, bins=b, weights=weights)
 
             hist = hist.T
 
@@ -1944,7 +2685,9 @@ class ModelSet(BlobFactory):
                 # Get likelihood contours (relative to peak) that enclose
                 # nu-% of the area
 
-                if contour_method == 'raw':
+                if have_hist:
+                    nu, levels = histogram.levels(like)
+                elif contour_method == 'raw':
                     nu, levels = error_2D(None, None, hist, None, nu=like, 
                         method='raw')
                 else:
@@ -2205,9 +2948,10 @@ class ModelSet(BlobFactory):
         info = self.plot_info[panel]
         kw = self.plot_info['kwargs']
         
-        ax = self.PosteriorPDF(info['axes'], z=info['z'], bins=info['bins'],
-            multiplier=info['multiplier'], take_log=info['take_log'],
-            fig=fig, ax=ax, **kw)
+        ax = self.PosteriorPDF(info['axes'], ivar=info['ivar'], 
+            bins=info['bins'], multiplier=info['multiplier'], 
+            take_log=info['take_log'], hist=info.get('hist'), fig=fig, ax=ax, 
+            **kw)
         
         ax.set_xticks(mp.grid[panel].get_xticks())
         ax.set_yticks(mp.grid[panel].get_yticks())
@@ -2314,8 +3058,18 @@ class ModelSet(BlobFactory):
         newer_than_one_pt_nine =\
             ((int(np_version[0]) == 1) and (int(np_version[1])>9))
         remove_nas = (newer_than_one or newer_than_one_pt_nine)
-        to_hist, is_log = self.ExtractData(pars, ivar=ivar, take_log=take_log,
-            un_log=un_log, multiplier=multiplier, remove_nas=remove_nas)
+        
+        # Compute all histograms in one go (see TriangleHistograms), unless
+        # we need the samples themselves for scatter plots or contours.
+        batch = (not scatter) and ((not kwargs.get('color_by_like', False))
+            or kwargs.get('contour_method', 'raw') == 'raw')
+        
+        if batch:
+            to_hist, is_log = None, {}
+        else:
+            to_hist, is_log = self.ExtractData(pars, ivar=ivar, 
+                take_log=take_log, un_log=un_log, multiplier=multiplier, 
+                remove_nas=remove_nas)
             
         # Make sure all inputs are lists of the same length!
         pars, take_log, multiplier, un_log, ivar = \
@@ -2323,7 +3077,14 @@ class ModelSet(BlobFactory):
             ivar)        
             
         # Modify bins to account for log-taking, multipliers, etc.
-        binvec = self._set_bins(pars, to_hist, take_log, bins)      
+        if batch:
+            hists = self.TriangleHistograms(pars, ivar=ivar, 
+                take_log=take_log, un_log=un_log, multiplier=multiplier, 
+                bins=bins, skip=skip, stop=stop, oned=oned)
+            binvec = hists['bins']
+        else:
+            hists = {}
+            binvec = self._set_bins(pars, to_hist, take_log, bins)      
                             
         if type(binvec) is not list:
             bins = [binvec[par] for par in pars]      
@@ -2395,10 +3156,15 @@ class ModelSet(BlobFactory):
                 if k in mp.diag and oned:
 
                     # Grab array to be histogrammed
-                    try:
-                        tohist = [to_hist[j]]
-                    except KeyError:
-                        tohist = [to_hist[p2]]
+                    if batch:
+                        tohist = None
+                    else:
+                        try:
+                            tohist = [to_hist[j]]
+                        except KeyError:
+                            tohist = [to_hist[p2]]
+                            
+                    hist = hists.get((len(pars) - i - 1,))
 
                     # Plot the PDF
                     ax = self.PosteriorPDF(p1, ax=mp.grid[k], 
@@ -2407,7 +3173,7 @@ class ModelSet(BlobFactory):
                         un_log=un_log[-1::-1][i], 
                         multiplier=[multiplier[-1::-1][i]], 
                         bins=[bins[-1::-1][i]], 
-                        skip=skip, skim=skim, stop=stop, **kwargs)
+                        skip=skip, skim=skim, stop=stop, hist=hist, **kwargs)
 
                     # Stick this stuff in fix_ticks?
                     if col != 0:
@@ -2424,6 +3190,7 @@ class ModelSet(BlobFactory):
                     self.plot_info[k] = {}
                     self.plot_info[k]['axes'] = [p1]
                     self.plot_info[k]['data'] = tohist
+                    self.plot_info[k]['hist'] = hist
                     self.plot_info[k]['ivar'] = ivar[-1::-1][i]
                     self.plot_info[k]['bins'] = [bins[-1::-1][i]]
                     self.plot_info[k]['multplier'] = [multiplier[-1::-1][i]]
@@ -2449,10 +3216,15 @@ class ModelSet(BlobFactory):
                 if p1 == p2 and (iv[0] == iv[1]):
                     continue
                     
-                try:
-                    tohist = [to_hist[j], to_hist[-1::-1][i]]
-                except KeyError:
-                    tohist = [to_hist[p2], to_hist[p1]]
+                if batch:
+                    tohist = None
+                else:
+                    try:
+                        tohist = [to_hist[j], to_hist[-1::-1][i]]
+                    except KeyError:
+                        tohist = [to_hist[p2], to_hist[p1]]
+                        
+                hist = hists.get((j, len(pars) - i - 1))
                                                     
                 # 2-D PDFs elsewhere
                 if scatter:
@@ -2469,7 +3241,7 @@ class ModelSet(BlobFactory):
                         un_log=[un_log[j], un_log[-1::-1][i]],
                         multiplier=[multiplier[j], multiplier[-1::-1][i]], 
                         bins=[bins[j], bins[-1::-1][i]], filled=filled, 
-                        skip=skip, stop=stop, **kwargs)
+                        skip=skip, stop=stop, hist=hist, **kwargs)
 
                 if row != 0:
                     mp.grid[k].set_xlabel('')
@@ -2479,6 +3251,7 @@ class ModelSet(BlobFactory):
                 self.plot_info[k] = {}
                 self.plot_info[k]['axes'] = [p2, p1]
                 self.plot_info[k]['data'] = tohist
+                self.plot_info[k]['hist'] = hist
                 self.plot_info[k]['ivar'] = iv
                 self.plot_info[k]['bins'] = [bins[j], bins[-1::-1][i]]
                 self.plot_info[k]['multiplier'] = [multiplier[j], multiplier[-1::-1][i]]
@@ -2829,6 +3602,10 @@ class ModelSet(BlobFactory):
         Returns vector of mean, and the covariance matrix itself.
         
         """
+        
+        if self.chunk_size is not None:
+            stats = self.StreamStatistics(pars, ivar=ivar, moments=True)
+            return stats['moments'].mean, stats['moments'].cov
                 
         data, is_log = self.ExtractData(pars, ivar=ivar)
         
@@ -2933,25 +3710,32 @@ class ModelSet(BlobFactory):
             
         """
                         
+        index = self._blob_index(name, ivar)
+        
+        if index is None:
+            return self.get_blob_from_disk(name)
+        
+        # Only read the piece we need from disk    
+        return self.get_blob_from_disk(name, index=index)
+        
+    def _blob_index(self, name, ivar=None):
+        """
+        Indices of element of blob `name` nearest `ivar`, or None if we
+        need the whole thing.
+        """
+        
         i, j, nd, dims = self.blob_info(name)
-        blob = self.get_blob_from_disk(name)
         
-        if nd == 0:
-            return blob
+        if (nd == 0) or (ivar is None):
+            return None
         elif nd == 1:
-            if ivar is None:
-                return blob
-            else:
-                k = np.argmin(np.abs(self.blob_ivars[i] - ivar))
-                return blob[:,k]
+            k = np.argmin(np.abs(self.blob_ivars[i] - ivar))
+            return (k,)
         elif nd == 2:
-            if ivar is None:
-                return blob
-                    
             assert len(ivar) == 2, "Must supply 2-D coordinate for blob!"
             k1 = np.argmin(np.abs(self.blob_ivars[i][0] - ivar[0]))
             k2 = np.argmin(np.abs(self.blob_ivars[i][1] - ivar[1]))
-            return blob[:,k1,k2]    
+            return (k1, k2)
     
     def max_likelihood_parameters(self, method='median'):
         """
@@ -2974,8 +3758,62 @@ class ModelSet(BlobFactory):
         
         return self._max_like_pars
         
+    def _derived_column(self, name):
+        """
+        Name of column in which derived blob `name` is stored, or None if
+        it isn't in the columnar store.
+        """
+        
+        if (self.columns is None) or (name in self.all_blob_names):
+            return None
+            
+        for column in self.columns.keys():
+            if column.startswith('blob_') and column.split('.', 1)[1] == name:
+                return column
+                
+        return None
+        
+    def _derived_index(self, column, ivar=None):
+        """
+        Like _blob_index, but for derived blobs.
+        """
+        
+        # Column names are blob_<nd>d.<name>
+        nd = int(column[5])
+        
+        if (nd == 0) or (ivar is None):
+            return None
+            
+        ivars = self.columns.attrs[column]['ivars']
+        
+        if nd == 1:
+            return (np.argmin(np.abs(np.array(ivars[0]) - ivar)),)
+        
+        return tuple([np.argmin(np.abs(np.array(ivars[i]) - ivar[i])) \
+            for i in range(2)])
+            
+    def _derived_sources(self, inputs):
+        """
+        Current state of everything a blob derived from `inputs` depends on:
+        the files non-derived inputs are read from, and the provenance of
+        derived ones (so that blobs derived from derived blobs are also
+        recomputed when necessary).
+        """
+        
+        sources = []
+        for name in inputs:
+            column = self._derived_column(name)
+            if column is None:
+                info = file_signature(self._sources(name))
+            else:
+                info = self.columns.attrs[column].get('provenance')
+                
+            sources.append((name, info))
+            
+        return sources
+        
     def DeriveBlob(self, func=None, fields=None, expr=None, varmap=None, 
-        save=True, ivar=None, name=None, clobber=False):
+        save=True, ivar=None, name=None, clobber=False, version=None):
         """
         Derive new blob from pre-existing ones.
         
@@ -3000,6 +3838,10 @@ class ModelSet(BlobFactory):
         
         The remaining parameters are:
         
+        ivar : dict
+            Independent variables at which to evaluate each blob in `varmap`,
+            if any. If not supplied, entire blobs are used (and broadcast
+            against one another as usual).
         save : bool
             Save to disk? If not, just returns array.
         name : str
@@ -3007,9 +3849,62 @@ class ModelSet(BlobFactory):
             to call it up later.
         clobber : bool
             If file with same ``name`` exists, overwrite it?
+        version : 
+            Identifies ``func``, e.g., a version number, in which case 
+            ``func`` itself isn't inspected. Needed for saved results to be 
+            re-used if ``func`` is, e.g., a callable object, or refers to 
+            anything other than numbers, strings, and arrays.
+            
+        ..note:: Expressions are evaluated `chunk_size` samples at a time 
+            (if set). Results are saved to the columnar store, 
+            prefix.columns, along with a record of how they were computed. 
+            They are only recomputed if the expression (or function) or 
+            the data it depends on changes. Results of functions that can't
+            be identified reliably (see `version`) are always recomputed.
         
         """    
         
+        if func is not None:
+            digest = _func_hash(func, version)
+            if digest is not None:
+                digest = hashlib.md5(repr([digest, fields])).hexdigest()
+            inputs = fields
+        else:
+            expression = BlobExpression(expr, varmap, ivar)
+            digest = expression.hash
+            inputs = expression.blobs
+        
+        if save:
+            assert name is not None, "Must supply name for new blob!"
+            
+            provenance = {'hash': digest, 
+                'sources': self._derived_sources(inputs),
+                'include_checkpoints': self.include_checkpoints}
+            
+            column = self._derived_column(name)
+            cand = glob.glob('%s.blob_?d.%s.pkl' % (self.prefix, name))
+            
+            # Can't tell if saved results are up to date: recompute
+            if digest is None:
+                pass
+            elif (column is not None) and (not clobber):
+                old = self.columns.attrs[column].get('provenance', {})
+                
+                # Up to date, or a different quantity with the same name.
+                # Results of unidentifiable functions are always replaced.
+                if old == provenance:
+                    return self.columns.read(column)
+                elif old.get('hash') not in [None, digest]:
+                    print '%s exists! Set clobber=True or remove by hand.' \
+                        % column
+                    return self.columns.read(column)
+                
+            # Pickles from older versions
+            elif cand and (not clobber):
+                print '%s exists! Set clobber=True or remove by hand.' % cand[0]
+                data, is_log = self.ExtractData(name)
+                return data[name]
+        
         if func is not None:
             data, is_log = self.ExtractData(fields)
             
@@ -3019,44 +3914,103 @@ class ModelSet(BlobFactory):
                 i, j, nd, size = self.blob_info(key)
                 ivars[key] = self.blob_ivars[i]
                 
-            result = func(data, ivars)
-        
-        else:
-        
-            blobs = varmap.values()
-            if ivar is not None:
-                iv = [ivar[blob] for blob in blobs]
-            else:
-                iv = None    
-            
-            data, is_log = self.ExtractData(blobs, ivar=iv)
+            result = np.asarray(func(data, ivars))
             
-            # Assign data to variable names
-            for var in varmap.keys():
-                exec('%s = data[\'%s\']' % (var, varmap[var]))
+            if not save:
+                return result
+                
+            writer, column, attrs = self._derived_writer(name, result, 
+                fields, provenance)
+            writer.append(column, result, **attrs)
             
-            result = eval(expr)
+        else:
+            writer = None
+            results = []
+            for data in self._derived_chunks(expression):
+                result = expression.evaluate(data)
+                
+                if not save:
+                    results.append(result)
+                    continue
+                    
+                # Write as we go, so as not to hold everything in memory
+                if writer is None:
+                    writer, column, attrs = self._derived_writer(name, 
+                        result, expression.blobs, provenance)
+                        
+                writer.append(column, result, **attrs)
+                
+            if not save:
+                if len(results) == 1:
+                    return results[0]
+                return np.concatenate(results)
+                
+            if writer is None:
+                return np.array([])
             
-            # Delete newly created local variables?
+        writer.flush()
         
-        if save:
-            assert name is not None, "Must supply name for new blob!"
-            
-            # First dimension is # of samples
-            nd = len(result.shape) - 1
+        # Re-read index of columnar outputs
+        del self._columns
+        
+        return self.columns.read(column)
+        
+    def _derived_chunks(self, expression):
+        """
+        Loop over the data needed to evaluate a BlobExpression, 
+        `chunk_size` samples at a time.
+        """
+        
+        N = self.num_samples
+        
+        if self.chunk_size is None:
+            size = max(N, 1)
+        else:
+            size = int(self.chunk_size)
+        
+        for start in range(0, N, size):
+            stop = min(start + size, N)
             
-            fn = '%s.blob_%id.%s.pkl' % (self.prefix, nd, name)
+            data = {}
+            for blob in expression.blobs:
+                data[blob] = self._read_chunk(blob, start, stop, 
+                    ivar=expression.ivar.get(blob))
+                    
+            yield data
             
-            if os.path.exists(fn) and (not clobber):
-                print '%s exists! Set clobber=True or remove by hand.' % fn
-                data, is_log = self.ExtractData(name)
-                return data[name]
+    def _derived_writer(self, name, result, inputs, provenance):
+        """
+        Prepare to save derived blob `name` to the columnar store.
         
-            f = open(fn, 'wb')
-            pickle.dump(result, f)
-            f.close()
+        Returns
+        -------
+        Tuple: (ColumnWriter instance, name of column, attributes of column).
+        
+        """
         
-        return result
+        # First dimension is # of samples
+        nd = result.ndim - 1
+        column = 'blob_%id.%s' % (nd, name)
+        
+        writer = ColumnWriter('%s.columns' % self.prefix, writer='derived')
+        
+        # Clear out old versions, which might have different dimensionality
+        for key in list(writer.keys()):
+            if key.startswith('blob_') and key.split('.', 1)[1] == name:
+                writer.remove(key)
+        
+        # Independent variables are those of the first input with the same
+        # dimensionality as the result
+        ivars = None
+        for blob in inputs:
+            if blob not in self.all_blob_names:
+                continue
+            i, j, blob_nd, dims = self.blob_info(blob)
+            if blob_nd == nd:
+                ivars = self.blob_ivars[i]
+                break
+                
+        return writer, column, {'ivars': ivars, 'provenance': provenance}
         
     def save(self, pars, z=None, path='.', fmt='hdf5', clobber=False):
         """
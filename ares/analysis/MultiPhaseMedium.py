@@ -22,6 +22,7 @@ from ..physics.Constants import *
 from scipy.integrate import cumtrapz
 from scipy.interpolate import interp1d
 from ..physics import Cosmology, Hydrogen
+from ..util.ReadData import HistoryReader
 from ..util.SetDefaultParameterValues import *
 from mpl_toolkits.axes_grid import inset_locator
 from .DerivedQuantities import DerivedQuantities as DQ
@@ -45,6 +46,11 @@ class DummyDQ(object):
         self._dq = DQ(ModelSet=None, pf=pf)
         
     def add_data(self, data):
+        # Don't read everything from disk right away
+        if getattr(data, 'lazy', False):
+            self._data = self._dq._data = data
+            return
+            
         self._dq._add_data(data)
         for key in data:
             self._data[key] = data[key]
@@ -98,6 +104,22 @@ class MultiPhaseMedium(object):
         self.kwargs = kwargs    
 
     def _load_data(self, data):
+        
+        # Single file containing history and parameters (read lazily)
+        for suffix in ['hdf5', 'h5', 'npz']:
+            if data.endswith('.%s' % suffix):
+                fn = data
+            elif os.path.exists('%s.history.%s' % (data, suffix)):
+                fn = '%s.history.%s' % (data, suffix)
+            else:
+                continue
+            
+            self.history = HistoryReader(fn)
+            self.pf = self.history.pf
+            if self.pf is None:
+                self.pf = SetAllDefaults()
+            return
+            
         try:
             f = open('%s.history.pkl' % data, 'rb')
             history = pickle.load(f)
@@ -15,6 +15,7 @@ from ..util import labels
 from math import floor, ceil
 import matplotlib.pyplot as pl
 from ..static.Grid import Grid
+from ..util.ReadData import HistoryReader, DataDumpReader
 from ..physics.Constants import *
 from .MultiPlot import MultiPanel
 from ..simulations import RaySegment as simRS
@@ -45,29 +46,22 @@ class RaySegment:
             self.data = data.history
             self.grid = data.parcel.grid
         
-        # Load contents of hdf5 file
+        # Output of simulations.RaySegment.save (read lazily)
+        elif (type(data) is str) and re.search('.history.', data):
+            self.data = HistoryReader(data)
+            self.pf = self.data.pf
+            self.grid = Grid(grid_cells=self.pf['grid_cells'], 
+                length_units=self.pf['length_units'], 
+                start_radius=self.pf['start_radius'],
+                approx_Salpha=self.pf['approx_Salpha'],
+                logarithmic_grid=self.pf['logarithmic_grid'],
+                cosmological_ics=self.pf['cosmological_ics'])
+            self.grid.set_properties(**self.pf)
+        
+        # Load contents of hdf5 file (data dumps are read lazily)
         elif type(data) is str:
-            import pickle
-            f = h5py.File(data, 'r')
-            
-            self.pf = {}
-            for key in f['parameters']:
-                self.pf[key] = f['parameters'][key].value
-            
-            self.data = {}
-            for key in f.keys():
-                if not f[key].attrs.get('is_data'):
-                    continue
-                
-                if key == 'parameters':
-                    continue
-                
-                dd = key#int(key.strip('dd'))
-                self.data[dd] = {}
-                for element in f[key]:
-                    self.data[dd][element] = f[key][element].value    
-            
-            f.close()
+            self.data = DataDumpReader(data)
+            self.pf = self.data.pf
             
             self.grid = Grid(dims=self.pf['grid_cells'], 
                 length_units=self.pf['length_units'], 
@@ -165,16 +165,17 @@ class loglikelihood(LogLikelihood):
             break
 
         # Compute the luminosity function, goodness of fit, return
-        phi = []
+        xdc = []
         for i, z in enumerate(self.redshifts):
             xdat = np.array(self.xdata[i])
 
             # Apply dust correction to observed data, which is uncorrected
-            M = xdat - pop.AUV(z, xdat) 
+            xdc.append(xdat - pop.AUV(z, xdat))
             
-            # Generate model LF
-            p = pop.LuminosityFunction(z=z, x=M, mags=True)
-            phi.extend(p)           
+        # Generate model LF at all redshifts in one go
+        phi = []
+        for p in pop.LuminosityFunctions(self.redshifts, xdc, mags=True):
+            phi.extend(p)
                 
         lnL = 0.5 * np.sum((np.array(phi) - self.ydata)**2 / self.error**2)    
         PofD = self.const_term - lnL
@@ -24,10 +24,12 @@ from types import FunctionType, InstanceType
 from ..analysis.BlobFactory import BlobFactory
 from ..analysis.TurningPoints import TurningPoints
 from ..analysis.InlineAnalysis import InlineAnalysis
+from ..util.WriteData import ColumnWriter, write_sampler_state, \
+    truncate_file, write_pickled_chunk
 from ..util.Stats import Gauss1D, GaussND, rebin, get_nu
 from ..util.SetDefaultParameterValues import _blob_names, _blob_redshifts
 from ..util.ReadData import flatten_chain, flatten_logL, flatten_blobs, \
-    read_pickled_chain
+    read_pickled_chain, ColumnReader, read_sampler_state
 
 try:
     import emcee
@@ -574,6 +576,7 @@ class ModelFit(BlobFactory):
             pos = self._prep_from_restart(restart)
         else:
             pos = None
+            self._restart_state = None
             self._prep_from_scratch(clobber)    
     
         return pos
@@ -619,9 +622,29 @@ class ModelFit(BlobFactory):
         #            print 'base_kwargs from file dont match those supplied!'
         #        MPI.COMM_WORLD.Abort()
         #    raise ValueError('base_kwargs from file dont match those supplied!')   
+        
+        # Pick up exactly where we left off, if we can (and weren't told
+        # to restart from a particular checkpoint instead)
+        if type(restart) is bool:
+            self._restart_state = self._load_state()
+        else:
+            self._restart_state = None
+            
+        if self._restart_state is not None:
+            print "Restarting from %s (step #%i)." \
+                % (self.state_fn, self._restart_state['ct'])
+            return self._restart_state['pos']
                     
         # Start from last step in pre-restart calculation
-        if self.checkpoint_append:
+        if self.output_format == 'columns':
+            reader = ColumnReader('%s.columns' % prefix)
+            self.ct = len(reader.chunks['chain']) - 1
+            
+            print "Restarting from %s.columns (checkpoint #%i)." \
+                % (prefix, self.ct)
+            chain = reader.read('chain', chunks=[-1])
+            
+        elif self.checkpoint_append:
             if type(restart) is bool:
             
                 ct = 0 
@@ -654,6 +677,289 @@ class ModelFit(BlobFactory):
         
         return pos
 
+    @property
+    def checkpoint_steps(self):
+        """
+        Number of steps between saves of the sampler's state, i.e., walker
+        positions, log-likelihoods, blobs, acceptance counters, and the
+        state of the random number generator (see `save_state`).
+        
+        If None (default), the state is saved after each checkpoint (every
+        `save_freq` steps), unless `checkpoint_time` says otherwise, so a
+        restart loses at most the steps taken since the last checkpoint. 
+        Saving more often means buffered steps (and their blobs) are also
+        written to `steps_fn`, though each save only writes the steps taken
+        since the previous one.
+        """
+        if not hasattr(self, '_checkpoint_steps'):
+            self._checkpoint_steps = None
+        return self._checkpoint_steps
+    
+    @checkpoint_steps.setter
+    def checkpoint_steps(self, value):
+        self._checkpoint_steps = value
+        
+    @property
+    def checkpoint_time(self):
+        """
+        Maximum wall-clock time [seconds] between saves of the sampler's 
+        state. If None, only `checkpoint_steps` matters.
+        """
+        if not hasattr(self, '_checkpoint_time'):
+            self._checkpoint_time = None
+        return self._checkpoint_time
+    
+    @checkpoint_time.setter
+    def checkpoint_time(self, value):
+        self._checkpoint_time = value
+        
+    @property
+    def state_fn(self):
+        return '%s.state.npz' % self.prefix
+    
+    @property
+    def steps_fn(self):
+        return '%s.state.steps.pkl' % self.prefix
+        
+    def _checkpoint_columns(self):
+        """
+        Number of chunks in each column (for columnar output).
+        """
+        
+        if self.output_format != 'columns':
+            return {}
+            
+        index = self.column_writer.index['columns']
+        
+        return {name: len(chunks) for name, chunks in index.items()}
+        
+    def _checkpoint_files(self):
+        """
+        Files appended to at each checkpoint. Everything else written by
+        `_write_checkpoint` is either replaced or written atomically.
+        """
+        
+        if self.output_format == 'columns':
+            return []
+            
+        fns = ['%s.facc.pkl' % self.prefix]
+        
+        if not self.checkpoint_append:
+            return fns
+            
+        fns.extend(['%s.chain.pkl' % self.prefix, '%s.logL.pkl' % self.prefix])
+        
+        if self.blob_names is not None:
+            for i, group in enumerate(self.blob_names):
+                for blob in group:
+                    fns.append('%s.blob_%id.%s.pkl' \
+                        % (self.prefix, self.blob_nd[i], blob))
+                        
+        return fns
+        
+    def _state_due(self, ct, t0):
+        if self.checkpoint_steps is not None:
+            if ct % self.checkpoint_steps == 0:
+                return True
+        if self.checkpoint_time is not None:
+            if (time.time() - t0) >= self.checkpoint_time:
+                return True
+        return False
+        
+    def _num_checkpoints(self):
+        """
+        Number of checkpoints (every `save_freq` steps) written to disk.
+        """
+        if self.output_format == 'columns':
+            if not os.path.exists('%s.columns' % self.prefix):
+                return 0
+            reader = ColumnReader('%s.columns' % self.prefix)
+            if 'chain' not in reader.chunks:
+                return 0
+            return len(reader.chunks['chain'])
+        
+        # Acceptance fraction is the last thing written at each checkpoint
+        fn = '%s.facc.pkl' % self.prefix
+        if not os.path.exists(fn):
+            return 0
+            
+        num = 0
+        with open(fn, 'rb') as f:
+            while True:
+                try:
+                    pickle.load(f)
+                    num += 1
+                except EOFError:
+                    break
+                except Exception:
+                    # Partially-written record: checkpoint didn't finish
+                    break
+                    
+        return num
+        
+    def _pack_blobs(self, blobs):
+        """
+        Convert blobs, a list (steps) of lists (walkers), to arrays.
+        """
+        
+        arrays = {}
+        if self.blob_names is None:
+            return arrays
+        
+        for j, group in enumerate(self.blob_names):
+            for k, blob in enumerate(group):
+                arrays['blob.%i.%i' % (j, k)] = \
+                    np.array([[blobs[i][l][j][k] \
+                        for l in range(self.nwalkers)] \
+                            for i in range(len(blobs))])
+                    
+        return arrays
+        
+    def _unpack_blobs(self, state):
+        """
+        Inverse of `_pack_blobs`.
+        """
+        
+        nsteps = state['pos'].shape[0]
+        
+        if self.blob_names is None:
+            return [None for i in range(nsteps)]
+        
+        blobs = []
+        for i in range(nsteps):
+            blobs.append([[[state['blob.%i.%i' % (j, k)][i,l] \
+                for k in range(len(group))] \
+                    for j, group in enumerate(self.blob_names)] \
+                        for l in range(self.nwalkers)])
+        
+        return blobs
+    
+    def save_state(self, ct, pos_all, prob_all, blobs_all, pos, prob, 
+        blobs):
+        """
+        Write everything needed to continue the MCMC exactly as if it had
+        never stopped.
+        
+        Steps taken since the last checkpoint (if any) are appended to 
+        `steps_fn`, so each call only writes the steps that haven't been 
+        written yet. These are only needed to resume between checkpoints, 
+        i.e., if `checkpoint_steps` or `checkpoint_time` is set. Everything
+        else, i.e., counters, the current step, the state of the random 
+        number generator, and how much of each output file is valid, goes
+        in a small file (`state_fn`) that is replaced atomically.
+        
+        Parameters
+        ----------
+        ct : int
+            Number of steps taken so far.
+        pos_all, prob_all, blobs_all : list
+            Walker positions, log-likelihoods, and blobs for each step taken
+            since the last checkpoint.
+        pos, prob, blobs : 
+            Walker positions, log-likelihoods, and blobs for current step.
+            
+        """
+        
+        nbuf = len(pos_all)
+        
+        # Buffer was emptied, i.e., a checkpoint was just written
+        if nbuf < self._nlogged:
+            self._nlogged = self._log_bytes = 0
+            
+        if nbuf > self._nlogged:    
+            if self._log_bytes > 0:
+                mode = 'r+b'
+            else:
+                mode = 'wb'
+            
+            # Anything past _log_bytes isn't part of the state
+            with open(self.steps_fn, mode) as f:
+                f.seek(self._log_bytes)
+                for i in range(self._nlogged, nbuf):
+                    pickle.dump((pos_all[i], prob_all[i], blobs_all[i]), f)
+                f.truncate()
+                f.flush()
+                os.fsync(f.fileno())
+                self._log_bytes = f.tell()
+            
+            self._nlogged = nbuf
+        
+        fns = self._checkpoint_files()
+        sizes = [os.path.getsize(fn) if os.path.exists(fn) else 0 \
+            for fn in fns]
+            
+        columns = self._checkpoint_columns()
+        
+        state = {'ct': ct, 'nbuf': nbuf, 'nflush': self.nflush,
+            'pos': np.array([pos]), 'lnprob': np.array([prob]),
+            'naccepted': self.sampler.naccepted,
+            'iterations': self.sampler.iterations,
+            'rstate': self.sampler.random_state,
+            'log_bytes': self._log_bytes, 'files': fns, 'sizes': sizes,
+            'columns': columns.keys(), 'chunks': columns.values()}
+        state.update(self._pack_blobs([blobs]))
+        
+        write_sampler_state(self.state_fn, state)
+        
+    def _load_state(self):
+        """
+        Read sampler state, and make sure it's consistent with the 
+        checkpoints on disk. Anything written to disk after the state was
+        saved, i.e., part of a checkpoint, or a checkpoint written after the
+        last save, is discarded. It will be written again (identically) 
+        once the MCMC gets back to that point.
+        
+        Returns
+        -------
+        Dictionary (see `save_state`), with the current step under the keys 
+        'pos', 'lnprob', and 'blobs', and buffered steps (if any) under
+        'pos_all', 'prob_all', and 'blobs_all'. None if there is no saved
+        state.
+        
+        """
+        
+        state = read_sampler_state(self.state_fn)
+        
+        if state is None:
+            return None
+            
+        nflush = self._num_checkpoints()    
+        
+        # Either we stopped before the next checkpoint was done, or after
+        # it was done but before the state was saved again
+        if nflush not in [state['nflush'], state['nflush'] + 1]:
+            raise IOError(('%s expects %i checkpoints, but found %i!' \
+                % (self.state_fn, state['nflush'], nflush)))
+        
+        for fn, nbytes in zip(state['files'], state['sizes']):
+            truncate_file(str(fn), int(nbytes))
+            
+        if self.output_format == 'columns':
+            chunks = dict(zip([str(name) for name in state['columns']], 
+                [int(num) for num in state['chunks']]))
+            self.column_writer.truncate(chunks)
+            self.column_writer.flush()
+        
+        state['blobs'] = self._unpack_blobs(state)[0]
+        state['pos'] = state['pos'][0]
+        state['lnprob'] = state['lnprob'][0]
+        
+        # Steps taken since last checkpoint
+        nbuf = int(state['nbuf'])
+        truncate_file(self.steps_fn, int(state['log_bytes']))
+        
+        steps = []
+        if nbuf > 0:
+            with open(self.steps_fn, 'rb') as f:
+                for i in range(nbuf):
+                    steps.append(pickle.load(f))
+        
+        state['pos_all'] = [step[0] for step in steps]
+        state['prob_all'] = [step[1] for step in steps]
+        state['blobs_all'] = [step[2] for step in steps]
+        
+        return state    
+        
     @property
     def checkpoint_by_proc(self):
         if not hasattr(self, '_checkpoint_by_proc'):
@@ -673,6 +979,37 @@ class ModelFit(BlobFactory):
     @checkpoint_append.setter
     def checkpoint_append(self, value):
         self._checkpoint_append = value    
+        
+    @property
+    def output_format(self):
+        """
+        How to write the chain, logL, facc, and blobs to disk.
+        
+        'pkl' : append pickled lists to prefix.*.pkl files.
+        'columns' : write .npy chunks to the prefix.columns directory, one
+            per checkpoint (see util.WriteData.ColumnWriter).
+            
+        """
+        if not hasattr(self, '_output_format'):
+            self._output_format = 'pkl'
+        return self._output_format
+    
+    @output_format.setter
+    def output_format(self, value):
+        assert value in ['pkl', 'columns'], \
+            "output_format must be 'pkl' or 'columns'!"
+        self._output_format = value
+        
+    @property
+    def column_writer(self):
+        if not hasattr(self, '_column_writer'):
+            self._column_writer = ColumnWriter('%s.columns' % self.prefix)
+        return self._column_writer
+        
+    def _have_output(self, prefix):
+        if self.output_format == 'columns':
+            return os.path.exists('%s.columns' % self.prefix)
+        return os.path.exists('%s.chain.pkl' % prefix)
 
     def _prep_from_scratch(self, clobber, by_proc=False):
         if rank > 0:
@@ -694,17 +1031,20 @@ class ModelFit(BlobFactory):
             os.system('rm -f %s.*.fail.pkl' % self.prefix)
             os.system('rm -f %s.*.chain.*pkl' % self.prefix)
             os.system('rm -f %s.*.blob*.*pkl' % self.prefix)
+            os.system('rm -f %s.state.*' % self.prefix)
             
             # Need to potentially axe a product file
             os.system('rm -f %s.fails.pkl' % self.prefix)
             os.system('rm -f %s.chain.pkl' % self.prefix)
+            
+            os.system('rm -rf %s.columns' % self.prefix)
                     
         # Each processor gets its own fail file
         f = open('%s.fail.pkl' % prefix_by_proc, 'wb')
         f.close()  
         
         # Main output: MCMC chains (flattened)
-        if self.checkpoint_append:
+        if self.checkpoint_append and self.output_format == 'pkl':
             f = open('%s.chain.pkl' % prefix_by_proc, 'wb')
             f.close()
         
@@ -713,11 +1053,13 @@ class ModelFit(BlobFactory):
             f.close()
         
         # Store acceptance fraction
-        f = open('%s.facc.pkl' % self.prefix, 'wb')
-        f.close()
+        if self.output_format == 'pkl':
+            f = open('%s.facc.pkl' % self.prefix, 'wb')
+            f.close()
         
         # File for blobs themselves
-        if self.blob_names is not None and self.checkpoint_append:
+        if self.blob_names is not None and self.checkpoint_append \
+            and self.output_format == 'pkl':
             
             for i, group in enumerate(self.blob_names):
                 for blob in group:
@@ -784,18 +1126,23 @@ class ModelFit(BlobFactory):
             Can also supply the filename of the checkpoint from which to 
             restart.
             
+        .. note :: If restart=True and the sampler state was saved (see 
+            `checkpoint_steps` and `checkpoint_time`), the MCMC picks up 
+            exactly where the previous run stopped. Either way, `steps` is 
+            the number of steps to take after the restart.
+            
         """
                 
         self.prefix = prefix
 
-        if os.path.exists('%s.chain.pkl' % prefix) and (not clobber):
+        if self._have_output(prefix) and (not clobber):
             if not restart:
                 msg = '%s exists! Remove manually, set clobber=True,' % prefix
                 msg += ' or set restart=True to append.' 
                 raise IOError(msg)
 
         if self.checkpoint_append:
-            if not os.path.exists('%s.chain.pkl' % prefix) and restart:
+            if (not self._have_output(prefix)) and restart:
                 msg = "This can't be a restart, %s*.pkl not found." % prefix
                 raise IOError(msg)
 
@@ -827,7 +1174,19 @@ class ModelFit(BlobFactory):
                 
         pos = self.prep_output_files(restart, clobber)    
         
-        state = None#np.random.RandomState(self.seed)
+        if restart:
+            saved = self._restart_state
+        else:
+            saved = None
+        
+        # Random number generator: restored exactly if we have a saved state,
+        # seeded (if requested) if we're starting from scratch.
+        if saved is not None:
+            state = saved['rstate']
+        elif (self.seed is not None) and (not restart):
+            state = np.random.RandomState(self.seed).get_state()
+        else:
+            state = None
                         
         # Burn in, prep output files     
         if (burn > 0) and (not restart):
@@ -852,9 +1211,6 @@ class ModelFit(BlobFactory):
             
         elif not restart:
             pos = self.guesses
-            state = None
-        else:
-            state = None # should this be saved and restarted?
 
         #
         ## MAIN CALCULATION BELOW
@@ -863,23 +1219,47 @@ class ModelFit(BlobFactory):
         if rank == 0:
             print "Starting MCMC: %s" % (time.ctime())
         
+        # Steps taken since the last checkpoint
+        pos_all = []; prob_all = []; blobs_all = []
+        prob = blobs = None
+        
+        # Steps already in the state file (see `save_state`)
+        self._nlogged = self._log_bytes = 0
+        
+        if saved is not None:
+            # Total number of steps taken so far
+            ct = int(saved['ct'])
+            
+            self.nflush = int(saved['nflush'])
+            
+            pos_all = saved['pos_all']
+            prob_all = saved['prob_all']
+            blobs_all = saved['blobs_all']
+            prob = saved['lnprob']
+            blobs = saved['blobs']
+            
+            self._nlogged = len(pos_all)
+            self._log_bytes = int(saved['log_bytes'])
+            
+            self.sampler.naccepted = saved['naccepted'].copy()
+            self.sampler.iterations = int(saved['iterations'])
+                
         # Need to make sure we don't overwrite previous outputs in this case    
-        if restart and (not self.checkpoint_append):
+        elif restart and (not self.checkpoint_append):
             ct = (self.ct + 1) * save_freq
+            self.nflush = self._num_checkpoints()
         else:
             ct = 0
+            self.nflush = self._num_checkpoints() if restart else 0
                         
         # Take steps, append to pickle file every save_freq steps
-        pos_all = []; prob_all = []; blobs_all = []
+        t_state = time.time()
         for pos, prob, state, blobs in self.sampler.sample(pos, 
-            iterations=steps, rstate0=state, storechain=False):
+            lnprob0=prob, blobs0=blobs, iterations=steps, rstate0=state, 
+            storechain=False):
             
             # Only the rank 0 processor ever makes it here
             
-            # If we're saving each checkpoint to its own file, this is the
-            # identifier to use in the filename
-            dd = 'dd' + str(ct / save_freq).zfill(4)
-            
             # Increment counter
             ct += 1
             
@@ -888,25 +1268,78 @@ class ModelFit(BlobFactory):
             blobs_all.append(blobs)
 
             if ct % save_freq != 0:
+                if self._state_due(ct, t_state):
+                    self.save_state(ct, pos_all, prob_all, blobs_all, pos,
+                        prob, blobs)
+                    t_state = time.time()
                 continue
+                
+            # If we stop while writing this, we'll resume from the last 
+            # saved state, i.e., buffered steps needn't be saved first.
+            self._write_checkpoint(ct, pos_all, prob_all, blobs_all)
 
-            # Remember that pos.shape = (nwalkers, ndim)
-            # So, pos_all has shape = (nsteps, nwalkers, ndim)
+            del pos_all, prob_all, blobs_all
+            gc.collect()
 
-            data = [flatten_chain(np.array(pos_all)),
-                    flatten_logL(np.array(prob_all)),
-                    blobs_all]
+            # Delete chain, logL, etc., to be conscious of memory
+            self.sampler.reset()
 
-            # The flattened version of pos_all has 
-            # shape = (save_freq * nwalkers, ndim)
+            pos_all = []; prob_all = []; blobs_all = []
+            
+            self.save_state(ct, pos_all, prob_all, blobs_all, pos, prob, 
+                blobs)
+            t_state = time.time()
+        if self.pool is not None and emcee_mpipool:
+            self.pool.close()
+        elif self.pool is not None:
+            self.pool.stop()
+
+        if rank == 0:
+            print "Finished on %s" % (time.ctime())
+    
+    def _write_checkpoint(self, ct, pos_all, prob_all, blobs_all):
+        """
+        Write the last `save_freq` steps to disk.
+        """
+        
+        prefix = self.prefix
+        save_freq = self.save_freq
+        
+        # If we're saving each checkpoint to its own file, this is the
+        # identifier to use in the filename
+        dd = 'dd' + str((ct - 1) / save_freq).zfill(4)
+        
+        # Remember that pos.shape = (nwalkers, ndim)
+        # So, pos_all has shape = (nsteps, nwalkers, ndim)
+
+        data = [flatten_chain(np.array(pos_all)),
+                flatten_logL(np.array(prob_all)),
+                blobs_all]
+
+        # The flattened version of pos_all has 
+        # shape = (save_freq * nwalkers, ndim)
 
+        if self.output_format == 'columns':
+            self.column_writer.append('chain', data[0])
+            self.column_writer.append('logL', data[1])
+            
+            if self.blob_names is not None:
+                self.save_blobs(data[2])
+            
+            # Running total: one row per checkpoint
+            self.column_writer.append('facc', 
+                self.sampler.acceptance_fraction[None,:])
+                
+            self.column_writer.flush()
+            
+        else:
             for i, suffix in enumerate(['chain', 'logL', 'blobs']):
 
                 if self.checkpoint_append:
                     mode = 'ab'
                 else:
                     mode = 'wb'
-                    
+                
                 # Blobs
                 if suffix == 'blobs':
                     if self.blob_names is None:
@@ -918,35 +1351,22 @@ class ModelFit(BlobFactory):
                         fn = '%s.%s.pkl' % (prefix, suffix)
                     else:
                         fn = '%s.%s.%s.pkl' % (prefix, dd, suffix)
-                    with open(fn, mode) as f:
-                        pickle.dump(data[i], f)
-                    
+                    write_pickled_chunk(fn, data[i], mode)
+                
             # This is a running total already so just save the end result 
             # for this set of steps
             f = open('%s.facc.pkl' % prefix, 'ab')
             pickle.dump(self.sampler.acceptance_fraction, f)
             f.close()
+            
+        self.nflush += 1
 
-            if self.checkpoint_append:
-                print "Checkpoint #%i: %s" % (ct / save_freq, time.ctime())
-            else:
-                print "Wrote %s.%s.*.pkl: %s" % (prefix, dd, time.ctime())
-
-            del data, pos_all, prob_all, blobs_all
-            gc.collect()
-
-            # Delete chain, logL, etc., to be conscious of memory
-            self.sampler.reset()
-
-            pos_all = []; prob_all = []; blobs_all = []
-
-        if self.pool is not None and emcee_mpipool:
-            self.pool.close()
-        elif self.pool is not None:
-            self.pool.stop()
-
-        if rank == 0:
-            print "Finished on %s" % (time.ctime())
+        if self.checkpoint_append or self.output_format == 'columns':
+            print "Checkpoint #%i: %s" % (ct / save_freq, time.ctime())
+        else:
+            print "Wrote %s.%s.*.pkl: %s" % (prefix, dd, time.ctime())
+            
+        del data
     
     def save_blobs(self, blobs, uncompress=True, prefix=None, dd=None):
         """
@@ -986,6 +1406,12 @@ class ModelFit(BlobFactory):
                     # indices: walkers*steps, blob group, blob
                     barr = blobs_now[l][j][k]
                     to_write.append(barr)   
+                    
+                if self.output_format == 'columns':
+                    name = 'blob_%id.%s' % (self.blob_nd[j], blob)
+                    self.column_writer.append(name, np.array(to_write), 
+                        ivars=self.blob_ivars[j])
+                    continue
 
                 if self.checkpoint_append:
                     mode = 'ab'
@@ -998,7 +1424,6 @@ class ModelFit(BlobFactory):
                     
                     assert dd is not None, "checkpoint_append=False but no DDID!"        
                             
-                with open(bfn, mode) as f:
-                    pickle.dump(np.array(to_write), f) 
+                write_pickled_chunk(bfn, np.array(to_write), mode) 
                     
                        
@@ -18,7 +18,12 @@ import copy, os, gc, re, time
 from .ModelFit import ModelFit
 from ..simulations import Global21cm
 from ..util import GridND, ProgressBar
-from ..util.ReadData import read_pickle_file, read_pickled_dict
+from ..util.WorkQueue import WorkQueue, MPIWorkQueue, pool_imap, \
+    serial_imap, pool_worker_id
+from ..util.ReadData import read_pickle_file, read_pickled_dict, \
+    ColumnReader, read_manifest, read_sharded_pickle
+from ..util.WriteData import write_shard_info, truncate_shard, \
+    write_manifest, write_pickled_chunk
 
 try:
     from mpi4py import MPI
@@ -30,6 +35,18 @@ except ImportError:
 
 def_kwargs = {'verbose': False, 'progress_bar': False}    
 
+def _procid():
+    """
+    ID of this process, used to name files written by individual models.
+    
+    Processes in a local pool all have rank 0, so use their ID within the
+    pool instead.
+    """
+    worker = pool_worker_id()
+    if worker is None:
+        return str(rank).zfill(3)
+    return str(worker).zfill(3)
+
 class ModelGrid(ModelFit):
     """Create an object for setting up and running model grids."""
     
@@ -61,6 +78,12 @@ class ModelGrid(ModelFit):
         """
         Figure out which models have already been run.
         
+        .. note :: Every processor reads the output of *all* processors
+            (i.e., all shards or column writers), since the number of
+            processors may have changed since the last run. Each processor
+            then keeps appending to its own files, so shards left behind by
+            processors that no longer exist are simply left as they are.
+        
         Parameters
         ----------
         prefix : str
@@ -68,18 +91,49 @@ class ModelGrid(ModelFit):
             
         """
         
-        if os.path.exists('%s.000.chain.pkl' % prefix):
-            save_by_proc = True
-        else:
-            save_by_proc = False
-        
-        if save_by_proc:
-            prefix_by_proc = prefix + '.%s' % (str(rank).zfill(3))
-        else:
-            prefix_by_proc = prefix
+        shard = str(rank).zfill(3)
         
         # Read in current status of model grid
-        chain = read_pickle_file('%s.chain.pkl' % prefix_by_proc)
+        if self.output_format == 'columns':
+            reader = ColumnReader('%s.columns' % prefix)
+            if 'chain' in reader:
+                chain = reader['chain']
+            else:
+                chain = np.array([])
+                
+            mine = ColumnReader('%s.columns' % prefix, writers=[shard])
+            if 'chain' in mine:
+                self._num_written = len(mine['chain'])
+            else:
+                self._num_written = 0
+                
+        elif self.save_by_proc:
+            # Throw out partial writes, i.e., if we crashed mid-checkpoint
+            info = truncate_shard(prefix, shard)
+            
+            manifest = read_manifest(prefix, use_shards=True)
+            
+            # Nobody is left to clean up after these processors
+            if rank == 0:
+                for old in manifest['shards']:
+                    if int(old['shard']) >= size:
+                        truncate_shard(prefix, old['shard'])
+            
+            chain = read_sharded_pickle(prefix, 'chain.pkl', manifest)
+            
+            if info is None:
+                self._num_written = 0
+            else:
+                self._num_written = info['num']
+        else:
+            chain = read_pickle_file('%s.chain.pkl' % prefix)
+            self._num_written = len(chain)
+
+        # e.g., root processor with dynamic load-balancing (LB=2)
+        if chain.size == 0:
+            if self.grid.structured:
+                self.done = np.zeros(self.grid.shape)
+            return
 
         # Read parameter info
         f = open('%s.pinfo.pkl' % prefix, 'rb')
@@ -198,16 +252,26 @@ class ModelGrid(ModelFit):
                 return
             
         prefix = self.prefix
+        
+        if clobber and rank == 0:
+            os.system('rm -f %s.*.shard.pkl' % prefix)
+            os.system('rm -f %s.manifest.pkl' % prefix)
+            
         super(ModelGrid, self)._prep_from_scratch(clobber, 
             by_proc=self.save_by_proc)
+        
+        # Don't let anybody write before the root processor has clobbered
+        if self.save_by_proc and size > 1:
+            MPI.COMM_WORLD.Barrier()
     
         if os.path.exists('%s.logL.pkl' % prefix):
             os.remove('%s.logL.pkl' % prefix)
 
         # Say what processor computed which models.
         # Really just to make sure load-balancing etc. is working
-        f = open('%s.load.pkl' % prefix_by_proc, 'wb')
-        f.close()
+        if self.output_format == 'pkl':
+            f = open('%s.load.pkl' % prefix_by_proc, 'wb')
+            f.close()
 
         for par in self.grid.axes_names:
             if re.search('Tmin', par):
@@ -247,28 +311,42 @@ class ModelGrid(ModelFit):
         self.prefix = prefix
         self.save_freq = save_freq
         
+        # Each processor writes its own files (shards), so that nobody
+        # ever waits on anybody else to write to disk. See `merge_shards`.
+        # Sharded output stays sharded on restart, whatever the number of
+        # processors is this time around.
+        if self.output_format == 'columns':
+            sharded = False
+        else:
+            sharded = read_manifest(prefix, use_shards=True) is not None
+        
+        if (size > 1) or (restart and sharded):
+            self.save_by_proc = True
+            
+        self._num_written = 0
+        
         if self.save_by_proc:
             prefix_by_proc = prefix + '.%s' % (str(rank).zfill(3))
         else:
             prefix_by_proc = prefix
+        
+        # Output from any processor counts, not just from this one
+        if self.save_by_proc and (self.output_format != 'columns'):
+            have_output = sharded
+        else:
+            have_output = self._have_output(prefix_by_proc)
                 
-        if os.path.exists('%s.chain.pkl' % prefix_by_proc) and (not clobber):
+        if have_output and (not clobber):
             if not restart:
                 raise IOError('%s exists! Remove manually, set clobber=True, or set restart=True to append.' 
                     % prefix_by_proc)
 
-        if not os.path.exists('%s.chain.pkl' % prefix_by_proc) and restart:
+        if (not have_output) and restart:
             raise IOError("This can't be a restart, %s*.pkl not found." % prefix_by_proc)
         
         # Load previous results if this is a restart
         if restart:
-            if (not self.save_by_proc) and (rank != 0):
-                MPI.COMM_WORLD.Recv(np.zeros(1), rank-1, tag=rank-1)
-                
             self._read_restart(prefix)
-            
-            if (not self.save_by_proc) and (rank != (size-1)):
-                MPI.COMM_WORLD.Send(np.zeros(1), rank+1, tag=rank)
                 
             if self.grid.structured:    
                 # Re-run load-balancing
@@ -281,8 +359,6 @@ class ModelGrid(ModelFit):
         else:
             ct0 = 0
 
-        ct = 0
-        
         if restart:
             Nleft = self.grid.size - ct0
         else:
@@ -308,6 +384,10 @@ class ModelGrid(ModelFit):
 
         if not hasattr(self, 'LB'):
             self.LoadBalance(0)                    
+            
+        if self.LB == 2:
+            self._run_dynamic(restart, prefix_by_proc, Nleft)
+            return
                             
         # Dictionary for hmf tables
         fcoll = {}
@@ -321,6 +401,7 @@ class ModelGrid(ModelFit):
         else:
             use_checks = True
         
+        ct = 0
         chain_all = []; blobs_all = []; load_all = []
 
         # Loop over models, use StellarPopulation.update routine 
@@ -349,94 +430,10 @@ class ModelGrid(ModelFit):
                 pb.update(pb_i)
                 continue
 
-            # Grab Tmin index
-            if self.Tmin_in_grid and self.LB > 0:
-                Tmin_ax = self.grid.axes[self.grid.axisnum(self.Tmin_ax_name)]
-                i_Tmin = Tmin_ax.locate(kwargs[self.Tmin_ax_name])
-            else:
-                i_Tmin = 0
-
-            # Copy kwargs - may need updating with pre-existing lookup tables
-            p = self.base_kwargs.copy()
-
-            # Log-ify stuff if necessary
-            kw = {}
-            for i, par in enumerate(self.parameters):
-                if self.is_log[i]:
-                    kw[par] = 10**kwargs[par]
-                else:
-                    kw[par] = kwargs[par]
-            
-            p.update(kw)
-
-            # Create new splines if we haven't hit this Tmin yet in our model grid.    
-            if i_Tmin not in fcoll.keys() and (not self.tanh):
-                sim = self.simulator(**p)
-                
-                self.sim = sim
-                
-                pops = sim.pops
-                
-                if hasattr(self, 'Tmin_ax_popid'):
-                    loc = self.Tmin_ax_popid
-                    suffix = '{%i}' % loc
-                else:
-                    if sim.pf.Npops > 1:
-                        loc = 0
-                        suffix = '{0}'
-                    else:    
-                        loc = 0
-                        suffix = ''
-                                
-                hmf_pars = {'pop_Tmin%s' % suffix: sim.pf['pop_Tmin%s' % suffix],
-                    'fcoll%s' % suffix: copy.deepcopy(pops[loc].fcoll), 
-                    'dfcolldz%s' % suffix: copy.deepcopy(pops[loc].dfcolldz)}
-
-                # Save for future iterations
-                fcoll[i_Tmin] = hmf_pars.copy()
-
-            # If we already have matching fcoll splines, use them!
-            elif not self.tanh:        
-                                        
-                hmf_pars = {'pop_Tmin%s' % suffix: fcoll[i_Tmin]['pop_Tmin%s' % suffix],
-                    'fcoll%s' % suffix: fcoll[i_Tmin]['fcoll%s' % suffix],
-                    'dfcolldz%s' % suffix: fcoll[i_Tmin]['dfcolldz%s' % suffix]}
-                p.update(hmf_pars)
-                sim = self.simulator(**p)
-                
-            else:
-                sim = self.simulator(**p)
-                
-            # Write this set of parameters to disk before running 
-            # so we can troubleshoot later if the run never finishes.
-            procid = str(rank).zfill(3)
-            fn = '%s.%s.checkpt.pkl' % (self.prefix, procid)
-            with open(fn, 'wb') as f:
-                pickle.dump(kw, f)
-                
-            # Kill if model gets stuck    
-            if self.timeout is not None:
-                signal.signal(signal.SIGALRM, self._handler)
-                signal.alarm(self.timeout)
-            
-            # Run simulation!
-            try:
-                sim.run()
-            except Exception:                                 
-                # Write to "fail" file
-                f = open('%s.%s.fail.pkl' % (self.prefix, str(rank).zfill(3)), 
-                    'ab')
-                pickle.dump(kw, f)
-                f.close()
-
-            # Disable the alarm
-            if self.timeout is not None:
-                signal.alarm(0)
-
-            chain = np.array([kwargs[key] for key in self.parameters])
+            chain, blobs = self._run_model(kwargs, fcoll)
 
             chain_all.append(chain)
-            blobs_all.append(sim.blobs)
+            blobs_all.append(blobs)
             load_all.append(rank)
 
             ct += 1
@@ -449,34 +446,15 @@ class ModelGrid(ModelFit):
 
             # Only record results every save_freq steps
             if ct % save_freq != 0:
-                del p, sim
                 gc.collect()
                 continue
 
             if rank == 0 and use_checks:
                 print "Checkpoint #%i: %s" % (ct / save_freq, time.ctime())
 
-            if (not self.save_by_proc) and (rank != 0):
-                # Here we wait until we get the key      
-                MPI.COMM_WORLD.Recv(np.zeros(1), rank-1, tag=rank-1)
-                    
-            # First assemble data from all processors?
-            # Analogous to assembling data from all walkers in MCMC
-            f = open('%s.chain.pkl' % prefix_by_proc, 'ab')
-            pickle.dump(chain_all, f)
-            f.close()
-            
-            self.save_blobs(blobs_all, False, prefix_by_proc)
-            
-            f = open('%s.load.pkl' % prefix_by_proc, 'ab')
-            pickle.dump(load_all, f)
-            f.close()
+            self._write_checkpoint(chain_all, blobs_all, load_all, 
+                prefix_by_proc)
 
-            # Send the key to the next processor
-            if (not self.save_by_proc) and (rank != (size-1)):
-                MPI.COMM_WORLD.Send(np.zeros(1), rank+1, tag=rank)
-
-            del p, sim
             del chain_all, blobs_all, load_all
             gc.collect()
 
@@ -486,26 +464,259 @@ class ModelGrid(ModelFit):
 
         # Need to make sure we write results to disk if we didn't 
         # hit the last checkpoint
-        if (not self.save_by_proc) and (rank != 0):
-            MPI.COMM_WORLD.Recv(np.zeros(1), rank-1, tag=rank-1)
-    
+        self._write_checkpoint(chain_all, blobs_all, load_all, prefix_by_proc)
+        
+        print "Processor %i: Wrote %s.*.pkl (%s)" \
+            % (rank, prefix, time.ctime())
+        
+        self._write_manifest()
+            
+    def _run_dynamic(self, restart, prefix_by_proc, Nleft):
+        """
+        Run model grid, handing out models from a shared work queue.
+        
+        Models that share lookup tables (i.e., the same Tmin) are grouped
+        together, and chunks shrink as the grid nears completion. With MPI,
+        the root processor only dispatches models, while the rest run them.
+        Otherwise, models are run by a pool of ``self.processes`` processes,
+        or serially.
+        """
+        
+        tasks = []; keys = []
+        for h, kwargs in enumerate(self.grid.all_kwargs):
+            if restart and self.grid.structured:
+                if self.done[self.grid.locate_entry(kwargs)]:
+                    continue
+                    
+            tasks.append(h)
+            keys.append(self._i_Tmin(kwargs))
+        
+        if size > 1:
+            num_workers = size - 1
+        else:
+            num_workers = self.processes
+        
+        queue = WorkQueue(tasks, keys, num_workers=num_workers, 
+            max_chunk=self.chunk_size)
+        
+        # Dictionary for hmf tables
+        fcoll = {}
+        
+        func = lambda h: self._run_model(self.grid.all_kwargs[h], fcoll)
+        
+        pb = ProgressBar(Nleft, 'grid')
+        pb.start()
+        
+        if size > 1:
+            pool = MPIWorkQueue(queue)
+            if pool.is_master():
+                pool.dispatch(pb.update)
+                results = []
+            else:
+                results = ((h, func(h)) for h in pool.tasks())
+        elif self.processes > 1:
+            results = pool_imap(queue, func, self.processes)
+        else:
+            results = serial_imap(queue, func)
+                    
+        ct = 0
+        chain_all = []; blobs_all = []; load_all = []
+        for h, (chain, blobs) in results:
+            
+            chain_all.append(chain)
+            blobs_all.append(blobs)
+            load_all.append(rank)
+            
+            ct += 1
+            
+            if size == 1:
+                pb.update(ct)
+                
+            if ct % self.save_freq != 0:
+                continue
+                
+            self._write_checkpoint(chain_all, blobs_all, load_all, 
+                prefix_by_proc)
+                
+            del chain_all, blobs_all, load_all
+            gc.collect()
+            
+            chain_all = []; blobs_all = []; load_all = []
+            
+        pb.finish()
+        
+        self._write_checkpoint(chain_all, blobs_all, load_all, prefix_by_proc)
+        
+        if ct > 0:
+            print "Processor %i: Wrote %s.*.pkl (%s)" \
+                % (rank, self.prefix, time.ctime())
+                
+        self._write_manifest()
+        
+    def _i_Tmin(self, kwargs):
+        """
+        Figure out which set of lookup tables (fcoll splines) a model needs.
+        """
+        
+        if not (self.Tmin_in_grid and self.LB > 0):
+            return 0
+        
+        if self.grid.structured:    
+            Tmin_ax = self.grid.axes[self.grid.axisnum(self.Tmin_ax_name)]
+            return Tmin_ax.locate(kwargs[self.Tmin_ax_name])
+        
+        return kwargs[self.Tmin_ax_name]
+        
+    def _run_model(self, kwargs, fcoll):
+        """
+        Run a single model.
+        
+        Parameters
+        ----------
+        kwargs : dict
+            Parameters of this model (i.e., an element of grid.all_kwargs).
+        fcoll : dict
+            Lookup tables from previous models, keyed by Tmin index. Will
+            be updated if this model requires new tables.
+            
+        Returns
+        -------
+        Tuple: (chain element, blobs).
+        
+        """
+        
+        i_Tmin = self._i_Tmin(kwargs)
+        
+        # Copy kwargs - may need updating with pre-existing lookup tables
+        p = self.base_kwargs.copy()
+
+        # Log-ify stuff if necessary
+        kw = {}
+        for i, par in enumerate(self.parameters):
+            if self.is_log[i]:
+                kw[par] = 10**kwargs[par]
+            else:
+                kw[par] = kwargs[par]
+        
+        p.update(kw)
+
+        # Create new splines if we haven't hit this Tmin yet in our model grid.    
+        if self.tanh:
+            sim = self.simulator(**p)
+        elif i_Tmin not in fcoll.keys():
+            sim = self.simulator(**p)
+            
+            self.sim = sim
+            
+            pops = sim.pops
+            
+            if hasattr(self, 'Tmin_ax_popid'):
+                loc = self.Tmin_ax_popid
+                suffix = '{%i}' % loc
+            else:
+                if sim.pf.Npops > 1:
+                    loc = 0
+                    suffix = '{0}'
+                else:    
+                    loc = 0
+                    suffix = ''
+                            
+            hmf_pars = {'pop_Tmin%s' % suffix: sim.pf['pop_Tmin%s' % suffix],
+                'fcoll%s' % suffix: copy.deepcopy(pops[loc].fcoll), 
+                'dfcolldz%s' % suffix: copy.deepcopy(pops[loc].dfcolldz)}
+
+            # Save for future iterations
+            fcoll[i_Tmin] = hmf_pars.copy()
+
+        # If we already have matching fcoll splines, use them!
+        else:
+            p.update(fcoll[i_Tmin])
+            sim = self.simulator(**p)
+            
+        # Write this set of parameters to disk before running 
+        # so we can troubleshoot later if the run never finishes.
+        procid = _procid()
+        fn = '%s.%s.checkpt.pkl' % (self.prefix, procid)
+        with open(fn, 'wb') as f:
+            pickle.dump(kw, f)
+            
+        # Kill if model gets stuck    
+        if self.timeout is not None:
+            signal.signal(signal.SIGALRM, self._handler)
+            signal.alarm(self.timeout)
+        
+        # Run simulation!
+        try:
+            sim.run()
+        except Exception:                                 
+            # Write to "fail" file
+            f = open('%s.%s.fail.pkl' % (self.prefix, procid), 'ab')
+            pickle.dump(kw, f)
+            f.close()
+
+        # Disable the alarm
+        if self.timeout is not None:
+            signal.alarm(0)
+
+        chain = np.array([kwargs[key] for key in self.parameters])
+        
+        return chain, sim.blobs
+        
+    def _write_checkpoint(self, chain_all, blobs_all, load_all, prefix_by_proc):
+        """
+        Append results to disk.
+        """
+        
+        if self.output_format == 'columns':
+            if chain_all:
+                self.column_writer.append('chain', np.array(chain_all))
+                self.column_writer.append('load', np.array(load_all))
+            
+            if blobs_all:
+                self.save_blobs(blobs_all, False)
+            
+            self._num_written += len(chain_all)
+            self.column_writer.flush()
+            return
+        
         if chain_all:
-            with open('%s.chain.pkl' % prefix_by_proc, 'ab') as f:
-                pickle.dump(chain_all, f)
+            write_pickled_chunk('%s.chain.pkl' % prefix_by_proc, chain_all)
         
         if blobs_all:
             self.save_blobs(blobs_all, False, prefix_by_proc)
         
         if load_all:
-            with open('%s.load.pkl' % prefix_by_proc, 'ab') as f:
-                pickle.dump(load_all, f)
+            write_pickled_chunk('%s.load.pkl' % prefix_by_proc, load_all)
         
-        print "Processor %i: Wrote %s.*.pkl (%s)" \
-            % (rank, prefix, time.ctime())
+        self._num_written += len(chain_all)
         
-        # Send the key to the next processor
-        if (not self.save_by_proc) and (rank != (size-1)):
-            MPI.COMM_WORLD.Send(np.zeros(1), rank+1, tag=rank)
+        # Record what's been written so far, i.e., what's safe to read
+        if self.save_by_proc:
+            write_shard_info(self.prefix, str(rank).zfill(3), 
+                self._shard_files, self._num_written)
+                
+    @property
+    def _shard_files(self):
+        files = ['chain.pkl', 'load.pkl']
+        if self.blob_names is not None:
+            for i, group in enumerate(self.blob_names):
+                for blob in group:
+                    files.append('blob_%id.%s.pkl' % (self.blob_nd[i], blob))
+        return files
+        
+    def _write_manifest(self):
+        """
+        Combine info about each processor's output into prefix.manifest.pkl.
+        """
+        
+        if (not self.save_by_proc) or (self.output_format == 'columns'):
+            return
+            
+        if size > 1:
+            MPI.COMM_WORLD.Barrier()
+            
+        if rank == 0:
+            write_manifest(self.prefix)
                 
     @property        
     def Tmin_in_grid(self):
@@ -569,6 +780,32 @@ class ModelGrid(ModelFit):
     @save_by_proc.setter
     def save_by_proc(self, value):
         self._save_by_proc = value
+        
+    @property
+    def chunk_size(self):
+        """
+        Maximum number of models handed out at once (if LB=2).
+        """
+        if not hasattr(self, '_chunk_size'):
+            self._chunk_size = None
+        return self._chunk_size
+        
+    @chunk_size.setter
+    def chunk_size(self, value):
+        self._chunk_size = value
+        
+    @property
+    def processes(self):
+        """
+        Number of local processes to run models with (if LB=2, no MPI).
+        """
+        if not hasattr(self, '_processes'):
+            self._processes = 1
+        return self._processes
+        
+    @processes.setter
+    def processes(self, value):
+        self._processes = int(value)
             
     @property
     def assignments(self):
@@ -588,6 +825,11 @@ class ModelGrid(ModelFit):
             self._unstructured_balance(method=method)       
             
     def _unstructured_balance(self, method=0):
+        
+        # Dynamic: models are handed out as processors become free
+        if method == 2:
+            self.LB = 2
+            return
                 
         if rank == 0:
 
@@ -628,6 +870,8 @@ class ModelGrid(ModelFit):
         method : int
             0 : OFF
             1 : By Tmin, cleverly
+            2 : Dynamic, i.e., hand out chunks of models (grouped by Tmin)
+                to processors as they become free.
             
         Returns
         -------
@@ -637,6 +881,10 @@ class ModelGrid(ModelFit):
         
         """
         
+        if method == 2:
+            self.LB = 2
+            return
+        
         self.LB = True
         
         if size == 1:
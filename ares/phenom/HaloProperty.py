@@ -12,6 +12,7 @@ Description:
 
 import numpy as np
 from ..util import ParameterFile
+from ..util.Misc import LRUDict
 
 def tanh_astep(M, lo, hi, logM0, logdM):
     # NOTE: lo = value at the low-mass end
@@ -36,9 +37,123 @@ func_options = \
  'plsum': 'p[0] * (x / p[1])**p[2] + p[3] * (x / p[4])**p5',
 }
     
+# Grid evaluations, shared by all instances with identical parameters
+_tab_cache = LRUDict(64)
+
+def _grid_key(arr):
+    arr = np.asarray(arr, dtype=float)
+    return (arr.shape, arr.tostring())
+    
 class ParameterizedHaloProperty(object):
     def __init__(self, **kwargs):
         self.pf = ParameterFile(**kwargs)
+        
+    @property
+    def pars(self):
+        """
+        Resolved parameters of the main function.
+        
+        Returns
+        -------
+        List containing [main function parameters, nested parameters], the 
+        latter of which is None for parameters that aren't themselves 
+        parameterized.
+        
+        """
+        if not hasattr(self, '_pars'):
+            pars1 = [self.pf['php_func_par%i' % i] for i in range(6)]
+            pars2 = []
+    
+            for i in range(6):
+                tmp = []
+                for j in range(6):
+                    name = 'php_func_par%i_par%i' % (i,j)
+                    if name in self.pf:
+                        tmp.append(self.pf[name])
+                    else:
+                        tmp.append(None)
+            
+                pars2.append(tmp)
+                
+            self._pars = [pars1, pars2]
+            
+        return self._pars
+        
+    @property
+    def faux_pars(self):
+        """
+        Parameters of the auxiliary functions, keyed by faux_id.
+        """
+        if not hasattr(self, '_faux_pars'):
+            self._faux_pars = {}
+            for faux_id in ['', '_A', '_B']:
+                if self.pf['php_faux%s' % faux_id] is None:
+                    continue
+                self._faux_pars[faux_id] = \
+                    [self.pf['php_faux%s_par%s' % (faux_id, i)] \
+                        for i in range(6)]
+                        
+        return self._faux_pars
+        
+    @property
+    def key(self):
+        """
+        Hashable representation of this parameter set.
+        """
+        if not hasattr(self, '_key'):
+            items = []
+            for par in sorted(self.pf.keys()):
+                if not par.startswith('php'):
+                    continue
+                val = self.pf[par]
+                if isinstance(val, (list, np.ndarray)):
+                    val = tuple(np.ravel(val))
+                items.append((par, val))
+                
+            self._key = tuple(items)
+        
+        return self._key
+        
+    def tabulate(self, z, M):
+        """
+        Evaluate this property on a full (redshift, halo mass) grid.
+        
+        Results are cached (by parameter set and grid), so repeated calls
+        with the same grid and parameters cost nothing. Since the cache is
+        shared by all instances, the array returned is read-only.
+        
+        Parameters
+        ----------
+        z : np.ndarray
+            1-D array of redshifts.
+        M : np.ndarray
+            1-D array of halo masses [Msun].
+        
+        Returns
+        -------
+        Array with shape (len(z), len(M)).
+        
+        """
+        
+        z = np.atleast_1d(z)
+        M = np.atleast_1d(M)
+        
+        try:
+            key = (self.key, _grid_key(z), _grid_key(M))
+        except TypeError:
+            # Some parameter isn't hashable, e.g., a function.
+            key = None
+            
+        if (key is not None) and (key in _tab_cache):
+            return _tab_cache[key]
+            
+        tab = self.__call__(z[:,None], M[None,:]) * np.ones([z.size, M.size])
+        
+        if key is not None:
+            tab.flags.writeable = False
+            _tab_cache[key] = tab
+            
+        return tab
     
     @property
     def func(self):
@@ -77,21 +192,7 @@ class ParameterizedHaloProperty(object):
         Compute the star formation efficiency.
         """
 
-        pars1 = [self.pf['php_func_par%i' % i] for i in range(6)]
-        pars2 = []
-
-        for i in range(6):
-            tmp = []
-            for j in range(6):
-                name = 'php_func_par%i_par%i' % (i,j)
-                if name in self.pf:
-                    tmp.append(self.pf[name])
-                else:
-                    tmp.append(None)
-        
-            pars2.append(tmp)
-        
-        return self._call(z, M, [pars1, pars2])
+        return self._call(z, M, self.pars)
 
     def _call(self, z, M, pars, func=None, faux_id=''):
         """
@@ -122,7 +223,7 @@ class ParameterizedHaloProperty(object):
         pars1, pars2 = pars
         
         # Read-in parameters to more convenient names
-        # I don't usually use exec, but when I do, it's to do garbage like this
+        vals = []
         for i, par in enumerate(pars1):
             
             if type(par) == str:
@@ -135,9 +236,13 @@ class ParameterizedHaloProperty(object):
                 p = pars2[i]
                 val = p[0] * ((1. + z) / (1. + p[1]))**p[2]
                 
-                exec('p%i = val' % i)
+                vals.append(val)
             else:
-                exec('p%i = par' % i)
+                vals.append(par)
+        
+        # Might have been handed fewer than 6 parameters (e.g., by curve_fit)
+        vals.extend([None] * (6 - len(vals)))
+        p0, p1, p2, p3, p4, p5 = vals
             
         # Actually execute the function                    
         if func == 'lognormal':
@@ -207,13 +312,15 @@ class ParameterizedHaloProperty(object):
                 if self.pf['php_faux%s' % faux_id] is None:
                     continue
                                 
-                p = [self.pf['php_faux%s_par%s' % (faux_id, i)] for i in range(6)]
+                p = self.faux_pars[faux_id]
                 aug = self._call(z, M, [p,None], self.pf['php_faux%s' % faux_id], faux_id)
 
+                # Not in place: aug may depend on a different variable than
+                # f, in which case broadcasting changes the shape.
                 if self.pf['php_faux%s_meth' % faux_id] == 'multiply':
-                    f *= aug
+                    f = f * aug
                 elif self.pf['php_faux%s_meth' % faux_id] == 'add':
-                    f += aug
+                    f = f + aug
                 else:    
                     raise NotImplemented('Unknown faux_meth \'%s\'' % self.pf['%s_meth' % par_pre])
 
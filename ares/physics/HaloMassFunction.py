@@ -380,16 +380,35 @@ class HaloMassFunction(object):
         _fcoll_tab[np.isnan(_fcoll_tab)] = 0.0
         self._fcoll_tab = _fcoll_tab
                     
-    def build_1d_splines(self, Tmin, mu=0.6):
+    def build_1d_splines(self, Tmin, mu=0.6, pf=None):
         """
         Construct splines for fcoll and its derivatives given a (fixed) 
         minimum virial temperature.
+        
+        Parameters
+        ----------
+        Tmin : int, float
+            Minimum virial temperature of star-forming halos.
+        mu : float
+            Mean molecular weight.
+        pf : dict
+            Parameters of the population asking, from which we'll take the
+            halo mass limits (pop_Mmin, pop_Tmax, pop_Mmax). If None, will 
+            use those this HaloMassFunction instance was built with. Allows
+            a single instance to be shared by populations with different 
+            mass limits.
+        
         """
         
-        Mmin_of_z = (self.pf['pop_Mmin'] is None) or \
-            type(self.pf['pop_Mmin']) is FunctionType
-        Mmax_of_z = (self.pf['pop_Tmax'] is not None) or \
-            type(self.pf['pop_Mmax']) is FunctionType    
+        if pf is None:
+            pf = self.pf
+            
+        Mmin = pf['pop_Mmin']
+        Tmax = pf['pop_Tmax']
+        
+        Mmin_of_z = (Mmin is None) or type(Mmin) is FunctionType
+        Mmax_of_z = (Tmax is not None) or \
+            type(pf['pop_Mmax']) is FunctionType    
         
         self.logM_min = np.zeros_like(self.z)
         self.logM_max = np.zeros_like(self.z)
@@ -397,16 +416,16 @@ class HaloMassFunction(object):
         self.dndm_Mmin = np.zeros_like(self.z)
         self.dndm_Mmax = np.zeros_like(self.z)
         for i, z in enumerate(self.z):
-            if self.pf['pop_Mmin'] is None:
+            if Mmin is None:
                 self.logM_min[i] = np.log10(self.VirialMass(Tmin, z, mu=mu))
             else:
-                if type(self.pf['pop_Mmin']) is FunctionType:
-                    self.logM_min[i] = np.log10(self.pf['pop_Mmin'](z))
+                if type(Mmin) is FunctionType:
+                    self.logM_min[i] = np.log10(Mmin(z))
                 else:    
-                    self.logM_min[i] = np.log10(self.pf['pop_Mmin'])
+                    self.logM_min[i] = np.log10(Mmin)
                     
             if Mmax_of_z:
-                self.logM_max[i] = np.log10(self.VirialMass(self.pf['pop_Tmax'], z, mu=mu))        
+                self.logM_max[i] = np.log10(self.VirialMass(Tmax, z, mu=mu))
                 self.dndm_Mmax[i] = 10**np.interp(self.logM_min[i], self.logM, 
                     np.log10(self.dndm[i,:]))
             # For boundary term
@@ -414,7 +433,7 @@ class HaloMassFunction(object):
                 self.dndm_Mmin[i] = 10**np.interp(self.logM_min[i], self.logM, 
                     np.log10(self.dndm[i,:]))
 
-            self.fcoll_Tmin[i] = self.fcoll_2d(z, self.logM_min[i])
+            self.fcoll_Tmin[i] = self.fcoll_2d(z, self.logM_min[i], pf=pf)
 
         # Main term: rate of change in collapsed fraction in halos that were
         # already above the threshold.
@@ -478,18 +497,26 @@ class HaloMassFunction(object):
     def fcoll_spline_2d(self, value):
         self._fcoll_spline_2d = value
         
-    def fcoll_2d(self, z, logMmin):
+    def fcoll_2d(self, z, logMmin, pf=None):
         """
         Return fraction of mass in halos more massive than 10**logMmin.
         Interpolation in 2D, x = redshift = z, y = logMass.
+        
+        If supplied, upper mass limits are taken from the parameters `pf`
+        (see `build_1d_splines`).
         """ 
         
-        if self.Mmax is not None:
+        if pf is None:
+            pf = self.pf
+            
+        Mmax = pf['pop_Mmax']
+        
+        if Mmax is not None:
             return np.squeeze(self.fcoll_spline_2d(z, logMmin)) \
-                 - np.squeeze(self.fcoll_spline_2d(z, self.logMmax))
-        elif self.pf['pop_Tmax'] is not None:
-            logMmax = np.log10(self.VirialMass(self.pf['pop_Tmax'], z, 
-                mu=self.pf['mu']))
+                 - np.squeeze(self.fcoll_spline_2d(z, np.log10(Mmax)))
+        elif pf['pop_Tmax'] is not None:
+            logMmax = np.log10(self.VirialMass(pf['pop_Tmax'], z, 
+                mu=pf['mu']))
                 
             if logMmin >= logMmax:
                 return tiny_fcoll
@@ -137,14 +137,14 @@ class Hydrogen(object):
     @property
     def kH_hi(self):
         if not hasattr(self, '_kH_hi'):
-            self._kH_hi = np.array(map(self.kappa_H, self.Tk_hi_H))
+            self._kH_hi = self.kappa_H(self.Tk_hi_H)
     
         return self._kH_hi
 
     @property
     def ke_hi(self):
         if not hasattr(self, '_ke_hi'):
-            self._ke_hi = np.array(map(self.kappa_e, self.Tk_hi_e))
+            self._ke_hi = self.kappa_e(self.Tk_hi_e)
 
         return self._ke_hi
 
@@ -152,7 +152,7 @@ class Hydrogen(object):
     def dlogkH_dlogT(self):  
         if not hasattr(self, '_dlogkH_dlogT'):
             Tk_p_H, dkHdT = central_difference(self.Tk_hi_H, self.kH_hi)
-            dlogkH_dlogT = dkHdT * Tk_p_H / np.array(map(self.kappa_H, Tk_p_H))
+            dlogkH_dlogT = dkHdT * Tk_p_H / self.kappa_H(Tk_p_H)
             
             _kH_spline = interpolate.interp1d(Tk_p_H, dlogkH_dlogT)
             self._dlogkH_dlogT = lambda T: _kH_spline(T)
@@ -163,44 +163,72 @@ class Hydrogen(object):
     def dlogke_dlogT(self):
         if not hasattr(self, '_dlogke_dlogT'):
             Tk_p_e, dkedT = central_difference(self.Tk_hi_e, self.ke_hi)
-            dlogke_dlogT = dkedT * Tk_p_e / np.array(map(self.kappa_e, Tk_p_e))
+            dlogke_dlogT = dkedT * Tk_p_e / self.kappa_e(Tk_p_e)
             
             _ke_spline = interpolate.interp1d(Tk_p_e, dlogke_dlogT)
             self._dlogke_dlogT = lambda T: _ke_spline(T)
     
         return self._dlogke_dlogT
     
-    def _kappa(self, Tk, Tarr, spline):
-        if Tk < Tarr[0]:
-            return spline(Tarr[0])
-        elif Tk > Tarr[-1]:
-            return spline(Tarr[-1])
-        else:
-            return spline(Tk)
+    def _log_table(self, Tarr, spline):
+        """
+        Tabulate the log of a rate coefficient in log-temperature.
+        
+        .. note :: Original data points are included in the table so that
+            kinks in the underlying spline are resolved exactly. In between,
+            linear interpolation in log-log space reproduces the spline to
+            better than one part in 10^4.
+        
+        """
+        lnT = np.union1d(np.log(Tarr), 
+            np.linspace(np.log(Tarr[0]), np.log(Tarr[-1]), 1000))
+        k = spline(np.clip(np.exp(lnT), Tarr[0], Tarr[-1]))
+        return lnT, np.log(k)
+        
+    @property
+    def _lnkappa_H_tab(self):
+        if not hasattr(self, '_lnkappa_H_tab_'):
+            self._lnkappa_H_tab_ = self._log_table(T_HH, self.kappa_H_pre)
+        return self._lnkappa_H_tab_
+        
+    @property
+    def _lnkappa_e_tab(self):
+        if not hasattr(self, '_lnkappa_e_tab_'):
+            self._lnkappa_e_tab_ = self._log_table(T_He, self.kappa_e_pre)
+        return self._lnkappa_e_tab_
+    
+    def _kappa(self, Tk, Tarr, tab):
+        """
+        Interpolate a tabulated rate coefficient, clamping to the edges of
+        the table for temperatures outside the range in `Tarr`.
+        """
+        lnT, lnk = tab
+        lnTk = np.log(np.clip(Tk, Tarr[0], Tarr[-1]))
+        return np.exp(np.interp(lnTk, lnT, lnk))
                                
     def kappa_H(self, Tk):
         """
         Rate coefficient for spin-exchange via H-H collsions.
+        
+        Parameters
+        ----------
+        Tk : int, float, np.ndarray
+            Kinetic temperature of the gas [K]
+        
         """
-        if type(Tk) in [float, np.float64]:            
-            return self._kappa(Tk, T_HH, self.kappa_H_pre)
-        else:
-            tmp = np.zeros_like(Tk)
-            for i in range(len(Tk)):
-                tmp[i] = self._kappa(Tk[i], T_HH, self.kappa_H_pre)
-            return tmp
+        return self._kappa(Tk, T_HH, self._lnkappa_H_tab)
             
     def kappa_e(self, Tk):       
         """
         Rate coefficient for spin-exchange via H-electron collsions.
+        
+        Parameters
+        ----------
+        Tk : int, float, np.ndarray
+            Kinetic temperature of the gas [K]
+        
         """                            
-        if type(Tk) in [float, np.float64]:
-            return self._kappa(Tk, T_He, self.kappa_e_pre)
-        else:
-            tmp = np.zeros_like(Tk)
-            for i in range(len(Tk)):
-                tmp[i] = self._kappa(Tk[i], T_He, self.kappa_e_pre)
-            return tmp
+        return self._kappa(Tk, T_He, self._lnkappa_e_tab)
 
     def photon_energy(self, nu, nl=1):
         """
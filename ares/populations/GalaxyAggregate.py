@@ -401,8 +401,11 @@ class GalaxyAggregate(HaloPopulation):
     
             # If tabulated, do things differently
             if self.sed_tab:
-                factor = self.src.yield_per_sfr(Emin, Emax) \
-                    / self.src.yield_per_sfr(*self.reference_band)
+                # Both bands at once
+                E1, E2 = self.reference_band
+                y = self.src.yield_per_sfr(np.array([Emin, E1]), 
+                    np.array([Emax, E2]))
+                factor = y[0] / y[1]
             else:
                 factor = quad(self.src.Spectrum, Emin, Emax)[0] \
                     / quad(self.src.Spectrum, *self.reference_band)[0]
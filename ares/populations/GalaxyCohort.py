@@ -13,6 +13,7 @@ Description:
 import re
 import numpy as np
 from ..util import read_lit
+from ..util.Misc import LRUDict
 from types import FunctionType
 from .GalaxyAggregate import GalaxyAggregate
 from scipy.optimize import fsolve, curve_fit
@@ -64,12 +65,14 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
             except (IndexError, TypeError):
                 is_php = False
     
+            boost = self.pf['pop_fstar_boost']
+    
             if self.sed_tab and (not is_php):
-                result = lambda z, M: self.src.__getattribute__(name) \
-                    / self.pf['pop_fstar_boost']
+                val = self.src.__getattribute__(name) / boost
+                result = lambda z, M: val
             elif type(self.pf[full_name]) in [float, np.float64]:
-                result = lambda z, M: self.pf[full_name] \
-                        / self.pf['pop_fstar_boost']
+                val = self.pf[full_name] / boost
+                result = lambda z, M: val
             elif is_php:
                 tmp = get_php_pars(self.pf[full_name], self.pf) 
                 
@@ -86,8 +89,10 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
                     pars = tmp            
                     
                 inst = ParameterizedHaloProperty(**pars)
-                result = lambda z, M: inst.__call__(z, M) \
-                        / self.pf['pop_fstar_boost']          
+                result = lambda z, M: inst.__call__(z, M) / boost
+                
+                # Hang on to this so we can tabulate on (z, M) grids later
+                self.php_instances[name] = inst
         
             else:
                 raise TypeError('dunno how to handle this')
@@ -96,6 +101,46 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
     
         return self.__dict__[name]
 
+    @property
+    def php_instances(self):
+        """
+        ParameterizedHaloProperty instances created for this population, 
+        keyed by (unprefixed) parameter name.
+        """
+        if not hasattr(self, '_php_instances'):
+            self._php_instances = {}
+        return self._php_instances
+        
+    def tabulate_property(self, name):
+        """
+        Evaluate a halo property, e.g., 'fstar', 'fesc', 'Nion', on the
+        (self.halos.z, self.halos.M) grid.
+        
+        ..note:: For parameterized halo properties, the result is cached by
+            parameter set, so this is computed once per model.
+        
+        Returns
+        -------
+        Array with shape (self.halos.Nz, self.halos.Nm).
+        
+        """
+        
+        z, M = self.halos.z, self.halos.M
+        
+        # Make sure instance exists if it's a php
+        func = getattr(self, name)
+        
+        if name == 'fstar' and hasattr(self, '_fstar_inst') \
+            and self.pf['pop_mlf'] is None:
+            return self._fstar_inst.tabulate(z, M) * self._fstar_boost
+        elif name in self.php_instances:
+            return self.php_instances[name].tabulate(z, M) \
+                / self.pf['pop_fstar_boost']
+        elif isinstance(func, ParameterizedHaloProperty):
+            return func.tabulate(z, M)
+                
+        return func(z[:,None], M[None,:]) * np.ones([z.size, M.size])
+
     def N_per_Msun(self, Emin, Emax):
         """
         Compute photon luminosity in band of interest per unit SFR for 
@@ -552,21 +597,112 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
                                                                 
         return phi_of_x
 
+    def LuminosityFunctions(self, redshifts, x, mags=True):
+        """
+        Reconstructed luminosity function at several redshifts at once.
+        
+        Parameters
+        ----------
+        redshifts : list, np.ndarray
+            Redshifts of interest.
+        x : list
+            Abscissae (magnitudes or luminosities) at which to evaluate the
+            LF, one array per redshift. If a single array is supplied, it
+            will be used for all redshifts.
+        mags : bool
+            If True, x-values will be in absolute (AB) magnitudes
+            
+        Returns
+        -------
+        List of number densities, one array per redshift.
+        
+        """
+        
+        redshifts = np.atleast_1d(redshifts)
+        
+        if np.ndim(x[0]) == 0:
+            x = [x] * len(redshifts)
+            
+        assert len(x) == len(redshifts), \
+            "Must supply one set of abscissae per redshift!"
+            
+        # Grow the caches if need be so this batch doesn't evict itself,
+        # but only for the duration of this call.
+        caches = [self._Lh_cache, self._phi_of_L, self._phi_of_M]
+        maxsize = [cache.maxsize for cache in caches]
+        for cache in caches:
+            if cache.maxsize is not None:
+                cache.resize(max(cache.maxsize, len(redshifts)))
+        
+        try:
+            # Compute all halo luminosities first (shares dndm interpolant).
+            self.Lh_tab(redshifts)
+                    
+            phi = [self.LuminosityFunction(z, np.array(x[i]), mags=mags) \
+                for i, z in enumerate(redshifts)]
+        finally:
+            for i, cache in enumerate(caches):
+                cache.resize(maxsize[i])
+                
+        return phi
+            
+    @property
+    def _Lh_cache(self):
+        if not hasattr(self, '_Lh_cache_'):
+            self._Lh_cache_ = LRUDict(self.pf['pop_lf_cache'])
+        return self._Lh_cache_
+
     def Lh(self, z):
-        return self.SFR(z, self.halos.M) * self.L1600_per_sfr(z, self.halos.M)
+        """
+        Luminosity (at 1600 Angstrom) of halos in self.halos.M at redshift z.
+        """
+        if z in self._Lh_cache:
+            return self._Lh_cache[z]
+        
+        Lh = self.SFR(z, self.halos.M) * self.L1600_per_sfr(z, self.halos.M)
+        
+        self._Lh_cache[z] = Lh
+        
+        return Lh
+        
+    def Lh_tab(self, redshifts):
+        """
+        Halo luminosities on a (redshifts, self.halos.M) grid.
+        """
+        return np.array([self.Lh(z) for z in redshifts])
+        
+    @property
+    def _dndm_interp(self):
+        """
+        Interpolant for the halo mass function in redshift.
+        
+        ..note:: This is built once and shared by all LF calculations.
+        """
+        if not hasattr(self, '_dndm_interp_'):
+            self._dndm_interp_ = interp1d(self.halos.z, 
+                self.halos.dndm[:,:-1], axis=0)
+        return self._dndm_interp_
+
+    @property
+    def _phi_of_L(self):
+        if not hasattr(self, '_phi_of_L_'):
+            self._phi_of_L_ = LRUDict(self.pf['pop_lf_cache'])
+        return self._phi_of_L_
+        
+    @property
+    def _phi_of_M(self):
+        if not hasattr(self, '_phi_of_M_'):
+            self._phi_of_M_ = LRUDict(self.pf['pop_lf_cache'])
+        return self._phi_of_M_
 
     def phi_of_L(self, z):
 
-        if not hasattr(self, '_phi_of_L'):
-            self._phi_of_L = {}
-        else:
-            if z in self._phi_of_L:
-                return self._phi_of_L[z]
+        if z in self._phi_of_L:
+            return self._phi_of_L[z]
 
         Lh = self.Lh(z)
         
         dMh_dLh = np.diff(self.halos.M) / np.diff(Lh)
-        dndm = interp1d(self.halos.z, self.halos.dndm[:,:-1], axis=0)
 
         # Only return stuff above Mmin
         Mmin = np.interp(z, self.halos.z, self.Mmin)
@@ -576,7 +712,8 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
         ok = np.logical_and(above_Mmin, below_Mmax)[0:-1]
         mask = self.mask = np.logical_not(ok)
 
-        phi_of_L = dndm(z) * self.fduty(z, self.halos.M[0:-1]) * dMh_dLh
+        phi_of_L = self._dndm_interp(z) * self.fduty(z, self.halos.M[0:-1]) \
+            * dMh_dLh
         
         lum = np.ma.array(Lh[:-1], mask=mask)
         phi = np.ma.array(phi_of_L, mask=mask)
@@ -585,14 +722,11 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
 
         self._phi_of_L[z] = lum, phi
 
-        return self._phi_of_L[z]
+        return lum, phi
 
     def phi_of_M(self, z):
-        if not hasattr(self, '_phi_of_M'):
-            self._phi_of_M = {}
-        else:
-            if z in self._phi_of_M:
-                return self._phi_of_M[z]
+        if z in self._phi_of_M:
+            return self._phi_of_M[z]
 
         Lh, phi_of_L = self.phi_of_L(z)
 
@@ -602,7 +736,7 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
 
         self._phi_of_M[z] = MAB[0:-1], phi_of_M
 
-        return self._phi_of_M[z]
+        return MAB[0:-1], phi_of_M
 
     def MUV_max(self, z): 
         """
@@ -651,9 +785,13 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
         """
         if not hasattr(self, '_sfr_tab'):
             self._sfr_tab = np.zeros([self.halos.Nz, self.halos.Nm])
+            
+            # SFE on the full (z, M) grid in one go
+            sfe = self.tabulate_property('fstar')
+            
             for i, z in enumerate(self.halos.z):
                 self._sfr_tab[i] = self.eta[i] * self.MAR(z, self.halos.M) \
-                    * self.cosm.fbar_over_fcdm * self.SFE(z, self.halos.M)
+                    * self.cosm.fbar_over_fcdm * sfe[i]
                 
                 mask = self.halos.M >= self.Mmin[i]
                 self._sfr_tab[i] *= mask
@@ -772,6 +910,8 @@ class GalaxyCohort(GalaxyAggregate,DustCorrection):
             else:
                 boost = 1. / self.pf['pop_fstar_boost']
             
+            self._fstar_boost = boost
+            
             if self.pf['pop_mlf'] is not None:
                 self._fstar = lambda z, M: boost / (1. + self.mlf(z, M))
             elif type(self.pf['pop_fstar']) in [float, np.float64]:
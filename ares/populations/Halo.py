@@ -69,7 +69,7 @@ class HaloPopulation(Population):
 
     def _set_fcoll(self, Tmin, mu):
         self._fcoll, self._dfcolldz, self._d2fcolldz2 = \
-            self.halos.build_1d_splines(Tmin, mu)
+            self.halos.build_1d_splines(Tmin, mu, pf=self.pf)
 
     @property
     def halos(self):
@@ -128,7 +128,7 @@ class HaloPopulation(Population):
             
             # Step 1: Calculate fcoll(z, Mmin)
             
-            fcoll = self.halos.fcoll_2d(z, np.log10(Mmin))
+            fcoll = self.halos.fcoll_2d(z, np.log10(Mmin), pf=self.pf)
             
             # Account for halos crossing threshold?
             
@@ -10,10 +10,12 @@ Description:
 
 """
 
+import os
 import numpy as np
-from scipy.integrate import quad
+from scipy.integrate import quad, cumtrapz
 from ares.physics import Cosmology
-from ..util.ReadData import read_lit
+from ..util.ReadData import read_lit, file_signature, _read_npy_cache, \
+    _write_npy_cache
 from scipy.interpolate import interp1d
 from ..util.ParameterFile import ParameterFile
 from ares.physics.Constants import h_p, c, erg_per_ev, g_per_msun, s_per_yr, \
@@ -21,6 +23,182 @@ from ares.physics.Constants import h_p, c, erg_per_ev, g_per_msun, s_per_yr, \
 
 relevant_pars = ['pop_Z', 'pop_imf', 'pop_nebular', 'pop_ssp', 'pop_tsf']
 
+# Parameters that determine which SED table gets loaded
+sed_table_pars = ['pop_Z', 'pop_imf', 'pop_nebular', 'pop_ssp', 'pop_binaries']
+
+HOME = os.environ.get('HOME')
+ARES = os.environ.get('ARES')
+
+# Process-wide cache of (wavelengths, data) for each SED table
+_sed_cache = {}
+
+def _sed_cache_prefix(**kwargs):
+    """
+    Construct prefix for SED cache files, e.g., eldridge2009_Z0.02_imf2.35...
+    """
+    
+    tags = [str(kwargs['pop_sed'])]
+    for par in sed_table_pars:
+        tags.append('%s%s' % (par.replace('pop_', ''), kwargs[par]))
+    
+    return '_'.join(tags)
+    
+def _sed_cache_dir(pf):
+    if pf['pop_sed_cache'] is True:
+        if ARES is not None:
+            return '%s/input/sed_cache' % ARES
+        return '%s/.ares/sed_cache' % HOME
+    else:
+        return pf['pop_sed_cache']
+        
+def _sed_sources(litinst, **kwargs):
+    """
+    Files a given SED table is derived from, i.e., the litdata module itself
+    and (if we can tell) the original data files.
+    """
+    
+    fns = []
+    if getattr(litinst, '__file__', None) is not None:
+        fns.append(litinst.__file__)
+    
+    data = None
+    if hasattr(litinst, '_kwargs_to_fn'):
+        try:
+            data = litinst._kwargs_to_fn(**kwargs)
+        except Exception:
+            data = None
+        
+    path = getattr(litinst, '_input', None)    
+    
+    if data is None:
+        # Don't know exactly which file(s), so consider all of them
+        if (path is not None) and os.path.isdir(path):
+            data = [os.path.join(path, fn) for fn in sorted(os.listdir(path))]
+        else:
+            data = []
+    elif type(data) is str:
+        data = [data]
+            
+    for fn in data:
+        if (not os.path.exists(fn)) and (path is not None):
+            fn = os.path.join(path, fn)
+        if os.path.isfile(fn):
+            fns.append(fn)
+    
+    return fns
+
+def load_sed(litinst, **kwargs):
+    """
+    Load an SED table, preferably from the cache.
+    
+    The first time a given (model, metallicity, IMF, ...) table is read, it 
+    is parsed from the original (ASCII) files via the litdata module's
+    `_load` method and saved as uncompressed .npy files in the directory 
+    set by `pop_sed_cache`. Later loads (in any process) memory-map those
+    files, and all instances within a process share the same arrays.
+    
+    Cached tables are regenerated whenever the litdata module or the 
+    original data files change (in modification time or size).
+    
+    Parameters
+    ----------
+    litinst : module
+        litdata module for this SED, e.g., read_lit('eldridge2009').
+    
+    Returns
+    -------
+    Tuple containing (wavelengths, data). See SynthesisModel.data for units.
+    
+    """
+    
+    # Nothing to gain for user-supplied SEDs
+    if (kwargs['pop_sed'] == 'user') or (not kwargs['pop_sed_cache']):
+        return litinst._load(**kwargs)
+    
+    prefix = _sed_cache_prefix(**kwargs)
+    
+    if prefix in _sed_cache:
+        return _sed_cache[prefix]
+    
+    path = _sed_cache_dir(kwargs)
+    fn_w = '%s/%s.wave.npy' % (path, prefix)
+    fn_d = '%s/%s.data.npy' % (path, prefix)
+        
+    # Cached tables are stale if the litdata module or data have changed.
+    key = (prefix, file_signature(_sed_sources(litinst, **kwargs)))
+    
+    wave = _read_npy_cache(fn_w, key)
+    data = _read_npy_cache(fn_d, key)
+    
+    if (wave is None) or (data is None):
+        wave, data = litinst._load(**kwargs)
+        wave = np.asarray(wave)
+        data = np.asarray(data)
+        
+        try:
+            if not os.path.exists(path):
+                os.makedirs(path)
+        except OSError:
+            pass
+        
+        # Written atomically, so other processes never see partially 
+        # written tables. Can't write cache (e.g., read-only file system)?
+        # No big deal.
+        _write_npy_cache(fn_w, key, wave)
+        _write_npy_cache(fn_d, key, data)
+    else:
+        wave = np.array(wave)
+            
+    _sed_cache[prefix] = wave, data
+    
+    return wave, data
+    
+def cache_sed(pop_sed, **kwargs):
+    """
+    Convert SED tables to binary format ahead of time.
+    
+    Parameters
+    ----------
+    pop_sed : str
+        Name of litdata module, e.g., 'eldridge2009'.
+    
+    Any other keyword arguments will be passed to ParameterFile. Supplying 
+    lists for any of `sed_table_pars` will loop over all combinations, e.g.,
+    
+        >>> cache_sed('eldridge2009', pop_Z=[0.001, 0.004, 0.02])
+        
+    Unless `pop_sed_cache` is supplied, tables go in the default location
+    (see `_sed_cache_dir`).
+    
+    Returns
+    -------
+    List of prefixes of the cached tables.
+    
+    """
+    
+    import itertools
+    
+    fixed = {'pop_sed_cache': True}
+    varied = []
+    for par in sed_table_pars:
+        if par in kwargs and type(kwargs[par]) in [list, tuple, np.ndarray]:
+            varied.append((par, list(kwargs.pop(par))))
+    
+    fixed.update(kwargs)
+    
+    names = [par for par, vals in varied]
+    prefixes = []
+    for combo in itertools.product(*[vals for par, vals in varied]):
+        kw = fixed.copy()
+        kw.update(dict(zip(names, combo)))
+        kw['pop_sed'] = pop_sed
+        
+        pf = ParameterFile(**kw)
+        load_sed(read_lit(pop_sed), **pf)
+        prefixes.append(_sed_cache_prefix(**pf))
+        
+    return prefixes
+
 class DummyClass(object):
     def __init__(self, **kwargs):
         self.kwargs = kwargs
@@ -145,13 +323,13 @@ class SynthesisModel(object):
         
         """
         if not hasattr(self, '_data'):
-            self._wavelengths, self._data = self.litinst._load(**self.pf)
+            self._wavelengths, self._data = load_sed(self.litinst, **self.pf)
         return self._data
     
     @property
     def wavelengths(self):
         if not hasattr(self, '_wavelengths'):
-            self._wavelengths, self._data = self.litinst._load(**self.pf)
+            self._wavelengths, self._data = load_sed(self.litinst, **self.pf)
         return self._wavelengths
 
     @property
@@ -220,13 +398,18 @@ class SynthesisModel(object):
         UV luminosity per unit SFR.
         """
                 
-        j = np.argmin(np.abs(wave - self.wavelengths))
-        
         dwavednu = np.diff(self.wavelengths) / np.diff(self.frequencies)
         
         if avg == 1:
-            yield_UV = self.data[j,:] * np.abs(dwavednu[j])
+            # Vectorized over wavelength: result has shape (Nwave, Ntimes)
+            if np.ndim(wave) > 0:
+                j = self._nearest(self.wavelengths, wave)
+                yield_UV = self.data[j,:] * np.abs(dwavednu[j])[:,None]
+            else:
+                j = np.argmin(np.abs(wave - self.wavelengths))
+                yield_UV = self.data[j,:] * np.abs(dwavednu[j])
         else:
+            j = np.argmin(np.abs(wave - self.wavelengths))
             assert avg % 2 != 0, "avg must be odd"
             s = (avg - 1) / 2
             yield_UV = np.mean(self.data[j-s:j+s,:] * np.abs(dwavednu[j-s:j+s]))
@@ -336,18 +519,119 @@ class SynthesisModel(object):
         return self.eV_per_phot(Emin, Emax) * erg_per_ev  
         
     def eV_per_phot(self, Emin, Emax):
-        i0 = np.argmin(np.abs(self.energies - Emin))
-        i1 = np.argmin(np.abs(self.energies - Emax))
+        """
+        Mean photon energy [eV] in the (Emin, Emax) band.
+        
+        ..note:: Emin and Emax can be arrays, in which case the result is
+            an array with one element per band.
+        """
         
         it = -1
-                
+        
         # Must convert units
-        E_avg = np.trapz(self.data[i1:i0,it] * self.energies[i1:i0], 
-            x=self.wavelengths[i1:i0]) \
-            / np.trapz(self.data[i1:i0,it], x=self.wavelengths[i1:i0])
+        E_avg = self._band_integral(self._cumul_wE, Emin, Emax)[...,it] \
+            / self._band_integral(self._cumul_w, Emin, Emax)[...,it]
         
         return E_avg
         
+    def _nearest(self, arr, vals):
+        """
+        Indices of elements of arr nearest to each element of vals.
+        """
+        vals = np.atleast_1d(vals)
+        return np.argmin(np.abs(arr[None,:] - vals[:,None]), axis=1)
+        
+    def _band_indices(self, Emin, Emax):
+        """
+        Indices in self.energies that bound the (Emin, Emax) band.
+        """
+        i0 = self._nearest(self.energies, Emin)
+        i1 = self._nearest(self.energies, Emax)
+        return i0, i1
+        
+    def _band_integral(self, cumul, Emin, Emax):
+        """
+        Integrate over the (Emin, Emax) band using a cumulative integral.
+        
+        This is equivalent to np.trapz(integrand[i1:i0], ...), where i0 and
+        i1 are the indices of the energies nearest Emin and Emax, but costs
+        two lookups per band.
+        
+        Parameters
+        ----------
+        cumul : np.ndarray
+            Cumulative integral of some integrand over the native wavelength
+            grid, with shape (Nwavelengths, Ntimes).
+        Emin, Emax : int, float, np.ndarray
+            Band(s) of interest [eV].
+            
+        Returns
+        -------
+        Array with shape (Ntimes,), or (Nbands, Ntimes) if Emin and Emax 
+        are arrays.
+        
+        """
+        
+        i0, i1 = self._band_indices(Emin, Emax)
+        
+        # Last element included in integration
+        i2 = i0 - 1
+        
+        result = cumul[np.maximum(i2, 0)] - cumul[i1]
+        
+        # Bands with fewer than two grid points have zero integral.
+        result[i2 <= i1] = 0.0
+        
+        if np.ndim(Emin) == 0 and np.ndim(Emax) == 0:
+            return result[0]
+        
+        return result
+        
+    @property
+    def _cumul_phot(self):
+        """
+        Cumulative photon luminosity, integrated in log-wavelength, for all
+        times. Units are photons / sec / (Msun [/ yr]).
+        """
+        if not hasattr(self, '_cumul_phot_'):
+            integrand = self.data * (self.wavelengths \
+                / (self.energies * erg_per_ev))[:,None]
+            self._cumul_phot_ = cumtrapz(integrand, 
+                x=np.log(self.wavelengths), axis=0, initial=0.0)
+        return self._cumul_phot_
+        
+    @property
+    def _cumul_nrg(self):
+        """
+        Cumulative luminosity, integrated in log-wavelength, for all times.
+        """
+        if not hasattr(self, '_cumul_nrg_'):
+            integrand = self.data * self.wavelengths[:,None]
+            self._cumul_nrg_ = cumtrapz(integrand, 
+                x=np.log(self.wavelengths), axis=0, initial=0.0)
+        return self._cumul_nrg_
+        
+    @property
+    def _cumul_w(self):
+        """
+        Cumulative luminosity, integrated in wavelength, for all times.
+        """
+        if not hasattr(self, '_cumul_w_'):
+            self._cumul_w_ = cumtrapz(self.data, x=self.wavelengths, axis=0,
+                initial=0.0)
+        return self._cumul_w_
+    
+    @property
+    def _cumul_wE(self):
+        """
+        Cumulative energy-weighted luminosity, integrated in wavelength, for
+        all times.
+        """
+        if not hasattr(self, '_cumul_wE_'):
+            self._cumul_wE_ = cumtrapz(self.data * self.energies[:,None], 
+                x=self.wavelengths, axis=0, initial=0.0)
+        return self._cumul_wE_
+        
     def yield_per_sfr(self, Emin, Emax):
         """
         Must be in the internal units of erg / g.
@@ -366,23 +650,15 @@ class SynthesisModel(object):
         Returns
         -------
         Integrated flux between (Emin, Emax) for all times in units of 
-        photons / sec / (Msun [/ yr])
+        photons / sec / (Msun [/ yr]). If Emin and Emax are arrays, result 
+        has shape (Nbands, Ntimes).
         """
         
-        # Find band of interest -- should be more precise and interpolate
-        i0 = np.argmin(np.abs(self.energies - Emin))
-        i1 = np.argmin(np.abs(self.energies - Emax))
-                                     
-        # Count up the photons in each spectral bin for all times
-        flux = np.zeros_like(self.times)
-        for i in range(self.times.size):
-            if energy_units:
-                integrand = self.data[i1:i0,i] * self.wavelengths[i1:i0]
-            else:
-                integrand = self.data[i1:i0,i] * self.wavelengths[i1:i0] \
-                    / (self.energies[i1:i0] * erg_per_ev)
-                        
-            flux[i] = np.trapz(integrand, x=np.log(self.wavelengths[i1:i0]))
+        # Band of interest is set by nearest grid points to Emin and Emax
+        if energy_units:
+            flux = self._band_integral(self._cumul_nrg, Emin, Emax)
+        else:
+            flux = self._band_integral(self._cumul_phot, Emin, Emax)
             
         # Current units: 
         # if pop_ssp: photons / sec / (Msun / 1e6)
@@ -438,14 +714,15 @@ class SynthesisModel(object):
         # Integrate (cumulatively) over time
         if self.pf['pop_ssp']:
             photons_per_b_t *= g_per_b / g_per_msun
-            return np.trapz(photons_per_b_t, x=self.times * s_per_myr) / 1e6
+            return np.trapz(photons_per_b_t, x=self.times * s_per_myr, 
+                axis=-1) / 1e6
         # Take steady-state result
         else:
             photons_per_b_t *= s_per_yr
             photons_per_b_t *= g_per_b / g_per_msun
             
             # Return last element: steady state result
-            return photons_per_b_t[-1]
+            return photons_per_b_t[...,-1]
                             
 #class Spectrum(StellarPopulation):
 #    def __init__(self, **kwargs):
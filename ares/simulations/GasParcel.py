@@ -14,7 +14,7 @@ which handles grid initialization, time-stepping, data storage, etc.
 import numpy as np
 from ..static import Grid
 from ..solvers import Chemistry
-from ..util.ReadData import _sort_history
+from ..util.ReadData import _sort_history, DataDumpReader
 from ..util import RestrictTimestep, CheckPoints, ProgressBar, ParameterFile
 
 class GasParcel(object):
@@ -56,6 +56,8 @@ class GasParcel(object):
         self.timestep = RestrictTimestep(self.grid, self.pf['epsilon_dt'], 
             self.pf['verbose'])
         
+        self.reset_stats()
+        
     def _set_chemistry(self):
         self.chem = Chemistry(self.grid, rt=self.pf['radiative_transfer'],
             recombination=self.pf['recombination'])
@@ -140,6 +142,12 @@ class GasParcel(object):
         # Rate coefficients for initial conditions
         self.update_rate_coefficients(self.grid.data)
         self.set_radiation_field()
+        
+        # Write data dumps to disk as we go, rather than saving everything
+        fn = self.pf['data_dump_file']
+        if fn is not None:
+            self.checkpoints.open_stream(fn, 
+                threaded=self.pf['data_dump_threaded'])
 
         all_t = []
         all_data = []
@@ -149,8 +157,11 @@ class GasParcel(object):
             self.update_rate_coefficients(data)
 
             # Save data
-            all_t.append(t)
-            all_data.append(data.copy())
+            if fn is None:
+                all_t.append(t)
+                all_data.append(data.copy())
+            else:
+                self.checkpoints.update(data, t=t)
 
             if t >= tf:
                 break
@@ -158,10 +169,112 @@ class GasParcel(object):
             pb.update(t)
 
         pb.finish()
+        
+        # History only available at data dumps, read from disk when needed
+        if fn is not None:
+            self.checkpoints.close_stream()
+            self.history = DataDumpReader(fn)
+            return
 
         self.history = _sort_history(all_data)
         self.history['t'] = np.array(all_t)
         
+    @property
+    def stats(self):
+        """
+        Statistics for the current (or most recent) run.
+        
+        Number of accepted and rejected steps, and number of right-hand-side
+        (nfev) and Jacobian (njev) evaluations in the chemistry solver.
+        """
+        stats = self._stats.copy()
+        stats.update(self.chem.stats)
+        return stats
+        
+    def reset_stats(self):
+        self._stats = {'accepted': 0, 'rejected': 0}
+        self.chem.stats = {'nfev': 0, 'njev': 0}
+        self._err_prev = 1.
+        
+    def _error_norm(self, data):
+        """
+        Compute (scaled) norm of the error estimate from the last step.
+        
+        RMS over evolving fields, maximum over grid cells, so that a norm
+        less than unity means all cells satisfy the tolerances.
+        """
+        q0 = self.chem.q_grid
+        q1 = np.array([data[sp] for sp in self.grid.evolving_fields]).T
+        
+        sc = self.pf['timestep_atol'] \
+           + self.pf['timestep_rtol'] * np.maximum(np.abs(q0), np.abs(q1))
+        
+        return np.max(np.sqrt(np.mean((self.chem.err_grid / sc)**2, axis=1)))
+        
+    def _adaptive_step(self, t, dt):
+        """
+        Evolve by dt, sub-stepping if local error estimates are too large.
+        
+        Parameters
+        ----------
+        t : float
+            Time at outset of this step [in time_units]
+        dt : float
+            Step-size. The parcel is always evolved by exactly this much, 
+            so that steps can be synchronized with other parcels.
+            
+        Returns
+        -------
+        Tuple: (new data, proposed next time-step).
+
+        """
+        
+        # Local error is second order in dt
+        k = 2.
+        safety = 0.9
+        min_dt = self.pf['min_timestep'] * self.pf['time_units']
+        
+        data = self.data
+        h = dt
+        h_next = dt
+        remaining = dt
+        while remaining > 1e-10 * dt:
+            
+            h_full = h
+            h = min(h, remaining)
+            
+            new = self.chem.Evolve(data, t=t, dt=h, error=True,
+                **self.rate_coefficients)
+                
+            err = self._error_norm(new)
+            
+            # Reject, try again with a smaller step
+            if (err > 1) and (h > min_dt):
+                self._stats['rejected'] += 1
+                h *= max(0.2, safety * err**(-1. / k))
+                h = max(h, min_dt)
+                continue
+            
+            self._stats['accepted'] += 1
+            
+            data = new
+            t += h
+            remaining -= h
+                        
+            # PI step-size control
+            err = max(err, 1e-10)
+            fac = safety * err**(-0.7 / k) * self._err_prev**(0.4 / k)
+            h_next = h * min(2., max(0.2, fac))
+            
+            # Don't let a step truncated to fit in dt shrink the next one
+            if h < h_full:
+                h_next = max(h_next, h_full)
+            
+            self._err_prev = err
+            h = h_next
+        
+        return data, h_next
+                        
     def step(self, t=0., dt=None, tf=None, data=None):
         """
         Evolve properties of gas parcel in time.
@@ -190,30 +303,44 @@ class GasParcel(object):
         if tf is None:    
             tf = self.pf['stop_time'] * self.pf['time_units']
 
-        max_timestep = self.pf['time_units'] * self.pf['max_timestep']
-
         self.dt = dt
         self.data = data
+        
+        adaptive = self.pf['timestep_control'] == 'adaptive'
+        
+        self.reset_stats()
                 
         # Evolve in time!
         while t < tf:
-                        
-            # Evolve by dt
-            self.data = self.chem.Evolve(self.data, t=t, dt=self.dt, 
-                **self.rate_coefficients)
+            
+            if adaptive:
+                self.data, new_dt = self._adaptive_step(t, self.dt)
+            else:
+                # Evolve by dt
+                self.data = self.chem.Evolve(self.data, t=t, dt=self.dt, 
+                    **self.rate_coefficients)
+                self._stats['accepted'] += 1
+                
+                # Figure out next dt based on max allowed change in 
+                # evolving fields
+                new_dt = self.timestep.Limit(self.chem.q_grid, 
+                    self.chem.dqdt_grid, method=self.pf['restricted_timestep'])
             
             t += self.dt 
 
-            # Figure out next dt based on max allowed change in evolving fields
-            new_dt = self.timestep.Limit(self.chem.q_grid, 
-                self.chem.dqdt_grid, method=self.pf['restricted_timestep'])
-
-            # Limit timestep further based on next DD and max allowed increase
-            dt = min(new_dt, 2 * self.dt)
-            dt = min(dt, self.checkpoints.next_dt(t, dt))
-            dt = min(dt, max_timestep)
-            
-            self.dt = dt
+            self.dt = dt = self.limit_timestep(t, new_dt)
             
             yield t, dt, self.data
+            
+    def limit_timestep(self, t, new_dt):
+        """
+        Limit proposed time-step based on next data dump, maximum allowed
+        increase (relative to current time-step), and max_timestep.
+        """
+        
+        dt = min(new_dt, 2 * self.dt)
+        dt = min(dt, self.checkpoints.next_dt(t, dt))
+        dt = min(dt, self.pf['time_units'] * self.pf['max_timestep'])
+        
+        return dt
         
@@ -12,8 +12,9 @@ Description:
 
 import os
 import numpy as np
+from copy import deepcopy
 from ..util.PrintInfo import print_sim
-from ..util.ReadData import _sort_history
+from ..util.WriteData import write_history
 from ..util import ParameterFile, ProgressBar
 from ..analysis.BlobFactory import BlobFactory
 from ..analysis.Global21cm import Global21cm as AnalyzeGlobal21cm
@@ -29,6 +30,63 @@ defaults = \
  'load_ics': True,
 }
 
+def get_Ja_Jlw(field, z):
+    """
+    Compute the Lyman-alpha and Lyman-Werner fluxes from all populations.
+    
+    Parameters
+    ----------
+    field : ares.simulations.MetaGalacticBackground instance
+        The radiation background.
+    z : int, float
+        Current redshift.
+    
+    Returns
+    -------
+    Tuple containing (Ja, Jlw).
+    
+    """
+    
+    Ja = 0.0
+    Jlw = 0.0
+    for i, pop in enumerate(field.pops):
+        if not pop.is_lya_src:
+            continue
+                                        
+        if not np.any(field.solve_rte[i]):
+            Ja += field.LymanAlphaFlux(z, popid=i)                    
+            Jlw += field.LymanWernerFlux(z, popid=i)
+            continue
+
+        # Grab line fluxes for this population for this step
+        for j, band in enumerate(field.bands_by_pop[i]):
+            E0, E1 = band
+            if not (E0 <= E_LyA < E1):
+                continue
+            
+            Earr = np.concatenate(field.energies[i][j])
+            l = np.argmin(np.abs(Earr - E_LyA))     # should be 0
+            
+            Ja += field.all_fluxes[-1][i][j][l]
+
+            ##
+            # Feedback time
+            ##
+            
+            # Find photons in LW band    
+            is_LW = np.logical_and(Earr >= 11.18, Earr <= E_LL)
+            
+            # And corresponding fluxes
+            flux = field.all_fluxes[-1][i][j][is_LW]
+            
+            # Convert to energy units, and per eV to prep for integral
+            flux *= Earr[is_LW] * erg_per_ev / ev_per_hz
+            
+            dnu = (E_LL - 11.18) / ev_per_hz
+            Jlw += np.trapz(flux, x=Earr[is_LW]) / dnu
+            
+    return Ja, Jlw
+
 class Global21cm(BlobFactory,AnalyzeGlobal21cm):
     def __init__(self, **kwargs):
         """
@@ -85,6 +143,10 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
     def pops(self):
         return self.medium.field.pops
         
+    @property
+    def stats(self):
+        return self.medium.stats
+        
     @property
     def grid(self):
         return self.medium.field.grid
@@ -93,28 +155,31 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
         """
         Compute differential brightness temperature for initial conditions.
         """
-        z = self.all_z
+        z = np.array(self.all_z)
+        
+        if len(z) == 0:
+            return []
+        
+        # Evaluate for all snapshots at once
+        Tk, h_2, e = [np.array([np.squeeze(data[key]) \
+            for data in self.all_data_igm]) for key in ['Tk', 'h_2', 'e']]
+        QHII = np.array([np.squeeze(data['h_2']) \
+            for data in self.all_data_cgm])
+        
+        n_H = self.medium.parcel_igm.grid.cosm.nH(z)
+        Ts = self.medium.parcel_igm.grid.hydr.Ts(z, Tk, 0.0, h_2, e * n_H)
+        
+        # Compute volume-averaged ionized fraction
+        xavg = QHII + (1. - QHII) * h_2
+        
+        # Derive brightness temperature
+        dTb = self.medium.parcel_igm.grid.hydr.dTb(z, xavg, Ts)
         
-        dTb = []
         for i, data_igm in enumerate(self.all_data_igm):
+            data_igm['dTb'] = float(dTb[i])
+            data_igm['Ts'] = Ts[i]
             
-            n_H = self.medium.parcel_igm.grid.cosm.nH(z[i])
-            Ts = \
-                self.medium.parcel_igm.grid.hydr.Ts(
-                    z[i], data_igm['Tk'], 0.0, data_igm['h_2'],
-                    data_igm['e'] * n_H)
-            
-            # Compute volume-averaged ionized fraction
-            QHII = self.all_data_cgm[i]['h_2']
-            xavg = QHII + (1. - QHII) * data_igm['h_2']        
-            
-            # Derive brightness temperature
-            Tb = self.medium.parcel_igm.grid.hydr.dTb(z[i], xavg, Ts)
-            self.all_data_igm[i]['dTb'] = float(Tb)
-            self.all_data_igm[i]['Ts'] = Ts
-            dTb.append(Tb)
-            
-        return dTb
+        return list(dTb)
         
     def _check_if_phenom(self, **kwargs):
         if not kwargs:
@@ -181,57 +246,17 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
         if not hasattr(self, '_suite'):
             self._suite = []    
         
-        tf = self.medium.tf
-        self.medium._insert_inits()
-                
-        pb = ProgressBar(tf, use=self.pf['progress_bar'])
-        
-        # Lists for data in general
-        self.all_t, self.all_z, self.all_data_igm, self.all_data_cgm, \
-            self.all_RC_igm, self.all_RC_cgm = \
-            self.medium.all_t, self.medium.all_z, self.medium.all_data_igm, \
-            self.medium.all_data_cgm, self.medium.all_RCs_igm, self.medium.all_RCs_cgm
-        
-        # Add zeros for Ja
-        for element in self.all_data_igm:
-            element['Ja'] = 0.0
-            element['Jlw'] = 0.0
-        
-        # List for extrema-finding    
-        self.all_dTb = self._init_dTb()
-                                        
-        for t, z, data_igm, data_cgm, rc_igm, rc_cgm in self.step():
-            
-            # Delaying the initialization prevents progressbar from being
-            # interrupted by, e.g., PrintInfo calls
-            if not pb.has_pb:
-                pb.start()
-                                                    
-            pb.update(t)
-                    
-            # Save data
-            self.all_z.append(z)
-            self.all_t.append(t)
-            self.all_dTb.append(data_igm['dTb'][0])
-            self.all_data_igm.append(data_igm.copy()) 
-            self.all_data_cgm.append(data_cgm.copy())
-            self.all_RC_igm.append(rc_igm.copy()) 
-            self.all_RC_cgm.append(rc_cgm.copy())
+        # Resume from previous LW feedback iteration?
+        if hasattr(self, '_restart'):
+            self.restore_state(self._restart)
+            del self._restart
             
-            # Automatically find turning points
-            if self.pf['track_extrema']:
-                if self.track.is_stopping_point(self.all_z, self.all_dTb):
-                    break
-
-        pb.finish()
+        self._evolve()
+        
+        self.history = self.medium._records_to_history()
+        self.history_igm = self.medium.history_igm
+        self.history_cgm = self.medium.history_cgm
         
-        self.history_igm = _sort_history(self.all_data_igm, prefix='igm_',
-            squeeze=True)
-        self.history_cgm = _sort_history(self.all_data_cgm, prefix='cgm_',
-            squeeze=True)
-
-        self.history = self.history_igm.copy()
-        self.history.update(self.history_cgm)
         self.history['dTb'] = self.history['igm_dTb']
         self.history['Ts'] = self.history['igm_Ts']
         self.history['Ja'] = self.history['igm_Ja']
@@ -239,16 +264,8 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
         
         # Save rate coefficients [optional]
         if self.pf['save_rate_coefficients']:
-            self.rates_igm = \
-                _sort_history(self.all_RC_igm, prefix='igm_', squeeze=True)
-            self.rates_cgm = \
-                _sort_history(self.all_RC_cgm, prefix='cgm_', squeeze=True)
-        
-            self.history.update(self.rates_igm)
-            self.history.update(self.rates_cgm)
-
-        self.history['t'] = np.array(self.all_t)
-        self.history['z'] = np.array(self.all_z)
+            self.rates_igm = self.medium.rates_igm
+            self.rates_cgm = self.medium.rates_cgm
                 
         self._count += 1
                 
@@ -270,6 +287,11 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
             kw_orig = self.kwargs.copy()
             
             self.kwargs['pop_Mmin{%i}' % self.pf['feedback_LW']] = f_Mmin
+            
+            if self.pf['feedback_LW_warm_start']:
+                warm_keys = self._prep_warm_start()
+            else:
+                warm_keys = []
                         
             delattr(self, '_pf')
             delattr(self, '_medium')
@@ -277,14 +299,281 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
                         
             self.__init__(**self.kwargs)
             self.run()
+            
+            # Don't hang on to these once we're done
+            for key in warm_keys:
+                self.kwargs[key] = self.pf[key] = None
+    
+    def _evolve(self, zstop=None):
+        """
+        Evolve the IGM and CGM, recording everything along the way.
+        
+        Parameters
+        ----------
+        zstop : int, float
+            If supplied, stop once this redshift has been reached.
+        
+        """
+        
+        tf = self.medium.tf
+        
+        pb = ProgressBar(tf, use=self.pf['progress_bar'])
+        
+        # Resume from a snapshot?
+        if hasattr(self.medium, '_resume'):
+            kw_step = self.medium._pop_resume()
+        else:
+            kw_step = {}
+            self._init_medium()
+            
+        records = self.medium.records
+                                        
+        for t, z, data_igm, data_cgm, rc_igm, rc_cgm in self.step(**kw_step):
+            
+            # Delaying the initialization prevents progressbar from being
+            # interrupted by, e.g., PrintInfo calls
+            if not pb.has_pb:
+                pb.start()
+                                                    
+            pb.update(t)
+                    
+            # Save data
+            self.medium._record(t, z, data_igm, data_cgm, rc_igm, rc_cgm)
+            
+            # Automatically find turning points
+            if self.pf['track_extrema']:
+                if self.track.is_stopping_point(records['time']['z'], 
+                    records['igm']['igm_dTb']):
+                    break
+                    
+            if (zstop is not None) and (z <= zstop):
+                break
+
+        pb.finish()
+        
+    def snapshot(self, z):
+        """
+        Run the calculation down to redshift `z` and save its state.
+        
+        This is useful when many models are identical at early times, e.g.,
+        if they only differ in parameters that don't matter until some 
+        redshift. The shared part of the calculation can be run once, and 
+        each model forked from the snapshot via `restore_state`, e.g.,
+        
+            state = ares.simulations.Global21cm(**base_pars).snapshot(z=20)
+            
+            for pars in models:
+                sim = ares.simulations.Global21cm(**pars)
+                sim.restore_state(state)
+                sim.run()
+        
+        .. note :: It is up to the user to make sure the models really are
+            identical at redshifts above `z`. Also, this object shouldn't
+            be run afterward: restore the state into a new one instead.
+        
+        Parameters
+        ----------
+        z : int, float
+            Redshift at which to stop.
+        
+        Returns
+        -------
+        Dictionary containing the state of the calculation. Can be pickled.
+        
+        """
+        
+        if self.is_phenom or self.pf['feedback_LW']:
+            raise NotImplementedError('Snapshots not supported for this kind of model.')
+        
+        self._evolve(zstop=z)
+        
+        return self.save_state()
+        
+    def save_state(self):
+        """
+        Record everything needed to resume the calculation from this point.
+        
+        Returns
+        -------
+        Dictionary containing the state of the MultiPhaseMedium (including
+        the radiation background), and the turning point tracker.
+        
+        """
+        
+        state = self.medium.save_state()
+        state['n_inits'] = self._n_inits
+        
+        if self.pf['track_extrema']:
+            state['track'] = {key: deepcopy(val) \
+                for key, val in self.track.__dict__.items() if key != 'pf'}
+                
+        return state
+        
+    def restore_state(self, state):
+        """
+        Prepare to resume a calculation from a previous state.
+        
+        Parameters
+        ----------
+        state : dict
+            Output of `save_state` or `snapshot`, possibly from a different
+            Global21cm instance.
+        
+        Returns
+        -------
+        Nothing. The next call to `run` will pick up where the state left 
+        off.
+        
+        """
+        
+        self.medium.restore_state(state)
+        self._n_inits = state['n_inits']
+        
+        if self.pf['track_extrema'] and ('track' in state):
+            self.track.__dict__.update(deepcopy(state['track']))
+                
+    def _init_medium(self):
+        """
+        Insert initial conditions and prepare to record the history.
+        """
+        
+        self.medium._insert_inits()
+        
+        # Lists for initial conditions
+        self.all_t, self.all_z, self.all_data_igm, self.all_data_cgm = \
+            self.medium.all_t, self.medium.all_z, self.medium.all_data_igm, \
+            self.medium.all_data_cgm
+        
+        # Add zeros for Ja
+        for element in self.all_data_igm:
+            element['Ja'] = 0.0
+            element['Jlw'] = 0.0
+        
+        # Initial dTb    
+        self._init_dTb()
+        
+        self._n_inits = len(self.all_z)
+        
+        # Columnar storage for everything from here on out
+        self.medium._init_records()
+        
+    def _prep_warm_start(self):
+        """
+        Prepare for next LW feedback iteration.
+        
+        Objects that don't depend on the minimum mass (the halo mass function
+        and optical depth tables) are handed to the next iteration via the
+        `hmf_instance` and `tau_instance` parameters. If possible, we'll also 
+        figure out how much of the current iteration can be recycled, i.e.,
+        the last snapshot before the new LW background (and thus minimum
+        mass) differs from that of the previous iteration.
+        
+        Returns
+        -------
+        List of parameters that were modified to carry objects over.
+        
+        """
+        
+        warm_keys = []
+        
+        field = self.medium.field
+        
+        if self.pf['hmf_instance'] is None:
+            for pop in field.pops:
+                if hasattr(pop, '_halos'):
+                    self.kwargs['hmf_instance'] = pop.halos
+                    warm_keys.append('hmf_instance')
+                    break
+        
+        # Only safe to recycle optical depth if it's used by one population
+        Nrte = sum([np.any(rte) for rte in field.solve_rte])
+        if (self.pf['tau_instance'] is None) and (Nrte == 1):
+            if hasattr(field, '_tau_solver'):
+                if hasattr(field._tau_solver, 'tau_fetched'):
+                    self.kwargs['tau_instance'] = field._tau_solver
+                    warm_keys.append('tau_instance')
+        
+        # Can we restart from an intermediate snapshot? Not if there is 
+        # hidden state in the RTE generators or turning point finder.
+        if not self.pf['feedback_LW_restart']:
+            return warm_keys
+        if len(self._suite) < 2:
+            return warm_keys
+        if self.pf['track_extrema'] or (not field.approx_all_pops):
+            return warm_keys
+        
+        # Compare LW backgrounds from this iteration and the last, which
+        # determine the minimum mass in the next iteration and this one.
+        z = self.history['z']
+        Jlw = self.history['Jlw']
+        zpre = self._suite[-2]['z'][-1::-1]
+        Jpre = np.interp(z, zpre, self._suite[-2]['Jlw'][-1::-1])
+        
+        err = np.abs(Jlw - Jpre)
+        diff = np.logical_and(err > self.pf['feedback_LW_restart_rtol'] \
+            * np.abs(Jpre), z < 50)
+                
+        if not np.any(diff):
+            return warm_keys
+        
+        # The minimum mass is interpolated between snapshots, and 
+        # differentiated on the HMF's redshift grid, so give ourselves some
+        # breathing room.
+        j = np.argwhere(diff)[0][0]
+        if j == 0:
+            return warm_keys
+            
+        z_safe = z[j-1] + 10 * self.pf['hmf_dz']
+        
+        # Index of last snapshot we can keep. Need the one before it too.
+        ok = np.argwhere(z > z_safe)
+        if len(ok) == 0:
+            return warm_keys
+            
+        k = ok[-1][0]
+        if k < self._n_inits + 1:
+            return warm_keys
+            
+        # Reconstruct gas properties at snapshot k
+        data = {}
+        for zone in ['igm', 'cgm']:
+            data[zone] = {}
+            grid = getattr(self.medium, 'parcel_%s' % zone).grid
+            for key in grid.data:
+                arr = self.history['%s_%s' % (zone, key)][k]
+                data[zone][key] = arr * np.ones_like(grid.data[key])
+            
+        records = {}
+        for name, rec in self.medium.records.items():
+            records[name] = rec.copy(k + 1)
+            
+        self._restart = \
+        {
+         'records': records,
+         't': self.history['t'][k], 
+         'z': z[k], 
+         'dt': self.history['t'][k+1] - self.history['t'][k],
+         'data_igm': data['igm'],
+         'data_cgm': data['cgm'],
+         'igm_h_1': np.atleast_1d(self.history['igm_h_1'][k-1]),
+         'n_inits': self._n_inits,
+        }
+        
+        return warm_keys
                                 
-    def step(self):
+    def step(self, **kwargs):
         """
         Generator for the 21-cm signal.
         
         .. note:: Basically just calling MultiPhaseMedium here, except we
             compute the spin temperature and brightness temperature on
             each step.
+            
+        Parameters
+        ----------
+        kwargs : optional keyword arguments
+            Passed to MultiPhaseMedium.step, e.g., to resume a calculation
+            from an intermediate snapshot.
         
         Returns
         -------
@@ -294,46 +583,11 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
 
         """
                         
-        for t, z, data_igm, data_cgm, RC_igm, RC_cgm in self.medium.step():            
+        for t, z, data_igm, data_cgm, RC_igm, RC_cgm in \
+            self.medium.step(**kwargs):            
                                                                                        
-            # Grab Lyman alpha flux
-            Ja = 0.0
-            Jlw = 0.0
-            for i, pop in enumerate(self.medium.field.pops):
-                if not pop.is_lya_src:
-                    continue
-                                                    
-                if not np.any(self.medium.field.solve_rte[i]):
-                    Ja += self.medium.field.LymanAlphaFlux(z, popid=i)                    
-                    Jlw += self.medium.field.LymanWernerFlux(z, popid=i)
-                    continue
-
-                # Grab line fluxes for this population for this step
-                for j, band in enumerate(self.medium.field.bands_by_pop[i]):
-                    E0, E1 = band
-                    if not (E0 <= E_LyA < E1):
-                        continue
-                    
-                    Earr = np.concatenate(self.medium.field.energies[i][j])
-                    l = np.argmin(np.abs(Earr - E_LyA))     # should be 0
-                    
-                    Ja += self.medium.field.all_fluxes[-1][i][j][l]
-
-                    ##
-                    # Feedback time
-                    ##
-                    
-                    # Find photons in LW band    
-                    is_LW = np.logical_and(Earr >= 11.18, Earr <= E_LL)
-                    
-                    # And corresponding fluxes
-                    flux = self.medium.field.all_fluxes[-1][i][j][is_LW]
-                    
-                    # Convert to energy units, and per eV to prep for integral
-                    flux *= Earr[is_LW] * erg_per_ev / ev_per_hz
-                    
-                    dnu = (E_LL - 11.18) / ev_per_hz
-                    Jlw += np.trapz(flux, x=Earr[is_LW]) / dnu
+            # Grab Lyman alpha and Lyman-Werner fluxes
+            Ja, Jlw = get_Ja_Jlw(self.medium.field, z)
                                         
             # Solver requires this                                            
             Ja = np.atleast_1d(Ja)                                            
@@ -430,6 +684,8 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
         Notes
         -----
         1) will save files as prefix.history.suffix and prefix.parameters.pkl.
+           For hdf5 and npz, the parameters are stored in the history file
+           itself, and no separate parameter file is written.
         2) ASCII files will fail if simulation had multiple populations.
     
         Parameters
@@ -457,18 +713,9 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
             pickle.dump(self.history, f)
             f.close()
     
-        elif suffix in ['hdf5', 'h5']:
-            import h5py
-            
-            f = h5py.File(fn, 'w')
-            for key in self.history:
-                f.create_dataset(key, data=np.array(self.history[key]))
-            f.close()
-    
-        elif suffix == 'npz':
-            f = open(fn, 'w')
-            np.savez(f, **self.history)
-            f.close()
+        # Single file containing history and parameters
+        elif suffix in ['hdf5', 'h5', 'npz']:
+            write_history(fn, self.history, pf=self.pf)
     
         # ASCII format
         else:            
@@ -481,20 +728,15 @@ class Global21cm(BlobFactory,AnalyzeGlobal21cm):
             print >> f, ''
     
             # Now, the data
-            for i in range(len(self.history[key])):
-                s = ''
-    
-                for key in self.history:
-                    s += '%-20.8e' % (self.history[key][i])
-    
-                if not s.strip():
-                    continue
-    
-                print >> f, s
+            data = np.array([self.history[key] for key in self.history]).T
+            np.savetxt(f, data, fmt='%-20.8e', delimiter='')
     
             f.close()
     
         print 'Wrote %s.history.%s' % (prefix, suffix)
+        
+        if suffix in ['hdf5', 'h5', 'npz']:
+            return
     
         write_pf = True
         if os.path.exists('%s.parameters.pkl' % prefix):
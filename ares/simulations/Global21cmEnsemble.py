@@ -0,0 +1,384 @@
+"""
+
+Global21cmEnsemble.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 14:02:11 PDT 2026
+
+Description: Evolve many global 21-cm models in a single simulation, by
+mapping each model onto one cell of a multi-cell IGM / CGM grid.
+
+"""
+
+import re
+import numpy as np
+from ..util import ProgressBar
+from .Global21cm import Global21cm, get_Ja_Jlw
+from ..util.HistoryRecorder import HistoryRecorder
+from .MultiPhaseMedium import MultiPhaseMedium
+from collections import Iterable
+from .MetaGalacticBackground import MetaGalacticBackground
+from ..util.SetDefaultParameterValues import GridParameters, \
+    MultiPhaseParameters, PhysicsParameters, CosmologyParameters, \
+    ControlParameters
+
+# Parameters that must be common to all members of an ensemble
+_shared_pars = []
+for _grp in [GridParameters, MultiPhaseParameters, PhysicsParameters,
+    CosmologyParameters, ControlParameters]:
+    _shared_pars.extend(_grp().keys())
+
+def _strip_id(par):
+    return re.sub(r'\{.*\}', '', par)
+
+def _squeeze_snapshots(arr):
+    """
+    Remove length-1 dimensions of each snapshot, but never the time axis.
+    """
+    shape = tuple([dim for dim in arr.shape[1:] if dim != 1])
+    return arr.reshape((arr.shape[0],) + shape)
+
+class Global21cmEnsemble(object):
+    def __init__(self, models, **kwargs):
+        """
+        Set up an ensemble of global 21-cm models.
+
+        Each model is evolved in its own IGM and CGM grid cell, so that
+        the chemistry and thermal evolution of all models proceeds in a single
+        (multi-cell) pair of GasParcels with a common time-step. The rate 
+        equations for all cells are solved at once (see Chemistry.batch).
+        Only the radiation backgrounds (i.e., rate coefficients and 
+        Lyman-alpha and LW fluxes) are computed separately for each model, 
+        since each model has its own populations.
+
+        .. note :: Because the time-step is shared, it is set by the model
+            that requires the finest time resolution, and the ODE solver's
+            internal steps are shared as well. As a result, the solutions for
+            individual models agree with those obtained by running each
+            model on its own only to within the solver tolerances, i.e., 
+            they are not identical.
+
+        .. note :: Models may only differ in their source and population
+            parameters (e.g., pop_*, source_*, php_*). Anything affecting
+            the grid, the chemistry, cosmology, or time-stepping must be
+            common to all models, and is set via keyword arguments.
+
+        Parameters
+        ----------
+        models : list
+            List of dictionaries, each containing the parameters that are
+            unique to a single model.
+        kwargs : optional keyword arguments
+            Parameters common to all models.
+
+        """
+
+        self.models = [model.copy() for model in models]
+        self.kwargs = kwargs
+
+        for model in self.models:
+            for par in model:
+                if _strip_id(par) not in _shared_pars:
+                    continue
+                raise ValueError(('Parameter %s must be the same for all ' +\
+                    'models in the ensemble!') % par)
+
+    @property
+    def N(self):
+        return len(self.models)
+
+    @property
+    def template(self):
+        """
+        A single Global21cm simulation used to set up initial conditions.
+        """
+        if not hasattr(self, '_template'):
+            self._template = Global21cm(**self.kwargs)
+
+            if self._template.is_phenom:
+                raise NotImplementedError('Ensembles of phenomenological models not supported.')
+
+            pf = self._template.pf
+            if pf['feedback_LW']:
+                raise NotImplementedError('LW feedback iterations not supported for ensembles.')
+            if (pf['stop_igm_h_2'] is not None) or \
+               (pf['stop_cgm_h_2'] is not None):
+                raise NotImplementedError('stop_igm_h_2 and stop_cgm_h_2 not supported for ensembles.')
+            if pf['coupled_phases']:
+                raise NotImplementedError('coupled_phases not supported for ensembles.')
+            if not (pf['include_igm'] and pf['include_cgm']):
+                raise NotImplementedError('Ensembles require both the IGM and CGM.')
+
+        return self._template
+
+    @property
+    def pf(self):
+        return self.template.pf
+
+    @property
+    def base_kwargs(self):
+        """
+        Parameters shared by all models, including initial conditions.
+        """
+        if not hasattr(self, '_base_kwargs'):
+            # Accessing the ICs updates the kwargs of the template medium
+            inits = self.template.medium.inits
+            self._base_kwargs = self.template.medium.kwargs.copy()
+        return self._base_kwargs
+
+    @property
+    def medium(self):
+        """
+        A MultiPhaseMedium object with one IGM and one CGM cell per model.
+        """
+        if not hasattr(self, '_medium'):
+            kw = self.base_kwargs.copy()
+            kw['igm_grid_cells'] = kw['cgm_grid_cells'] = self.N
+
+            # Single-valued lists would only initialize a single cell
+            for zone in ['igm', 'cgm']:
+                par = '%s_initial_temperature' % zone
+                T0 = self.pf[par]
+                if isinstance(T0, Iterable) and len(T0) == 1:
+                    kw[par] = T0[0]
+
+            self._medium = MultiPhaseMedium(**kw)
+            
+            # One stacked ODE solve per phase rather than a loop over cells
+            for parcel in self._medium.parcels:
+                parcel.chem.batch = True
+                
+        return self._medium
+
+    @property
+    def parcel_igm(self):
+        return self.medium.parcel_igm
+
+    @property
+    def parcel_cgm(self):
+        return self.medium.parcel_cgm
+
+    @property
+    def fields(self):
+        """
+        List of MetaGalacticBackground objects, one per model.
+        """
+        if not hasattr(self, '_fields'):
+            grid = self.template.medium.parcel_igm.grid
+
+            self._fields = []
+            for model in self.models:
+                kw = self.base_kwargs.copy()
+                kw.update(model)
+                self._fields.append(MetaGalacticBackground(grid=grid, **kw))
+
+        return self._fields
+
+    def _gather_rate_coefficients(self, z, zone, data):
+        """
+        Stack rate coefficients for all models into (N, ...) arrays.
+        """
+
+        RC = {}
+        for i, field in enumerate(self.fields):
+            kw = {'%s_h_1' % zone: data['h_1'][i:i+1]}
+            rc = field.update_rate_coefficients(z, zone=zone, return_rc=True,
+                **kw)
+            for key in rc:
+                if key not in RC:
+                    RC[key] = []
+                RC[key].append(rc[key])
+
+        for key in RC:
+            RC[key] = np.concatenate(RC[key], axis=0)
+
+        return RC
+
+    def run(self):
+        """
+        Run all models.
+
+        Returns
+        -------
+        Nothing: sets `history` attribute, a list with one dictionary per
+        model, each in the same format as Global21cm.history.
+
+        """
+
+        sim = self.template
+
+        tf = sim.medium.tf
+
+        # Pre-first-light evolution is the same for all models
+        sim.medium._insert_inits()
+        sim.all_t, sim.all_z, sim.all_data_igm, sim.all_data_cgm = \
+            sim.medium.all_t, sim.medium.all_z, sim.medium.all_data_igm, \
+            sim.medium.all_data_cgm
+
+        for element in sim.all_data_igm:
+            element['Ja'] = 0.0
+            element['Jlw'] = 0.0
+
+        sim.all_dTb = sim._init_dTb()
+        sim.medium._init_records()
+
+        # Snapshots have a leading dimension of length N, which we keep
+        self.records = \
+        {
+         'time': HistoryRecorder(),
+         'igm': HistoryRecorder(prefix='igm_', squeeze=False),
+         'cgm': HistoryRecorder(prefix='cgm_', squeeze=False),
+         'rc_igm': HistoryRecorder(prefix='igm_', squeeze=False),
+         'rc_cgm': HistoryRecorder(prefix='cgm_', squeeze=False),
+        }
+
+        pb = ProgressBar(tf, use=self.pf['progress_bar'])
+        pb.start()
+
+        for t, z, data_igm, data_cgm, RC_igm, RC_cgm in self.step():
+            pb.update(t)
+
+            self.records['time'].append(t=t, z=z)
+            self.records['igm'].append(data_igm)
+            self.records['cgm'].append(data_cgm)
+
+            if self.pf['save_rate_coefficients']:
+                self.records['rc_igm'].append(RC_igm)
+                self.records['rc_cgm'].append(RC_cgm)
+
+        pb.finish()
+
+        names = ['time', 'igm', 'cgm']
+        if self.pf['save_rate_coefficients']:
+            names += ['rc_igm', 'rc_cgm']
+
+        # Split into one history per model, prepending the shared ICs
+        self.history = [{} for i in range(self.N)]
+        for name in names:
+            inits = sim.medium.records[name]
+            rec = self.records[name]
+
+            for key in rec.keys():
+                for i, hist in enumerate(self.history):
+                    if name == 'time':
+                        new = rec[key]
+                    else:
+                        new = _squeeze_snapshots(rec[key][:,i])
+
+                    if key in inits:
+                        hist[key] = np.concatenate((inits[key], new))
+                    else:
+                        hist[key] = new
+
+        for hist in self.history:
+            hist['dTb'] = hist['igm_dTb']
+            hist['Ts'] = hist['igm_Ts']
+            hist['Ja'] = hist['igm_Ja']
+            hist['Jlw'] = hist['igm_Jlw']
+
+    def step(self):
+        """
+        Generator for an ensemble of global 21-cm models.
+
+        .. note:: This follows MultiPhaseMedium.step and Global21cm.step,
+            except rate coefficients, Lyman-alpha and LW fluxes are
+            computed separately for each model.
+
+        Returns
+        -------
+        Tuple containing the current time, redshift, and dictionaries for the
+        IGM and CGM data and rate coefficients at a single snapshot. Each
+        quantity has a leading dimension of length N (the number of models).
+
+        """
+
+        t = 0.0
+        z = self.pf['initial_redshift']
+        dt = self.pf['time_units'] * self.pf['initial_timestep']
+        zf = self.pf['final_redshift']
+        max_dt = self.pf['max_timestep'] * self.pf['time_units']
+
+        data_igm = self.parcel_igm.grid.data.copy()
+        data_cgm = self.parcel_cgm.grid.data.copy()
+
+        grid = self.parcel_igm.grid
+
+        # Evolve in time!
+        while z > zf:
+
+            # Increment time / redshift
+            dtdz = grid.cosm.dtdz(z)
+            t += dt
+            z -= dt / dtdz
+
+            for field in self.fields:
+                field.update_redshift(z)
+
+            # IGM rate coefficients, then update IGM parcel
+            RC_igm = self._gather_rate_coefficients(z, 'igm', data_igm)
+            t1, dt1, data_igm = self.medium.gen_igm.next()
+            self.parcel_igm.update_rate_coefficients(data_igm, **RC_igm)
+
+            # CGM rate coefficients, then update CGM parcel
+            RC_cgm = self._gather_rate_coefficients(z, 'cgm', data_cgm)
+            self.parcel_cgm.update_rate_coefficients(data_cgm, **RC_cgm)
+            t2, dt2, data_cgm = self.medium.gen_cgm.next()
+
+            # Must update timesteps in unison
+            dt = min(dt1, dt2, max_dt)
+            self.parcel_igm.dt = dt
+            self.parcel_cgm.dt = dt
+
+            # Grab Lyman alpha and Lyman-Werner fluxes for each model
+            J = np.array([get_Ja_Jlw(field, z) for field in self.fields])
+            Ja = J[:,0]
+            Jlw = J[:,1]
+
+            # Compute spin temperature
+            n_H = grid.cosm.nH(z)
+            Ts = grid.hydr.Ts(z, data_igm['Tk'], Ja, data_igm['h_2'],
+                data_igm['e'] * n_H)
+
+            # Compute volume-averaged ionized fraction
+            xavg = data_cgm['h_2'] + (1. - data_cgm['h_2']) * data_igm['h_2']
+
+            # Derive brightness temperature
+            dTb = grid.hydr.dTb(z, xavg, Ts)
+
+            data_igm.update({'Ts': Ts, 'dTb': dTb, 'Ja': Ja, 'Jlw': Jlw})
+
+            yield t, z, data_igm, data_cgm, RC_igm, RC_cgm
+
+    @property
+    def sims(self):
+        """
+        List of Global21cm objects, one per model, with history attached.
+
+        Useful for computing blobs and for analysis.
+        """
+        if not hasattr(self, '_sims'):
+            self._sims = []
+            for i, model in enumerate(self.models):
+                kw = self.base_kwargs.copy()
+                kw.update(model)
+                kw['verbose'] = False
+
+                sim = Global21cm(**kw)
+                sim.history = self.history[i]
+
+                # Share parcels of template, but use this model's sources
+                sim.medium._parcels = self.template.medium.parcels
+                sim.medium._field = self.fields[i]
+
+                self._sims.append(sim)
+
+        return self._sims
+
+    @property
+    def blobs(self):
+        """
+        List of blobs, one element per model.
+        """
+        return [sim.blobs for sim in self.sims]
+
@@ -16,6 +16,20 @@ from scipy.interpolate import interp1d
 from ..solvers import UniformBackground
 from ..util.ReadData import _sort_history, flatten_energies, flatten_flux
 
+def _copy_fluxes(val):
+    """
+    Copy (nested lists of) flux arrays.
+    """
+    if val is None:
+        return None
+    elif isinstance(val, np.ndarray):
+        return val.copy()
+    elif type(val) in [list, tuple]:
+        return [_copy_fluxes(element) for element in val]
+    elif type(val) is dict:
+        return {key: _copy_fluxes(val[key]) for key in val}
+    return val
+
 class MetaGalacticBackground(UniformBackground):
     def __init__(self, grid=None, **kwargs):
         """
@@ -163,6 +177,75 @@ class MetaGalacticBackground(UniformBackground):
 
     def update_redshift(self, z):
         self.z = z
+        
+    def save_state(self):
+        """
+        Record everything needed to resume evolution of the background.
+        
+        .. note :: All flux arrays are copied, so that continuing this 
+            calculation won't modify the state.
+        
+        Returns
+        -------
+        Dictionary that can be passed to `restore_state`, possibly of a 
+        MetaGalacticBackground object with different source parameters.
+        
+        """
+        
+        state = {'z': getattr(self, 'z', None)}
+        
+        if self.approx_all_pops or (not hasattr(self, '_fhi')):
+            return state
+            
+        for key in ['_zhi', '_zlo', '_fhi', '_flo']:
+            state[key] = _copy_fluxes(getattr(self, key))
+        
+        state['all_z'] = list(self.all_z)
+        state['all_fluxes'] = _copy_fluxes(self.all_fluxes)
+        
+        gens = []
+        for st in self.generator_states:
+            if st is None:
+                gens.append(None)
+                continue
+            
+            tmp = []    
+            for band in st:
+                if type(band) is list:
+                    tmp.append([sub.copy() for sub in band])
+                else:
+                    tmp.append(band.copy())
+            gens.append(tmp)
+                
+        state['generators'] = gens
+        
+        return state
+        
+    def restore_state(self, state):
+        """
+        Resume evolution of the background from a previous state.
+        
+        Parameters
+        ----------
+        state : dict
+            Output of `save_state`.
+            
+        """
+        
+        if state['z'] is not None:
+            self.update_redshift(state['z'])
+            
+        if 'generators' not in state:
+            return
+            
+        # Copy so that many calculations can be forked from one state
+        for key in ['_zhi', '_zlo', '_fhi', '_flo']:
+            setattr(self, key, _copy_fluxes(state[key]))
+                
+        self.all_z = list(state['all_z'])
+        self.all_fluxes = _copy_fluxes(state['all_fluxes'])
+        
+        self._set_generators(states=state['generators'])
 
     @property
     def history(self):
@@ -333,6 +416,38 @@ class MetaGalacticBackground(UniformBackground):
         return super(MetaGalacticBackground, self).update_rate_coefficients(z, 
             **kwargs)
             
+    def update_all_rate_coefficients(self, z, zones=['igm', 'cgm'], 
+        **kwargs):
+        """
+        Compute rate coefficients in several zones from a single flux update.
+        
+        Parameters
+        ----------
+        z : float
+            Current redshift.
+        zones : list
+            Zones for which to compute rate coefficients.
+        
+        Returns
+        -------
+        List of rate coefficient dictionaries, one per zone.
+        
+        """
+        
+        if self.approx_all_pops:
+            fluxes = [None] * self.Npops
+        else:    
+            z, fluxes = self.update_fluxes()
+        
+        RCs = []
+        for zone in zones:
+            kw = kwargs.copy()
+            kw.update({'zone': zone, 'fluxes': fluxes})
+            RCs.append(super(MetaGalacticBackground, 
+                self).update_rate_coefficients(z, **kw))
+        
+        return RCs
+            
     def get_integrated_flux(self, band, popid=0):
         """
         Return integrated flux in supplied (Emin, Emax) band at all redshifts.
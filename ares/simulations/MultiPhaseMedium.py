@@ -13,11 +13,18 @@ Description:
 import numpy as np
 from .GasParcel import GasParcel
 from ..util import ParameterFile, ProgressBar
-from ..util.ReadData import _sort_history, _load_inits
+from ..util.ReadData import _load_inits, _inits_key
+from ..solvers import CoupledChemistry
+from ..util.HistoryRecorder import HistoryRecorder
 from .MetaGalacticBackground import MetaGalacticBackground
-from ..util.SetDefaultParameterValues import MultiPhaseParameters
+from ..util.SetDefaultParameterValues import MultiPhaseParameters, \
+    CosmologyParameters
 
 _mpm_defs = MultiPhaseParameters()
+_cosmo_defs = CosmologyParameters()
+
+# Pre-first-light IGM history, shared by all instances (see _inits_history)
+_inits_history_cache = {}
 
 class MultiPhaseMedium(object):
     def __init__(self, **kwargs):
@@ -185,6 +192,80 @@ class MultiPhaseMedium(object):
                         
             self._parcels[-1].pf['stop_time'] = self.tf / self.pf['time_units']
              
+    @property
+    def stats(self):
+        """
+        Time-stepping statistics (see GasParcel.stats) for each phase.
+        
+        .. note :: If coupled_phases=True, solver statistics are in
+            stats['coupled'] rather than those for each phase.
+        
+        """
+        stats = {}
+        if self.pf['include_igm']:
+            stats['igm'] = self.parcel_igm.stats
+        if self.pf['include_cgm']:
+            stats['cgm'] = self.parcel_cgm.stats
+        if self.pf['coupled_phases']:
+            stats['coupled'] = self.coupled_chem.stats.copy()
+        return stats
+        
+    @property
+    def coupled_chem(self):
+        """
+        Solver for the IGM and CGM chemistry as a single system of ODEs.
+        """
+        if not hasattr(self, '_coupled_chem'):
+            if not (self.pf['include_igm'] and self.pf['include_cgm']):
+                raise ValueError('coupled_phases requires both the IGM and CGM!')
+            if self.pf['timestep_control'] == 'adaptive':
+                raise NotImplementedError('coupled_phases only supports timestep_control=\'heuristic\'.')
+            if (self.pf['stop_igm_h_2'] is not None) or \
+               (self.pf['stop_cgm_h_2'] is not None):
+                raise NotImplementedError('stop_igm_h_2 and stop_cgm_h_2 not supported for coupled_phases.')
+                
+            self._coupled_chem = CoupledChemistry([self.parcel_igm.chem,
+                self.parcel_cgm.chem])
+                
+        return self._coupled_chem
+        
+    def _evolve_coupled(self, t, dt):
+        """
+        Evolve the IGM and CGM parcels by dt with a single ODE solve.
+        
+        Parameters
+        ----------
+        t : float
+            Time at outset of this step [in seconds].
+        dt : float
+            Time-step [in seconds].
+            
+        Returns
+        -------
+        Tuple: (next time-step for the IGM, next time-step for the CGM, 
+        IGM data, CGM data).
+        
+        """
+        
+        parcels = [self.parcel_igm, self.parcel_cgm]
+        
+        data = self.coupled_chem.Evolve([parcel.data for parcel in parcels],
+            t=t, dt=dt, kwargs=[parcel.rate_coefficients for parcel in parcels])
+        
+        dts = []
+        for i, parcel in enumerate(parcels):
+            parcel.data = data[i]
+            parcel._stats['accepted'] += 1
+            
+            # Same time-step restrictions as GasParcel.step
+            new_dt = parcel.timestep.Limit(parcel.chem.q_grid, 
+                parcel.chem.dqdt_grid, method=parcel.pf['restricted_timestep'])
+            
+            parcel.dt = dt
+            dts.append(parcel.limit_timestep(t + dt, new_dt))
+            
+        return dts[0], dts[1], data[0], data[1]
+        
     @property
     def zones(self):
         if not hasattr(self, '_zones'):
@@ -252,66 +333,222 @@ class MultiPhaseMedium(object):
 
         """
         
-        self._insert_inits()
+        # Resume from snapshot?
+        if hasattr(self, '_resume'):
+            kw_step = self._pop_resume()
+        else:
+            kw_step = {}
+            self._insert_inits()
+            self._init_records()
 
         pb = ProgressBar(self.tf, use=self.pf['progress_bar'])
         pb.start()
                                     
         # Evolve in time
-        for t, z, data_igm, data_cgm, RC_igm, RC_cgm in self.step():
+        for t, z, data_igm, data_cgm, RC_igm, RC_cgm in self.step(**kw_step):
             
             pb.update(t)
                         
             # Save data
-            self.all_z.append(z)
-            self.all_t.append(t)
+            self._record(t, z, data_igm, data_cgm, RC_igm, RC_cgm)
+
+        pb.finish()          
+
+        self.history = self._records_to_history()
+        
+    def save_state(self):
+        """
+        Record everything needed to resume the calculation from this point.
+        
+        .. note :: Can only be called while a calculation is in progress,
+            i.e., after at least one step has been taken.
+        
+        Returns
+        -------
+        Dictionary that can be passed to `restore_state`, possibly of a
+        MultiPhaseMedium object with different source parameters. Contains 
+        only numbers, arrays, and HistoryRecorder objects, so it can be 
+        pickled and restored in another process.
+        
+        """
+        
+        now = self._now
+        
+        state = {'t': now['t'], 'z': now['z'], 'dt': now['dt']}
+        
+        for key in ['data_igm', 'data_cgm', 'rc_igm']:
+            if now[key] is None:
+                state[key] = None
+            else:
+                state[key] = {k: np.copy(v) for k, v in now[key].items()}
+        
+        state['records'] = {}
+        for name, rec in self.records.items():
+            state['records'][name] = rec.copy()
             
-            if self.pf['include_cgm']:    
-                self.all_data_cgm.append(data_cgm.copy())
+        state['field'] = self.field.save_state()
             
-            if self.pf['include_igm']:
-                self.all_data_igm.append(data_igm.copy())  
+        return state
+        
+    def restore_state(self, state):
+        """
+        Prepare to resume a calculation from a previous state.
+        
+        Parameters
+        ----------
+        state : dict
+            Output of `save_state`.
+            
+        Returns
+        -------
+        Nothing. The next call to `run` (or `step`) will pick up where the
+        state left off.
+        
+        """
+        
+        # Copy so that many calculations can be forked from one state
+        self.records = {}
+        for name, rec in state['records'].items():
+            self.records[name] = rec.copy()
+            
+        if state.get('field') is not None:
+            self.field.restore_state(state['field'])
+            
+        self._resume = {}
+        for key in ['t', 'z', 'dt', 'igm_h_1', 'rc_igm']:
+            if state.get(key) is not None:
+                self._resume[key] = state[key]
+                
+        # Only pass along (copies of) the fields the parcels evolve
+        for zone in ['igm', 'cgm']:
+            data = state.get('data_%s' % zone)
+            if data is None:
+                continue
+            
+            grid = getattr(self, 'parcel_%s' % zone).grid
+            self._resume['data_%s' % zone] = \
+                {key: np.copy(data[key]) for key in grid.data}
                 
+    def _pop_resume(self):
+        """
+        Return keyword arguments for `step` needed to resume calculation.
+        """
+        kw = self._resume
+        del self._resume
+        return kw
+        
+    def _init_records(self):
+        """
+        Set up columnar storage for the history, starting with the ICs.
+        
+        .. note :: Must be called after `_insert_inits`.
+        
+        Returns
+        -------
+        Nothing: sets `records` attribute, a dictionary of HistoryRecorder
+        objects.
+        
+        """
+        
+        self.records = \
+        {
+         'time': HistoryRecorder(),
+         'igm': HistoryRecorder(prefix='igm_'),
+         'cgm': HistoryRecorder(prefix='cgm_'),
+         'rc_igm': HistoryRecorder(prefix='igm_'),
+         'rc_cgm': HistoryRecorder(prefix='cgm_'),
+        }
+        
+        for t, z in zip(self.all_t, self.all_z):
+            self.records['time'].append(t=t, z=z)
+        
+        for zone in ['igm', 'cgm']:
+            if not self.pf['include_%s' % zone]:
+                continue
+                
+            self.records[zone].extend(getattr(self, 'all_data_%s' % zone))
+            
             if self.pf['save_rate_coefficients']:
-                if self.pf['include_cgm']:     
-                    self.all_RCs_cgm.append(RC_cgm.copy())
-                if self.pf['include_igm']:
-                    self.all_RCs_igm.append(RC_igm.copy())
-
-        pb.finish()          
-
-        # Sort everything by time
+                self.records['rc_%s' % zone].extend(
+                    getattr(self, 'all_RCs_%s' % zone))
+        
+    def _record(self, t, z, data_igm, data_cgm, RC_igm, RC_cgm):
+        """
+        Save a single snapshot of the calculation.
+        """
+        
+        self.records['time'].append(t=t, z=z)
+        
         if self.pf['include_igm']:
-            self.history_igm = \
-                _sort_history(self.all_data_igm, prefix='igm_', squeeze=True)
-            self.history = self.history_igm.copy()
-        else:
-            self.history = {}
+            self.records['igm'].append(data_igm)
+            if self.pf['save_rate_coefficients']:
+                self.records['rc_igm'].append(RC_igm)
             
         if self.pf['include_cgm']:    
-            self.history_cgm = \
-                _sort_history(self.all_data_cgm, prefix='cgm_', squeeze=True)        
-            self.history.update(self.history_cgm)
+            self.records['cgm'].append(data_cgm)
+            if self.pf['save_rate_coefficients']:
+                self.records['rc_cgm'].append(RC_cgm)
+                
+    def _records_to_history(self):
+        """
+        Collect contents of `records` into a single dictionary.
+        
+        .. note :: Arrays are views into the recorders' storage, i.e., no
+            data is copied or re-sorted.
+        
+        """
+        
+        history = {}
+        
+        if self.pf['include_igm']:
+            self.history_igm = self.records['igm'].history
+            history.update(self.history_igm)
+            
+        if self.pf['include_cgm']:    
+            self.history_cgm = self.records['cgm'].history
+            history.update(self.history_cgm)
 
         # Save rate coefficients [optional]
         if self.pf['save_rate_coefficients']:
             if self.pf['include_igm']:
-                self.rates_igm = \
-                    _sort_history(self.all_RCs_igm, prefix='igm_', squeeze=True)
-                self.history.update(self.rates_igm)
+                self.rates_igm = self.records['rc_igm'].history
+                history.update(self.rates_igm)
             
             if self.pf['include_cgm']:    
-                self.rates_cgm = \
-                    _sort_history(self.all_RCs_cgm, prefix='cgm_', squeeze=True)
-                self.history.update(self.rates_cgm)
+                self.rates_cgm = self.records['rc_cgm'].history
+                history.update(self.rates_cgm)
 
-        self.history['t'] = np.array(self.all_t)
-        self.history['z'] = np.array(self.all_z)
+        history['t'] = self.records['time']['t']
+        history['z'] = self.records['time']['z']
         
-    def step(self):
+        return history
+        
+    def step(self, t=0.0, z=None, dt=None, data_igm=None, data_cgm=None,
+        igm_h_1=None, rc_igm=None):
         """
         Generator for a two-phase intergalactic medium.
         
+        .. note :: By default, starts from the initial conditions. To resume 
+            a calculation from some intermediate snapshot, supply `t`, `z`,
+            `dt`, `data_igm`, `data_cgm`, and either `rc_igm` or `igm_h_1`.
+        
+        Parameters
+        ----------
+        t : int, float
+            Time at which to start [in seconds].
+        z : int, float
+            Redshift at which to start.
+        dt : int, float
+            Next time-step [in seconds].
+        data_igm, data_cgm : dict
+            Gas properties in each zone at time `t`.
+        igm_h_1 : np.ndarray
+            Neutral fraction in the IGM on the step preceding `t`, which was 
+            used to compute the most recent IGM rate coefficients.
+        rc_igm : dict
+            Most recent IGM rate coefficients due to the radiation field. If
+            supplied, `igm_h_1` is ignored.
+        
         Returns
         -------
         Tuple containing the current time, redshift, and dictionaries for the
@@ -319,17 +556,49 @@ class MultiPhaseMedium(object):
         
         """
 
-        t = 0.0
-        z = self.pf['initial_redshift']
-        dt = self.pf['time_units'] * self.pf['initial_timestep']
+        if z is None:
+            z = self.pf['initial_redshift']
+        if dt is None:
+            dt = self.pf['time_units'] * self.pf['initial_timestep']
         zf = self.pf['final_redshift']
         
         # Read initial conditions
-        if self.pf['include_igm']:  
-            data_igm = self.parcel_igm.grid.data.copy()
+        if self.pf['include_igm']:
+            if data_igm is None:
+                data_igm = self.parcel_igm.grid.data.copy()
+            else:
+                self.gen_igm = self.parcel_igm.step(t=t, dt=dt, 
+                    data=data_igm.copy())
+                    
+                # Rate coefficients the IGM parcel had at this point
+                if rc_igm is None:
+                    self.field.update_redshift(z)
+                    rc_igm = self.field.update_rate_coefficients(z, 
+                        zone='igm', return_rc=True, igm_h_1=igm_h_1)
+                    
+                self.parcel_igm.update_rate_coefficients(data_igm, **rc_igm)
+                
+            data_igm_pre = data_igm.copy()
         
         if self.pf['include_cgm']:
-            data_cgm = self.parcel_cgm.grid.data.copy()
+            if data_cgm is None:
+                data_cgm = self.parcel_cgm.grid.data.copy()
+            else:
+                self.gen_cgm = self.parcel_cgm.step(t=t, dt=dt, 
+                    data=data_cgm.copy())
+                    
+            data_cgm_pre = data_cgm.copy()
+            
+        # Both parcels evolved by coupled_chem rather than their generators
+        coupled = self.pf['coupled_phases']
+        if coupled:
+            for parcel, data in [(self.parcel_igm, data_igm), 
+                (self.parcel_cgm, data_cgm)]:
+                parcel.data = data.copy()
+                parcel.dt = dt
+                parcel.reset_stats()
+            
+            self.coupled_chem.stats = {'nfev': 0, 'njev': 0}
 
         # Evolve in time!
         while z > zf:
@@ -341,9 +610,22 @@ class MultiPhaseMedium(object):
                         
             # The (potential) generators need this
             self.field.update_redshift(z)
-                        
+            
+            if coupled:
+                # Rate coefficients for both phases from one flux update
+                RC_igm, RC_cgm = self.field.update_all_rate_coefficients(z,
+                    return_rc=True, igm_h_1=data_igm['h_1'], 
+                    cgm_h_1=data_cgm['h_1'])
+                
+                # As in the split case, the IGM lags by one step
+                self.parcel_cgm.update_rate_coefficients(data_cgm, **RC_cgm)
+                
+                dt1, dt2, data_igm, data_cgm = self._evolve_coupled(t - dt, dt)
+                
+                self.parcel_igm.update_rate_coefficients(data_igm, **RC_igm)
+                                
             # IGM rate coefficients
-            if self.pf['include_igm']:
+            elif self.pf['include_igm']:
                 done = False
                 if self.pf['stop_igm_h_2'] is not None:
                     if data_igm['h_2'] > self.pf['stop_igm_h_2']:
@@ -365,7 +647,9 @@ class MultiPhaseMedium(object):
                 RC_igm = data_igm = None
                 data_igm = {'h_1': 1.0}
                 
-            if self.pf['include_cgm']:
+            if coupled:
+                pass
+            elif self.pf['include_cgm']:
                 
                 done = False
                 if self.pf['stop_cgm_h_2'] is not None:
@@ -413,6 +697,10 @@ class MultiPhaseMedium(object):
                     self.parcel_igm.dt = dt
                 if self.pf['include_cgm']:
                     self.parcel_cgm.dt = dt
+                    
+                # Everything we'd need to resume from here
+                self._now = {'t': t, 'z': z, 'dt': dt, 'data_igm': data_igm,
+                    'data_cgm': data_cgm, 'rc_igm': RC_igm}
 
                 yield t, z, data_igm, data_cgm, RC_igm, RC_cgm
                 
@@ -441,72 +729,107 @@ class MultiPhaseMedium(object):
                 del self.all_RCs_cgm, self.all_data_cgm    
             return
             
-        # Flip to descending order (in redshift)
-        z_inits = self.inits['z'][-1::-1]
-        Tk_inits = self.inits['Tk'][-1::-1]
-        xe_inits = self.inits['xe'][-1::-1]
-        inits_all = {'z': z_inits, 'Tk': Tk_inits, 'xe': xe_inits}
-
-        # Stop pre-pending once we hit the first light redshift
-        i_trunc = np.argmin(np.abs(z_inits - self.pf['initial_redshift']))    
-        if z_inits[i_trunc] <= self.pf['initial_redshift']:
-            i_trunc += 1
-
-        self.all_t = []
-        self.all_data_igm = []
-        self.all_z = list(z_inits[0:i_trunc])
+        hist = self._inits_history()
+        
+        self.all_z = list(hist['z'])
+        self.all_t = [0.0] * len(self.all_z)
         self.all_RCs_igm = [self.rates_no_RT(self.parcel_igm.grid)] * len(self.all_z)
         self.all_RCs_cgm = [self.rates_no_RT(self.parcel_igm.grid)] * len(self.all_z)
 
         # Don't mess with the CGM (much)
         if self.pf['include_cgm']:
             tmp = self.parcel_cgm.grid.data
+            z = hist['z']
+            
+            # One row per redshift: particle_density works in place, so the
+            # electron fraction must already have the shape of the output.
+            rho = self.parcel_cgm.grid.cosm.MeanBaryonDensity(z)
+            e = np.ones((z.size, 1)) * tmp['e'][None,:]
+            n = self.parcel_cgm.grid.particle_density({'e': e}, z[:,None])
+            
             self.all_data_cgm = [tmp.copy() for i in range(len(self.all_z))]
             for i, cgm_data in enumerate(self.all_data_cgm):
-                self.all_data_cgm[i]['rho'] = \
-                    self.parcel_cgm.grid.cosm.MeanBaryonDensity(self.all_z[i])
-                
-                self.all_data_cgm[i]['n'] = \
-                    self.parcel_cgm.grid.particle_density(cgm_data, self.all_z[i])
+                cgm_data['rho'] = rho[i]
+                cgm_data['n'] = n[i]
         
         if not self.pf['include_igm']:
+            self.all_data_igm = []
             return
         
-        # Loop over redshift and derive things for the IGM
-        for i, red in enumerate(self.all_z): 
+        keys = [key for key in hist if key != 'z']
+        self.all_data_igm = [{key: hist[key][i] for key in keys} \
+            for i in range(len(self.all_z))]
+            
+    def _inits_history(self):
+        """
+        Derive pre-first-light IGM history from initial conditions.
+        
+        .. note :: Results are cached (per process) and shared by all 
+            MultiPhaseMedium instances with the same initial conditions,
+            cosmology, initial redshift, and chemistry.
+        
+        Returns
+        -------
+        Dictionary of arrays, in descending order in redshift, ending at
+        the initial redshift of the calculation.
+        
+        """
+        
+        grid = self.parcel_igm.grid
+        
+        key = (_inits_key(), self.pf['initial_redshift'], tuple(grid.Z), 
+            self.parcel_igm.pf['include_He'], grid.expansion, 
+            tuple(grid.data.keys())) \
+            + tuple([(par, repr(self.pf[par])) for par in sorted(_cosmo_defs)])
+        
+        if key in _inits_history_cache:
+            return _inits_history_cache[key]
+        
+        # Flip to descending order (in redshift)
+        z_inits = self.inits['z'][-1::-1]
 
-            snapshot = {}
-            for key in self.parcel_igm.grid.data.keys():
-                if key in self.inits.keys():
-                    snapshot[key] = inits_all[key][i]
-                    continue
+        # Stop pre-pending once we hit the first light redshift
+        i_trunc = np.argmin(np.abs(z_inits - self.pf['initial_redshift']))    
+        if z_inits[i_trunc] <= self.pf['initial_redshift']:
+            i_trunc += 1
+        
+        z = z_inits[0:i_trunc].copy()
+        
+        hist = {'z': z}
+        for element in grid.data.keys():
+            if element in self.inits.keys():
+                hist[element] = self.inits[element][-1::-1][0:i_trunc].copy()
             
-            # Electron fraction
-            snapshot['e'] = inits_all['xe'][i]
-  
-            # Hydrogen neutral fraction
-            xe = inits_all['xe'][i]
+        # Electron fraction
+        xe = self.inits['xe'][-1::-1][0:i_trunc].copy()
+        hist['e'] = xe.copy()
+        
+        # Hydrogen neutral fraction
+        if 2 not in grid.Z:
+            xe = np.minimum(xe, 1.0)
             
-            if 2 not in self.parcel_igm.grid.Z:
-                xe = min(xe, 1.0)
-                
-            xi = xe / (1. + self.parcel_igm.grid.cosm.y)
-
-            snapshot['h_1'] = 1. - xi
-            snapshot['h_2'] = xi
+        xi = xe / (1. + grid.cosm.y)
+        
+        hist['h_1'] = 1. - xi
+        hist['h_2'] = xi
+        
+        # Add helium, assuming xHeII = xHII, and xHeIII << 1
+        if self.parcel_igm.pf['include_He']:
+            hist['he_1'] = 1. - xi
+            hist['he_2'] = xi
+            hist['he_3'] = 1e-10 * np.ones_like(xi)
             
-            # Add helium, assuming xHeII = xHII, and xHeIII << 1
-            if self.parcel_igm.pf['include_He']:
-                snapshot['he_1'] = 1. - xi
-                snapshot['he_2'] = xi
-                snapshot['he_3'] = 1e-10
-                
-            snapshot['rho'] = self.parcel_igm.grid.cosm.MeanBaryonDensity(red)
-            snapshot['n'] = \
-                self.parcel_igm.grid.particle_density(snapshot.copy(), red)
-
-            self.all_t.append(0.0)
-            self.all_data_igm.append(snapshot.copy())
+        hist['rho'] = grid.cosm.MeanBaryonDensity(z)
+        hist['n'] = grid.particle_density(hist, z)
+        
+        for element in hist:
+            hist[element].flags.writeable = False
+        
+        # Only cache if n doesn't depend on the grid's density
+        if grid.expansion:
+            _inits_history_cache[key] = hist
+        
+        return hist
 
 
             
\ No newline at end of file
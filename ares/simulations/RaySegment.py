@@ -14,7 +14,8 @@ import numpy as np
 from ..util import ProgressBar
 from .GasParcel import GasParcel
 from ..solvers import RadialField
-from ..util.ReadData import _sort_history
+from ..util.ReadData import _sort_history, DataDumpReader
+from ..util.WriteData import write_history
 
 class RaySegment(object):
     """
@@ -37,8 +38,25 @@ class RaySegment(object):
         self.parcel.update_rate_coefficients(self.grid.data)
         self._set_radiation_field()
         
-    def save(self):
-        pass
+    def save(self, prefix, suffix='hdf5', clobber=False):
+        """
+        Save history and parameters to a single file, prefix.history.suffix.
+        
+        Parameters
+        ----------
+        prefix : str
+            Prefix of save filename
+        suffix : str
+            Suffix of save filename. Can be hdf5 (or h5) or npz.
+        clobber : bool
+            Overwrite pre-existing file of same name?
+        
+        """
+        
+        fn = '%s.history.%s' % (prefix, suffix)
+        write_history(fn, self.history, pf=self.pf, clobber=clobber)
+        
+        print 'Wrote %s' % fn
     
     def save_tables(self, prefix=None):
         """
@@ -85,6 +103,12 @@ class RaySegment(object):
         """
 
         tf = self.pf['stop_time'] * self.pf['time_units']
+        
+        # Write data dumps to disk as we go, rather than saving everything
+        fn = self.pf['data_dump_file']
+        if fn is not None:
+            self.parcel.checkpoints.open_stream(fn, 
+                threaded=self.pf['data_dump_threaded'])
 
         pb = ProgressBar(tf, use=self.pf['progress_bar'])
         pb.start()
@@ -100,8 +124,11 @@ class RaySegment(object):
             self.update_rate_coefficients(data, **RCs)
                         
             # Save data
-            all_t.append(t)
-            all_data.append(data.copy())
+            if fn is None:
+                all_t.append(t)
+                all_data.append(data.copy())
+            else:
+                self.parcel.checkpoints.update(data, t=t)
             
             if t >= tf:
                 break
@@ -109,6 +136,12 @@ class RaySegment(object):
             pb.update(t)
 
         pb.finish()
+        
+        # History only available at data dumps, read from disk when needed
+        if fn is not None:
+            self.parcel.checkpoints.close_stream()
+            self.history = DataDumpReader(fn)
+            return self.history
 
         to_return = _sort_history(all_data)
         to_return['t'] = np.array(all_t)
@@ -3,4 +3,4 @@ from .RaySegment import RaySegment
 from .Global21cm import Global21cm
 from .MultiPhaseMedium import MultiPhaseMedium
 from .MetaGalacticBackground import MetaGalacticBackground
-
+from .Global21cmEnsemble import Global21cmEnsemble
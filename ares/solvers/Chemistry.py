@@ -40,6 +40,8 @@ class Chemistry(object):
 
         self.grid = grid
         self.rtON = rt
+        self.atol = atol
+        self.rtol = rtol
         
         self.chemnet = ChemicalNetwork(grid, rate_src=rate_src,
             recombination=recombination)
@@ -56,6 +58,9 @@ class Chemistry(object):
             method='bdf', nsteps=1e4, order=5, atol=atol, rtol=rtol)
             
         self.solver._integrator.iwork[2] = -1
+        
+        # Counters for RHS and Jacobian evaluations (reset by user)
+        self.stats = {'nfev': 0, 'njev': 0}
             
         # Empty arrays in the shapes we often need
         self.zeros_gridxq = np.zeros([self.grid.dims, 
@@ -63,7 +68,65 @@ class Chemistry(object):
         self.zeros_grid_x_abs = np.zeros_like(self.grid.zeros_grid_x_absorbers)
         self.zeros_grid_x_abs2 = np.zeros_like(self.grid.zeros_grid_x_absorbers2)
         
-    def Evolve(self, data, t, dt, **kwargs):
+    @property
+    def batch(self):
+        """
+        If True, solve the rate equations for all cells at once.
+        
+        All cells are stacked into a single system of ODEs, whose Jacobian
+        is block-diagonal (i.e., banded), rather than looping over cells. 
+        This is much faster for grids with many (independent) cells, but the
+        solution in each cell will only agree with the cell-by-cell solution
+        to within the solver tolerances, since a single set of (internal) 
+        time-steps is used for all cells.
+        """
+        if not hasattr(self, '_batch'):
+            self._batch = False
+        return self._batch
+    
+    @batch.setter
+    def batch(self, value):
+        self._batch = value
+        
+    @property
+    def batch_solver(self):
+        if not hasattr(self, '_batch_solver'):
+            Nq = len(self.grid.evolving_fields)
+            self._batch_solver = ode(self._BatchRateEquations, 
+                jac=self._BatchJacobian).set_integrator('vode',
+                method='bdf', nsteps=1e4, order=5, atol=self.atol, 
+                rtol=self.rtol, lband=Nq-1, uband=Nq-1)
+            
+            self._batch_solver._integrator.iwork[2] = -1
+            
+        return self._batch_solver
+        
+    def _BatchRateEquations(self, t, y, args):
+        """
+        Right-hand side of rate equations for all cells, flattened.
+        
+        The ODE vector is ordered cell by cell, i.e., all species for cell 0, 
+        then all species for cell 1, etc.
+        """
+        q = y.reshape(self.grid.dims, -1).T
+        return self.chemnet.RateEquations(t, q, args).T.ravel()
+        
+    def _BatchJacobian(self, t, y, args):
+        """
+        Jacobian for all cells, in the packed (banded) format used by VODE.
+        """
+        q = y.reshape(self.grid.dims, -1).T
+        J = self.chemnet.Jacobian(t, q, args)
+        
+        Nq = q.shape[0]
+        packed = np.zeros([2 * Nq - 1, y.size])
+        for i in range(Nq):
+            for j in range(Nq):
+                packed[Nq-1+i-j,j::Nq] = J[i,j]
+                
+        return packed
+        
+    def Evolve(self, data, t, dt, error=False, **kwargs):
         """
         Evolve all cells by dt.
         
@@ -76,6 +139,128 @@ class Chemistry(object):
             Current time.
         dt : float
             Current time-step.
+        error : bool
+            If True, estimate the local error of this step via step-doubling,
+            i.e., compare one step of dt with two steps of dt / 2, the 
+            second of which uses conditions at the midpoint rather than the
+            start of the step: the redshift at t + dt / 2, and the particle
+            density computed from the first half-step's solution at that 
+            redshift. The (more accurate) two half-step solution is 
+            returned, and the difference between the two is stored in the 
+            `err_grid` attribute. Since conditions are held fixed within 
+            each (sub-)step, this scales as dt^2.
+            
+        """
+        
+        newdata, kwargs_by_cell, z, dz = self._prep(data, t, dt, kwargs)
+        
+        if self.batch:
+            return self._evolve_batch(data, newdata, kwargs_by_cell, t, dt,
+                z, dz, error)
+            
+        # Full step and first half-step in every cell, so that the density
+        # at the midpoint is known before taking the second half-step.
+        if error:
+            y_full = np.zeros_like(self.zeros_gridxq)
+            y_half = np.zeros_like(self.zeros_gridxq)
+            for cell in xrange(self.grid.dims):
+                q = self._q_cell(data, cell)
+                args = self._args_cell(data, kwargs_by_cell[cell], cell, t)
+                y_full[cell] = self._integrate(q, args, dt)
+                y_half[cell] = self._integrate(q, args, 0.5 * dt)
+            
+            n_mid = self._midpoint_density(y_half, t, dt)
+                              
+        # Loop over grid and solve chemistry
+        for cell in xrange(self.grid.dims):
+
+            # Construct q vector
+            q = self._q_cell(data, cell)
+            args = self._args_cell(data, kwargs_by_cell[cell], cell, t)
+
+            if error:
+                args_mid = args[:-2] + (n_mid[cell], t + 0.5 * dt)
+                y = self._integrate(y_half[cell], args_mid, 0.5 * dt)
+                self.err_grid[cell] = y - y_full[cell]
+            else:
+                y = self._integrate(q, args, dt)
+
+            self.q_grid[cell] = q.copy()
+            self.dqdt_grid[cell] = self.chemnet.dqdt.copy()
+
+            for i, value in enumerate(y):
+                newdata[self.grid.evolving_fields[i]][cell] = y[i]
+
+        # Compute particle density
+        newdata['n'] = self.grid.particle_density(newdata, z - dz)
+        
+        return newdata  
+        
+    def _evolve_batch(self, data, newdata, kwargs, t, dt, z, dz, error):
+        """
+        Evolve all cells by dt with a single (stacked) ODE solve.
+        """
+        
+        q = np.array([data[sp] for sp in self.grid.evolving_fields])
+        args = self._args_batch(data, kwargs, t)
+        
+        if error:
+            y_full = self._integrate(q.T.ravel(), args, dt, self.batch_solver)
+            y_half = self._integrate(q.T.ravel(), args, 0.5 * dt, 
+                self.batch_solver)
+            n_mid = self._midpoint_density(y_half.reshape(self.grid.dims, 
+                -1), t, dt)
+            args_mid = args[:-2] + (n_mid, t + 0.5 * dt)
+            y = self._integrate(y_half, args_mid, 0.5 * dt, self.batch_solver)
+            self.err_grid[:] = (y - y_full).reshape(self.grid.dims, -1)
+        else:
+            y = self._integrate(q.T.ravel(), args, dt, self.batch_solver)
+        
+        self.q_grid[:] = q.T
+        self.dqdt_grid[:] = self.chemnet.dqdt.T
+        
+        y = y.reshape(self.grid.dims, -1)
+        for i, species in enumerate(self.grid.evolving_fields):
+            newdata[species][:] = y[:,i]
+        
+        # Compute particle density
+        newdata['n'] = self.grid.particle_density(newdata, z - dz)
+        
+        return newdata
+        
+    def _midpoint_density(self, y, t, dt):
+        """
+        Particle density at t + dt / 2, given the solution there.
+        
+        Parameters
+        ----------
+        y : np.ndarray
+            Solution after the first half-step, with shape (number of cells,
+            number of evolving fields).
+            
+        """
+        
+        if self.grid.expansion:
+            z = self.grid.cosm.TimeToRedshiftConverter(0, t + 0.5 * dt, 
+                self.grid.zi)
+        else:
+            z = 0
+        
+        e = y[:,self.grid.evolving_fields.index('e')]
+            
+        return self.grid.particle_density({'e': e}, z)
+        
+    def _prep(self, data, t, dt, kwargs):
+        """
+        Setup before looping over cells.
+        
+        Returns
+        -------
+        Tuple: (copy of data to be filled in, list of rate coefficients in
+        each cell, redshift, and change in redshift over this step). If 
+        solving all cells at once (see `batch`), the rate coefficients are
+        not sorted by cell.
+        
         """
         
         if self.grid.expansion:
@@ -99,42 +284,66 @@ class Chemistry(object):
         if not kwargs:
             kwargs = self.rcs.copy()
 
-        kwargs_by_cell = self._sort_kwargs_by_cell(kwargs)
+        if self.batch:
+            kwargs_by_cell = kwargs
+        else:
+            kwargs_by_cell = self._sort_kwargs_by_cell(kwargs)
 
         self.q_grid = np.zeros_like(self.zeros_gridxq)
         self.dqdt_grid = np.zeros_like(self.zeros_gridxq)
-                              
-        # Loop over grid and solve chemistry
-        for cell in xrange(self.grid.dims):
-
-            # Construct q vector
-            q = np.zeros(len(self.grid.evolving_fields))
-            for i, species in enumerate(self.grid.evolving_fields):
-                q[i] = data[species][cell]
-                                    
-            kwargs_cell = kwargs_by_cell[cell]
-                                        
-            if self.rtON:
-                args = (cell, kwargs_cell['k_ion'], kwargs_cell['k_ion2'],
-                    kwargs_cell['k_heat'], data['n'][cell], t)
-            else:
-                args = (cell, self.grid.zeros_absorbers, 
-                    self.grid.zeros_absorbers2, self.grid.zeros_absorbers, 
-                    data['n'][cell], t)
-
-            self.solver.set_initial_value(q, 0.0).set_f_params(args).set_jac_params(args)
-            self.solver.integrate(dt)
-
-            self.q_grid[cell] = q.copy()
-            self.dqdt_grid[cell] = self.chemnet.dqdt.copy()
-
-            for i, value in enumerate(self.solver.y):
-                newdata[self.grid.evolving_fields[i]][cell] = self.solver.y[i]
-
-        # Compute particle density
-        newdata['n'] = self.grid.particle_density(newdata, z - dz)
+        self.err_grid = np.zeros_like(self.zeros_gridxq)
         
-        return newdata  
+        return newdata, kwargs_by_cell, z, dz
+        
+    def _integrate(self, q, args, dt, solver=None):
+        """
+        Integrate rate equations for a single cell (by default) over dt.
+        """
+        
+        if solver is None:
+            solver = self.solver
+        
+        solver.set_initial_value(q, 0.0).set_f_params(args).set_jac_params(args)
+        solver.integrate(dt)
+        
+        # Number of RHS and Jacobian evaluations (from DVODE's IWORK)
+        self.stats['nfev'] += solver._integrator.iwork[11]
+        self.stats['njev'] += solver._integrator.iwork[12]
+        
+        return solver.y.copy()
+        
+    def _q_cell(self, data, cell):
+        q = np.zeros(len(self.grid.evolving_fields))
+        for i, species in enumerate(self.grid.evolving_fields):
+            q[i] = data[species][cell]
+        return q
+        
+    def _args_cell(self, data, kwargs_cell, cell, t):
+        """
+        Extra arguments for ChemicalNetwork.RateEquations (and Jacobian).
+        """
+        if self.rtON:
+            args = (cell, kwargs_cell['k_ion'], kwargs_cell['k_ion2'],
+                kwargs_cell['k_heat'], data['n'][cell], t)
+        else:
+            args = (cell, self.grid.zeros_absorbers, 
+                self.grid.zeros_absorbers2, self.grid.zeros_absorbers, 
+                data['n'][cell], t)
+        return args
+
+    def _args_batch(self, data, kwargs, t):
+        """
+        Like _args_cell, but for all cells at once (cells in last dimension).
+        """
+        if self.rtON:
+            k_ion, k_ion2, k_heat = \
+                kwargs['k_ion'], kwargs['k_ion2'], kwargs['k_heat']
+        else:
+            k_ion, k_ion2, k_heat = self.zeros_grid_x_abs, \
+                self.zeros_grid_x_abs2, self.zeros_grid_x_abs
+                
+        return (slice(None), np.transpose(k_ion), np.rollaxis(k_ion2, 0, 3), 
+            np.transpose(k_heat), data['n'], t)
 
     def _sort_kwargs_by_cell(self, kwargs):
         """
@@ -0,0 +1,147 @@
+"""
+
+CoupledChemistry.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 17:21:45 PDT 2026
+
+Description: Evolve the chemistry of several phases (e.g., IGM and CGM)
+at once, by stacking their rate equations into a single ODE system.
+
+"""
+
+import numpy as np
+from scipy.integrate import ode
+
+class CoupledChemistry(object):
+    def __init__(self, chems, atol=1e-8, rtol=1e-8):
+        """
+        Create a coupled chemistry object.
+
+        Parameters
+        ----------
+        chems : list
+            List of ares.solvers.Chemistry instances, one per phase. All
+            phases must have the same number of grid cells.
+
+        """
+
+        self.chems = chems
+
+        dims = [chem.grid.dims for chem in self.chems]
+        assert len(set(dims)) == 1, \
+            "All phases must have the same number of grid cells!"
+
+        self.dims = dims[0]
+
+        # Location of each phase in the stacked q vector
+        self.slices = []
+        i = 0
+        for chem in self.chems:
+            Nq = len(chem.grid.evolving_fields)
+            self.slices.append(slice(i, i + Nq))
+            i += Nq
+
+        self.Nq = i
+
+        self.solver = ode(self.RateEquations,
+            jac=self.Jacobian).set_integrator('vode',
+            method='bdf', nsteps=1e4, order=5, atol=atol, rtol=rtol)
+
+        self.solver._integrator.iwork[2] = -1
+
+        self.stats = {'nfev': 0, 'njev': 0}
+
+    def RateEquations(self, t, q, args):
+        """
+        Compute right-hand side of the stacked rate equations.
+
+        Parameters
+        ----------
+        args : list
+            Extra arguments for each phase's ChemicalNetwork.
+
+        """
+
+        dqdt = np.zeros(self.Nq)
+        for i, chem in enumerate(self.chems):
+            sl = self.slices[i]
+            dqdt[sl] = chem.chemnet.RateEquations(t, q[sl], args[i])
+
+        return dqdt
+
+    def Jacobian(self, t, q, args):
+        """
+        Compute the (block diagonal) Jacobian of the stacked system.
+        """
+
+        J = np.zeros((self.Nq, self.Nq))
+        for i, chem in enumerate(self.chems):
+            sl = self.slices[i]
+            J[sl,sl] = chem.chemnet.Jacobian(t, q[sl], args[i])
+
+        return J
+
+    def Evolve(self, data, t, dt, kwargs):
+        """
+        Evolve all cells of all phases by dt.
+
+        Parameters
+        ----------
+        data : list
+            Data dictionaries (see Chemistry.Evolve), one per phase.
+        t : float
+            Current time.
+        dt : float
+            Current time-step.
+        kwargs : list
+            Rate coefficient dictionaries, one per phase.
+
+        Returns
+        -------
+        List of new data dictionaries, one per phase. As with
+        Chemistry.Evolve, the `q_grid` and `dqdt_grid` attributes of each
+        Chemistry object are also updated, so that the usual time-step
+        restrictions may be applied.
+
+        """
+
+        prep = [chem._prep(data[i], t, dt, kwargs[i]) \
+            for i, chem in enumerate(self.chems)]
+
+        newdata = [element[0] for element in prep]
+
+        for cell in xrange(self.dims):
+
+            q = np.zeros(self.Nq)
+            args = []
+            for i, chem in enumerate(self.chems):
+                kwargs_by_cell = prep[i][1]
+                q[self.slices[i]] = chem._q_cell(data[i], cell)
+                args.append(chem._args_cell(data[i], kwargs_by_cell[cell],
+                    cell, t))
+
+            self.solver.set_initial_value(q, 0.0).set_f_params(args).set_jac_params(args)
+            self.solver.integrate(dt)
+
+            # Number of RHS and Jacobian evaluations (from DVODE's IWORK)
+            self.stats['nfev'] += self.solver._integrator.iwork[11]
+            self.stats['njev'] += self.solver._integrator.iwork[12]
+
+            for i, chem in enumerate(self.chems):
+                sl = self.slices[i]
+
+                chem.q_grid[cell] = q[sl]
+                chem.dqdt_grid[cell] = chem.chemnet.dqdt.copy()
+
+                for j, value in enumerate(self.solver.y[sl]):
+                    newdata[i][chem.grid.evolving_fields[j]][cell] = value
+
+        # Compute particle density
+        for i, chem in enumerate(self.chems):
+            z, dz = prep[i][2:]
+            newdata[i]['n'] = chem.grid.particle_density(newdata[i], z - dz)
+
+        return newdata
+
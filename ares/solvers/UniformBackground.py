@@ -483,17 +483,32 @@ class UniformBackground(object):
 
         """
         if not hasattr(self, '_generators'):
-        
-            self._generators = []
-            for i, pop in enumerate(self.pops):
-                if not np.any(self.solve_rte[i]):
-                    gen = None
-                else:
-                    gen = self.FluxGenerator(popid=i)
-            
-                self._generators.append(gen)
+            self._set_generators()
         
         return self._generators
+        
+    def _set_generators(self, states=None):
+        """
+        Create generators for each population.
+        
+        Parameters
+        ----------
+        states : list
+            Generator states (see `generator_states`) to resume from, one
+            per population.
+        
+        """
+        
+        self._generators = []
+        for i, pop in enumerate(self.pops):
+            if not np.any(self.solve_rte[i]):
+                gen = None
+            elif states is None:
+                gen = self.FluxGenerator(popid=i)
+            else:
+                gen = self.FluxGenerator(popid=i, states=states[i])
+        
+            self._generators.append(gen)
 
     def _set_integrator(self):
         """
@@ -1050,7 +1065,7 @@ class UniformBackground(object):
         return epsilon
             
     def _flux_generator_generic(self, energies, redshifts, ehat, tau=None,
-        flux0=None):
+        flux0=None, start=None, state=None):
         """
         Generic flux generator.
         
@@ -1066,7 +1081,14 @@ class UniformBackground(object):
             2-D array of optical depths, or reference to an array that will
             be modified with time.
         flux0 : np.ndarray  
-            1-D array of initial flux values.
+            1-D array of initial flux values. If `start` is supplied, this
+            is the flux at redshift index `start` + 1.
+        start : int
+            Index of first redshift to yield, for resuming a calculation.
+            By default, starts at the highest redshift.
+        state : dict
+            If supplied, will be updated with the current redshift index and
+            flux on each step, so that the generator can be re-created later.
             
         """
         
@@ -1092,12 +1114,20 @@ class UniformBackground(object):
             flux = flux0
 
         L = redshifts.size
-        ll = self._ll = L - 1
+        
+        if start is None:
+            ll = self._ll = L - 1
+        else:
+            ll = self._ll = start
+            
+        # Nothing left to do
+        if ll < 0:
+            return
 
         otf = False
 
         # Loop over redshift - this is the generator                    
-        z = redshifts[-1]
+        z = redshifts[ll]
         while z >= redshifts[0]:
                         
             # First iteration: no time for there to be flux yet
@@ -1127,6 +1157,10 @@ class UniformBackground(object):
             # An alternative would be to extrapolate, and thus mimic a
             # background spectrum that is not truncated at Emax
             flux[-1] = 0.0
+            
+            if state is not None:
+                state['ll'] = ll
+                state['flux'] = flux
                 
             yield redshifts[ll], flux
     
@@ -1157,17 +1191,32 @@ class UniformBackground(object):
         
         return line_flux
 
-    def _flux_generator_sawtooth(self, E, z, ehat, tau):
+    def _flux_generator_sawtooth(self, E, z, ehat, tau, flux0=None, 
+        start=None, state=None):
         """
         Create generators for the flux between all Lyman-n bands.
+        
+        .. note :: Optional arguments are as in _flux_generator_generic,
+            except `flux0` and `state` are lists with one element per 
+            Lyman-n band.
+        
         """
+        
+        if state is None:
+            state = [None] * len(E)
+        if flux0 is None:
+            flux0 = [None] * len(E)
 
         gens = []
         for i, nrg in enumerate(E):
-            gens.append(self._flux_generator_generic(nrg, z, ehat[i], tau[i]))
+            gens.append(self._flux_generator_generic(nrg, z, ehat[i], tau[i],
+                flux0=flux0[i], start=start, state=state[i]))
+        
+        if start is None:
+            start = z.size - 1
 
         # Generator over redshift
-        for i in range(z.size):  
+        for i in range(start + 1):  
             flux = []
             for gen in gens:
                 z, new_flux = gen.next()
@@ -1178,7 +1227,22 @@ class UniformBackground(object):
 
             yield z, flatten_flux(flux) + flatten_flux(line_flux)
 
-    def FluxGenerator(self, popid):
+    @property
+    def generator_states(self):
+        """
+        Current position of each flux generator, by population and band.
+        
+        .. note :: Each element is a dictionary (or a list of dictionaries 
+            for sawtooth bands) containing the index of the most recent
+            redshift and the flux there. None for populations that 
+            approximate the RTE.
+        
+        """
+        if not hasattr(self, '_generator_states'):
+            self._generator_states = [None for i in range(self.Npops)]
+        return self._generator_states
+        
+    def FluxGenerator(self, popid, states=None):
         """
         Evolve some radiation background in time.
         
@@ -1186,6 +1250,9 @@ class UniformBackground(object):
         ----------
         popid : str
             Create flux generator for a single population.
+        states : list
+            Generator states (see `generator_states`) to resume from, one
+            per band.
     
         Returns
         -------
@@ -1198,17 +1265,40 @@ class UniformBackground(object):
         # List of all intervals in rest-frame photon energy
         bands = self.bands_by_pop[popid]
         
+        self.generator_states[popid] = []
+        
         generators_by_band = []
         for i, band in enumerate(bands):
-            if type(self.energies[popid][i]) is list:   
+            sawtooth = type(self.energies[popid][i]) is list
+            
+            if sawtooth:
+                Nsub = len(self.energies[popid][i])
+                state = [{} for j in range(Nsub)]
+            else:
+                Nsub = None
+                state = {}
+            
+            # Resume from previous state? Only if generator has been used.
+            kw = {}
+            if states is not None:
+                last = states[i][0] if sawtooth else states[i]
+                if last and sawtooth:
+                    kw['start'] = last['ll'] - 1
+                    kw['flux0'] = [st['flux'].copy() for st in states[i]]
+                elif last:
+                    kw['start'] = last['ll'] - 1
+                    kw['flux0'] = last['flux'].copy()
+            
+            if sawtooth:   
                 gen = self._flux_generator_sawtooth(E=self.energies[popid][i],
                     z=self.redshifts[popid], ehat=self.emissivities[popid][i],
-                    tau=self.tau[popid][i])                    
+                    tau=self.tau[popid][i], state=state, **kw)
             else:        
                 gen = self._flux_generator_generic(self.energies[popid][i],
                     self.redshifts[popid], self.emissivities[popid][i],
-                    tau=self.tau[popid][i])
+                    tau=self.tau[popid][i], state=state, **kw)
 
+            self.generator_states[popid].append(state)
             generators_by_band.append(gen)
 
         return generators_by_band
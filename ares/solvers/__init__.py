@@ -1,4 +1,5 @@
 from .Chemistry import Chemistry
+from .CoupledChemistry import CoupledChemistry
 from .RadialField import RadialField
 from .OpticalDepth import OpticalDepth
 from .UniformBackground import UniformBackground
@@ -15,6 +15,7 @@ from .Star import _Planck
 from .Source import Source
 from types import FunctionType
 from scipy.integrate import quad
+from ..util.Misc import LRUDict
 from ..util.ReadData import read_lit
 from ..util.SetDefaultParameterValues import BlackHoleParameters
 from ..physics.CrossSections import PhotoIonizationCrossSection as sigma_E
@@ -23,6 +24,17 @@ from ..physics.Constants import s_per_myr, G, g_per_msun, c, t_edd, m_p, \
 
 sptypes = ['pl', 'mcd', 'simpl']
 
+# Floor for log-log interpolation of tabulated SEDs
+tiny_I = 1e-300
+
+# Tabulated SEDs, shared by all BlackHole instances with identical parameters
+_sed_tabs = LRUDict(32)
+
+# Parameters that uniquely determine a tabulated (unnormalized) SED
+_sed_tab_pars = ['source_sed', 'source_mass', 'source_eta', 'source_isco', 
+    'source_rmax', 'source_alpha', 'source_fsc', 'source_uponly', 
+    'source_temperature', 'source_Emin', 'source_Emax', 'source_sed_Nbins']
+
 class BlackHole(Source):
     def __init__(self, **kwargs):
         """ 
@@ -104,6 +116,139 @@ class BlackHole(Source):
         #    self.type_by_num.append(sptype)
         #    self.type_by_name.append(sptypes.keys()[sptypes.values().index(sptype)])                
                 
+    @property
+    def sed_tab(self):
+        """
+        Are we tabulating this SED on a grid in log-E?
+        """
+        if not hasattr(self, '_sed_tab'):
+            self._sed_tab = (self.pf['source_sed_Nbins'] is not None) and \
+                (self.pf['source_sed'] in ['mcd', 'simpl', 'zebra'])
+        return self._sed_tab
+            
+    @property
+    def _E_tab(self):
+        if not hasattr(self, '_E_tab_'):
+            self._E_tab_ = np.logspace(self.logEmin, self.logEmax, 
+                self.pf['source_sed_Nbins'])
+        return self._E_tab_
+        
+    @property
+    def _I_tab(self):
+        """
+        Unnormalized (and unabsorbed) SED on the grid self._E_tab.
+        """
+        if not hasattr(self, '_I_tab_'):
+            key = tuple([self.pf[par] for par in _sed_tab_pars])
+            
+            if key in _sed_tabs:
+                self._I_tab_ = _sed_tabs[key]
+            else:
+                if self.pf['source_sed'] == 'mcd':
+                    self._I_tab_ = self._MultiColorDiskTab(self._E_tab)
+                else:
+                    self._I_tab_ = self._SIMPLTab(self._E_tab)
+                    
+                _sed_tabs[key] = self._I_tab_
+            
+            # Interpolate in log-log space
+            self._logI_tab = np.log(np.maximum(self._I_tab_, tiny_I))
+                
+        return self._I_tab_
+        
+    def _InterpolateSED(self, E):
+        tab = self._I_tab
+        return np.exp(np.interp(np.log(E), np.log(self._E_tab), 
+            self._logI_tab))
+    
+    def _MultiColorDiskTab(self, E):
+        """
+        Vectorized version of _MultiColorDisk (at t=0). 
+        
+        Integrates over disk temperature on a fixed grid in log(T).
+        """
+        
+        lnT = np.linspace(np.log(self.T_out), np.log(self.T_in), 
+            self.pf['source_sed_Nbins'])
+        T = np.exp(lnT)
+        
+        # dT = T dlnT
+        integrand = (T / self.T_in)**(-11. / 3.) \
+            * _Planck(E[:,None], T[None,:]) * T / self.T_in
+        
+        return np.trapz(integrand, x=lnT, axis=1)
+        
+    def _GreensFunctionSIMPLTab(self, Ein, Eout):
+        """
+        Vectorized version of _GreensFunctionSIMPL.
+        
+        Returns
+        -------
+        Array with shape (len(Eout), len(Ein)).
+        """
+        
+        Gamma = -self.pf['source_alpha'] + 1.0
+        
+        x = Eout[:,None] / Ein[None,:]
+        up = x >= 1.
+        
+        if self.pf['source_uponly']:
+            G = up * (Gamma - 1.0) * x**(-1.0 * Gamma)
+        else:
+            G = (Gamma - 1.0) * (Gamma + 2.0) / (1.0 + 2.0 * Gamma) \
+                * np.where(up, x**(-1.0 * Gamma), x**(Gamma + 1.0))
+                
+        return G / Ein[None,:]
+        
+    def _SIMPLTab(self, E):
+        """
+        Vectorized version of _SIMPL (at t=0).
+        
+        The Comptonization kernel is applied as a matrix, with quadrature
+        weights for the trapezoid rule in ln(E0).
+        """
+        
+        # Input photon distribution
+        if self.pf['source_sed'] == 'zebra':
+            nin = _Planck(E, self.pf['source_temperature']) / E
+        else:
+            nin = self._MultiColorDiskTab(E) / E
+        
+        fsc = self.pf['source_fsc']
+        
+        lnE = np.log(E)
+        w = np.zeros_like(lnE)
+        w[0:-1] += 0.5 * np.diff(lnE)
+        w[1:] += 0.5 * np.diff(lnE)
+        
+        K = self._GreensFunctionSIMPLTab(E, E) * (E * w)[None,:]
+        
+        nout = (1.0 - fsc) * nin + fsc * np.dot(K, nin)
+        
+        return nout * E
+    
+    @property
+    def _normL(self):
+        if not hasattr(self, '_normL_'):
+            if not self.sed_tab:
+                return super(BlackHole, self)._normL
+            
+            # Integrate tabulated SED directly
+            E = self._E_tab
+            ok = np.logical_and(E >= self.pf['source_EminNorm'], 
+                E <= self.pf['source_EmaxNorm'])
+            E = np.concatenate(([self.pf['source_EminNorm']], E[ok], 
+                [self.pf['source_EmaxNorm']]))
+            
+            if self.intrinsic_hardening:
+                integrand = self._Intensity(E)
+            else:
+                integrand = self._Intensity(E, absorb=False)
+                    
+            self._normL_ = 1. / np.trapz(integrand, x=E)
+            
+        return self._normL_
+                            
     def _SchwartzchildRadius(self, M):
         return 2. * self._GravitationalRadius(M)
 
@@ -172,7 +317,7 @@ class BlackHole(Source):
 
         # Input photon distribution
         if self.pf['source_sed'] == 'zebra':
-            nin = lambda E0: _Planck(E0, self.T) / E0
+            nin = lambda E0: _Planck(E0, self.pf['source_temperature']) / E0
         else:
             nin = lambda E0: self._MultiColorDisk(E0, t) / E0
     
@@ -260,7 +405,9 @@ class BlackHole(Source):
         emitted at photon energy E.  Normalization handled separately.
         """
                         
-        if self.pf['source_sed'] == 'pl': 
+        if self.sed_tab and t == 0:
+            Lnu = self._InterpolateSED(E)
+        elif self.pf['source_sed'] == 'pl': 
             Lnu = self._PowerLaw(E, t)    
         elif self.pf['source_sed'] == 'mcd':
             Lnu = self._MultiColorDisk(E, t)
@@ -274,7 +421,10 @@ class BlackHole(Source):
             Lnu = 0.0
             
         if self.pf['source_logN'] > 0 and absorb:
-            Lnu *= self._hardening_factor(E)
+            if np.ndim(E) > 0:
+                Lnu *= np.array(map(self._hardening_factor, E))
+            else:
+                Lnu *= self._hardening_factor(E)
         
         return Lnu          
             
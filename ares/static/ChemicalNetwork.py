@@ -108,7 +108,10 @@ class ChemicalNetwork(object):
         t : float
             Current time.
         q : np.ndarray
-            Array of dependent variables, one per rate equation.
+            Array of dependent variables, one per rate equation. May also
+            be 2-D, with shape (number of equations, number of cells), in
+            which case `cell` should be a slice and all other arguments
+            should have the number of cells as their last dimension.
         args : list
             Extra information needed to compute rates. They are, in order:
             [cell #, ionization rate coefficient (IRC), secondary IRC,
@@ -293,15 +296,16 @@ class ChemicalNetwork(object):
             
         # Can effectively turn off ionization equations once EoR is over.
         if self.monotonic_EoR:
-            if x['h_1'] <= self.monotonic_EoR:
-                dqdt['h_1'] = dqdt['h_2'] = 0.0
+            done = x['h_1'] <= self.monotonic_EoR
+            dqdt['h_1'] = np.where(done, 0.0, dqdt['h_1'])
+            dqdt['h_2'] = np.where(done, 0.0, dqdt['h_2'])
             if self.include_He:
-                if x['he_1'] <= self.monotonic_EoR:
-                    dqdt['he_1'] = 0.0
-                if x['he_2'] <= self.monotonic_EoR:
-                    dqdt['he_2'] = 0.0
+                for sp in ['he_1', 'he_2']:
+                    dqdt[sp] = np.where(x[sp] <= self.monotonic_EoR, 0.0,
+                        dqdt[sp])
             
-        self.dqdt = self.zeros_q.copy()
+        # q may be (Nev, Ncells) if many cells are solved at once
+        self.dqdt = np.zeros((self.Nev,) + np.shape(q)[1:])
         for i, sp in enumerate(self.grid.qmap):
             self.dqdt[i] = dqdt[sp]
 
@@ -310,9 +314,12 @@ class ChemicalNetwork(object):
     def Jacobian(self, t, q, args):
         """
         Compute the Jacobian for the system of equations.
+        
+        If `q` is 2-D (see RateEquations), one Jacobian is computed per
+        cell, and the result has shape (Nev, Nev, number of cells).
         """
         self.q = q
-        self.dqdt = self.zeros_q.copy()
+        self.dqdt = np.zeros((self.Nev,) + np.shape(q)[1:])
     
         cell, k_ion, k_ion2, k_heat, ntot, time = args
                 
@@ -349,7 +356,7 @@ class ChemicalNetwork(object):
             dxi = self.dxi
             domega = self.domega
     
-        J = self.zeros_jac.copy()
+        J = np.zeros((self.Nev, self.Nev) + np.shape(q)[1:])
         
         # Where do the electrons live?
         if self.Nev == 6:
@@ -0,0 +1,123 @@
+"""
+
+BlobExpression.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 03:05:52 PDT 2026
+
+Description: Arithmetic expressions involving blobs (or parameters), e.g.,
+'x - y' with x and y standing in for two different blobs, compiled once
+and then evaluated (with NumPy broadcasting) on as many chunks of data as
+we like.
+
+"""
+
+import ast
+import hashlib
+import numpy as np
+from ..physics import Constants
+
+# Names (besides variables) allowed in expressions
+namespace = {'np': np, 'numpy': np, 'pi': np.pi, 'e': np.e, 'inf': np.inf,
+    'True': True, 'False': False, 'None': None}
+for _name in ['abs', 'sqrt', 'exp', 'log', 'log10', 'sin', 'cos', 'tan',
+    'arcsin', 'arccos', 'arctan', 'arctan2', 'sinh', 'cosh', 'tanh',
+    'minimum', 'maximum', 'where', 'isfinite', 'sum', 'mean', 'diff',
+    'gradient', 'trapz', 'interp']:
+    namespace[_name] = getattr(np, _name)
+
+# Physical constants, e.g., nu_0_mhz. Names above take precedence, so 'e'
+# is still Euler's number (the electron charge is e_cgs).
+for _name in dir(Constants):
+    if _name.startswith('_') or (_name in namespace):
+        continue
+    if isinstance(getattr(Constants, _name), (int, float)):
+        namespace[_name] = getattr(Constants, _name)
+
+class BlobExpression(object):
+    def __init__(self, expr, varmap, ivar=None):
+        """
+        Initialize a BlobExpression object.
+
+        Parameters
+        ----------
+        expr : str
+            For example, 'x - y'.
+        varmap : dict
+            Relates variables in `expr` to blobs. For example,
+
+            varmap = {'x': 'nu_D', 'y': 'nu_C'}
+
+        ivar : dict
+            Independent variables at which to evaluate each blob (if any),
+            e.g., {'igm_Tk': 10.}.
+
+        """
+
+        self.expr = expr
+        self.varmap = varmap
+        self.ivar = ivar if ivar is not None else {}
+
+        # Parse once, and make sure we know what every name refers to
+        self.tree = ast.parse(expr.strip(), mode='eval')
+
+        for node in ast.walk(self.tree):
+            if not isinstance(node, ast.Name):
+                continue
+            if (node.id not in varmap) and (node.id not in namespace):
+                raise NameError('Unrecognized variable \'%s\' in expression '
+                    '\'%s\'.' % (node.id, expr))
+
+        self.code = compile(self.tree, '<%s>' % expr, 'eval')
+
+    @property
+    def blobs(self):
+        """
+        Names of blobs (or parameters) needed to evaluate this expression.
+        """
+        return [self.varmap[var] for var in sorted(self.varmap)]
+
+    @property
+    def hash(self):
+        """
+        Identifies this expression, i.e., is the same for expressions that
+        differ only in formatting, and different if any of the inputs change.
+        """
+        if not hasattr(self, '_hash'):
+            # Values of constants, in case they're ever revised
+            consts = sorted(set([(node.id, repr(namespace[node.id])) \
+                for node in ast.walk(self.tree) \
+                if isinstance(node, ast.Name) and \
+                (node.id not in self.varmap) and \
+                isinstance(namespace[node.id], (int, float))]))
+            info = [ast.dump(self.tree), sorted(self.varmap.items()),
+                sorted([(blob, np.array(self.ivar[blob]).tolist()) \
+                    for blob in self.ivar])]
+            if consts:
+                info.append(consts)
+            self._hash = hashlib.md5(repr(info)).hexdigest()
+
+        return self._hash
+
+    def evaluate(self, data):
+        """
+        Evaluate expression.
+
+        Parameters
+        ----------
+        data : dict
+            Values of blobs, with the same keys as `varmap`, i.e., the names
+            of blobs (not the variables in the expression).
+
+        Returns
+        -------
+        Array of results.
+
+        """
+
+        local = {var: data[self.varmap[var]] for var in self.varmap}
+
+        return np.asarray(eval(self.code, {'__builtins__': {}},
+            dict(namespace, **local)))
+
@@ -0,0 +1,160 @@
+"""
+
+HistoryRecorder.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 15:10:37 PDT 2026
+
+Description: Columnar storage for time-series data, i.e., a replacement
+for appending snapshot dictionaries to a list and sorting them afterward.
+
+"""
+
+import numpy as np
+
+class HistoryRecorder(object):
+    def __init__(self, prefix='', squeeze=True, size=256):
+        """
+        Initialize a HistoryRecorder object.
+
+        Each field is stored in its own pre-allocated array, whose first
+        dimension is time (i.e., snapshot number). Arrays are grown
+        geometrically when full, so that appending a snapshot is (amortized)
+        O(1) and no sorting is required when the calculation is over.
+
+        Parameters
+        ----------
+        prefix : str
+            Will prepend to all field names on output.
+        squeeze : bool
+            Remove length-1 dimensions of each snapshot before storing it.
+            Equivalent to ``squeeze=True`` in util.ReadData._sort_history.
+        size : int
+            Number of snapshots to allocate room for initially.
+
+        """
+        self.prefix = prefix
+        self.squeeze = squeeze
+        self.size = int(size)
+        self._data = {}
+        self._num = 0
+
+    def __len__(self):
+        return self._num
+
+    def __contains__(self, name):
+        return self._strip(name) in self._data
+
+    def __getitem__(self, name):
+        """
+        Return history of a given field (as a view, not a copy).
+        """
+        return self._data[self._strip(name)][0:self._num]
+
+    def _strip(self, name):
+        if self.prefix and name.startswith(self.prefix):
+            return name[len(self.prefix):]
+        return name
+
+    def _name(self, key):
+        if type(key) is int and not self.prefix.strip():
+            return key
+        return '%s%s' % (self.prefix, key)
+
+    def keys(self):
+        return [self._name(key) for key in self._data.keys()]
+
+    def _allocate(self, key, value):
+        arr = np.zeros((self.size,) + value.shape,
+            dtype=np.result_type(value.dtype, float))
+
+        # Fields that show up late are padded with NaNs
+        arr[0:self._num] = np.nan
+
+        self._data[key] = arr
+
+    def _grow(self):
+        self.size *= 2
+        for key, arr in self._data.items():
+            new = np.zeros((self.size,) + arr.shape[1:], dtype=arr.dtype)
+            new[0:self._num] = arr[0:self._num]
+            self._data[key] = new
+
+    def append(self, snapshot=None, **kwargs):
+        """
+        Record a single snapshot.
+
+        Parameters
+        ----------
+        snapshot : dict
+            Dictionary containing data at a single time. Values are copied,
+            so there's no need to copy the dictionary beforehand.
+        kwargs : optional keyword arguments
+            Additional fields, e.g., ``append(t=t, z=z)``.
+
+        """
+
+        if snapshot is None:
+            snapshot = kwargs
+        elif kwargs:
+            snapshot = snapshot.copy()
+            snapshot.update(kwargs)
+
+        if self._num == self.size:
+            self._grow()
+
+        for key in snapshot:
+            value = np.asarray(snapshot[key])
+
+            if self.squeeze:
+                value = value.squeeze()
+
+            if key not in self._data:
+                self._allocate(key, value)
+
+            self._data[key][self._num] = value
+
+        self._num += 1
+
+    def extend(self, snapshots):
+        """
+        Record a list of snapshots.
+        """
+        for snapshot in snapshots:
+            self.append(snapshot)
+
+    def copy(self, num=None):
+        """
+        Return a new HistoryRecorder containing the first `num` snapshots.
+
+        .. note :: Arrays are trimmed to fit, so copies are as small as
+            possible (e.g., for saving or sending to other processes).
+
+        """
+        if num is None:
+            num = self._num
+        num = min(num, self._num)
+
+        size = max(num, 1)
+
+        new = HistoryRecorder(prefix=self.prefix, squeeze=self.squeeze,
+            size=size)
+        for key, arr in self._data.items():
+            new._data[key] = np.zeros((size,) + arr.shape[1:],
+                dtype=arr.dtype)
+            new._data[key][0:num] = arr[0:num]
+        new._num = num
+
+        return new
+
+    @property
+    def history(self):
+        """
+        Dictionary containing the entire history of each field.
+        """
+        data = {}
+        for key in self._data:
+            data[self._name(key)] = self._data[key][0:self._num]
+        return data
+
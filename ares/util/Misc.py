@@ -12,7 +12,7 @@ Description:
 
 import re, os
 import numpy as np
-from collections import Iterable
+from collections import Iterable, OrderedDict
 from scipy.integrate import cumtrapz
 from ..physics.Constants import sigma_T
 from .SetDefaultParameterValues import SetAllDefaults
@@ -38,6 +38,98 @@ def get_hg_rev():
         
     return pipe.stdout.read().strip()
     
+def _nbytes(value):
+    """
+    Memory footprint of an array (including its mask, if it has one).
+    """
+    nbytes = getattr(value, 'nbytes', 0)
+    mask = getattr(value, 'mask', None)
+    if isinstance(mask, np.ndarray):
+        nbytes += mask.nbytes
+    return nbytes
+
+class LRUDict(object):
+    """
+    Dictionary-like container that holds at most `maxsize` items.
+    
+    Retrieving an item marks it as most recently used; inserting a new item
+    when full discards the least recently used one. If maxsize is None, the
+    container is unbounded (i.e., behaves like a regular dictionary).
+    
+    If `maxbytes` is supplied, least recently used items are also discarded
+    whenever the total size of all (array) items exceeds `maxbytes`. The
+    most recently inserted item is always kept, however big it is.
+    """
+    def __init__(self, maxsize=32, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.nbytes = 0
+        self._data = OrderedDict()
+        
+    def __contains__(self, key):
+        return key in self._data
+        
+    def __len__(self):
+        return len(self._data)
+        
+    def __iter__(self):
+        return iter(list(self._data.keys()))
+        
+    def keys(self):
+        return list(self._data.keys())
+        
+    def __getitem__(self, key):
+        # Move to the end, i.e., most recently used
+        value = self._data.pop(key)
+        self._data[key] = value
+        return value
+        
+    def get(self, key, default=None):
+        if key in self._data:
+            return self[key]
+        return default
+        
+    def __setitem__(self, key, value):
+        if key in self._data:
+            del self[key]
+            
+        self._data[key] = value
+        self.nbytes += _nbytes(value)
+        
+        self._trim()
+        
+    def _trim(self):
+        if self.maxsize is not None:
+            while len(self._data) > self.maxsize:
+                self._pop_oldest()
+                
+        if self.maxbytes is not None:
+            while (self.nbytes > self.maxbytes) and (len(self._data) > 1):
+                self._pop_oldest()
+                
+    def _pop_oldest(self):
+        key, value = self._data.popitem(last=False)
+        self.nbytes -= _nbytes(value)
+            
+    def __delitem__(self, key):
+        self.nbytes -= _nbytes(self._data.pop(key))
+        
+    def update(self, other):
+        for key in other:
+            self[key] = other[key]
+        
+    def clear(self):
+        self._data.clear()
+        self.nbytes = 0
+        
+    def resize(self, maxsize):
+        """
+        Change the maximum number of items, discarding the least recently
+        used ones if there are now too many.
+        """
+        self.maxsize = maxsize
+        self._trim()
+    
 class evolve:
     """ Make things that may or may not evolve with time callable. """
     def __init__(self, val):
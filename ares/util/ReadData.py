@@ -12,7 +12,8 @@ Description:
 
 import numpy as np
 import imp as _imp
-import os, re, sys
+import os, re, sys, glob
+import struct, zipfile
 
 try:
     import dill as pickle
@@ -183,20 +184,271 @@ def _load_npz(fn):
     data.close()
     return new
 
-def _load_inits(fn=None):
+# Initial conditions, keyed by (path, modification time)
+_inits_cache = {}
 
+def _inits_key(fn=None):
+    """
+    Unique identifier for an initial conditions file.
+    """
     if fn is None:
         fn = '%s/input/inits/initial_conditions.npz' % ARES
-        inits = _load_npz(fn)
 
-    else:
+    fn = os.path.abspath(fn)
+
+    return fn, os.path.getmtime(fn)
+
+def _load_inits(fn=None):
+    """
+    Read initial conditions (i.e., the recombination history).
+
+    .. note :: Files are only read once per process. The arrays returned
+        are shared by all callers, and so are read-only.
+
+    """
+
+    key = _inits_key(fn)
+
+    if key not in _inits_cache:
+        fn = key[0]
         if re.search('.hdf5', fn):
             inits = _load_hdf5(fn)
         else:
             inits = _load_npz(fn)
 
-    return inits        
+        for element in inits:
+            inits[element].flags.writeable = False
+
+        _inits_cache[key] = inits
 
+    return _inits_cache[key].copy()
+
+def _mmap_npz_member(fn, info):
+    """
+    Memory-map a single (uncompressed) member of an npz archive.
+    
+    Returns None if this isn't possible, e.g., if the member is compressed.
+    """
+    
+    if info.compress_type != zipfile.ZIP_STORED:
+        return None
+    
+    f = open(fn, 'rb')
+    
+    # Skip over local file header to the start of the .npy file
+    f.seek(info.header_offset)
+    header = f.read(30)
+    n, m = struct.unpack('<HH', header[26:30])
+    f.seek(info.header_offset + 30 + n + m)
+    
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    
+    offset = f.tell()
+    f.close()
+    
+    if dtype.hasobject:
+        return None
+    
+    return np.memmap(fn, dtype=dtype, mode='r', offset=offset, shape=shape,
+        order='F' if fortran else 'C')
+    
+class HistoryReader(object):
+    # So analysis classes know not to read everything right away
+    lazy = True
+    
+    def __init__(self, fn, mmap=True):
+        """
+        Lazily read the history of a calculation.
+        
+        Reads files written by util.WriteData.write_history (or 
+        HistoryWriter). Fields are only read from disk when they are first
+        accessed. For (uncompressed) npz files, they are memory-mapped.
+        
+        Parameters
+        ----------
+        fn : str
+            Name of file. Anything that does not end in '.npz' is assumed
+            to be HDF5.
+        mmap : bool
+            Memory-map fields of npz files?
+            
+        """
+        
+        self.fn = fn
+        self.mmap = mmap
+        self._cache = {}
+        
+        if fn.endswith('.npz'):
+            self._zf = zipfile.ZipFile(fn)
+            self._members = {}
+            for info in self._zf.infolist():
+                self._members[info.filename.replace('.npy', '')] = info
+            self._keys = [key for key in self._members \
+                if key != '__parameters__']
+        else:
+            self._f = h5py.File(fn, 'r')
+            self._keys = list(self._f['history'].keys())
+    
+    def _read(self, key):
+        if hasattr(self, '_f'):
+            return self._f['history'][key][...]
+        
+        info = self._members[key]
+        
+        if self.mmap:
+            data = _mmap_npz_member(self.fn, info)
+            if data is not None:
+                return data
+        
+        f = self._zf.open(info)
+        data = np.lib.format.read_array(f)
+        f.close()
+        
+        return data
+    
+    @property
+    def pf(self):
+        """
+        Parameter file (None if one wasn't saved).
+        """
+        if not hasattr(self, '_pf'):
+            if hasattr(self, '_f'):
+                if 'parameters' in self._f:
+                    raw = self._f['parameters'][()].tostring()
+                else:
+                    raw = None
+            elif '__parameters__' in self._members:
+                raw = self._read('__parameters__').tostring()
+            else:
+                raw = None
+            
+            self._pf = None if raw is None else pickle.loads(raw)
+        
+        return self._pf
+    
+    def keys(self):
+        return list(set(self._keys) | set(self._cache.keys()))
+    
+    def __iter__(self):
+        for key in self.keys():
+            yield key
+    
+    def __len__(self):
+        return len(self.keys())
+            
+    def __contains__(self, name):
+        return (name in self._cache) or (name in self._keys)
+    
+    def __getitem__(self, name):
+        if name not in self._cache:
+            if name not in self._keys:
+                raise KeyError(name)
+            self._cache[name] = self._read(name)
+        
+        return self._cache[name]
+    
+    def __setitem__(self, name, value):
+        self._cache[name] = value
+        
+    def copy(self):
+        """
+        Read everything, return a dictionary.
+        """
+        return {key: self[key] for key in self.keys()}
+    
+    def close(self):
+        if hasattr(self, '_f'):
+            self._f.close()
+        else:
+            self._zf.close()
+    
+class DataDumpReader(object):
+    # So analysis classes know not to read everything right away
+    lazy = True
+    
+    def __init__(self, fn):
+        """
+        Lazily read data dumps, i.e., output of util.WriteData.CheckPoints.
+        
+        Indexing with the name of a data dump (e.g., 'dd0000') returns a 
+        dictionary containing that snapshot. Indexing with the name of a 
+        field returns its values in all data dumps, stacked along the first
+        axis (so 't', the time, is an alias for 'time').
+        
+        Parameters
+        ----------
+        fn : str
+            Name of HDF5 file.
+        
+        """
+        
+        self.fn = fn
+        self._f = h5py.File(fn, 'r')
+        self._cache = {}
+        
+        self.dumps = sorted([key for key in self._f.keys() \
+            if self._f[key].attrs.get('is_data')])
+            
+    @property
+    def pf(self):
+        if not hasattr(self, '_pf'):
+            self._pf = {}
+            if 'parameters' in self._f:
+                for key in self._f['parameters']:
+                    self._pf[key] = self._f['parameters'][key][()]
+        return self._pf
+    
+    def fields(self):
+        if not self.dumps:
+            return []
+        return list(self._f[self.dumps[0]].keys())
+        
+    def keys(self):
+        return list(set(self.fields()) | set(self._cache.keys()) | set(['t']))
+    
+    def __iter__(self):
+        for key in self.keys():
+            yield key
+            
+    def __contains__(self, name):
+        return (name in self.dumps) or (name in self.keys())
+        
+    def snapshot(self, name):
+        """
+        Read a single data dump.
+        """
+        grp = self._f[name]
+        return {key: grp[key][()] for key in grp}
+            
+    def field(self, name):
+        """
+        Read a single field from all data dumps.
+        """
+        if name == 't':
+            name = 'time'
+        return np.array([self._f[dd][name][()] for dd in self.dumps])
+        
+    def __getitem__(self, name):
+        if name in self.dumps:
+            return self.snapshot(name)
+            
+        if name not in self._cache:
+            if name not in self.fields() + ['t']:
+                raise KeyError(name)
+            self._cache[name] = self.field(name)
+        
+        return self._cache[name]
+        
+    def __setitem__(self, name, value):
+        self._cache[name] = value
+        
+    def close(self):
+        self._f.close()
+        
 def read_pickled_blobs(fn):
     """
     Reads arbitrary meta-data blobs from emcee that have been pickled.
@@ -303,6 +555,507 @@ def read_pickle_file(fn):
     
     return np.array(results)
 
+def read_sampler_state(fn):
+    """
+    Read MCMC sampler state written by `WriteData.write_sampler_state`.
+    
+    Returns
+    -------
+    Dictionary of arrays, or None if `fn` doesn't exist. If present, the 
+    state of the random number generator is under the key 'rstate', in the
+    form accepted by `np.random.RandomState.set_state`.
+    
+    """
+    
+    if not os.path.exists(fn):
+        return None
+        
+    state = {}
+    with open(fn, 'rb') as f:
+        data = np.load(f)
+        for key in data.files:
+            state[key] = data[key].copy()
+        data.close()
+        
+    if 'rstate_keys' in state:
+        pos, has_gauss = state.pop('rstate_num')
+        state['rstate'] = (str(state.pop('rstate_name')), 
+            state.pop('rstate_keys'), int(pos), int(has_gauss), 
+            float(state.pop('rstate_gauss')))
+    else:
+        state['rstate'] = None
+    
+    return state
+    
+def read_manifest(prefix, use_shards=False):
+    """
+    Find all shards (i.e., per-processor outputs) of a data set.
+    
+    Parameters
+    ----------
+    prefix : str
+        Prefix for the entire data set.
+    use_shards : bool
+        Ignore prefix.manifest.pkl (if it exists), and instead assemble the
+        manifest from the info files of each shard. This is what happens if 
+        there is no manifest, e.g., while a calculation is still running.
+        
+    Returns
+    -------
+    Dictionary containing info for each shard (ordered by rank), and the
+    total number of elements. None if there are no shards.
+    
+    """
+    
+    fn = '%s.manifest.pkl' % prefix
+    if os.path.exists(fn) and (not use_shards):
+        with open(fn, 'rb') as f:
+            return pickle.load(f)
+    
+    shards = []
+    for fn in glob.glob('%s.*.shard.pkl' % prefix):
+        with open(fn, 'rb') as f:
+            shards.append(pickle.load(f))
+            
+    if not shards:
+        return None
+        
+    shards.sort(key=lambda info: (info['rank'], info['shard']))
+    
+    return {'shards': shards, 'num': sum([info['num'] for info in shards])}
+    
+def read_sharded_pickle(prefix, suffix, manifest=None):
+    """
+    Read a file spread over many shards as if it were a single file.
+    
+    Parameters
+    ----------
+    prefix : str
+        Prefix for the entire data set.
+    suffix : str
+        e.g., 'chain.pkl' for the chain, 'blob_0d.tau_e.pkl' for a blob.
+    manifest : dict
+        Output of `read_manifest`. Will be read in if not supplied.
+    
+    """
+    
+    if manifest is None:
+        manifest = read_manifest(prefix)
+        
+    results = []
+    for info in manifest['shards']:
+        nbytes = info['sizes'].get(suffix, 0)
+        if nbytes == 0:
+            continue
+            
+        # Anything past nbytes isn't from a complete checkpoint
+        with open('%s.%s.%s' % (prefix, info['shard'], suffix), 'rb') as f:
+            while f.tell() < nbytes:
+                results.extend(pickle.load(f))
+
+    return np.array(results)
+    
+class ColumnReader(object):
+    def __init__(self, path, writers=None, mmap=True):
+        """
+        Read columns written by (one or more) util.WriteData.ColumnWriter.
+        
+        Parameters
+        ----------
+        path : str
+            Directory containing data, e.g., prefix + '.columns'.
+        writers : list
+            Only read data from these writers. If None, read all of them,
+            in order of writer ID.
+        mmap : bool
+            Memory-map .npy chunks rather than reading them into memory.
+            
+        """
+        
+        self.path = path
+        self.mmap = mmap
+        
+        fns = sorted(glob.glob('%s/index.*.pkl' % path))
+        
+        self.chunks = {}
+        self.attrs = {}
+        self.writers = []
+        for fn in fns:
+            with open(fn, 'rb') as f:
+                index = pickle.load(f)
+            
+            if (writers is not None) and (index['writer'] not in writers):
+                continue
+                
+            self.writers.append(index['writer'])
+                
+            for name, chunks in index['columns'].items():
+                self.chunks.setdefault(name, []).extend(chunks)
+            for name, attrs in index['attrs'].items():
+                self.attrs.setdefault(name, {}).update(attrs)
+                
+    def keys(self):
+        return self.chunks.keys()
+        
+    def __contains__(self, name):
+        return name in self.chunks
+        
+    def __getitem__(self, name):
+        return self.read(name)
+        
+    def num(self, name):
+        """
+        Number of elements in a given column.
+        """
+        return sum([chunk[1] for chunk in self.chunks[name]])
+        
+    def _load_chunk(self, fn):
+        fn = '%s/%s' % (self.path, fn)
+        if fn.endswith('.npz'):
+            with np.load(fn) as f:
+                return f['data']
+        
+        return np.load(fn, mmap_mode='r' if self.mmap else None)
+        
+    def read(self, name, start=None, stop=None, chunks=None, index=None):
+        """
+        Read (a slice of) a column, loading only the chunks needed.
+        
+        Parameters
+        ----------
+        name : str
+            Name of column.
+        start, stop : int
+            Read elements start:stop only.
+        chunks : list
+            Read only these chunks (e.g., checkpoints), by number. Negative
+            numbers count from the end, as usual.
+        index : tuple
+            Read only these elements of each row, e.g., a single redshift
+            of a 1-D blob is index=(k,).
+            
+        Returns
+        -------
+        Array. If only a single (uncompressed) chunk is needed, this will be 
+        a read-only view of the memory-mapped file. 
+        
+        """
+        
+        all_chunks = self.chunks[name]
+        
+        if chunks is not None:
+            all_chunks = [all_chunks[i] for i in chunks]
+        
+        N = sum([chunk[1] for chunk in all_chunks])
+        start, stop, step = slice(start, stop).indices(N)
+        
+        i = 0
+        data = []
+        for fn, num in all_chunks:
+            lo, hi = i, i + num
+            i += num
+            
+            if (hi <= start) or (lo >= stop):
+                continue
+            
+            arr = self._load_chunk(fn)[max(start - lo, 0):min(stop, hi) - lo]
+            
+            if index is not None:
+                arr = arr[(slice(None),) + tuple(index)]
+            
+            data.append(arr)
+        
+        if len(data) == 1:
+            return data[0]
+        elif len(data) == 0:
+            return np.array([])
+            
+        return np.concatenate(data)
+        
+def _iter_pickled_chunks(fn, nbytes=None, is_chain=False):
+    """
+    Generator for pickled chunks (arrays) in a single file.
+    """
+    
+    with open(fn, 'rb') as f:
+        while (nbytes is None) or (f.tell() < nbytes):
+            try:
+                chunk = np.asarray(pickle.load(f), dtype=float)
+            except EOFError:
+                break
+            
+            if chunk.size == 0:
+                continue
+                
+            # Unflattened chains: (walkers, steps, params)
+            if is_chain:
+                chunk = chunk.reshape(-1, chunk.shape[-1])
+            
+            yield chunk
+    
+def file_signature(fns):
+    """
+    Identify the current state of some files, e.g., to determine whether
+    anything derived from them is out of date.
+    
+    Returns
+    -------
+    List of (absolute path, modification time, size) for each file.
+    
+    """
+    return [(os.path.abspath(fn), os.path.getmtime(fn), os.path.getsize(fn)) \
+        for fn in fns]
+
+def _cache_key(fns, nbytes):
+    return [(os.path.abspath(fn), os.path.getmtime(fn), os.path.getsize(fn),
+        nbytes[i]) for i, fn in enumerate(fns)]
+    
+def read_chunk_index(fn, nbytes=None):
+    """
+    Read offsets and shapes of the chunks in a file of pickled chunks.
+    
+    These are recorded at write time by util.WriteData.write_pickled_chunk.
+    
+    Parameters
+    ----------
+    fn : str
+        File of pickled chunks.
+    nbytes : int
+        Only consider chunks in the first `nbytes` bytes of the file. If
+        None, consider the whole file.
+    
+    Returns
+    -------
+    List of (start, end, shape) for each chunk, in order, or None if the
+    index doesn't account for every byte (e.g., it doesn't exist, or 
+    somebody wrote to the file without updating it).
+    
+    """
+    
+    idx = '%s.idx' % fn
+    if not os.path.exists(idx):
+        return None
+    
+    if nbytes is None:
+        nbytes = os.path.getsize(fn)
+    
+    # If a file was truncated (e.g., on restart) and appended to again, 
+    # later records replace earlier ones with the same starting point
+    records = {}
+    with open(idx, 'rb') as f:
+        while True:
+            try:
+                start, end, shape = pickle.load(f)
+            except EOFError:
+                break
+            records[start] = (end, shape)
+    
+    chunks = []
+    pos = 0
+    while (pos < nbytes) and (pos in records):
+        end, shape = records[pos]
+        if end > nbytes:
+            break
+        chunks.append((pos, end, shape))
+        pos = end
+        
+    if pos != nbytes:
+        return None
+        
+    return chunks
+    
+def _chunk_rows(shape, is_chain):
+    """
+    Number of elements in a chunk, and the shape of each one.
+    """
+    
+    if np.prod(shape) == 0:
+        return 0, None
+    
+    # Unflattened chains: (walkers, steps, params)
+    if is_chain:
+        return int(np.prod(shape[:-1])), tuple(shape[-1:])
+    
+    return shape[0], tuple(shape[1:])
+    
+def _read_indexed_chunks(args):
+    """
+    Unpickle chunks of a single file straight into (a slice of) an array.
+    """
+    
+    fn, chunks, out, is_chain = args
+    
+    j = 0
+    with open(fn, 'rb') as f:
+        for start, end, shape in chunks:
+            N, shape = _chunk_rows(shape, is_chain)
+            if N == 0:
+                continue
+            
+            f.seek(start)
+            chunk = np.asarray(pickle.load(f), dtype=float)
+            out[j:j+N] = chunk.reshape((N,) + shape)
+            j += N
+    
+def _read_all_chunks(args):
+    fn, nbytes, is_chain = args
+    return list(_iter_pickled_chunks(fn, nbytes, is_chain))
+    
+def load_chain(fns, cache=None, nbytes=None, threads=4):
+    """
+    Read a chain spread over one or more files of pickled chunks.
+    
+    See `load_pickled` for description of parameters.
+    
+    Returns
+    -------
+    2-D array, with shape (number of elements, number of parameters).
+    
+    """
+    
+    return load_pickled(fns, cache=cache, nbytes=nbytes, is_chain=True,
+        threads=threads)
+    
+def load_pickled(fns, cache=None, nbytes=None, is_chain=False, threads=4):
+    """
+    Read an array spread over one or more files of pickled chunks.
+    
+    If the number and shape of chunks in each file were recorded when they
+    were written (see `read_chunk_index`), the result is allocated up 
+    front, and each file is unpickled directly into its own piece of it. 
+    Otherwise, files are read into lists of chunks, which are then copied
+    into place. Either way, each chunk is unpickled only once.
+    
+    Parameters
+    ----------
+    fns : list
+        Files to read, in order.
+    cache : str
+        Name of .npy file in which to store the result. If it exists, and 
+        none of the files in `fns` have changed since it was written, it
+        will be memory-mapped instead of reading `fns`.
+    nbytes : list
+        Number of bytes to read from each file (e.g., for shards, see 
+        `read_manifest`). If None, read entire files.
+    is_chain : bool
+        If True, flatten chunks to 2-D, i.e., (elements, parameters).
+    threads : int
+        Number of files to read at once.
+        
+    Returns
+    -------
+    Array whose first dimension is the number of elements (e.g., models).
+    
+    """
+    
+    if nbytes is None:
+        nbytes = [None] * len(fns)
+    
+    key = _cache_key(fns, nbytes)
+    
+    if cache is not None:
+        data = _read_npy_cache(cache, key)
+        if data is not None:
+            return data
+    
+    index = [read_chunk_index(fn, nbytes[i]) for i, fn in enumerate(fns)]
+    
+    # Un-indexed files must be read before we know how big the result is
+    todo = [(fn, nbytes[i], is_chain) for i, fn in enumerate(fns) \
+        if index[i] is None]
+    loaded = dict(zip([arg[0] for arg in todo], 
+        _map(_read_all_chunks, todo, threads)))
+    
+    # Count elements
+    N = []
+    shape = None
+    for i, fn in enumerate(fns):
+        if index[i] is None:
+            rows = [(len(chunk), chunk.shape[1:]) for chunk in loaded[fn]]
+        else:
+            rows = [_chunk_rows(chunk[2], is_chain) for chunk in index[i]]
+        
+        N.append(sum([row[0] for row in rows]))
+        
+        for num, sh in rows:
+            if (shape is None) and (num > 0):
+                shape = sh
+    
+    if sum(N) == 0:
+        return np.zeros((0, 0)) if is_chain else np.zeros(0)
+    
+    data = np.empty((sum(N),) + shape)
+    
+    # Fill, one file at a time
+    todo = []
+    for i, fn in enumerate(fns):
+        out = data[sum(N[0:i]):sum(N[0:i+1])]
+        if index[i] is not None:
+            todo.append((fn, index[i], out, is_chain))
+            continue
+        
+        # Discard chunks as we go
+        j = 0
+        chunks = loaded.pop(fn)
+        while chunks:
+            chunk = chunks.pop(0)
+            out[j:j+len(chunk)] = chunk
+            j += len(chunk)
+            
+    _map(_read_indexed_chunks, todo, threads)
+            
+    if (cache is not None) and (rank == 0):
+        _write_npy_cache(cache, key, data)
+        
+    return data
+    
+def _map(func, args, threads):
+    """
+    Apply function to each element of `args`, with a pool of threads.
+    """
+    
+    if (threads > 1) and (len(args) > 1):
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(min(threads, len(args)))
+        results = pool.map(func, args)
+        pool.close()
+        return results
+        
+    return map(func, args)
+    
+def _read_npy_cache(cache, key):
+    """
+    Memory-map cached array, if it's still up to date.
+    """
+    
+    if not (os.path.exists(cache) and os.path.exists(cache + '.key')):
+        return None
+        
+    try:
+        with open(cache + '.key', 'rb') as f:
+            if pickle.load(f) != key:
+                return None
+        return np.load(cache, mmap_mode='r')
+    except Exception:
+        return None
+        
+def _write_npy_cache(cache, key, data):
+    # Might not have write permission, which is fine.
+    try:
+        if os.path.exists(cache + '.key'):
+            os.remove(cache + '.key')
+        
+        tmp = '%s.%i.tmp' % (cache, os.getpid())
+        with open(tmp, 'wb') as f:
+            np.save(f, data)
+        os.rename(tmp, cache)
+        
+        with open(tmp, 'wb') as f:
+            pickle.dump(key, f)
+        os.rename(tmp, cache + '.key')
+    except (IOError, OSError):
+        pass
+    
 def read_pickled_blobs(fn):
     return read_pickle_file(fn)    
     
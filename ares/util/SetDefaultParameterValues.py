@@ -118,6 +118,9 @@ def MultiPhaseParameters():
      
      "photon_counting": False,
      "monotonic_EoR": 1e-6,
+     
+     # Evolve IGM and CGM as a single (stacked) system of ODEs?
+     "coupled_phases": False,
 
      "igm_grid_cells": 1,     
      "igm_expansion": True,
@@ -221,6 +224,9 @@ def PhysicsParameters():
     'feedback_LW_rtol': 0.,
     'feedback_LW_atol': 1.,
     'feedback_LW_mean_err': False,
+    'feedback_LW_warm_start': False,
+    'feedback_LW_restart': False,
+    'feedback_LW_restart_rtol': 1e-4,
 
     }
 
@@ -354,6 +360,9 @@ def PopulationParameters():
     "pop_lf_mags": None,
 
     'pop_lf_Mmax': 1e15,
+    
+    # Max number of redshifts for which LFs are held in memory
+    'pop_lf_cache': 16,
 
     "pop_fduty": 1.0,
         
@@ -372,6 +381,11 @@ def PopulationParameters():
     "pop_psm_instance": None,
     "pop_tsf": 100.,
     "pop_binaries": False,        # for BPASS
+    
+    # Store SED tables as .npy files after first read? If True, will use
+    # $ARES/input/sed_cache (or $HOME/.ares/sed_cache if $ARES isn't set),
+    # otherwise supply path.
+    "pop_sed_cache": False,
 
     # Option of setting Z, t, or just supplying SSP table?
     
@@ -543,7 +557,11 @@ def SourceParameters():
     "source_eta": 0.1,
     "source_isco": 6,  
     "source_rmax": 1e3,
-
+    
+    # If not None, tabulate 'mcd', 'simpl', and 'zebra' SEDs on a grid with
+    # this many points in log-E (rather than integrating on-the-fly).
+    "source_sed_Nbins": None,
+    
     }
     
     pf.update(rcParams)
@@ -654,6 +672,10 @@ def ControlParameters():
     "dzDataDump": None,
     'logdtDataDump': None,
     'logdzDataDump': None,
+    
+    # Stream data dumps to this (HDF5) file as they're made
+    'data_dump_file': None,
+    'data_dump_threaded': False,
     "stop_time": 500,
     
     "initial_redshift": 50.,
@@ -686,6 +708,12 @@ def ControlParameters():
     "tau_ifront": 0.5,
     "restricted_timestep": ['ions', 'neutrals', 'electrons', 'temperature'],
     
+    # 'heuristic' (limit fractional change, epsilon_dt) or 'adaptive' 
+    # (error-controlled, with rejection and PI step-size control)
+    "timestep_control": 'heuristic',
+    "timestep_rtol": 1e-3,
+    "timestep_atol": 1e-10,
+    
     # Real-time analysis junk
     "stop": None,           # 'B', 'C', 'trans', or 'D'
     
@@ -0,0 +1,144 @@
+"""
+
+SortedIndex.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 01:58:16 PDT 2026
+
+Description: Sorted indexes of (1-D) data sets, so that range queries
+don't require scanning every element, and can be saved to disk.
+
+"""
+
+import numpy as np
+from .ReadData import _read_npy_cache, _write_npy_cache, file_signature
+
+# Allow for round-off error at the edges of ranges
+MP = np.finfo(float).eps
+
+class SortedIndex(object):
+    def __init__(self, values=None, data=None):
+        """
+        Initialize a SortedIndex object.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Values to be indexed, e.g., a parameter for each element of an
+            MCMC chain.
+        data : np.ndarray
+            Pre-existing index, i.e., structured array with fields 'order'
+            and 'value' (as saved by `save`).
+
+        """
+
+        if data is None:
+            values = np.asarray(values, dtype=np.float64)
+
+            # NaNs sort to the end, and so are never found
+            order = np.argsort(values, kind='mergesort')
+
+            data = np.zeros(values.size,
+                dtype=[('order', np.int64), ('value', np.float64)])
+            data['order'] = order
+            data['value'] = values[order]
+
+        self.data = data
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def order(self):
+        return self.data['order']
+
+    @property
+    def values(self):
+        return self.data['value']
+
+    def range(self, lo=None, hi=None, tol=MP):
+        """
+        Find all elements with lo <= value <= hi.
+
+        Parameters
+        ----------
+        lo, hi : float
+            Bounds of range. If None, range is unbounded on that side.
+        tol : float
+            Values within `tol` of either bound are included too.
+
+        Returns
+        -------
+        Array of indices of elements, in ascending order.
+
+        """
+
+        if lo is None:
+            i1 = 0
+        else:
+            i1 = np.searchsorted(self.values, lo - tol, side='left')
+
+        if hi is None:
+            i2 = np.searchsorted(self.values, np.inf, side='right')
+        else:
+            i2 = np.searchsorted(self.values, hi + tol, side='right')
+
+        return np.sort(self.order[i1:i2])
+
+    def save(self, fn, sources=None):
+        """
+        Save index to .npy file.
+
+        Parameters
+        ----------
+        fn : str
+            Name of file.
+        sources : list
+            Files containing the data being indexed. If any of them change,
+            the saved index is considered out of date (see `load`).
+
+        """
+        _write_npy_cache(fn, _source_key(sources), self.data)
+
+    @staticmethod
+    def load(fn, sources=None):
+        """
+        Memory-map saved index, if it exists and is up to date.
+
+        Returns
+        -------
+        SortedIndex instance, or None if index is missing or out of date.
+
+        """
+
+        data = _read_npy_cache(fn, _source_key(sources))
+
+        if data is None:
+            return None
+
+        return SortedIndex(data=data)
+
+def _source_key(sources):
+    if sources is None:
+        return None
+    return file_signature(sources)
+
+def intersect(ids):
+    """
+    Find elements common to all of several sorted arrays of indices.
+
+    Smallest arrays are intersected first, so as to keep intermediate
+    results small.
+    """
+
+    ids = sorted(ids, key=len)
+
+    result = ids[0]
+    for element in ids[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, element, assume_unique=True)
+
+    return result
+
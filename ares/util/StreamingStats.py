@@ -0,0 +1,281 @@
+"""
+
+StreamingStats.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 23:58:31 PDT 2026
+
+Description: Statistics that can be accumulated one chunk of samples at a
+time, so that chains (and blobs) too big to fit in memory can be analyzed.
+Each accumulator can also be merged with another of its kind, e.g., one
+built on a different processor.
+
+"""
+
+import numpy as np
+from .Stats import error_2D
+
+class RunningMoments(object):
+    def __init__(self, ndim):
+        """
+        Weighted mean and covariance of `ndim` quantities.
+
+        Uses the pairwise update of Chan, Golub, & LeVeque (1979), which
+        is numerically stable (unlike accumulating sums of squares).
+        """
+        self.ndim = ndim
+        self.W = 0.0
+        self.W2 = 0.0
+        self.mu = np.zeros(ndim)
+        self.M2 = np.zeros((ndim, ndim))
+
+    def update(self, x, weights=None):
+        """
+        Add samples.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            Array of shape (samples, ndim).
+        weights : np.ndarray
+            Weight of each sample. If None, all weights are unity.
+
+        """
+        x = np.asarray(x, dtype=float).reshape(-1, self.ndim)
+
+        if weights is None:
+            w = np.ones(x.shape[0])
+        else:
+            w = np.asarray(weights, dtype=float)
+
+        W = w.sum()
+        if W == 0:
+            return
+
+        mu = np.dot(w, x) / W
+        dx = x - mu
+        M2 = np.dot((w[:,None] * dx).T, dx)
+
+        self._combine(W, np.dot(w, w), mu, M2)
+
+    def merge(self, other):
+        if other.W > 0:
+            self._combine(other.W, other.W2, other.mu, other.M2)
+
+    def _combine(self, W, W2, mu, M2):
+        tot = self.W + W
+        delta = mu - self.mu
+
+        self.M2 += M2 + np.outer(delta, delta) * self.W * W / tot
+        self.mu += delta * W / tot
+        self.W = tot
+        self.W2 += W2
+
+    @property
+    def mean(self):
+        return self.mu.copy()
+
+    @property
+    def cov(self):
+        """
+        Unbiased covariance, i.e., equivalent to np.cov(x, aweights=w),
+        which reduces to np.cov(x) for unit weights.
+        """
+        return self.M2 / (self.W - self.W2 / self.W)
+
+class StreamingHistogram(object):
+    def __init__(self, bins):
+        """
+        1-D or 2-D histogram with fixed bin edges.
+
+        Parameters
+        ----------
+        bins : list
+            Bin edges in each dimension, i.e., a list of one or two arrays.
+
+        """
+        self.edges = [np.asarray(edges, dtype=float) for edges in bins]
+        self.ndim = len(self.edges)
+
+        assert self.ndim in [1, 2], "Only 1-D and 2-D histograms allowed!"
+
+        self.counts = np.zeros([len(edges) - 1 for edges in self.edges])
+
+    def update(self, x, weights=None):
+        """
+        Add samples.
+
+        Parameters
+        ----------
+        x : list
+            Samples of each dimension, i.e., a list of one or two arrays.
+        weights : np.ndarray
+            Weight of each sample.
+
+        """
+        if self.ndim == 1:
+            hist, edges = np.histogram(x[0], bins=self.edges[0],
+                weights=weights)
+        else:
+            hist, xedges, yedges = np.histogram2d(x[0], x[1],
+                bins=self.edges, weights=weights)
+
+        self.counts += hist
+
+    def merge(self, other):
+        self.counts += other.counts
+
+    @property
+    def pdf(self):
+        """
+        Normalized such that the integral over the range of the histogram
+        is unity, as np.histogram(..., density=True).
+        """
+        widths = np.diff(self.edges[0])
+        for edges in self.edges[1:]:
+            widths = np.multiply.outer(widths, np.diff(edges))
+
+        return self.counts / widths / self.counts.sum()
+
+    @property
+    def T(self):
+        """
+        Same 2-D histogram, with the two dimensions swapped.
+        """
+        hist = StreamingHistogram(self.edges[-1::-1])
+        hist.counts = self.counts.T
+        return hist
+
+    def levels(self, nu=[0.95, 0.68]):
+        """
+        Levels (relative to the peak) of 2-D contours enclosing nu-% of the
+        samples. See util.Stats.error_2D.
+        """
+        if not hasattr(self, '_levels'):
+            self._levels = {}
+
+        key = tuple(np.atleast_1d(nu))
+        if key not in self._levels:
+            self._levels[key] = error_2D(None, None, self.counts, None,
+                nu=nu, method='raw')
+
+        return self._levels[key]
+
+class QuantileSketch(object):
+    def __init__(self, compression=500, max_exact=2**16):
+        """
+        Mergeable sketch of a (weighted) distribution for computing
+        quantiles, a simplified version of the t-digest (Dunning & Ertl 2019).
+
+        Samples are kept as-is until there are more than `max_exact` of
+        them, at which point they are merged into at most ~compression / 2
+        weighted centroids. Centroids are smallest in the tails, so extreme
+        quantiles remain accurate.
+
+        Parameters
+        ----------
+        compression : int
+            Sets number of centroids, and thus accuracy.
+        max_exact : int
+            Number of samples to hold before compressing. Until then,
+            quantiles are exact.
+
+        """
+        self.compression = compression
+        self.max_exact = max_exact
+
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.exact = True
+        self.unweighted = True
+
+    def __len__(self):
+        return len(self.means)
+
+    @property
+    def total_weight(self):
+        return self.weights.sum()
+
+    def update(self, x, weights=None):
+        """
+        Add samples.
+
+        Non-finite samples, and those with zero weight, are ignored.
+        """
+        x = np.asarray(x, dtype=float).ravel()
+
+        if weights is None:
+            w = np.ones_like(x)
+        else:
+            w = np.asarray(weights, dtype=float).ravel()
+
+        ok = np.logical_and(np.isfinite(x), w > 0)
+        x = x[ok]
+        w = w[ok]
+
+        if np.any(w != 1):
+            self.unweighted = False
+
+        self._add(x, w)
+
+    def merge(self, other):
+        self.exact = self.exact and other.exact
+        self.unweighted = self.unweighted and other.unweighted
+        self._add(other.means, other.weights)
+
+    def _add(self, x, w):
+        self.means = np.concatenate((self.means, x))
+        self.weights = np.concatenate((self.weights, w))
+
+        if len(self.means) > self.max_exact:
+            self.compress()
+
+    def compress(self):
+        """
+        Merge neighboring samples (or centroids) into bigger centroids.
+        """
+
+        order = np.argsort(self.means, kind='mergesort')
+        x = self.means[order]
+        w = self.weights[order]
+
+        # Quantile of each centroid's center
+        W = w.sum()
+        q = (np.cumsum(w) - 0.5 * w) / W
+
+        # Scale function: at most one unit of k per centroid
+        k = self.compression * np.arcsin(2. * np.clip(q, 0, 1) - 1.) \
+            / 2. / np.pi
+        group = np.floor(k - k.min()).astype(int)
+
+        wsum = np.bincount(group, weights=w)
+        xsum = np.bincount(group, weights=w * x)
+        ok = wsum > 0
+
+        self.means = xsum[ok] / wsum[ok]
+        self.weights = wsum[ok]
+        self.exact = False
+
+    def quantile(self, q):
+        """
+        Compute quantile(s) q, each between 0 and 1.
+
+        For unweighted samples that haven't been compressed, this is
+        identical to np.percentile(x, 100 * q).
+        """
+
+        if len(self.means) == 0:
+            return np.nan * np.ones_like(q)
+
+        if self.exact and self.unweighted:
+            return np.percentile(self.means, 100 * np.asarray(q))
+
+        order = np.argsort(self.means, kind='mergesort')
+        x = self.means[order]
+        w = self.weights[order]
+
+        cdf = np.cumsum(w) - 0.5 * w
+
+        return np.interp(np.asarray(q) * w.sum(), cdf, x)
+
@@ -0,0 +1,463 @@
+"""
+
+WorkQueue.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 20:05:44 PDT 2026
+
+Description: Dynamic scheduling of (many) independent tasks, e.g., the
+models of a ModelGrid, over MPI or a local pool of processes.
+
+"""
+
+import time
+from collections import deque
+
+try:
+    from mpi4py import MPI
+except ImportError:
+    MPI = None
+
+# Message tags
+TAG_REQUEST = 1
+TAG_WORK = 2
+TAG_STEAL = 3
+TAG_RETURN = 4
+
+class WorkQueue(object):
+    def __init__(self, tasks, keys=None, num_workers=1, max_chunk=None):
+        """
+        Initialize a WorkQueue object.
+
+        Tasks are handed out in chunks, whose size shrinks as the queue
+        empties (guided self-scheduling). Chunk sizes are set by the measured
+        runtime of each kind of task, so that each chunk should take about
+        the same amount of time.
+
+        Parameters
+        ----------
+        tasks : list
+            Task IDs, e.g., indices of models in a model grid.
+        keys : list
+            One per task. Tasks with the same key (e.g., that share lookup
+            tables) are kept together, and handed to workers that most
+            recently ran tasks with that key, when possible.
+        num_workers : int
+            Number of workers pulling tasks from the queue.
+        max_chunk : int
+            Maximum number of tasks per chunk.
+
+        """
+
+        if keys is None:
+            keys = [None] * len(tasks)
+
+        self.num_workers = max(int(num_workers), 1)
+        self.max_chunk = max_chunk
+
+        # Group tasks by key, in order of first appearance
+        self.key_of = {}
+        self.groups = []
+        for task, key in zip(tasks, keys):
+            self.key_of[task] = key
+            for group in self.groups:
+                if group[0] == key:
+                    group[1].append(task)
+                    break
+            else:
+                self.groups.append((key, deque([task])))
+
+        # Runtime statistics by key
+        self._time = {}
+        self._num = {}
+
+        # Most recent key run by each worker
+        self.last_key = {}
+
+    def __len__(self):
+        return sum([len(group[1]) for group in self.groups])
+
+    def record(self, task, runtime):
+        """
+        Record runtime of a completed task.
+        """
+        key = self.key_of[task]
+        self._time[key] = self._time.get(key, 0.) + runtime
+        self._num[key] = self._num.get(key, 0) + 1
+
+    def expected(self, key):
+        """
+        Expected runtime of a task with given key.
+        """
+        if self._num.get(key, 0) > 0:
+            return self._time[key] / self._num[key]
+
+        num = sum(self._num.values())
+        if num > 0:
+            return sum(self._time.values()) / num
+
+        return 1.
+
+    @property
+    def expected_remaining(self):
+        return sum([self.expected(key) * len(group) \
+            for key, group in self.groups])
+
+    def next_chunk(self, worker=0):
+        """
+        Retrieve next chunk of tasks.
+
+        Parameters
+        ----------
+        worker : int
+            ID number of worker asking for tasks.
+
+        Returns
+        -------
+        List of tasks (empty if there's nothing left to do).
+
+        """
+
+        self.groups = [group for group in self.groups if len(group[1])]
+
+        if not self.groups:
+            return []
+
+        # Stick to same key as this worker's previous chunk, if possible
+        key = self.last_key.get(worker)
+        keys = [group[0] for group in self.groups]
+        if key in keys:
+            group = self.groups[keys.index(key)]
+        else:
+            # Otherwise, start the group least likely to be touched by
+            # anybody else (i.e., from the back)
+            busy = set(self.last_key.values())
+            for group in self.groups[-1::-1]:
+                if group[0] not in busy:
+                    break
+            else:
+                group = self.groups[0]
+
+        key, tasks = group
+
+        # Aim for each chunk to take 1/2N of the remaining time
+        # (tasks may be too quick to have a measurable runtime)
+        target = self.expected_remaining / (2. * self.num_workers)
+        runtime = self.expected(key)
+        if runtime > 0:
+            N = max(int(target / runtime), 1)
+        else:
+            N = len(tasks)
+        if self.max_chunk is not None:
+            N = min(N, self.max_chunk)
+
+        chunk = [tasks.popleft() for i in range(min(N, len(tasks)))]
+
+        self.last_key[worker] = key
+
+        return chunk
+
+    def put_back(self, tasks):
+        """
+        Return (unstarted) tasks to the front of the queue.
+        """
+        for task in tasks[-1::-1]:
+            key = self.key_of[task]
+            for group in self.groups:
+                if group[0] == key:
+                    group[1].appendleft(task)
+                    break
+            else:
+                self.groups.insert(0, (key, deque([task])))
+
+class MPIWorkQueue(object):
+    def __init__(self, queue, comm=None, master=0):
+        """
+        Dispatch tasks from a WorkQueue to MPI workers.
+
+        The master only hands out work. Workers ask for more tasks when
+        they run out, reporting runtimes for the tasks they just completed.
+        Once the queue is empty, idle workers steal the unstarted half of
+        the chunk belonging to the worker with the most work left.
+
+        Parameters
+        ----------
+        queue : WorkQueue instance
+            Must be identical on all processors.
+        comm : mpi4py.MPI.COMM_WORLD instance.
+            If None, one will be created.
+        master : int
+            ID # of root processor.
+
+        """
+        self.queue = queue
+        self.comm = MPI.COMM_WORLD if comm is None else comm
+        self.master = master
+
+        assert self.comm.size > 1
+
+        self.workers = set(range(self.comm.size))
+        self.workers.discard(self.master)
+
+    def is_master(self):
+        return self.master == self.comm.rank
+
+    def dispatch(self, callback=None):
+        """
+        Master loop: hand out tasks until everything is done.
+
+        Parameters
+        ----------
+        callback : function
+            Called with the total number of completed tasks whenever a
+            worker reports back, e.g., to update a progress bar.
+
+        """
+
+        assert self.is_master()
+
+        comm = self.comm
+        queue = self.queue
+
+        # Tasks handed to each worker that haven't been reported done
+        out = {worker: [] for worker in self.workers}
+        stealing = set()
+        exhausted = set()
+        waiting = deque()
+        active = set(self.workers)
+        num_done = 0
+
+        while active:
+            status = MPI.Status()
+            msg = comm.recv(source=MPI.ANY_SOURCE, tag=MPI.ANY_TAG,
+                status=status)
+            worker, tag = status.source, status.tag
+
+            if tag == TAG_REQUEST:
+                for task, runtime in msg:
+                    queue.record(task, runtime)
+                num_done += len(msg)
+                if msg and (callback is not None):
+                    callback(num_done)
+                out[worker] = []
+                exhausted.discard(worker)
+                waiting.append(worker)
+            elif tag == TAG_RETURN:
+                stealing.discard(worker)
+                if not msg:
+                    exhausted.add(worker)
+                out[worker] = [task for task in out[worker] \
+                    if task not in msg]
+                queue.put_back(msg)
+
+            # Serve idle workers
+            while waiting:
+                if len(queue):
+                    worker = waiting.popleft()
+                    chunk = queue.next_chunk(worker)
+                    out[worker] = chunk
+                    comm.send(chunk, dest=worker, tag=TAG_WORK)
+                    continue
+
+                # Steal from the worker with the most (expected) work left
+                victims = [(sum([queue.expected(queue.key_of[task]) \
+                    for task in out[w]]), w) for w in out \
+                    if len(out[w]) > 1 and w not in (stealing | exhausted)]
+
+                if victims:
+                    victim = max(victims)[1]
+                    stealing.add(victim)
+                    comm.send(None, dest=victim, tag=TAG_STEAL)
+                    break
+
+                # Nothing left to steal. Wait for outstanding steals, or
+                # shut down idle workers if there are none.
+                if stealing:
+                    break
+
+                busy = [w for w in out if out[w] and w not in waiting]
+                if busy:
+                    break
+
+                while waiting:
+                    worker = waiting.popleft()
+                    comm.send([], dest=worker, tag=TAG_WORK)
+                    active.discard(worker)
+
+    def tasks(self):
+        """
+        Worker loop: generator for tasks assigned to this processor.
+
+        .. note :: The time between successive iterations is recorded as
+            the runtime of each task.
+
+        """
+
+        assert not self.is_master()
+
+        comm = self.comm
+        master = self.master
+
+        local = deque()
+        done = []
+        while True:
+
+            if not local:
+                comm.send(done, dest=master, tag=TAG_REQUEST)
+                done = []
+
+                # Might receive (stale) steal requests while waiting
+                while True:
+                    status = MPI.Status()
+                    msg = comm.recv(source=master, tag=MPI.ANY_TAG,
+                        status=status)
+                    if status.tag == TAG_STEAL:
+                        comm.send([], dest=master, tag=TAG_RETURN)
+                        continue
+                    break
+
+                if not msg:
+                    break
+
+                local.extend(msg)
+
+            # Give up half of our unstarted tasks?
+            if comm.Iprobe(source=master, tag=TAG_STEAL):
+                comm.recv(source=master, tag=TAG_STEAL)
+                N = len(local) // 2
+                stolen = [local.pop() for i in range(N)][-1::-1]
+                comm.send(stolen, dest=master, tag=TAG_RETURN)
+
+            task = local.popleft()
+
+            t1 = time.time()
+            yield task
+            t2 = time.time()
+
+            done.append((task, t2 - t1))
+
+# Function to be run by each process of a local pool. Set in pool_imap,
+# inherited by worker processes when they are forked.
+_pool_func = None
+
+# ID number of this process within a local pool (None outside of one)
+_pool_worker = None
+
+def _init_worker(counter):
+    global _pool_worker
+    with counter.get_lock():
+        _pool_worker = counter.value
+        counter.value += 1
+
+def pool_worker_id():
+    """
+    ID number (0, 1, ...) of this process within a pool started by
+    pool_imap, or None if we're not in one.
+    
+    Every process in a local pool has MPI rank 0, so this is what
+    distinguishes them, e.g., when naming output files.
+    """
+    return _pool_worker
+
+def _run_chunk(chunk):
+    results = []
+    for task in chunk:
+        t1 = time.time()
+        result = _pool_func(task)
+        t2 = time.time()
+        results.append((task, result, t2 - t1))
+    return pool_worker_id(), results
+
+def pool_imap(queue, func, processes):
+    """
+    Run tasks from a WorkQueue with a local pool of processes.
+
+    Parameters
+    ----------
+    queue : WorkQueue instance
+    func : function
+        Called with a single task ID as its argument. Return value must
+        be picklable.
+    processes : int
+        Number of processes.
+
+    Returns
+    -------
+    Generator for (task, result) pairs, in the order they are completed.
+
+    """
+
+    global _pool_func
+    _pool_func = func
+
+    import multiprocessing as mp
+
+    counter = mp.Value('i', 0)
+    pool = mp.Pool(processes, initializer=_init_worker, initargs=(counter,))
+
+    queue.num_workers = processes
+
+    # Keep one chunk in flight per process. Each is requested on behalf of
+    # a worker: the one that just finished (and so is the one that's idle),
+    # or, until we've heard back from everybody, a provisional (negative) 
+    # ID, since we can't know which process will pick the chunk up.
+    in_flight = deque()
+    idle = deque()
+    guess = 0
+    try:
+        while len(queue) or in_flight:
+            while len(queue) and (len(in_flight) < processes):
+                if idle:
+                    worker = idle.popleft()
+                else:
+                    guess -= 1
+                    worker = guess
+
+                in_flight.append((pool.apply_async(_run_chunk,
+                    (queue.next_chunk(worker),)), worker))
+
+            # Wait for first chunk that's done
+            while True:
+                ready = [item for item in in_flight if item[0].ready()]
+                if ready:
+                    break
+                time.sleep(1e-2)
+
+            for item in ready:
+                in_flight.remove(item)
+                res, asked = item
+                worker, results = res.get()
+
+                # Credit the key to the process that actually ran the chunk
+                if (asked != worker) and (asked in queue.last_key):
+                    queue.last_key[worker] = queue.last_key.pop(asked)
+
+                idle.append(worker)
+
+                for task, result, runtime in results:
+                    queue.record(task, runtime)
+                    yield task, result
+    finally:
+        pool.terminate()
+        _pool_func = None
+
+def serial_imap(queue, func):
+    """
+    Run tasks from a WorkQueue one at a time.
+
+    Returns
+    -------
+    Generator for (task, result) pairs.
+
+    """
+
+    while len(queue):
+        for task in queue.next_chunk():
+            t1 = time.time()
+            result = func(task)
+            t2 = time.time()
+
+            queue.record(task, t2 - t1)
+
+            yield task, result
@@ -11,9 +11,20 @@ Description:
 """
 
 import os, types
+import threading
 import numpy as np
 from ..physics.Cosmology import Cosmology
 from ..physics.Constants import s_per_myr
+
+try:
+    import dill as pickle
+except ImportError:
+    import pickle
+    
+try:
+    import Queue as queue
+except ImportError:
+    import queue
     
 try:
     import h5py
@@ -29,6 +40,30 @@ except ImportError:
     rank = 0
     size = 1
 
+def _write_pf_group(f, pf):
+    """
+    Write parameters to 'parameters' group of HDF5 file (or group) `f`.
+    """
+    grp = f.create_group('parameters')
+    for key in pf:
+        if type(pf[key]) is types.NoneType:
+            continue
+        
+        try:    
+            grp.create_dataset(key, data=pf[key])
+        except TypeError:
+            pass
+            
+def _write_dump(f, name, data):
+    """
+    Write a single data dump to its own group of HDF5 file `f`.
+    """
+    grp = f.create_group(name)
+    grp.attrs.create('is_data', data=True)
+    
+    for key in data:
+        grp.create_dataset(key, data=data[key])
+
 class CheckPoints:
     def __init__(self, pf=None, grid=None, time_units=s_per_myr,
         dtDataDump=5., dzDataDump=None, logdtDataDump=None, logdzDataDump=None,
@@ -136,6 +171,9 @@ class CheckPoints:
         else:
             name = self.name(z=z)
         
+        if self.streaming:
+            raise NotImplementedError('Can\'t add to data dumps once they\'ve been streamed to disk.')
+        
         for kwarg in kwargs:
             self.data[name][kwarg] = kwargs[kwarg]
         
@@ -147,7 +185,11 @@ class CheckPoints:
         
         to_write, dump_type = self.write_now(t=t, z=z)
         if to_write:
-            tmp = data.copy()
+            if self.streaming:
+                # Simulation may modify arrays while they're being written
+                tmp = {key: np.array(data[key]) for key in data}
+            else:
+                tmp = data.copy()
             
             if t is not None:
                 tmp.update({'time': t})
@@ -156,14 +198,106 @@ class CheckPoints:
                     tmp.update({'redshift': z})
             
             if dump_type == 'dd':
-                self.data[self.name(t=t)] = tmp
+                names = [self.name(t=t)]
             elif dump_type == 'rd':
-                self.data[self.name(z=z)] = tmp
+                names = [self.name(z=z)]
             else:
-                self.data[self.name(t=t)] = tmp
-                self.data[self.name(z=z)] = tmp
+                names = [self.name(t=t), self.name(z=z)]
+            
+            for name in names:
+                if self.streaming:
+                    self._put(name, tmp)
+                else:
+                    self.data[name] = tmp
                                 
             del tmp
+            
+    @property
+    def streaming(self):
+        return hasattr(self, '_stream')
+        
+    def open_stream(self, fn, threaded=False, queue_size=8):
+        """
+        Write data dumps to disk as soon as they're produced.
+        
+        The file has the same layout as that written by `dump`, i.e., one
+        HDF5 group per data dump, so it can be read by analysis.RaySegment.
+        
+        Parameters
+        ----------
+        fn : str
+            Name of output file.
+        threaded : bool
+            If True, write data in a background thread, so that I/O can 
+            overlap with computation.
+        queue_size : int
+            Maximum number of data dumps waiting to be written by the 
+            background thread. Once full, `update` will block, which keeps
+            memory use bounded.
+        
+        """
+        
+        if not have_h5py:
+            raise ImportError('Streaming data dumps requires h5py!')
+        
+        self._stream = h5py.File(fn, 'w')
+        self._stream_errors = []
+        
+        _write_pf_group(self._stream, self.pf)
+        
+        if threaded:
+            self._queue = queue.Queue(maxsize=queue_size)
+            self._thread = threading.Thread(target=self._writer)
+            self._thread.daemon = True
+            self._thread.start()
+        
+        # Anything stored so far (i.e., initial conditions)
+        for name in sorted(self.data.keys()):
+            self._put(name, self.data[name])
+        
+        self.data = {}
+        
+    def _writer(self):
+        """
+        Write data dumps from the queue until we hit the sentinel (None).
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            
+            try:
+                _write_dump(self._stream, *item)
+            except Exception as err:
+                self._stream_errors.append(err)
+    
+    def _put(self, name, data):
+        if self._stream_errors:
+            raise self._stream_errors[0]
+            
+        if hasattr(self, '_queue'):
+            self._queue.put((name, data))
+        else:
+            _write_dump(self._stream, name, data)
+            
+    def close_stream(self):
+        """
+        Finish writing data dumps and close the file.
+        """
+        
+        if not self.streaming:
+            return
+            
+        if hasattr(self, '_queue'):
+            self._queue.put(None)
+            self._thread.join()
+            del self._queue, self._thread
+            
+        self._stream.close()
+        del self._stream
+        
+        if self._stream_errors:
+            raise self._stream_errors[0]
                     
     def write_now(self, t=None, z=None):
         """ May be conflict if this time/redshift corresponds to DD and RD. """
@@ -251,33 +385,633 @@ class CheckPoints:
     
         if have_h5py:
             f = h5py.File(fn, 'w')
-            basename = fn[0:fn.rfind('.')]
             
-            pf = f.create_group('parameters')
-            for key in self.pf:
-                if type(self.pf[key]) is types.NoneType:
-                    continue
-                
-                try:    
-                    pf.create_dataset(key, data=self.pf[key])
-                except TypeError:
-                    pass
+            _write_pf_group(f, self.pf)
             
             for dd in self.data.keys():
-                grp = f.create_group(dd)
-                grp.attrs.create('is_data', data=True)
-                
-                for key in self.data[dd]:
-                    grp.create_dataset(key, data=self.data[dd][key])
-                    
-                del grp    
+                _write_dump(f, dd, self.data[dd])
                 
             f.close() 
         
         else:
             
-            raise NotImplemented('need to implement npz writer for data dumps.')       
+            raise NotImplemented('need to implement npz writer for data dumps.')
+
+def _pickle_pf(pf):
+    """
+    Serialize parameter file as a (void) array, e.g., for storage in HDF5.
+    """
+    return np.void(pickle.dumps(dict(pf), protocol=pickle.HIGHEST_PROTOCOL))
+
+class HistoryWriter(object):
+    def __init__(self, fn, mode='w', pf=None, compression='gzip', 
+        chunks=256):
+        """
+        Write the history of a calculation to a single HDF5 file.
+        
+        All fields are stored in the 'history' group, one dataset per field,
+        with time (i.e., snapshot number) as the first dimension. Datasets
+        are chunked and (optionally) compressed, and can be extended, so
+        that snapshots can be streamed to disk as a calculation proceeds. 
+        The parameter file is pickled and stored in the 'parameters' dataset.
+        
+        Parameters
+        ----------
+        fn : str
+            Name of output file.
+        mode : str
+            'w' to create a new file (overwriting any existing file), 'a' to
+            append to an existing file.
+        pf : dict
+            Parameter file.
+        compression : str, None
+            Compression filter for all datasets. See h5py documentation.
+        chunks : int
+            Number of snapshots per chunk.
+            
+        """
+        
+        if not have_h5py:
+            raise ImportError('HistoryWriter requires h5py!')
+        
+        self.fn = fn
+        self.compression = compression
+        self.chunks = int(chunks)
+        
+        self.f = h5py.File(fn, mode)
+        self.grp = self.f.require_group('history')
+        
+        # Number of snapshots written so far
+        self._num = 0
+        for key in self.grp:
+            self._num = max(self._num, self.grp[key].shape[0])
+        
+        if pf is not None:
+            self.write_pf(pf)
+            
+    def __len__(self):
+        return self._num        
+            
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, *args):
+        self.close()
+        
+    def write_pf(self, pf):
+        if 'parameters' in self.f:
+            del self.f['parameters']
+        self.f.create_dataset('parameters', data=_pickle_pf(pf))
+        
+    def _create(self, key, value, num):
+        """
+        Create an (extendable) dataset for field `key` with `num` elements.
+        """
+        
+        if np.issubdtype(value.dtype, np.floating):
+            fill = np.nan
+        else:
+            fill = 0
+            
+        shape = value.shape[1:]
+        self.grp.create_dataset(key, shape=(num,) + shape, dtype=value.dtype,
+            maxshape=(None,) + shape, chunks=(self.chunks,) + shape, 
+            compression=self.compression, shuffle=self.compression is not None,
+            fillvalue=fill)
+            
+    def write(self, history):
+        """
+        Write history (dictionary of arrays) all at once.
+        
+        .. note :: Fields that already exist will be overwritten.
+        
+        """
+        
+        for key in history:
+            if history[key] is None:
+                continue
+                
+            value = np.asarray(history[key])
+            
+            if key in self.grp:
+                del self.grp[key]
+            
+            self._create(key, value, value.shape[0])
+            self.grp[key][...] = value
+            
+            self._num = max(self._num, value.shape[0])
+                
+    def append(self, snapshot=None, **kwargs):
+        """
+        Add a single snapshot to the end of all datasets.
+        
+        Parameters
+        ----------
+        snapshot : dict
+            Dictionary containing data at a single time.
+        kwargs : optional keyword arguments
+            Additional fields, e.g., ``append(t=t, z=z)``.
+            
+        """
+        
+        if snapshot is None:
+            snapshot = kwargs
+        elif kwargs:
+            snapshot = snapshot.copy()
+            snapshot.update(kwargs)
+            
+        num = self._num + 1
+        
+        for key in snapshot:
+            if snapshot[key] is None:
+                continue
+                
+            value = np.asarray(snapshot[key])[None,...]
+            
+            if key not in self.grp:
+                # Fields that show up late are padded with fill values
+                self._create(key, value, self._num)
+                
+            self.grp[key].resize(num, axis=0)
+            self.grp[key][self._num] = value[0]
+        
+        # Keep everything the same length
+        for key in self.grp:
+            if self.grp[key].shape[0] < num:
+                self.grp[key].resize(num, axis=0)    
+        
+        self._num = num
+            
+    def flush(self):
+        self.f.flush()
+        
+    def close(self):
+        self.f.close()
 
-         
+def write_history(fn, history, pf=None, clobber=False, compression='gzip'):
+    """
+    Write history of a calculation (and its parameters) to a single file.
+    
+    Parameters
+    ----------
+    fn : str
+        Name of output file. If it ends in '.npz', an uncompressed npz 
+        archive will be written (members of which can be memory-mapped by
+        util.ReadData.HistoryReader). Otherwise, HDF5.
+    history : dict
+        Dictionary of arrays, each with time as its first dimension.
+    pf : dict
+        Parameter file.
+    clobber : bool
+        Overwrite pre-existing file of same name?
+    compression : str, None
+        Compression filter for HDF5 output.
+    
+    """
+    
+    if os.path.exists(fn):
+        if clobber:
+            os.remove(fn)
+        else: 
+            raise IOError('%s exists! Set clobber=True to overwrite.' % fn)
+            
+    if fn.endswith('.npz'):
+        data = {}
+        for key in history:
+            if history[key] is None:
+                continue
+            data[key] = np.asarray(history[key])
+            
+        if pf is not None:
+            data['__parameters__'] = np.frombuffer(_pickle_pf(pf).tostring(),
+                dtype=np.uint8)
+            
+        f = open(fn, 'wb')
+        np.savez(f, **data)
+        f.close()
         
-        
\ No newline at end of file
+    else:
+        with HistoryWriter(fn, mode='w', pf=pf, 
+            compression=compression) as writer:
+            writer.write(history)
+
+def _makedirs(path):
+    """
+    Create a directory (and parents), unless it already exists.
+    """
+    if os.path.isdir(path):
+        return
+    try:
+        os.makedirs(path)
+    except OSError:
+        # Somebody else might have just made it
+        if not os.path.isdir(path):
+            raise
+
+def _atomic_dump(obj, fn):
+    """
+    Pickle an object without ever leaving a partially-written file behind.
+    """
+    tmp = '%s.%i.tmp' % (fn, os.getpid())
+    with open(tmp, 'wb') as f:
+        pickle.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    # Atomic on POSIX systems    
+    os.rename(tmp, fn)
+    
+def write_sampler_state(fn, state):
+    """
+    Save the complete state of an MCMC sampler to a binary (.npz) file.
+    
+    Parameters
+    ----------
+    fn : str
+        Name of file. Any previous version is replaced atomically, so there 
+        is always exactly one complete state on disk.
+    state : dict
+        Arrays to save. The special key 'rstate' can hold the state of a 
+        NumPy random number generator, i.e., the tuple returned by 
+        `np.random.RandomState.get_state` (see `ReadData.read_sampler_state`).
+        
+    """
+    
+    arrays = {}
+    for key, value in state.items():
+        if key == 'rstate':
+            if value is None:
+                continue
+            name, keys, pos, has_gauss, cached_gaussian = value
+            arrays['rstate_name'] = np.array(name)
+            arrays['rstate_keys'] = np.array(keys)
+            arrays['rstate_num'] = np.array([pos, has_gauss])
+            arrays['rstate_gauss'] = np.array(cached_gaussian)
+        else:    
+            arrays[key] = np.asarray(value)
+    
+    # Write to a file handle so NumPy doesn't tack on another suffix
+    tmp = '%s.%i.tmp' % (fn, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.savez(f, **arrays)
+        f.flush()
+        os.fsync(f.fileno())
+        
+    os.rename(tmp, fn)
+    
+def write_pickled_chunk(fn, chunk, mode='ab'):
+    """
+    Write a chunk (e.g., a checkpoint's worth of a chain) to a file of
+    pickled chunks, and record where it is and what shape it has.
+    
+    The record goes in fn + '.idx', and consists of the offsets of the 
+    first and last byte of the chunk and its shape, so that readers can
+    allocate space for the entire data set before unpickling anything. See
+    util.ReadData.read_chunk_index.
+    
+    Parameters
+    ----------
+    fn : str
+        Name of file.
+    chunk : np.ndarray, list
+        Data to be written.
+    mode : str
+        'ab' to append, 'wb' to overwrite.
+    
+    """
+    
+    with open(fn, mode) as f:
+        start = f.tell()
+        pickle.dump(chunk, f)
+        end = f.tell()
+    
+    # Start a new index if this is a new file
+    with open('%s.idx' % fn, 'ab' if start > 0 else 'wb') as f:
+        pickle.dump((start, end, np.shape(chunk)), f)
+        
+def write_shard_info(prefix, shard, files, num):
+    """
+    Record the state of a single processor's output files (its "shard").
+    
+    Parameters
+    ----------
+    prefix : str
+        Prefix for the entire data set.
+    shard : str
+        Shard ID, i.e., files in this shard are named prefix.shard.*
+    files : list
+        Suffixes of all files in this shard, e.g., 'chain.pkl'.
+    num : int
+        Number of elements (e.g., models) written to each file so far.
+        
+    .. note :: Only the bytes of each file written before this call are
+        considered part of the data set, so readers never see a partially 
+        written checkpoint, and crashed runs can be truncated on restart.
+    
+    """
+    
+    sizes = {}
+    for suffix in files:
+        fn = '%s.%s.%s' % (prefix, shard, suffix)
+        if os.path.exists(fn):
+            sizes[suffix] = os.path.getsize(fn)
+        else:
+            sizes[suffix] = 0
+    
+    info = {'shard': shard, 'rank': rank, 'num': num, 'sizes': sizes}
+    
+    _atomic_dump(info, '%s.%s.shard.pkl' % (prefix, shard))
+    
+def truncate_shard(prefix, shard):
+    """
+    Discard anything written to a shard after its last complete checkpoint.
+    
+    Returns
+    -------
+    Shard info dictionary (see `write_shard_info`), or None if this shard
+    has no record.
+    
+    """
+    
+    fn = '%s.%s.shard.pkl' % (prefix, shard)
+    if not os.path.exists(fn):
+        return None
+        
+    with open(fn, 'rb') as f:
+        info = pickle.load(f)
+        
+    for suffix, nbytes in info['sizes'].items():
+        truncate_file('%s.%s.%s' % (prefix, shard, suffix), nbytes)
+                
+    return info
+    
+def truncate_file(fn, nbytes):
+    """
+    Discard everything after the first `nbytes` bytes of a file (if it 
+    exists, and is any longer than that).
+    """
+    
+    if not os.path.exists(fn):
+        return
+    if os.path.getsize(fn) > nbytes:
+        with open(fn, 'r+b') as f:
+            f.truncate(nbytes)
+    
+def write_manifest(prefix):
+    """
+    Combine the info of all shards into a single manifest file.
+    """
+    
+    from .ReadData import read_manifest
+    
+    manifest = read_manifest(prefix, use_shards=True)
+    
+    if manifest is None:
+        raise IOError('No shards found for prefix %s!' % prefix)
+    
+    _atomic_dump(manifest, '%s.manifest.pkl' % prefix)
+    
+    return manifest
+    
+def merge_shards(prefix, clobber=False):
+    """
+    Concatenate shards into a single set of files, e.g., prefix.chain.pkl.
+    
+    Our output files are sequences of pickles, so concatenating them is
+    just a matter of copying bytes. If run in parallel, each processor
+    merges a different subset of files.
+    
+    Parameters
+    ----------
+    prefix : str
+        Prefix for the entire data set.
+    clobber : bool
+        Overwrite pre-existing merged files?
+        
+    """
+    
+    from .ReadData import read_manifest, read_chunk_index
+    
+    manifest = read_manifest(prefix)
+    
+    if manifest is None:
+        raise IOError('No shards found for prefix %s!' % prefix)
+        
+    suffixes = []
+    for info in manifest['shards']:
+        for suffix in info['sizes']:
+            if suffix not in suffixes:
+                suffixes.append(suffix)
+    
+    for i, suffix in enumerate(sorted(suffixes)):
+        if i % size != rank:
+            continue
+        
+        fn = '%s.%s' % (prefix, suffix)
+        if os.path.exists(fn) and (not clobber):
+            raise IOError('%s exists! Set clobber=True to overwrite.' % fn)
+        
+        tmp = '%s.%i.tmp' % (fn, os.getpid())
+        index = []
+        with open(tmp, 'wb') as out:
+            for info in manifest['shards']:
+                nbytes = info['sizes'].get(suffix, 0)
+                if nbytes == 0:
+                    continue
+                
+                shard_fn = '%s.%s.%s' % (prefix, info['shard'], suffix)
+                
+                # Chunk offsets in merged file (if every shard has them)
+                if index is not None:
+                    chunks = read_chunk_index(shard_fn, nbytes)
+                    if chunks is None:
+                        index = None
+                    else:
+                        base = out.tell()
+                        index.extend([(base + start, base + end, shape) \
+                            for start, end, shape in chunks])
+                
+                with open(shard_fn, 'rb') as f:
+                    while nbytes > 0:
+                        buff = f.read(min(nbytes, 2**24))
+                        if not buff:
+                            break
+                        out.write(buff)
+                        nbytes -= len(buff)
+        
+        if index is not None:
+            with open('%s.idx' % tmp, 'wb') as f:
+                for record in index:
+                    pickle.dump(record, f)
+            os.rename('%s.idx' % tmp, '%s.idx' % fn)
+        elif os.path.exists('%s.idx' % fn):
+            os.remove('%s.idx' % fn)
+        
+        os.rename(tmp, fn)
+        
+class ColumnWriter(object):
+    def __init__(self, path, writer=None, compression=False):
+        """
+        Append data to a set of columns, stored as a directory of chunks.
+        
+        Each call to `append` writes a new chunk (a single .npy file) for a
+        given column, e.g., one per checkpoint of an MCMC. Chunks aren't
+        part of the data set until `flush` is called, at which point this
+        writer's index file is (atomically) updated. Different writers
+        (e.g., processors) keep separate indices, so they never need to 
+        coordinate with one another.
+        
+        Layout:
+            path/index.<writer>.pkl
+            path/<column>/<writer>.<chunk>.npy
+        
+        Parameters
+        ----------
+        path : str
+            Directory to write to, e.g., prefix + '.columns'.
+        writer : str
+            ID of this writer. Defaults to the (zero-padded) MPI rank.
+        compression : bool
+            Save chunks as compressed .npz files? These can't be 
+            memory-mapped when read back in.
+            
+        .. note :: If this writer's index already exists, new data will be
+            appended to it (e.g., on restart).
+            
+        """
+        
+        self.path = path
+        self.compression = compression
+        
+        if writer is None:
+            writer = str(rank).zfill(3)
+        self.writer = writer
+        
+        _makedirs(path)
+                    
+        fn = self.index_fn
+        if os.path.exists(fn):
+            with open(fn, 'rb') as f:
+                self.index = pickle.load(f)
+        else:
+            self.index = {'writer': writer, 'columns': {}, 'attrs': {}}
+            
+    @property
+    def index_fn(self):
+        return '%s/index.%s.pkl' % (self.path, self.writer)
+        
+    def __enter__(self):
+        return self
+        
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.flush()
+        
+    def keys(self):
+        return self.index['columns'].keys()
+        
+    def append(self, name, data, **attrs):
+        """
+        Write a chunk of data to a given column.
+        
+        Parameters
+        ----------
+        name : str
+            Name of column, e.g., 'chain' or 'blob_1d.igm_Tk'.
+        data : np.ndarray
+            Its first dimension is the number of elements (e.g., models).
+        attrs : optional keyword arguments
+            Any (picklable) info to associate with this column, e.g., the
+            independent variables of a blob.
+        
+        """
+        
+        data = np.asarray(data)
+        
+        _makedirs('%s/%s' % (self.path, name))
+        
+        chunks = self.index['columns'].setdefault(name, [])
+        
+        suffix = 'npz' if self.compression else 'npy'
+        
+        # Don't overwrite chunks of a removed column (still part of the data
+        # set until we flush), or left over from an unfinished write.
+        num = len(chunks)
+        while True:
+            fn = '%s/%s.%s.%s' % (name, self.writer, str(num).zfill(5), 
+                suffix)
+            if not os.path.exists('%s/%s' % (self.path, fn)):
+                break
+            num += 1
+        
+        if self.compression:
+            np.savez_compressed('%s/%s' % (self.path, fn), data=data)
+        else:
+            np.save('%s/%s' % (self.path, fn), data)
+            
+        chunks.append((fn, data.shape[0] if data.ndim else 1))
+        
+        if attrs:
+            self.index['attrs'].setdefault(name, {}).update(attrs)
+        
+    def remove(self, name):
+        """
+        Remove a column (or at least, this writer's chunks of it).
+
+        Nothing changes on disk until `flush` is called, so readers see 
+        either the old column or its replacement, never neither.
+        """
+
+        for fn, num in self.index['columns'].pop(name, []):
+            self._removed.append(fn)
+
+        self.index['attrs'].pop(name, None)
+
+    def truncate(self, chunks):
+        """
+        Forget chunks written since some earlier point, e.g., a checkpoint
+        written after the state of a calculation was last saved.
+        
+        Parameters
+        ----------
+        chunks : dict
+            Number of chunks of each column to keep. Columns not in this
+            dictionary are removed entirely.
+            
+        .. note :: As with `remove`, nothing changes on disk until `flush`
+            is called.
+        
+        """
+        
+        for name in list(self.index['columns'].keys()):
+            num = chunks.get(name, 0)
+            if num == 0:
+                self.remove(name)
+                continue
+                
+            for fn, N in self.index['columns'][name][num:]:
+                self._removed.append(fn)
+                
+            self.index['columns'][name] = self.index['columns'][name][0:num]
+
+    @property
+    def _removed(self):
+        """
+        Chunks of removed columns, to be deleted once the index is flushed.
+        """
+        if not hasattr(self, '_removed_chunks'):
+            self._removed_chunks = []
+        return self._removed_chunks
+
+    def flush(self):
+        """
+        Add all chunks written so far to the data set.
+        """
+        _atomic_dump(self.index, self.index_fn)
+        
+        while self._removed:
+            fn = '%s/%s' % (self.path, self._removed.pop())
+            if os.path.exists(fn):
+                os.remove(fn)
+        
+    close = flush
+
@@ -8,6 +8,7 @@ from .BlobBundles import BlobBundle
 from .ProgressBar import ProgressBar
 from .ParameterFile import ParameterFile
 from .MagnitudeSystem import MagnitudeSystem
+from .HistoryRecorder import HistoryRecorder
 from .ParameterBundles import ParameterBundle
 from .RestrictTimestep import RestrictTimestep
 
@@ -0,0 +1,43 @@
+"""
+
+test_bh_sed_tab.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 12:20:05 PDT 2026
+
+Description: How much faster is normalizing and sampling a SIMPL SED when 
+it is tabulated rather than integrated on-the-fly?
+
+"""
+
+import ares
+import time
+import numpy as np
+
+pars = \
+{
+ 'source_sed': 'simpl',
+ 'source_mass': 10.,
+ 'source_Emin': 1e2,
+ 'source_Emax': 3e4,
+ 'source_EminNorm': 5e2,
+ 'source_EmaxNorm': 8e3,
+ 'source_fsc': 0.1,
+}
+
+if __name__ == '__main__':
+    E = np.logspace(2.5, 4, 50)
+
+    t1 = time.time()
+    bh1 = ares.sources.BlackHole(**pars)
+    L1 = np.array(map(bh1.Spectrum, E))
+    t2 = time.time()
+
+    t3 = time.time()
+    bh2 = ares.sources.BlackHole(source_sed_Nbins=2000, **pars)
+    L2 = bh2.Spectrum(E)
+    t4 = time.time()
+
+    print "Tabulated SED is %.2gx faster than quad." % ((t2 - t1) / (t4 - t3))
+    print "Max relative difference: %.2g" % np.max(np.abs(L2 - L1) / L1)
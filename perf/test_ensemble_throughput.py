@@ -0,0 +1,51 @@
+"""
+
+test_ensemble_throughput.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 14:40:52 PDT 2026
+
+Description: How many global 21-cm models per second can we run as an
+ensemble, compared to running them one at a time?
+
+"""
+
+import ares
+import time
+import numpy as np
+
+pars = {'verbose': False, 'progress_bar': False}
+
+if __name__ == '__main__':
+    for N in [1, 16, 128]:
+        fX = np.logspace(-1, 1, N)
+        models = [{'pop_yield{1}': 2.6e39 * f} for f in fX]
+
+        t1 = time.time()
+        for model in models[0:min(N, 16)]:
+            kw = pars.copy()
+            kw.update(model)
+            sim = ares.simulations.Global21cm(**kw)
+            sim.run()
+        t2 = time.time()
+
+        # Only run (at most) 16 models serially
+        rate_serial = min(N, 16) / (t2 - t1)
+
+        t3 = time.time()
+        ens = ares.simulations.Global21cmEnsemble(models, **pars)
+        ens.run()
+        t4 = time.time()
+
+        rate_ens = N / (t4 - t3)
+
+        print "N=%i: serial %.2g models/s, ensemble %.2g models/s (%.2gx)" \
+            % (N, rate_serial, rate_ens, rate_ens / rate_serial)
+
+        # Compare final model to serial result
+        dTb1 = np.interp(20., sim.history['z'][-1::-1], sim.history['dTb'][-1::-1])
+        i = min(N, 16) - 1
+        hist = ens.history[i]
+        dTb2 = np.interp(20., hist['z'][-1::-1], hist['dTb'][-1::-1])
+        print "    dTb(z=20): serial=%.4g, ensemble=%.4g" % (dTb1, dTb2)
@@ -0,0 +1,66 @@
+"""
+
+test_history_io.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 18:40:13 PDT 2026
+
+Description: Compare write/read speed for Global21cm.save outputs, i.e., 
+pickle vs. (compressed) HDF5 vs. (uncompressed, memory-mappable) npz.
+
+"""
+
+import os
+import ares
+import time
+import numpy as np
+from ares.util.ReadData import HistoryReader
+
+try:
+    import dill as pickle
+except ImportError:
+    import pickle
+
+if __name__ == '__main__':
+    sim = ares.simulations.Global21cm(verbose=False, progress_bar=False)
+    sim.run()
+
+    prefix = 'test_history_io'
+
+    for suffix in ['pkl', 'hdf5', 'npz']:
+        fn = '%s.history.%s' % (prefix, suffix)
+
+        t1 = time.time()
+        sim.save(prefix, suffix=suffix, clobber=True)
+        t2 = time.time()
+
+        # Read everything
+        t3 = time.time()
+        if suffix == 'pkl':
+            f = open(fn, 'rb')
+            hist = pickle.load(f)
+            f.close()
+        else:
+            hist = HistoryReader(fn).copy()
+        t4 = time.time()
+
+        # Read a single field
+        t5 = time.time()
+        if suffix == 'pkl':
+            f = open(fn, 'rb')
+            dTb = pickle.load(f)['dTb']
+            f.close()
+        else:
+            dTb = HistoryReader(fn)['dTb']
+        t6 = time.time()
+
+        assert np.allclose(dTb, sim.history['dTb'])
+
+        print "%s: write=%.3g s, read all=%.3g s, read dTb=%.3g s, size=%.3g MB" \
+            % (suffix, t2 - t1, t4 - t3, t6 - t5, os.path.getsize(fn) / 1e6)
+
+        os.remove(fn)
+
+    if os.path.exists('%s.parameters.pkl' % prefix):
+        os.remove('%s.parameters.pkl' % prefix)
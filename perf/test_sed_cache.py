@@ -0,0 +1,54 @@
+"""
+
+test_sed_cache.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 11:03:27 PDT 2026
+
+Description: How much faster is instantiating SynthesisModel objects when 
+the SED tables have been converted to binary (and cached)?
+
+"""
+
+import ares
+import sys, time
+
+# The module, not the class of the same name
+sm = sys.modules['ares.populations.SynthesisModel']
+
+Zs = [0.02, 0.03, 0.04]
+
+def setup(pop_sed_cache=True, **kwargs):
+    for Z in Zs:
+        pop = ares.populations.SynthesisModel(pop_sed='eldridge2009', pop_Z=Z,
+            pop_sed_cache=pop_sed_cache, **kwargs)
+        tmp = pop.Spectrum(10.)
+    
+if __name__ == '__main__':
+    # ASCII every time
+    t1 = time.time()
+    setup(pop_sed_cache=False)
+    t2 = time.time()
+
+    # First pass: tables are converted and written to disk
+    sm._sed_cache.clear()
+    t3 = time.time()
+    setup()
+    t4 = time.time()
+
+    # Fresh process (simulated): tables are memory-mapped from disk
+    sm._sed_cache.clear()
+    t5 = time.time()
+    setup()
+    t6 = time.time()
+
+    # Same process: tables are shared
+    t7 = time.time()
+    setup()
+    t8 = time.time()
+
+    print "ASCII:               %.3g s" % (t2 - t1)
+    print "ASCII + conversion:  %.3g s" % (t4 - t3)
+    print "memory-mapped:       %.3g s (%.2gx faster)" % (t6 - t5, (t2 - t1) / (t6 - t5))
+    print "shared in-process:   %.3g s (%.2gx faster)" % (t8 - t7, (t2 - t1) / (t8 - t7))
@@ -0,0 +1,53 @@
+"""
+
+test_timestep_control.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 16:48:20 PDT 2026
+
+Description: Compare the number of steps (and solver work) required by the 
+heuristic and error-controlled time-steppers for the default global 21-cm
+problem.
+
+"""
+
+import ares
+import time
+import numpy as np
+
+pars = {'verbose': False, 'progress_bar': False}
+
+if __name__ == '__main__':
+    results = {}
+    for control in ['heuristic', 'adaptive']:
+        for rtol in [1e-2, 1e-3, 1e-4]:
+
+            if (control == 'heuristic') and (rtol != 1e-3):
+                continue
+
+            sim = ares.simulations.Global21cm(timestep_control=control, 
+                timestep_rtol=rtol, **pars)
+
+            t1 = time.time()
+            sim.run()
+            t2 = time.time()
+
+            results[(control, rtol)] = sim
+
+            print "%s (rtol=%.0e): %.2g s" % (control, rtol, t2 - t1)
+            for zone in ['igm', 'cgm']:
+                stats = sim.stats[zone]
+                print "    %s: %i accepted, %i rejected, %i RHS, %i Jacobian" \
+                    % (zone, stats['accepted'], stats['rejected'], stats['nfev'], 
+                       stats['njev'])
+
+    # Compare to heuristic solution
+    ref = results[('heuristic', 1e-3)]
+    z = np.arange(10, 40)
+    dTb_ref = np.interp(z, ref.history['z'][-1::-1], ref.history['dTb'][-1::-1])
+    for key in results:
+        sim = results[key]
+        dTb = np.interp(z, sim.history['z'][-1::-1], sim.history['dTb'][-1::-1])
+        print "%s (rtol=%.0e): max |dTb - dTb_ref| = %.3g mK" \
+            % (key[0], key[1], np.max(np.abs(dTb - dTb_ref)))
@@ -0,0 +1,120 @@
+"""
+
+test_analysis_1d_error.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 12:31:09 PDT 2026
+
+Description: Make sure 1-D error bars and 2-D contour levels are the same
+whether samples are read all at once or in chunks, for MCMC chains and
+(weighted) model grids alike.
+
+"""
+
+import os
+import glob
+import ares
+import pickle
+import numpy as np
+
+Ns, Nd = 1001, 2
+pars = ['par_%i' % i for i in range(Nd)]
+bins = [np.linspace(-3, 3, 21)] * Nd
+
+def _save(prefix, chain, logL=None):
+    with open('%s.chain.pkl' % prefix, 'wb') as f:
+        pickle.dump(chain, f)
+    with open('%s.pinfo.pkl' % prefix, 'wb') as f:
+        pickle.dump((pars, [False] * Nd), f)
+    if logL is not None:
+        with open('%s.logL.pkl' % prefix, 'wb') as f:
+            pickle.dump(logL, f)
+
+def _compare(anl, **kwargs):
+    """
+    Compute error bars and contour levels in memory and in chunks.
+    """
+
+    results = []
+    for chunk_size in [None, 64]:
+        anl.chunk_size = chunk_size
+        if hasattr(anl, '_histogram_cache'):
+            del anl._histogram_cache
+
+        errs = [anl.get_1d_error(pars[0], nu=0.68, peak=peak, **kwargs) \
+            for peak in ['median', 'mode', None]]
+        hist = anl.TriangleHistograms(pars, bins=bins, oned=False, **kwargs)
+        results.append((errs, hist[(0, 1)]))
+
+    (errs1, hist1), (errs2, hist2) = results
+
+    for (mu1, err1), (mu2, err2) in zip(errs1, errs2):
+        assert np.allclose(mu1, mu2) if mu1 is not None else mu2 is None
+        assert np.allclose(err1, err2)
+
+    assert np.allclose(hist1.counts, hist2.counts)
+    assert np.allclose(hist1.levels()[1], hist2.levels()[1])
+
+    return errs1, hist1
+
+def test():
+
+    chain = np.random.normal(size=(Ns, Nd))
+    logL = np.random.rand(Ns)
+
+    # MCMC: samples unweighted, skip & stop trim beginning and end of chain
+    prefix = 'test_1d_error_mcmc'
+    _save(prefix, chain, logL)
+
+    anl = ares.analysis.ModelSet(prefix)
+    anl.cache_chain = False
+
+    skip, stop = 100, 50
+    errs, hist = _compare(anl, skip=skip, stop=stop)
+
+    x = chain[skip:Ns-stop,0]
+    lo, hi = np.percentile(x, (16., 84.))
+
+    mu, err = errs[0]
+    assert np.allclose(mu, np.percentile(x, 50.))
+    assert np.allclose([mu - err[0], mu + err[1]], [lo, hi])
+
+    mu, err = errs[1]
+    assert mu == chain[skip + np.argmax(logL[skip:Ns-stop]),0]
+
+    mu, err = errs[2]
+    assert np.allclose(err, [lo, hi])
+
+    h, xe, ye = np.histogram2d(chain[skip:Ns-stop,0], chain[skip:Ns-stop,1],
+        bins=bins)
+    assert np.all(hist.counts == h)
+    assert np.allclose(anl.get_levels(h)[1], hist.levels()[1])
+
+    # Model grid: samples weighted by likelihood
+    prefix = 'test_1d_error_grid'
+    _save(prefix, chain)
+
+    anl = ares.analysis.ModelSet(prefix)
+    anl.cache_chain = False
+    assert not anl.is_mcmc
+
+    anl.set_constraint(par_1=[None, lambda x: np.exp(-(x - 0.5)**2 / 0.5)])
+
+    errs, hist = _compare(anl)
+
+    w = np.exp(-(chain[:,1] - 0.5)**2 / 0.5)
+    h, xe, ye = np.histogram2d(chain[:,0], chain[:,1], bins=bins, weights=w)
+    assert np.allclose(hist.counts, h)
+    assert np.allclose(anl.get_levels(h)[1], hist.levels()[1])
+
+    # Weighting matters: median of par_1 is pulled toward 0.5
+    mu, err = anl.get_1d_error(pars[1], peak='median')
+    assert mu > 0.25
+
+    for fn in glob.glob('test_1d_error_*'):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
+
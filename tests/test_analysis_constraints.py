@@ -0,0 +1,140 @@
+"""
+
+test_analysis_constraints.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 13:02:51 PDT 2026
+
+Description: Make sure set_constraint and sort_by_Tmin (which work on whole
+columns at once) agree with sample-by-sample calculations, and that saved
+indexes only go stale when the data they were built from change.
+
+"""
+
+import os
+import glob
+import ares
+import math
+import pickle
+import numpy as np
+from ares.util.SortedIndex import SortedIndex
+
+prefix = 'test_constraints'
+
+Ns = 200
+pars = ['Tmin{0}', 'fstar{0}', 'Tmin{1}', 'fstar{1}', 'fX']
+ivars = np.arange(5, 15)
+
+def _save(chain, blob_0d, blob_1d):
+    with open('%s.chain.pkl' % prefix, 'wb') as f:
+        pickle.dump(chain, f)
+    with open('%s.pinfo.pkl' % prefix, 'wb') as f:
+        pickle.dump((pars, [False] * len(pars)), f)
+
+    setup = \
+    {
+     'blob_names': [['z_D'], ['igm_Tk']],
+     'blob_ivars': [None, [ivars]],
+     'blob_funcs': None,
+    }
+
+    with open('%s.setup.pkl' % prefix, 'wb') as f:
+        pickle.dump(setup, f)
+    with open('%s.blob_0d.z_D.pkl' % prefix, 'wb') as f:
+        pickle.dump(blob_0d, f)
+    with open('%s.blob_1d.igm_Tk.pkl' % prefix, 'wb') as f:
+        pickle.dump(blob_1d, f)
+
+def _sort_by_Tmin_slow(chain):
+    """
+    Sample-by-sample version of ModelSet.sort_by_Tmin (two populations).
+    """
+    new = chain.copy()
+    for i in range(chain.shape[0]):
+        Tmin = chain[i,[0,2]]
+        if np.all(np.diff(Tmin) > 0):
+            continue
+
+        i_Tasc = np.argsort(Tmin)
+        for k, par in enumerate(pars):
+            if '{' not in par:
+                continue
+            name, num = par[:-3], int(par[-2])
+            new[i,pars.index('%s{%i}' % (name, i_Tasc[num]))] = chain[i,k]
+
+    return new
+
+def test():
+
+    chain = np.random.rand(Ns, len(pars))
+    chain[:,[0,2]] = 10**(3. + 2 * chain[:,[0,2]])
+    chain[0,2] = chain[0,0]                        # tie
+
+    blob_0d = 10. + 10. * np.random.rand(Ns)
+    blob_1d = np.random.rand(Ns, len(ivars)) * 100.
+
+    _save(chain, blob_0d, blob_1d)
+
+    # sort_by_Tmin
+    anl = ares.analysis.ModelSet(prefix)
+    anl.sort_by_Tmin()
+
+    sorted_chain = np.ma.getdata(anl.chain)
+    assert np.all(sorted_chain == _sort_by_Tmin_slow(chain))
+    assert np.all(np.diff(sorted_chain[:,[0,2]], axis=1) >= 0)
+
+    # Only once
+    anl.sort_by_Tmin()
+    assert np.all(np.ma.getdata(anl.chain) == sorted_chain)
+
+    # set_constraint
+    f1 = lambda x: np.exp(-(x - 15.)**2 / 2. / 2.**2)
+    f2 = lambda x: math.exp(-(x - 50.)**2 / 2. / 20.**2)   # scalars only
+    f3 = lambda x: np.exp(-(x - 0.5)**2 / 2. / 0.1**2)
+
+    anl = ares.analysis.ModelSet(prefix)
+    anl.set_constraint(z_D=[None, f1], igm_Tk=[10.2, f2])
+
+    k = np.argmin(np.abs(ivars - 10.2))
+    logL = np.zeros(Ns)
+    for i in range(Ns):
+        logL[i] = np.log(f1(blob_0d[i])) + np.log(f2(blob_1d[i,k]))
+
+    assert np.allclose(anl.logL, logL)
+
+    anl.set_constraint(add_constraint=True, fX=[None, f3])
+    assert np.allclose(anl.logL, logL + np.log(f3(chain[:,-1])))
+
+    # Starts over otherwise
+    anl.set_constraint(fX=[None, f3])
+    assert np.allclose(anl.logL, np.log(f3(chain[:,-1])))
+
+    # Indexes of parameters don't care about blobs, and vice versa
+    anl = ares.analysis.ModelSet(prefix)
+    anl.get_index('fX')
+    anl.get_index('z_D')
+
+    fn_par = glob.glob('%s.fX.*.index.npy' % prefix)[0]
+    fn_blob = glob.glob('%s.z_D.*.index.npy' % prefix)[0]
+
+    with open('%s.blob_1d.igm_Tk.pkl' % prefix, 'ab') as f:
+        pickle.dump(blob_1d[0:1], f)
+
+    anl = ares.analysis.ModelSet(prefix)
+    assert SortedIndex.load(fn_par, anl._sources('fX')) is not None
+    assert SortedIndex.load(fn_blob, anl._sources('z_D')) is not None
+
+    with open('%s.chain.pkl' % prefix, 'ab') as f:
+        pickle.dump(chain[0:1], f)
+
+    anl = ares.analysis.ModelSet(prefix)
+    assert SortedIndex.load(fn_par, anl._sources('fX')) is None
+    assert SortedIndex.load(fn_blob, anl._sources('z_D')) is not None
+
+    for fn in glob.glob('%s.*' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,135 @@
+"""
+
+test_analysis_derived_blobs.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 13:47:18 PDT 2026
+
+Description: Make sure derived blobs are re-used when nothing has changed,
+recomputed when their inputs (including other derived blobs) change, and
+replaced cleanly when clobbered.
+
+"""
+
+import os
+import glob
+import time
+import ares
+import shutil
+import pickle
+import numpy as np
+from ares.physics.Constants import nu_0_mhz
+
+prefix = 'test_derived_blobs'
+
+Ns = 100
+
+# Number of times each function has been called
+calls = {'diff': 0, 'obj': 0}
+
+def diff(data, ivars):
+    calls['diff'] += 1
+    return data['nu_D'] - data['nu_C']
+
+class Diff(object):
+    def __call__(self, data, ivars):
+        calls['obj'] += 1
+        return data['nu_D'] - data['nu_C']
+
+def _save_blob(name, data):
+    with open('%s.blob_0d.%s.pkl' % (prefix, name), 'wb') as f:
+        pickle.dump(data, f)
+
+def _chunk_files(name):
+    return glob.glob('%s.columns/blob_0d.%s/*' % (prefix, name))
+
+def test():
+
+    if os.path.exists('%s.columns' % prefix):
+        shutil.rmtree('%s.columns' % prefix)
+
+    chain = np.random.rand(Ns, 2)
+    with open('%s.chain.pkl' % prefix, 'wb') as f:
+        pickle.dump(chain, f)
+    with open('%s.pinfo.pkl' % prefix, 'wb') as f:
+        pickle.dump((['par_0', 'par_1'], [False] * 2), f)
+    with open('%s.logL.pkl' % prefix, 'wb') as f:
+        pickle.dump(np.random.rand(Ns), f)
+
+    setup = {'blob_names': [['nu_C', 'nu_D']], 'blob_ivars': [None],
+        'blob_funcs': None}
+    with open('%s.setup.pkl' % prefix, 'wb') as f:
+        pickle.dump(setup, f)
+
+    nu_C = 100. + 20. * np.random.rand(Ns)
+    nu_D = 50. + 20. * np.random.rand(Ns)
+    _save_blob('nu_C', nu_C)
+    _save_blob('nu_D', nu_D)
+
+    # Functions: computed once, then re-used
+    anl = ares.analysis.ModelSet(prefix)
+    data = anl.DeriveBlob(func=diff, fields=['nu_C', 'nu_D'], name='dnu')
+    assert np.allclose(data, nu_D - nu_C)
+    assert calls['diff'] == 1
+
+    anl = ares.analysis.ModelSet(prefix)
+    data = anl.DeriveBlob(func=diff, fields=['nu_C', 'nu_D'], name='dnu')
+    assert np.allclose(data, nu_D - nu_C)
+    assert calls['diff'] == 1
+
+    # Expressions, including constants, and derived blobs of derived blobs
+    anl.DeriveBlob(expr='nu_0_mhz / x - 1.', varmap={'x': 'nu_D'}, name='z_D')
+    data = anl.DeriveBlob(expr='2 * x', varmap={'x': 'dnu'}, name='dnu2')
+    assert np.allclose(data, 2 * (nu_D - nu_C))
+    assert np.allclose(anl.ExtractData('z_D')[0]['z_D'], nu_0_mhz / nu_D - 1.)
+
+    # Inputs change: recompute, and so do blobs derived from them
+    time.sleep(1.1)
+    nu_D = 55. + 20. * np.random.rand(Ns)
+    _save_blob('nu_D', nu_D)
+
+    anl = ares.analysis.ModelSet(prefix)
+    data = anl.DeriveBlob(func=diff, fields=['nu_C', 'nu_D'], name='dnu')
+    assert np.allclose(data, nu_D - nu_C)
+    assert calls['diff'] == 2
+
+    data = anl.DeriveBlob(expr='2 * x', varmap={'x': 'dnu'}, name='dnu2')
+    assert np.allclose(data, 2 * (nu_D - nu_C))
+
+    # Different quantity with the same name: left alone unless clobbered
+    num = len(_chunk_files('dnu'))
+
+    anl = ares.analysis.ModelSet(prefix)
+    data = anl.DeriveBlob(expr='x + y', varmap={'x': 'nu_D', 'y': 'nu_C'},
+        name='dnu')
+    assert np.allclose(data, nu_D - nu_C)
+
+    data = anl.DeriveBlob(expr='x + y', varmap={'x': 'nu_D', 'y': 'nu_C'},
+        name='dnu', clobber=True)
+    assert np.allclose(data, nu_D + nu_C)
+
+    # Replaced, not added to, and old chunks cleaned up
+    anl = ares.analysis.ModelSet(prefix)
+    assert np.allclose(anl.columns.read('blob_0d.dnu'), nu_D + nu_C)
+    assert len(_chunk_files('dnu')) == num
+    assert len(anl.columns.chunks['blob_0d.dnu']) == num
+
+    # Callable objects can't be identified, so they're always recomputed...
+    for i in range(2):
+        anl.DeriveBlob(func=Diff(), fields=['nu_C', 'nu_D'], name='dnu_obj')
+    assert calls['obj'] == 2
+
+    # ...unless we say what they are
+    for i in range(2):
+        anl.DeriveBlob(func=Diff(), fields=['nu_C', 'nu_D'], name='dnu_obj',
+            version=1)
+    assert calls['obj'] == 3
+
+    shutil.rmtree('%s.columns' % prefix)
+    for fn in glob.glob('%s.*' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
+
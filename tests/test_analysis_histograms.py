@@ -0,0 +1,78 @@
+"""
+
+test_analysis_histograms.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 01:22:37 PDT 2026
+
+Description: Make sure the histograms behind triangle plots are computed
+correctly (in memory or in chunks), and aren't recomputed unnecessarily.
+
+"""
+
+import os
+import glob
+import ares
+import pickle
+import numpy as np
+
+def test(Ns=1001, Nd=3, prefix='test_hist'):
+
+    chain = np.random.normal(size=(Ns, Nd))
+    pars = ['par_%i' % i for i in range(Nd)]
+
+    with open('%s.chain.pkl' % prefix, 'wb') as f:
+        pickle.dump(chain, f)
+    with open('%s.pinfo.pkl' % prefix, 'wb') as f:
+        pickle.dump((pars, [False] * Nd), f)
+    with open('%s.logL.pkl' % prefix, 'wb') as f:
+        pickle.dump(np.random.rand(Ns), f)
+
+    anl = ares.analysis.ModelSet(prefix)
+    anl.cache_chain = False
+
+    bins = [np.linspace(-3, 3, 21)] * Nd
+    hists = anl.TriangleHistograms(pars, bins=bins)
+
+    for i in range(Nd):
+        h, x = np.histogram(chain[:,i], bins=bins[i])
+        assert np.all(hists[(i,)].counts == h)
+        for j in range(i + 1, Nd):
+            h, x, y = np.histogram2d(chain[:,i], chain[:,j], 
+                bins=[bins[i], bins[j]])
+            assert np.all(hists[(i, j)].counts == h)
+            assert np.all(hists[(j, i)].counts == h.T)
+
+    # Cached
+    assert anl.TriangleHistograms(pars, bins=bins) is hists
+
+    # Changing the mask means starting over
+    mask = np.zeros(Ns)
+    mask[0:100] = 1
+    anl.mask = mask
+    hists = anl.TriangleHistograms(pars, bins=bins)
+    h, x = np.histogram(chain[100:,0], bins=bins[0])
+    assert np.all(hists[(0,)].counts == h)
+
+    # Same thing in chunks
+    counts = anl.TriangleHistograms(pars, bins=20)[(0, 1)].counts
+    del anl._histogram_cache
+    anl.chunk_size = 64
+    assert np.all(anl.TriangleHistograms(pars, bins=20)[(0, 1)].counts \
+        == counts)
+
+    mu, err = anl.get_1d_error(pars[0], nu=0.68)
+    lo, hi = np.percentile(chain[100:,0], (16., 84.))
+    assert np.allclose(mu - err[0], lo) and np.allclose(mu + err[1], hi)
+
+    mu, cov = anl.CovarianceMatrix(pars)
+    assert np.allclose(mu, np.mean(chain[100:], axis=0))
+    assert np.allclose(cov, np.cov(chain[100:].T))
+
+    for fn in glob.glob('%s.*' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
+
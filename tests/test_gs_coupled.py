@@ -0,0 +1,40 @@
+"""
+
+test_gs_coupled.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 17:58:02 PDT 2026
+
+Description: Make sure evolving the IGM and CGM as a single system of ODEs
+gives the same answer as evolving them separately.
+
+"""
+
+import ares
+import numpy as np
+
+def test():
+
+    pars = {'verbose': False, 'progress_bar': False}
+
+    sim1 = ares.simulations.Global21cm(**pars)
+    sim1.run()
+    
+    sim2 = ares.simulations.Global21cm(coupled_phases=True, **pars)
+    sim2.run()
+    
+    z = np.arange(8, 40)
+    for key in ['dTb', 'igm_Tk', 'cgm_h_2']:
+        y1 = np.interp(z, sim1.history['z'][-1::-1], 
+            sim1.history[key][-1::-1])
+        y2 = np.interp(z, sim2.history['z'][-1::-1], 
+            sim2.history[key][-1::-1])
+        
+        assert np.allclose(y1, y2, rtol=1e-3, atol=1e-3), \
+            "Coupled solution for %s disagrees!" % key
+            
+    assert 'coupled' in sim2.stats
+    
+if __name__ == "__main__":
+    test()
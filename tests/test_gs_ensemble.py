@@ -0,0 +1,77 @@
+"""
+
+test_gs_ensemble.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 10:02:17 PDT 2026
+
+Description: Make sure running models as an ensemble reproduces running
+them one at a time.
+
+"""
+
+import ares
+import numpy as np
+
+pars = {'verbose': False, 'progress_bar': False}
+
+fX = [0.1, 1., 10.]
+models = [{'pop_yield{1}': 2.6e39 * f} for f in fX]
+
+# Redshifts at which to compare
+z = np.arange(8, 35)
+
+def _interp(hist, field):
+    return np.interp(z, hist['z'][-1::-1], hist[field][-1::-1])
+
+def test():
+
+    serial = []
+    for model in models:
+        kw = pars.copy()
+        kw.update(model)
+        sim = ares.simulations.Global21cm(**kw)
+        sim.run()
+        serial.append(sim.history)
+
+    # A single model has the same time-steps as the serial run
+    ens = ares.simulations.Global21cmEnsemble(models[1:2], **pars)
+    ens.run()
+
+    # Same fields, same shapes (i.e., history is squeezed the same way)
+    for field in serial[1]:
+        assert field in ens.history[0], field
+        assert ens.history[0][field].shape == serial[1][field].shape, field
+
+    for field in ['dTb', 'igm_Tk', 'cgm_h_2']:
+        assert np.allclose(_interp(ens.history[0], field),
+            _interp(serial[1], field), rtol=1e-4, atol=1e-6), field
+
+    # Many models share a time-step (and a single ODE solve), so answers 
+    # agree only to within time-stepping error.
+    ens = ares.simulations.Global21cmEnsemble(models, **pars)
+    ens.run()
+
+    assert len(ens.history) == len(models)
+
+    for i, model in enumerate(models):
+        dTb1 = _interp(serial[i], 'dTb')
+        dTb2 = _interp(ens.history[i], 'dTb')
+
+        assert np.max(np.abs(dTb2 - dTb1)) < 1., \
+            "Ensemble model #%i differs from serial run by > 1 mK!" % i
+
+        Tk1 = _interp(serial[i], 'igm_Tk')
+        Tk2 = _interp(ens.history[i], 'igm_Tk')
+
+        assert np.allclose(Tk1, Tk2, rtol=1e-2)
+
+        xi1 = _interp(serial[i], 'cgm_h_2')
+        xi2 = _interp(ens.history[i], 'cgm_h_2')
+
+        assert np.allclose(xi1, xi2, rtol=1e-2, atol=1e-5)
+
+if __name__ == '__main__':
+    test()
+
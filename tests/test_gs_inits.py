@@ -0,0 +1,44 @@
+"""
+
+test_gs_inits.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 16:05:48 PDT 2026
+
+Description: Make sure the pre-first-light CGM history (derived from the
+initial conditions for all redshifts at once) agrees with that computed one
+redshift at a time.
+
+"""
+
+import ares
+import numpy as np
+
+def test():
+
+    sim = ares.simulations.Global21cm(load_ics=True, verbose=False,
+        progress_bar=False)
+    sim.run()
+
+    medium = sim.medium
+    grid = medium.parcel_cgm.grid
+
+    Nz = len(medium.all_z)
+    assert Nz > 0
+
+    n_ref = np.zeros(Nz)
+    rho_ref = np.zeros(Nz)
+    for i, red in enumerate(medium.all_z):
+        data = grid.data.copy()
+        rho_ref[i] = grid.cosm.MeanBaryonDensity(red)
+        n_ref[i] = grid.particle_density(data, red)
+
+    assert np.allclose(sim.history['cgm_n'][0:Nz], n_ref, rtol=1e-12)
+    assert np.allclose(sim.history['cgm_rho'][0:Nz], rho_ref, rtol=1e-12)
+
+    for i, cgm_data in enumerate(medium.all_data_cgm):
+        assert np.shape(cgm_data['n']) == np.shape(grid.data['e'])
+
+if __name__ == '__main__':
+    test()
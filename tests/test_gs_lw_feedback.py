@@ -0,0 +1,71 @@
+"""
+
+test_gs_lw_feedback.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 10:31:52 PDT 2026
+
+Description: Make sure warm-started LW feedback iterations (shared halo
+mass function, restarts from intermediate snapshots) converge to the same
+answer as iterations that start from scratch.
+
+"""
+
+import ares
+import numpy as np
+
+# Feedback acts on the second population, which also has an upper mass
+# limit, while the halo mass function is inherited from the first.
+pars = \
+{
+ 'verbose': False,
+ 'progress_bar': False,
+ 'feedback_LW': 1,
+ 'feedback_LW_iter': 3,
+ 'pop_Tmax{1}': 1e5,
+}
+
+z = np.arange(10, 40)
+
+def _interp(hist, field):
+    return np.interp(z, hist['z'][-1::-1], hist[field][-1::-1])
+
+def test():
+
+    # Off by default
+    pf = ares.util.ParameterFile()
+    assert not pf['feedback_LW_warm_start']
+    assert not pf['feedback_LW_restart']
+
+    sims = []
+    for warm in [False, True]:
+        sim = ares.simulations.Global21cm(feedback_LW_warm_start=warm,
+            feedback_LW_restart=warm, **pars)
+        sim.run()
+        sims.append(sim)
+
+    cold, warm = sims
+
+    assert cold.count == warm.count
+
+    # Converged minimum mass
+    Mmin_cold = cold.kwargs['pop_Mmin{1}']
+    Mmin_warm = warm.kwargs['pop_Mmin{1}']
+    assert np.allclose(map(Mmin_cold, z), map(Mmin_warm, z), rtol=1e-3)
+
+    # Second population really did inherit the first's halo mass function,
+    # but kept its own upper mass limit (checked via the answer below).
+    pops = warm.medium.field.pops
+    assert pops[1].halos is pops[0].halos
+
+    for field in ['dTb', 'Jlw', 'igm_Tk']:
+        assert np.allclose(_interp(cold.history, field),
+            _interp(warm.history, field), rtol=1e-3, atol=1e-3), field
+
+    # Shared objects aren't held on to once we're done
+    assert warm.pf['hmf_instance'] is None
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,78 @@
+"""
+
+test_gs_snapshot.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 11:05:33 PDT 2026
+
+Description: Make sure a calculation forked from a snapshot gives the same
+answer as one run straight through, that snapshots survive being pickled,
+and that they aren't modified by the calculations forked from them.
+
+"""
+
+import ares
+import pickle
+import numpy as np
+
+pars = \
+{
+ 'verbose': False,
+ 'progress_bar': False,
+ 'pop_sed{1}': 'pl',
+ 'pop_alpha{1}': -1.5,
+ 'pop_Emin{1}': 2e2,
+ 'pop_Emax{1}': 3e4,
+ 'pop_EminNorm{1}': 5e2,
+ 'pop_EmaxNorm{1}': 8e3,
+ 'pop_solve_rte{1}': True,
+ 'pop_approx_tau{1}': True,
+}
+
+def _same(a, b):
+    """
+    Compare (nested) containers of arrays element by element.
+    """
+    if isinstance(a, dict):
+        return sorted(a.keys()) == sorted(b.keys()) and \
+            all([_same(a[key], b[key]) for key in a])
+    elif isinstance(a, (list, tuple)):
+        return len(a) == len(b) and \
+            all([_same(a[i], b[i]) for i in range(len(a))])
+    elif isinstance(a, np.ndarray):
+        return np.array_equal(a, b)
+    elif isinstance(a, (int, float, np.number)) or (a is None):
+        return np.all(a == b)
+    return True
+
+def test():
+
+    sim = ares.simulations.Global21cm(**pars)
+    sim.run()
+
+    state = ares.simulations.Global21cm(**pars).snapshot(z=20.)
+    pickled = pickle.dumps(state)
+
+    sim1 = ares.simulations.Global21cm(**pars)
+    sim1.restore_state(state)
+    sim1.run()
+
+    # Forked calculation shouldn't have touched the snapshot
+    assert _same(state['field'], pickle.loads(pickled)['field'])
+    assert _same(state['data_igm'], pickle.loads(pickled)['data_igm'])
+
+    # Restore from pickled state
+    sim2 = ares.simulations.Global21cm(**pars)
+    sim2.restore_state(pickle.loads(pickled))
+    sim2.run()
+
+    for field in ['z', 'dTb', 'igm_Tk', 'cgm_h_2', 'Ja']:
+        assert np.allclose(sim1.history[field], sim.history[field],
+            rtol=1e-8), field
+        assert np.array_equal(sim2.history[field], sim1.history[field]), \
+            field
+
+if __name__ == '__main__':
+    test()
+
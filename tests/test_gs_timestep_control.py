@@ -0,0 +1,54 @@
+"""
+
+test_gs_timestep_control.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 11:38:26 PDT 2026
+
+Description: Make sure error-controlled time-stepping reproduces a solution
+computed with (many) small fixed-size steps, while taking fewer steps.
+
+"""
+
+import ares
+import numpy as np
+
+pars = \
+{
+ 'verbose': False,
+ 'progress_bar': False,
+ 'final_redshift': 10.,
+}
+
+z = np.arange(11, 40)
+
+def _interp(hist, field):
+    return np.interp(z, hist['z'][-1::-1], hist[field][-1::-1])
+
+def test():
+
+    # Reference: small steps
+    ref = ares.simulations.Global21cm(timestep_control='heuristic',
+        epsilon_dt=0.005, max_timestep=0.2, **pars)
+    ref.run()
+
+    sim = ares.simulations.Global21cm(timestep_control='adaptive',
+        timestep_rtol=1e-3, **pars)
+    sim.run()
+
+    assert np.max(np.abs(_interp(sim.history, 'dTb') \
+        - _interp(ref.history, 'dTb'))) < 1.
+
+    for field in ['igm_Tk', 'igm_h_2', 'cgm_h_2']:
+        assert np.allclose(_interp(sim.history, field),
+            _interp(ref.history, field), rtol=1e-2, atol=1e-6), field
+
+    # Rejected steps count as work too
+    for zone in ['igm', 'cgm']:
+        nsteps = sim.stats[zone]['accepted'] + sim.stats[zone]['rejected']
+        assert nsteps < ref.stats[zone]['accepted'], zone
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,66 @@
+"""
+
+test_inference_grid_restart.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 16:40:21 PDT 2026
+
+Description: Make sure a restarted model grid knows about models run by
+every processor of the previous run, even if there are fewer (or more)
+processors this time around.
+
+"""
+
+import os
+import glob
+import pickle
+import numpy as np
+from ares.inference.ModelGrid import ModelGrid
+from ares.util.WriteData import write_shard_info
+from ares.util.ReadData import read_pickle_file
+
+prefix = 'test_grid_restart'
+
+def test():
+
+    mg = ModelGrid()
+    mg.axes = {'x': np.arange(4.), 'y': np.arange(3.)}
+
+    names = mg.grid.axes_names
+    models = [[kw[par] for par in names] for kw in mg.grid.all_kwargs]
+
+    with open('%s.pinfo.pkl' % prefix, 'wb') as f:
+        pickle.dump((names, [False] * len(names)), f)
+
+    # Three processors each ran three models, i.e., three left to go
+    for i in range(3):
+        shard = str(i).zfill(3)
+        with open('%s.%s.chain.pkl' % (prefix, shard), 'wb') as f:
+            pickle.dump(models[3*i:3*(i+1)], f)
+
+        write_shard_info(prefix, shard, ['chain.pkl'], 3)
+
+    # Last processor crashed mid-checkpoint
+    with open('%s.002.chain.pkl' % prefix, 'ab') as f:
+        f.write('garbage')
+
+    # Restart in serial
+    mg.save_by_proc = True
+    mg._read_restart(prefix)
+
+    assert mg.done.sum() == 9
+    for kw in mg.grid.all_kwargs[0:9]:
+        assert mg.done[mg.grid.locate_entry(kw)]
+
+    # Only this processor's own models count towards what it has written
+    assert mg._num_written == 3
+
+    # Nobody else will clean up the shard of the missing processor
+    assert len(read_pickle_file('%s.002.chain.pkl' % prefix)) == 3
+
+    for fn in glob.glob('%s.*pkl' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
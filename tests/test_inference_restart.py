@@ -0,0 +1,130 @@
+"""
+
+test_inference_restart.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 14:22:40 PDT 2026
+
+Description: Make sure an MCMC that is stopped (or killed while writing a
+checkpoint, or before saving its state) and then restarted produces exactly
+the same chain, logL, and acceptance fraction as one that ran straight 
+through.
+
+"""
+
+import os
+import glob
+import pickle
+import numpy as np
+from ares.util.ReadData import flatten_chain
+from ares.inference.ModelFit import ModelFit
+
+pars = ['x', 'y']
+nwalkers = 8
+save_freq = 4
+steps = 12
+
+guesses = np.random.normal(size=(nwalkers, len(pars)))
+
+class Interrupted(Exception):
+    pass
+
+def lnprob(x):
+    return -0.5 * np.sum(x**2)
+
+def _fitter():
+    fitter = ModelFit()
+    fitter.parameters = pars
+    fitter.is_log = False
+    fitter.nwalkers = nwalkers
+    fitter.loglikelihood = lnprob
+    fitter.guesses = guesses
+    fitter.seed = 1234
+    return fitter
+
+def _run(prefix, steps, restart=False, crash=None, lost=None,
+    checkpoint_steps=None):
+    fitter = _fitter()
+    fitter.checkpoint_steps = checkpoint_steps
+
+    if lost is not None:
+        save = fitter.save_state
+
+        def save_state(ct, *args):
+            if ct == lost:
+                raise Interrupted
+            return save(ct, *args)
+
+        fitter.save_state = save_state
+
+    if crash is not None:
+        write = fitter._write_checkpoint
+
+        def _write_checkpoint(ct, pos_all, prob_all, blobs_all):
+            if ct != crash:
+                return write(ct, pos_all, prob_all, blobs_all)
+
+            # Half of the chain makes it to disk, nothing else does
+            data = pickle.dumps(flatten_chain(np.array(pos_all)))
+            with open('%s.chain.pkl' % prefix, 'ab') as f:
+                f.write(data[0:len(data) / 2])
+            raise Interrupted
+
+        fitter._write_checkpoint = _write_checkpoint
+
+    try:
+        fitter.run(prefix, steps=steps, save_freq=save_freq,
+            clobber=not restart, restart=restart)
+    except Interrupted:
+        pass
+
+def _read(prefix, suffix):
+    data = []
+    with open('%s.%s.pkl' % (prefix, suffix), 'rb') as f:
+        while True:
+            try:
+                data.append(pickle.load(f))
+            except EOFError:
+                break
+    return np.array(data)
+
+def test():
+
+    # Straight through
+    _run('test_restart_ref', steps)
+
+    # By default, the state is only saved at checkpoints, so there's no
+    # need to keep track of individual steps
+    assert not os.path.exists('test_restart_ref.state.steps.pkl')
+
+    # Stopped mid-buffer (having saved the state every step)
+    _run('test_restart_buf', 5, checkpoint_steps=1)
+    _run('test_restart_buf', steps - 5, restart=True, checkpoint_steps=1)
+
+    # Stopped at a checkpoint
+    _run('test_restart_ckpt', 2 * save_freq)
+    _run('test_restart_ckpt', steps - 2 * save_freq, restart=True)
+
+    # Stopped while writing a checkpoint, or after writing it but before
+    # saving the state: either way, resume from the previous checkpoint
+    _run('test_restart_crash', steps, crash=2 * save_freq)
+    _run('test_restart_crash', steps - save_freq, restart=True)
+
+    _run('test_restart_lost', steps, lost=2 * save_freq)
+    _run('test_restart_lost', steps - save_freq, restart=True)
+
+    for prefix in ['test_restart_buf', 'test_restart_ckpt',
+        'test_restart_crash', 'test_restart_lost']:
+        for suffix in ['chain', 'logL', 'facc']:
+            ref = _read('test_restart_ref', suffix)
+            new = _read(prefix, suffix)
+            assert ref.shape == new.shape, (prefix, suffix)
+            assert np.array_equal(ref, new), (prefix, suffix)
+
+    for fn in glob.glob('test_restart_*'):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,93 @@
+"""
+
+test_phps_tab.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 10:12:41 PDT 2026
+
+Description: Make sure grid evaluations of parameterized halo properties
+agree with point-by-point calls.
+
+"""
+
+import numpy as np
+from ares.phenom import ParameterizedHaloProperty
+
+pars_dpl_Mofz = \
+{
+'php_func': 'dpl',
+'php_func_var': 'mass',
+'php_func_par0': 1e-1,
+'php_func_par1': 'pl',
+'php_func_par1_par0': 1e11,
+'php_func_par1_par1': 6.,
+'php_func_par1_par2': -1.,
+'php_func_par2': 0.6,
+'php_func_par3': -0.5,
+'php_faux': 'pl',
+'php_faux_var': '1+z',
+'php_faux_meth': 'multiply',
+'php_faux_par0': 1.,
+'php_faux_par1': 7.,
+'php_faux_par2': 1.,
+'php_ceil': 0.1,
+}
+
+# Main function depends only on mass, auxiliary function only on redshift
+pars_pl_zdep = \
+{
+'php_func': 'pl',
+'php_func_var': 'mass',
+'php_func_par0': 1e-1,
+'php_func_par1': 1e11,
+'php_func_par2': 0.6,
+'php_faux': 'pl',
+'php_faux_var': '1+z',
+'php_faux_meth': 'multiply',
+'php_faux_par0': 1.,
+'php_faux_par1': 7.,
+'php_faux_par2': 1.,
+}
+
+def test():
+    
+    z = np.linspace(5, 30, 26)
+    Mh = np.logspace(7, 15, 200)
+    
+    php = ParameterizedHaloProperty(**pars_dpl_Mofz)
+    
+    tab = php.tabulate(z, Mh)
+    
+    assert tab.shape == (z.size, Mh.size)
+    
+    for i, red in enumerate(z):
+        assert np.allclose(tab[i], php(red, Mh))
+        
+    # Second call should come straight from the cache
+    assert php.tabulate(z, Mh) is tab
+    
+    # New instance w/ same parameters should share the cache too
+    php2 = ParameterizedHaloProperty(**pars_dpl_Mofz)
+    assert php2.tabulate(z, Mh) is tab
+    
+    # ...so nobody may modify it in place
+    try:
+        tab *= 2
+        raise AssertionError('Cached table should be read-only!')
+    except ValueError:
+        pass
+    
+    # Separable function whose pieces broadcast to the full grid
+    php3 = ParameterizedHaloProperty(**pars_pl_zdep)
+    
+    tab = php3.tabulate(z, Mh)
+    
+    assert tab.shape == (z.size, Mh.size)
+    
+    for i, red in enumerate(z):
+        assert np.allclose(tab[i], 
+            1e-1 * (Mh / 1e11)**0.6 * (1. + red) / 7.)
+    
+if __name__ == '__main__':
+    test()
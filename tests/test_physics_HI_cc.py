@@ -67,6 +67,17 @@ def test():
         # Numbers small so ignore absolute tolerance
         ok *= np.allclose(tab, interp, atol=0.0)
         
+    # Tabulated (log-log) rates should agree with splines, incl. clamping
+    T = np.logspace(-1, 5, 2000)
+    for hyd in [hydr, hydr2]:
+        for Tarr, spline, func in [(hyd.tabulated_coeff['T_H'], 
+            hyd.kappa_H_pre, hyd.kappa_H), (hyd.tabulated_coeff['T_e'], 
+            hyd.kappa_e_pre, hyd.kappa_e)]:
+            exact = spline(np.clip(T, Tarr[0], Tarr[-1]))
+            ok *= np.allclose(func(T), exact, rtol=1e-4, atol=0.0)
+            ok *= np.allclose(func(float(T[100])), exact[100], rtol=1e-4, 
+                atol=0.0)
+        
     pl.savefig('%s.png' % (__file__.rstrip('.py')))
     pl.close()        
         
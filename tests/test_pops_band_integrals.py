@@ -0,0 +1,112 @@
+"""
+
+test_pops_band_integrals.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 15:04:12 PDT 2026
+
+Description: Make sure band integrals computed from cumulative tables agree
+with the (old) approach of integrating over each band separately, for all
+ages, single bands or many at once.
+
+"""
+
+import numpy as np
+from ares.populations.SynthesisModel import SynthesisModel
+from ares.physics.Constants import erg_per_ev, s_per_myr, s_per_yr, \
+    g_per_msun
+
+bands = [(10.2, 13.6), (13.6, 24.6), (2., 8.), (13.6, 100.), (5., 5.001)]
+
+class FakeLitData(object):
+    times = np.linspace(1., 100., 20)
+    weights = np.ones_like(times)
+
+def _model(ssp):
+    pop = SynthesisModel(pop_sed='user', pop_ssp=ssp)
+    pop._litinst = FakeLitData()
+
+    # Wavelengths in ascending (i.e., energies in descending) order
+    pop._wavelengths = np.logspace(2, 4, 1000)
+    pop._data = np.random.rand(1000, FakeLitData.times.size) \
+        * np.exp(-np.log(pop._wavelengths / 1e3)**2)[:,None]
+
+    return pop
+
+def _band(pop, Emin, Emax):
+    i0 = np.argmin(np.abs(pop.energies - Emin))
+    i1 = np.argmin(np.abs(pop.energies - Emax))
+    return i0, i1
+
+def _IntegratedEmission(pop, Emin, Emax, energy_units=False):
+    i0, i1 = _band(pop, Emin, Emax)
+
+    flux = np.zeros_like(pop.times)
+    for i in range(pop.times.size):
+        if energy_units:
+            integrand = pop.data[i1:i0,i] * pop.wavelengths[i1:i0]
+        else:
+            integrand = pop.data[i1:i0,i] * pop.wavelengths[i1:i0] \
+                / (pop.energies[i1:i0] * erg_per_ev)
+
+        flux[i] = np.trapz(integrand, x=np.log(pop.wavelengths[i1:i0]))
+
+    return flux
+
+def _eV_per_phot(pop, Emin, Emax):
+    i0, i1 = _band(pop, Emin, Emax)
+
+    return np.trapz(pop.data[i1:i0,-1] * pop.energies[i1:i0],
+        x=pop.wavelengths[i1:i0]) \
+        / np.trapz(pop.data[i1:i0,-1], x=pop.wavelengths[i1:i0])
+
+def _PhotonsPerBaryon(pop, Emin, Emax):
+    photons_per_b_t = _IntegratedEmission(pop, Emin, Emax)
+    photons_per_b_t *= pop.cosm.g_per_baryon / g_per_msun
+
+    if pop.pf['pop_ssp']:
+        return np.trapz(photons_per_b_t, x=pop.times * s_per_myr) / 1e6
+    else:
+        return photons_per_b_t[-1] * s_per_yr
+
+def test():
+
+    Emin = np.array([band[0] for band in bands])
+    Emax = np.array([band[1] for band in bands])
+
+    for ssp in [True, False]:
+        pop = _model(ssp)
+
+        for i, (lo, hi) in enumerate(bands):
+
+            for energy_units in [True, False]:
+                ref = _IntegratedEmission(pop, lo, hi, energy_units)
+                new = pop.IntegratedEmission(lo, hi, energy_units)
+                assert new.shape == pop.times.shape
+                assert np.allclose(new, ref, rtol=1e-8, atol=0), (lo, hi)
+
+                # Many bands at once
+                new = pop.IntegratedEmission(Emin, Emax, energy_units)
+                assert new.shape == (len(bands), pop.times.size)
+                assert np.allclose(new[i], ref, rtol=1e-8, atol=0), (lo, hi)
+
+            ref = _PhotonsPerBaryon(pop, lo, hi)
+            assert np.allclose(pop.PhotonsPerBaryon(lo, hi), ref, rtol=1e-8,
+                atol=0), (lo, hi)
+            assert np.allclose(pop.PhotonsPerBaryon(Emin, Emax)[i], ref,
+                rtol=1e-8, atol=0), (lo, hi)
+
+            # Too narrow to contain two grid points: no mean energy
+            if hi - lo < 0.01:
+                continue
+
+            ref = _eV_per_phot(pop, lo, hi)
+            assert np.allclose(pop.eV_per_phot(lo, hi), ref, rtol=1e-8), \
+                (lo, hi)
+            assert np.allclose(pop.erg_per_phot(Emin[:-1], Emax[:-1])[i],
+                ref * erg_per_ev, rtol=1e-8), (lo, hi)
+
+if __name__ == '__main__':
+    test()
+
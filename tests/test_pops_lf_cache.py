@@ -0,0 +1,68 @@
+"""
+
+test_pops_lf_cache.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 09:12:40 PDT 2026
+
+Description: Make sure batched LF evaluation agrees with one-at-a-time
+evaluation, and that it leaves the size of the LF caches alone.
+
+"""
+
+import ares
+import numpy as np
+from ares.util.Misc import LRUDict
+
+pars = \
+{
+'pop_sfr_model': 'sfe-func',
+'pop_fstar': 'php',
+'php_func': 'pl',
+'php_func_var': 'mass',
+'php_func_par0': 1e-1,
+'php_func_par1': 1e11,
+'php_func_par2': 0.6,
+'pop_lf_cache': 2,
+}
+
+def test():
+
+    # LRU behavior
+    cache = LRUDict(maxsize=2)
+    cache['a'] = 1
+    cache['b'] = 2
+    cache['a']
+    cache['c'] = 3
+    assert cache.keys() == ['a', 'c']
+
+    cache.resize(4)
+    cache['d'] = 4
+    cache['e'] = 5
+    assert len(cache) == 4
+
+    cache.resize(2)
+    assert cache.keys() == ['d', 'e']
+
+    # Batched LFs
+    pop = ares.populations.GalaxyPopulation(**pars)
+
+    redshifts = [4., 5., 6., 7., 8.]
+    mags = np.arange(-24, -14, 0.5)
+
+    phi = pop.LuminosityFunctions(redshifts, mags)
+
+    for cache in [pop._Lh_cache, pop._phi_of_L, pop._phi_of_M]:
+        assert cache.maxsize == 2
+        assert len(cache) <= 2
+
+    for i, z in enumerate(redshifts):
+        assert np.allclose(phi[i], pop.LuminosityFunction(z, mags))
+
+    # Most recent redshifts should be cached
+    assert 8. in pop._phi_of_M
+
+if __name__ == '__main__':
+    test()
+
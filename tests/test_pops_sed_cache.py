@@ -0,0 +1,82 @@
+"""
+
+test_pops_sed_cache.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 09:41:05 PDT 2026
+
+Description: Make sure cached SED tables are re-used, and regenerated
+whenever the original data change.
+
+"""
+
+import os
+import sys
+import time
+import shutil
+import numpy as np
+from ares.util import ParameterFile
+
+# The module, not the class of the same name
+sm = sys.modules['ares.populations.SynthesisModel']
+
+path = 'test_sed_cache'
+
+class FakeLitData(object):
+    """
+    Stand-in for a litdata module whose data live in a single file.
+    """
+    def __init__(self):
+        self.__file__ = os.path.abspath(__file__)
+        self._input = os.path.abspath(path)
+        self.calls = 0
+
+    def _kwargs_to_fn(self, **kwargs):
+        return 'sed_Z%s.txt' % kwargs['pop_Z']
+
+    def _load(self, **kwargs):
+        self.calls += 1
+        data = np.loadtxt('%s/%s' % (self._input, self._kwargs_to_fn(**kwargs)))
+        return data[:,0], data[:,1:]
+
+def test():
+
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.mkdir(path)
+
+    fn = '%s/sed_Z0.02.txt' % path
+    np.savetxt(fn, np.random.rand(10, 3))
+
+    lit = FakeLitData()
+    pf = ParameterFile(pop_sed='fake', pop_Z=0.02,
+        pop_sed_cache=os.path.abspath('%s/cache' % path))
+
+    # Off by default
+    assert ParameterFile()['pop_sed_cache'] is False
+
+    wave1, data1 = sm.load_sed(lit, **pf)
+    assert lit.calls == 1
+
+    # Fresh process (simulated): read from disk
+    sm._sed_cache.clear()
+    wave2, data2 = sm.load_sed(lit, **pf)
+    assert lit.calls == 1
+    assert np.all(wave1 == wave2) and np.all(data1 == data2)
+
+    # Data change -> cache is stale
+    time.sleep(1.1)
+    np.savetxt(fn, np.random.rand(12, 3))
+
+    sm._sed_cache.clear()
+    wave3, data3 = sm.load_sed(lit, **pf)
+    assert lit.calls == 2
+    assert data3.shape == (12, 2)
+
+    sm._sed_cache.clear()
+    shutil.rmtree(path)
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,63 @@
+"""
+
+test_sources_bh_sed_tab.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 15:21:37 PDT 2026
+
+Description: Make sure tabulated MCD and SIMPL spectra (and their
+normalization) agree with those computed on-the-fly with quad to better
+than 1%.
+
+"""
+
+import ares
+import numpy as np
+
+pars = \
+{
+ 'source_mass': 10.,
+ 'source_Emin': 1e2,
+ 'source_Emax': 3e4,
+ 'source_EminNorm': 5e2,
+ 'source_EmaxNorm': 8e3,
+ 'source_fsc': 0.1,
+}
+
+# Tolerance (relative)
+rtol = 1e-2
+
+def test():
+
+    E = np.logspace(2.5, 4, 50)
+
+    for sed in ['mcd', 'simpl']:
+        bh1 = ares.sources.BlackHole(source_sed=sed, **pars)
+        bh2 = ares.sources.BlackHole(source_sed=sed, source_sed_Nbins=2000,
+            **pars)
+
+        assert not bh1.sed_tab
+        assert bh2.sed_tab
+
+        L1 = np.array(map(bh1.Spectrum, E))
+        L2 = bh2.Spectrum(E)
+
+        assert L2.shape == E.shape
+        assert np.allclose(L2, L1, rtol=rtol, atol=0), \
+            '%s: max rel. error %.2g' % (sed, np.max(np.abs(L2 - L1) / L1))
+
+        # Scalars still OK
+        assert np.allclose(bh2.Spectrum(E[10]), L1[10], rtol=rtol)
+
+        # Normalization: unity integral in (EminNorm, EmaxNorm) band
+        assert np.allclose(bh2._normL, bh1._normL, rtol=rtol)
+
+        Enorm = np.logspace(np.log10(pars['source_EminNorm']),
+            np.log10(pars['source_EmaxNorm']), 5000)
+        assert np.allclose(np.trapz(bh2.Spectrum(Enorm), x=Enorm), 1.,
+            rtol=rtol)
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,69 @@
+"""
+
+test_util_blob_cache.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 23:47:05 PDT 2026
+
+Description: Make sure blobs can be read in pieces, and that the blob
+cache respects its memory budget.
+
+"""
+
+import os
+import glob
+import shutil
+import pickle
+import numpy as np
+from ares.util.Misc import LRUDict
+from ares.util.ReadData import load_pickled, ColumnReader
+from ares.util.WriteData import ColumnWriter
+
+prefix = 'test_blob_cache'
+
+def test():
+
+    # Memory budget: room for two 800-byte arrays
+    cache = LRUDict(maxsize=None, maxbytes=2000)
+    for i in range(3):
+        cache[i] = np.ones(100)
+
+    assert 0 not in cache
+    assert cache.nbytes == 1600
+
+    cache[1]  # 1 is now most recently used
+    cache[3] = np.ones(100)
+    assert (1 in cache) and (2 not in cache)
+
+    # Blob written in two checkpoints
+    blob = np.random.rand(20, 16)
+    fn = '%s.blob_1d.igm_Tk.pkl' % prefix
+    with open(fn, 'wb') as f:
+        pickle.dump(blob[0:10], f)
+        pickle.dump(blob[10:], f)
+
+    data = load_pickled([fn], cache='%s.cache.npy' % prefix)
+    assert np.all(data == blob)
+
+    data = load_pickled([fn], cache='%s.cache.npy' % prefix)
+    assert isinstance(data, np.memmap)
+    assert np.all(data[:,3] == blob[:,3])
+
+    # Same thing, but columnar
+    writer = ColumnWriter('%s.columns' % prefix)
+    writer.append('blob_1d.igm_Tk', blob[0:10])
+    writer.append('blob_1d.igm_Tk', blob[10:])
+    writer.flush()
+
+    reader = ColumnReader('%s.columns' % prefix)
+    assert np.all(reader.read('blob_1d.igm_Tk', index=(3,)) == blob[:,3])
+    assert np.all(reader.read('blob_1d.igm_Tk', 5, 15, index=(3,)) \
+        == blob[5:15,3])
+
+    shutil.rmtree('%s.columns' % prefix)
+    for fn in glob.glob('%s.*' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
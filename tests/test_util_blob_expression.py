@@ -0,0 +1,82 @@
+"""
+
+test_util_blob_expression.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 03:48:20 PDT 2026
+
+Description: Make sure blob expressions evaluate correctly chunk by chunk,
+and that their hashes change only when they should.
+
+"""
+
+import os
+import shutil
+import numpy as np
+from ares.physics.Constants import nu_0_mhz
+from ares.util.ReadData import ColumnReader
+from ares.util.WriteData import ColumnWriter
+from ares.util.BlobExpression import BlobExpression
+
+path = 'test_blob_expression.columns'
+
+def test():
+
+    x = np.random.rand(100)
+    y = np.random.rand(100, 16)
+
+    expr = BlobExpression('log10(x) * y - 1', {'x': 'nu_D', 'y': 'igm_Tk'})
+
+    # Chunk by chunk, broadcasting 0-D against 1-D blob
+    result = []
+    for i in range(0, 100, 30):
+        data = {'nu_D': x[i:i+30], 'igm_Tk': y[i:i+30]}
+        result.append(expr.evaluate(data))
+
+    assert np.allclose(np.concatenate(result), np.log10(x)[:,None] * y - 1)
+
+    # Formatting doesn't matter, but inputs do
+    assert expr.hash == \
+        BlobExpression('log10( x )*y-1', {'x': 'nu_D', 'y': 'igm_Tk'}).hash
+    assert expr.hash != \
+        BlobExpression('log10(x) * y - 1', {'x': 'nu_C', 'y': 'igm_Tk'}).hash
+    assert expr.hash != BlobExpression('log10(x) * y - 1',
+        {'x': 'nu_D', 'y': 'igm_Tk'}, ivar={'igm_Tk': 10.}).hash
+
+    # Physical constants are available
+    expr = BlobExpression('nu_0_mhz / x - 1', {'x': 'nu_D'})
+    assert np.allclose(expr.evaluate({'nu_D': x}), nu_0_mhz / x - 1)
+
+    # Unknown names are caught right away
+    try:
+        BlobExpression('x + z', {'x': 'nu_D'})
+        raise AssertionError('Should have raised NameError!')
+    except NameError:
+        pass
+
+    # Derived blobs can be replaced in the columnar store
+    writer = ColumnWriter(path, writer='derived')
+    writer.append('blob_1d.test', np.ones((10, 16)))
+    writer.flush()
+
+    writer = ColumnWriter(path, writer='derived')
+    writer.remove('blob_1d.test')
+    writer.append('blob_0d.test', np.zeros(10))
+
+    # Old version still intact until the new one is complete
+    assert ColumnReader(path).keys() == ['blob_1d.test']
+    assert np.all(ColumnReader(path)['blob_1d.test'] == 1)
+
+    writer.flush()
+    assert not os.listdir('%s/blob_1d.test' % path)
+
+    reader = ColumnReader(path)
+    assert reader.keys() == ['blob_0d.test']
+    assert np.all(reader['blob_0d.test'] == 0)
+
+    shutil.rmtree(path)
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,81 @@
+"""
+
+test_util_columns.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 22:26:19 PDT 2026
+
+Description: Make sure columnar outputs can be appended to, read back in
+(in whole or in part), that unflushed chunks are ignored, and that writers
+can start the same column at the same time.
+
+"""
+
+import shutil
+import threading
+import numpy as np
+from ares.util.ReadData import ColumnReader
+from ares.util.WriteData import ColumnWriter
+
+path = 'test_columns.columns'
+
+def test():
+
+    chain = np.random.rand(40, 3)
+    blob = np.random.rand(40, 16)
+    ivars = np.arange(5, 21)
+
+    # Two writers (e.g., processors), two checkpoints each
+    for i in range(2):
+        writer = ColumnWriter(path, writer=str(i).zfill(3),
+            compression=(i == 1))
+        for j in range(2):
+            k = 20 * i + 10 * j
+            writer.append('chain', chain[k:k+10])
+            writer.append('blob_1d.igm_Tk', blob[k:k+10], ivars=ivars)
+            writer.flush()
+
+    # Not flushed, so shouldn't show up
+    writer.append('chain', np.zeros((10, 3)))
+
+    reader = ColumnReader(path)
+
+    assert reader.num('chain') == 40
+    assert np.all(reader['chain'] == chain)
+    assert np.all(reader['blob_1d.igm_Tk'] == blob)
+    assert np.all(reader.attrs['blob_1d.igm_Tk']['ivars'] == ivars)
+
+    # Slices that span chunks
+    assert np.all(reader.read('chain', 5, 25) == chain[5:25])
+    assert np.all(reader.read('chain', chunks=[-1]) == chain[30:])
+
+    # Single writer, e.g., on restart
+    reader = ColumnReader(path, writers=['000'])
+    assert np.all(reader['chain'] == chain[0:20])
+
+    # Many writers starting a new column at once
+    errors = []
+    def append(writer):
+        try:
+            writer.append('blob_0d.tau_e', np.ones(5))
+            writer.flush()
+        except Exception as err:
+            errors.append(err)
+
+    writers = [ColumnWriter(path, writer=str(i).zfill(3)) \
+        for i in range(10, 18)]
+    threads = [threading.Thread(target=append, args=(writer,)) \
+        for writer in writers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors, errors
+    assert ColumnReader(path).num('blob_0d.tau_e') == 40
+
+    shutil.rmtree(path)
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,63 @@
+"""
+
+test_util_data_dumps.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 19:31:55 PDT 2026
+
+Description: Make sure data dumps streamed to disk (with and without a 
+background writer thread) agree with the in-memory history.
+
+"""
+
+import os
+import ares
+import numpy as np
+from ares.util.WriteData import have_h5py
+
+def test():
+    
+    if not have_h5py:
+        return
+    
+    pf = \
+    {
+     'grid_cells': 8,
+     'isothermal': True,
+     'stop_time': 1e2,
+     'dtDataDump': 10.,
+     'radiative_transfer': False,
+     'density_units': 1.0,
+     'initial_timestep': 1,
+     'max_timestep': 1e2,
+     'restricted_timestep': None,
+     'initial_temperature': np.logspace(3, 5, 8),
+     'initial_ionization': [1.-1e-8, 1e-8],
+    }
+    
+    sim = ares.simulations.GasParcel(**pf)
+    sim.run()
+    
+    for threaded in [False, True]:
+        fn = 'test_util_data_dumps.hdf5'
+        
+        sim2 = ares.simulations.GasParcel(data_dump_file=fn, 
+            data_dump_threaded=threaded, **pf)
+        sim2.run()
+        
+        dumps = sim2.history
+        
+        assert len(dumps.dumps) > 1
+        
+        for i, t in enumerate(dumps['t']):
+            if t == 0:
+                continue
+            j = np.argmin(np.abs(sim.history['t'] - t))
+            assert np.allclose(dumps['h_2'][i], sim.history['h_2'][j])
+        
+        dumps.close()
+        os.remove(fn)
+    
+if __name__ == '__main__':
+    test()
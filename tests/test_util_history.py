@@ -0,0 +1,45 @@
+"""
+
+test_util_history.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 15:32:08 PDT 2026
+
+Description: Make sure the columnar history recorder agrees with sorting
+lists of snapshots after the fact.
+
+"""
+
+import numpy as np
+from ares.util import HistoryRecorder
+from ares.util.ReadData import _sort_history
+
+def test():
+
+    snapshots = []
+    for i in range(1000):
+        snapshots.append({'Tk': np.array([10. + i]), 'h_1': np.array([1.]),
+            'k_ion': np.ones((1, 3)) * i, 'k_ion2': np.ones((1, 3, 3)) * i})
+
+    # Start small to make sure arrays are grown correctly
+    rec = HistoryRecorder(prefix='igm_', size=4)
+    rec.extend(snapshots)
+
+    hist = _sort_history(snapshots, prefix='igm_', squeeze=True)
+
+    assert len(rec) == 1000
+    assert set(rec.keys()) == set(hist.keys())
+
+    for key in hist:
+        assert rec[key].shape == hist[key].shape
+        assert np.all(rec[key] == hist[key])
+
+    rec2 = HistoryRecorder()
+    for i in range(10):
+        rec2.append(t=float(i), z=10. - i)
+
+    assert np.all(rec2.history['t'] == np.arange(10))
+
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,58 @@
+"""
+
+test_util_history_io.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 18:52:37 PDT 2026
+
+Description: Round-trip histories through write_history / HistoryReader.
+
+"""
+
+import os
+import numpy as np
+from ares.util.ReadData import HistoryReader
+from ares.util.WriteData import write_history, HistoryWriter, have_h5py
+
+def test():
+    
+    hist = {'z': np.linspace(30, 10, 100), 'Tk': np.random.rand(100), 
+        'k_ion': np.random.rand(100, 3)}
+    pf = {'final_redshift': 10., 'initial_redshift': 30.}
+    
+    suffixes = ['npz']
+    if have_h5py:
+        suffixes.append('hdf5')
+    
+    for suffix in suffixes:
+        fn = 'test_util_history_io.%s' % suffix
+        write_history(fn, hist, pf=pf, clobber=True)
+        
+        data = HistoryReader(fn)
+        assert set(data.keys()) == set(hist.keys())
+        assert data.pf == pf
+        for key in hist:
+            assert np.all(data[key] == hist[key])
+            
+        data.close()
+        os.remove(fn)
+        
+    if not have_h5py:
+        return    
+        
+    # Stream snapshots to disk one at a time
+    fn = 'test_util_history_io.hdf5'
+    with HistoryWriter(fn, pf=pf) as writer:
+        for i in range(100):
+            snapshot = {key: hist[key][i] for key in hist}
+            writer.append(snapshot)
+            
+    data = HistoryReader(fn)
+    for key in hist:
+        assert np.all(data[key] == hist[key])
+    data.close()
+    os.remove(fn)
+            
+if __name__ == '__main__':
+    test()
@@ -0,0 +1,102 @@
+"""
+
+test_util_load_chain.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 23:02:37 PDT 2026
+
+Description: Make sure chains read from many files (and cached) agree with
+the chunk-by-chunk reader, with or without an index of chunk shapes.
+
+"""
+
+import os
+import glob
+import pickle
+import numpy as np
+from ares.util.ReadData import load_chain, load_pickled, \
+    read_pickled_chain, read_chunk_index
+from ares.util.WriteData import write_pickled_chunk, truncate_file
+
+prefix = 'test_load_chain'
+
+def test():
+
+    chain = np.random.rand(60, 3)
+
+    # Three files, each with two chunks, one of which is unflattened
+    fns = []
+    for i in range(3):
+        fn = '%s.proc%s.chain.pkl' % (prefix, str(i).zfill(4))
+        with open(fn, 'wb') as f:
+            pickle.dump(list(chain[20*i:20*i+10]), f)
+            pickle.dump(chain[20*i+10:20*(i+1)].reshape(2, 5, 3), f)
+        fns.append(fn)
+
+    cache = '%s.chain.cache.npy' % prefix
+
+    data = load_chain(fns, cache=cache)
+    assert np.all(data == chain)
+    assert np.all(load_chain(fns[0:1]) == read_pickled_chain(fns[0]))
+
+    # Second time around we should get the (memory-mapped) cache
+    data = load_chain(fns, cache=cache)
+    assert isinstance(data, np.memmap)
+    assert np.all(data == chain)
+
+    # Cache should be ignored once the files change
+    with open(fns[-1], 'ab') as f:
+        pickle.dump(list(chain[0:5]), f)
+
+    data = load_chain(fns, cache=cache)
+    assert data.shape == (65, 3)
+    assert not isinstance(data, np.memmap)
+
+    for fn in glob.glob('%s.*' % prefix):
+        os.remove(fn)
+
+    # Same thing, but with chunk shapes recorded as we go
+    for i in range(3):
+        fn = '%s.proc%s.chain.pkl' % (prefix, str(i).zfill(4))
+        write_pickled_chunk(fn, list(chain[20*i:20*i+10]))
+        write_pickled_chunk(fn, chain[20*i+10:20*(i+1)].reshape(2, 5, 3))
+
+        assert [chunk[2] for chunk in read_chunk_index(fn)] \
+            == [(10, 3), (2, 5, 3)]
+
+    assert np.all(load_chain(fns) == chain)
+
+    # Only read complete checkpoints
+    size = os.path.getsize(fns[0])
+    write_pickled_chunk(fns[0], chain[0:5])
+    data = load_chain(fns, nbytes=[size, None, None])
+    assert np.all(data == chain)
+
+    # Truncated (e.g., on restart) and appended to again
+    truncate_file(fns[0], size)
+    write_pickled_chunk(fns[0], chain[0:7])
+    data = load_chain(fns[0:1])
+    assert data.shape == (27, 3)
+    assert np.all(data[20:] == chain[0:7])
+
+    # Somebody wrote without updating the index: read the slow way
+    with open(fns[1], 'ab') as f:
+        pickle.dump(list(chain[0:5]), f)
+    assert read_chunk_index(fns[1]) is None
+    data = load_chain(fns)
+    assert data.shape == (72, 3)
+    assert np.all(data[27:47] == chain[20:40])
+
+    # Blobs, i.e., arrays of arbitrary shape per element
+    blob = np.random.rand(12, 4, 2)
+    fn = '%s.blob_2d.test.pkl' % prefix
+    write_pickled_chunk(fn, blob[0:5], 'wb')
+    write_pickled_chunk(fn, blob[5:])
+    assert np.all(load_pickled([fn]) == blob)
+
+    for fn in glob.glob('%s.*' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
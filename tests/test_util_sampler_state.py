@@ -0,0 +1,57 @@
+"""
+
+test_util_sampler_state.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 04:37:12 PDT 2026
+
+Description: Make sure sampler states survive a round trip to disk, in
+particular the random number generator, so that restarts are exact.
+
+"""
+
+import os
+import numpy as np
+from ares.util.ReadData import read_sampler_state
+from ares.util.WriteData import write_sampler_state
+
+fn = 'test_sampler_state.npz'
+
+def test():
+
+    rng = np.random.RandomState(42)
+    rng.normal()  # make sure cached gaussian matters
+
+    pos = rng.rand(3, 8, 2)
+    state = {'ct': 3, 'nbuf': 3, 'nflush': 0, 'pos': pos,
+        'lnprob': -rng.rand(3, 8), 'naccepted': np.arange(8),
+        'iterations': 3, 'rstate': rng.get_state()}
+
+    write_sampler_state(fn, state)
+
+    # Overwrites happen atomically, leaving no temporary files behind
+    write_sampler_state(fn, state)
+    assert os.listdir('.').count(fn) == 1
+    assert not [f for f in os.listdir('.') if f.startswith(fn + '.')]
+
+    saved = read_sampler_state(fn)
+
+    assert saved['ct'] == 3 and saved['iterations'] == 3
+    assert np.all(saved['pos'] == pos)
+    assert np.all(saved['naccepted'] == np.arange(8))
+
+    # Random numbers pick up exactly where they left off
+    new = np.random.RandomState()
+    new.set_state(saved['rstate'])
+
+    assert np.all(new.normal(size=10) == rng.normal(size=10))
+    assert np.all(new.rand(10) == rng.rand(10))
+
+    os.remove(fn)
+
+    assert read_sampler_state(fn) is None
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,66 @@
+"""
+
+test_util_shards.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 21:34:50 PDT 2026
+
+Description: Make sure per-processor output files (shards) can be read as
+a single data set, before and after merging, and that incomplete writes
+are ignored.
+
+"""
+
+import os
+import glob
+import pickle
+import numpy as np
+from ares.util.ReadData import read_manifest, read_sharded_pickle, \
+    read_pickle_file
+from ares.util.WriteData import write_shard_info, write_manifest, \
+    merge_shards, truncate_shard
+
+prefix = 'test_shards'
+
+def test():
+
+    chain = np.random.rand(30, 2)
+
+    # Three "processors", writing 10 models each in two checkpoints
+    for i in range(3):
+        shard = str(i).zfill(3)
+        for j in range(2):
+            with open('%s.%s.chain.pkl' % (prefix, shard), 'ab') as f:
+                pickle.dump(list(chain[10*i+5*j:10*i+5*(j+1)]), f)
+
+            write_shard_info(prefix, shard, ['chain.pkl'], 5 * (j + 1))
+
+    # Pretend last processor crashed mid-checkpoint
+    with open('%s.002.chain.pkl' % prefix, 'ab') as f:
+        f.write('garbage')
+
+    manifest = read_manifest(prefix)
+    assert manifest['num'] == 30
+
+    data = read_sharded_pickle(prefix, 'chain.pkl')
+    assert np.all(data == chain)
+
+    # Manifest vs. info from individual shards
+    write_manifest(prefix)
+    assert read_manifest(prefix)['num'] == 30
+
+    merge_shards(prefix)
+    assert np.all(read_pickle_file('%s.chain.pkl' % prefix) == chain)
+
+    # Restarts should throw out partial writes
+    info = truncate_shard(prefix, '002')
+    assert info['num'] == 10
+    assert np.all(read_pickle_file('%s.002.chain.pkl' % prefix) \
+        == chain[20:])
+
+    for fn in glob.glob('%s.*pkl' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
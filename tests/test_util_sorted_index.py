@@ -0,0 +1,66 @@
+"""
+
+test_util_sorted_index.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 02:31:44 PDT 2026
+
+Description: Make sure range queries via sorted indexes find the same
+elements as a brute-force scan, and that saved indexes go stale when the
+data they were built from change.
+
+"""
+
+import os
+import glob
+import pickle
+import numpy as np
+from ares.util.SortedIndex import SortedIndex, intersect
+
+prefix = 'test_sorted_index'
+
+def test():
+
+    x = np.random.rand(1000)
+    y = np.random.rand(1000)
+    x[10] = np.nan
+
+    ix = SortedIndex(x)
+    iy = SortedIndex(y)
+
+    ids = ix.range(0.2, 0.4)
+    assert np.all(ids == np.where(np.logical_and(x >= 0.2, x <= 0.4))[0])
+
+    # Unbounded on one side
+    assert np.all(iy.range(hi=0.5) == np.where(y <= 0.5)[0])
+    assert len(ix.range()) == 999
+
+    # Conjunctions
+    ids = intersect([ix.range(0.2, 0.4), iy.range(0.5, None)])
+    ok = np.logical_and(np.logical_and(x >= 0.2, x <= 0.4), y >= 0.5)
+    assert np.all(ids == np.where(ok)[0])
+
+    # Save, re-load
+    src = '%s.chain.pkl' % prefix
+    with open(src, 'wb') as f:
+        pickle.dump(x, f)
+
+    fn = '%s.x.index.npy' % prefix
+    ix.save(fn, [src])
+
+    index = SortedIndex.load(fn, [src])
+    assert np.all(index.range(0.2, 0.4) == ix.range(0.2, 0.4))
+
+    # Stale if source changes
+    with open(src, 'ab') as f:
+        pickle.dump(y, f)
+
+    assert SortedIndex.load(fn, [src]) is None
+
+    for fn in glob.glob('%s.*' % prefix):
+        os.remove(fn)
+
+if __name__ == '__main__':
+    test()
+
@@ -0,0 +1,73 @@
+"""
+
+test_util_streaming_stats.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 00:41:12 PDT 2026
+
+Description: Make sure statistics accumulated chunk by chunk agree with
+those computed with all samples in memory.
+
+"""
+
+import numpy as np
+from ares.util.StreamingStats import RunningMoments, StreamingHistogram, \
+    QuantileSketch
+
+def test():
+
+    x = np.random.normal(size=(10001, 3))
+    x[:,1] += 0.5 * x[:,0]
+    bins = [np.linspace(-3, 3, 21), np.linspace(-4, 4, 31)]
+
+    moments = RunningMoments(3)
+    hist1d = StreamingHistogram(bins[0:1])
+    hist2d = StreamingHistogram(bins)
+    sketch = QuantileSketch()
+
+    for i in range(0, x.shape[0], 999):
+        chunk = x[i:i+999]
+        moments.update(chunk)
+        hist1d.update([chunk[:,0]])
+        hist2d.update([chunk[:,0], chunk[:,1]])
+        sketch.update(chunk[:,0])
+
+    assert np.allclose(moments.mean, np.mean(x, axis=0))
+    assert np.allclose(moments.cov, np.cov(x.T))
+
+    pdf, edges = np.histogram(x[:,0], bins=bins[0], density=True)
+    assert np.allclose(hist1d.pdf, pdf)
+
+    counts, xedges, yedges = np.histogram2d(x[:,0], x[:,1], bins=bins)
+    assert np.all(hist2d.counts == counts)
+
+    # Small data: quantiles are exact
+    q = np.array([0.16, 0.5, 0.84])
+    assert np.allclose(sketch.quantile(q), np.percentile(x[:,0], 100 * q))
+
+    # Big data: compressed sketches, built separately then merged
+    y = np.random.rand(400000)
+    sketches = [QuantileSketch(), QuantileSketch()]
+    for i in range(0, y.size, 50000):
+        sketches[(i // 50000) % 2].update(y[i:i+50000])
+
+    sketches[0].merge(sketches[1])
+
+    assert not sketches[0].exact
+    assert len(sketches[0]) < 1000
+    assert np.allclose(sketches[0].quantile(q), np.percentile(y, 100 * q),
+        atol=1e-3)
+
+    # Weights
+    w = np.random.rand(x.shape[0])
+    moments = RunningMoments(3)
+    for i in range(0, x.shape[0], 999):
+        moments.update(x[i:i+999], weights=w[i:i+999])
+
+    assert np.allclose(moments.mean, np.average(x, axis=0, weights=w))
+    assert np.allclose(moments.cov, np.cov(x.T, aweights=w))
+
+if __name__ == '__main__':
+    test()
+
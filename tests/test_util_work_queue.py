@@ -0,0 +1,60 @@
+"""
+
+test_util_work_queue.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Sun Oct 18 20:48:13 PDT 2026
+
+Description: Make sure every task is handed out exactly once, that tasks
+sharing a key stay together, and that chunks shrink as the queue empties.
+Also that a local pool keeps track of which process ran which key.
+
+"""
+
+from ares.util.WorkQueue import WorkQueue, serial_imap, pool_imap
+
+def test():
+
+    tasks = range(100)
+    keys = [i % 4 for i in tasks]
+
+    queue = WorkQueue(tasks, keys, num_workers=4)
+
+    assert len(queue) == 100
+
+    chunks = []
+    while len(queue):
+        chunk = queue.next_chunk(worker=len(chunks) % 4)
+        assert len(set([keys[task] for task in chunk])) == 1
+        for task in chunk:
+            queue.record(task, 1.)
+        chunks.append(chunk)
+
+    done = sorted(sum(chunks, []))
+    assert done == list(tasks)
+
+    # Guided self-scheduling: first chunk is biggest
+    assert len(chunks[0]) >= len(chunks[-1])
+
+    # Returned tasks get handed out again
+    queue.put_back(chunks[-1])
+    assert len(queue) == len(chunks[-1])
+
+    # Serial runs return all results
+    queue = WorkQueue(tasks, keys, max_chunk=8)
+    results = dict(serial_imap(queue, lambda task: task**2))
+
+    assert len(results) == 100
+    assert all([results[task] == task**2 for task in tasks])
+
+    # Same with a pool. Keys are tied to real process IDs, not guesses.
+    queue = WorkQueue(tasks, keys, max_chunk=8)
+    results = dict(pool_imap(queue, lambda task: task**2, 3))
+
+    assert len(results) == 100
+    assert all([results[task] == task**2 for task in tasks])
+    assert set(queue.last_key.keys()) <= set(range(3))
+
+if __name__ == '__main__':
+    test()
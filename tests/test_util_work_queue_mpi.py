@@ -0,0 +1,137 @@
+"""
+
+test_util_work_queue_mpi.py
+
+Author: Jordan Mirocha
+Affiliation: UCLA
+Created on: Mon Oct 19 12:04:37 PDT 2026
+
+Description: Make sure the MPI dispatcher hands every task out exactly once
+(including stolen ones), and that processes in a local pool can tell each
+other apart. "MPI" here is a set of threads passing messages, so this runs
+without mpi4py.
+
+"""
+
+import sys
+import time
+import threading
+from ares.util.WorkQueue import WorkQueue, MPIWorkQueue, pool_imap, \
+    pool_worker_id
+
+# The module, not the class of the same name
+wq = sys.modules['ares.util.WorkQueue']
+
+class FakeMPI(object):
+    ANY_SOURCE = -1
+    ANY_TAG = -1
+
+    class Status(object):
+        source = None
+        tag = None
+
+class FakeComm(object):
+    """
+    Stand-in for MPI.COMM_WORLD, as seen by one processor.
+    """
+    def __init__(self, rank, size, mailbox, cond):
+        self.rank = rank
+        self.size = size
+        self.mailbox = mailbox
+        self.cond = cond
+
+    def _match(self, source, tag):
+        for i, (src, dest, tg, msg) in enumerate(self.mailbox):
+            if dest != self.rank:
+                continue
+            if source not in (FakeMPI.ANY_SOURCE, src):
+                continue
+            if tag not in (FakeMPI.ANY_TAG, tg):
+                continue
+            return i
+        return None
+
+    def send(self, msg, dest, tag):
+        with self.cond:
+            self.mailbox.append((self.rank, dest, tag, msg))
+            self.cond.notify_all()
+
+    def recv(self, source, tag, status=None):
+        with self.cond:
+            while True:
+                i = self._match(source, tag)
+                if i is not None:
+                    break
+                self.cond.wait(0.1)
+            src, dest, tg, msg = self.mailbox.pop(i)
+
+        if status is not None:
+            status.source, status.tag = src, tg
+
+        return msg
+
+    def Iprobe(self, source, tag):
+        with self.cond:
+            return self._match(source, tag) is not None
+
+def test():
+
+    size = 4
+    tasks = range(60)
+    keys = [i % 3 for i in tasks]
+
+    mailbox = []
+    cond = threading.Condition()
+
+    MPI = wq.MPI
+    wq.MPI = FakeMPI
+
+    done = {rank: [] for rank in range(1, size)}
+
+    def work(rank):
+        queue = WorkQueue(tasks, keys, num_workers=size-1)
+        pool = MPIWorkQueue(queue, FakeComm(rank, size, mailbox, cond))
+        for task in pool.tasks():
+            # Make one worker slow so that others steal from it
+            time.sleep(1e-2 if rank == 1 else 1e-3)
+            done[rank].append(task)
+
+    try:
+        threads = [threading.Thread(target=work, args=(rank,)) \
+            for rank in range(1, size)]
+        for thread in threads:
+            thread.start()
+
+        queue = WorkQueue(tasks, keys, num_workers=size-1)
+        pool = MPIWorkQueue(queue, FakeComm(0, size, mailbox, cond))
+        assert pool.is_master()
+
+        progress = []
+        pool.dispatch(progress.append)
+
+        for thread in threads:
+            thread.join()
+    finally:
+        wq.MPI = MPI
+
+    # Every task run exactly once, and reported back to the master
+    assert sorted(sum(done.values(), [])) == list(tasks)
+    assert progress[-1] == len(tasks)
+    assert sum(queue._num.values()) == len(tasks)
+    assert not mailbox
+
+    # Everybody pitched in
+    assert all([len(done[rank]) > 0 for rank in done])
+
+    # Local pool: every process has its own ID
+    assert pool_worker_id() is None
+
+    queue = WorkQueue(tasks, keys, max_chunk=4)
+    results = dict(pool_imap(queue, lambda task: pool_worker_id(), 3))
+
+    assert len(results) == len(tasks)
+    assert set(results.values()) <= set(range(3))
+
+if __name__ == '__main__':
+    test()
+